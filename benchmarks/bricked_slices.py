@@ -0,0 +1,115 @@
+"""
+Benchmark of the latency of reading axial, coronal and sagittal slices from
+the C-order memmap of the image and from the bricked layout (BrickedVolume)
+with different brick sizes. The slices read are consecutive ones from the
+middle of the volume, as when scrolling. Cold: the OS page cache of the file
+is dropped (posix_fadvise, where available) and the brick cache is empty.
+Warm: the same slices read again.
+
+Usage:
+    python benchmarks/bricked_slices.py [number_of_slices] [brick_sizes]
+
+e.g. python benchmarks/bricked_slices.py 20 32,64
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from invesalius.data.bricked_volume import (  # noqa: E402
+    BrickCache,
+    BrickedVolume,
+    create_bricked_volume,
+)
+
+SHAPE = (400, 512, 512)
+DTYPE = "int16"
+
+
+def drop_page_cache(filename):
+    if not hasattr(os, "posix_fadvise"):
+        return
+    fd = os.open(filename, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+def read_slice(volume, axis, n):
+    if axis == 0:
+        return np.array(volume[n])
+    elif axis == 1:
+        return np.array(volume[:, n, :])
+    else:
+        return np.array(volume[:, :, n])
+
+
+def time_slices(volume, axis, indexes):
+    t0 = time.perf_counter()
+    for n in indexes:
+        read_slice(volume, axis, n)
+    return 1000 * (time.perf_counter() - t0) / len(indexes)
+
+
+def main():
+    nslices = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    if len(sys.argv) > 2:
+        brick_sizes = [int(i) for i in sys.argv[2].split(",")]
+    else:
+        brick_sizes = [32, 64]
+
+    folder = tempfile.mkdtemp()
+    filename = os.path.join(folder, "matrix.dat")
+    matrix = np.memmap(filename, mode="w+", dtype=DTYPE, shape=SHAPE)
+    rng = np.random.default_rng(0)
+    for i in range(SHAPE[0]):
+        matrix[i] = rng.integers(-1024, 3071, SHAPE[1:], dtype=DTYPE)
+    matrix.flush()
+
+    layouts = [("memmap", filename, None)]
+    try:
+        for b in brick_sizes:
+            bfilename = os.path.join(folder, "matrix_%d.bricks" % b)
+            t0 = time.perf_counter()
+            create_bricked_volume(matrix, bfilename, b).close()
+            print(
+                "Conversion to bricks of %d^3: %.2f s" % (b, time.perf_counter() - t0)
+            )
+            layouts.append(("bricks %d^3" % b, bfilename, b))
+
+        print(
+            "Volume %s, %d slices per orientation, ms per slice"
+            % ("x".join(str(i) for i in SHAPE[::-1]), nslices)
+        )
+        print("%-14s %-8s %10s %10s" % ("layout", "axis", "cold", "warm"))
+        for name, path, b in layouts:
+            for axis, orientation in enumerate(("AXIAL", "CORONAL", "SAGITAL")):
+                first = (SHAPE[axis] - nslices) // 2
+                indexes = range(first, first + nslices)
+                drop_page_cache(path)
+                if b is None:
+                    volume = np.memmap(path, mode="r", dtype=DTYPE, shape=SHAPE)
+                else:
+                    volume = BrickedVolume(
+                        path, SHAPE, DTYPE, b, mode="r", cache=BrickCache()
+                    )
+                cold = time_slices(volume, axis, indexes)
+                warm = time_slices(volume, axis, indexes)
+                print("%-14s %-8s %10.2f %10.2f" % (name, orientation, cold, warm))
+                del volume
+    finally:
+        del matrix
+        for name, path, b in layouts:
+            os.remove(path)
+        os.rmdir(folder)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Benchmark of the projection kernels of invesalius_cy.mips with different
+numbers of threads. The volume is a memmap (as the one used by Slice) and
+the kernels read the slab from it in place. MaxIP, MinIP and MeanIP are
+also compared with the NumPy reductions over a copy of the slab used
+before.
+
+Usage:
+    python benchmarks/mips_threads.py [number_slices] [repetitions]
+"""
+
+import os
+import sys
+import tempfile
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import invesalius.constants as const  # noqa: E402
+from invesalius.data.slab_projection import project, slab_view  # noqa: E402
+
+SHAPE = (400, 512, 512)
+
+PROJECTIONS = (
+    ("MaxIP", const.PROJECTION_MaxIP),
+    ("MinIP", const.PROJECTION_MinIP),
+    ("MeanIP", const.PROJECTION_MeanIP),
+    ("LMIP", const.PROJECTION_LMIP),
+    ("MIDA", const.PROJECTION_MIDA),
+    ("Contour MIP", const.PROJECTION_CONTOUR_MIP),
+    ("Contour LMIP", const.PROJECTION_CONTOUR_LMIP),
+    ("Contour MIDA", const.PROJECTION_CONTOUR_MIDA),
+)
+
+NUMPY_PROJECTIONS = {
+    const.PROJECTION_MaxIP: lambda a, axis: a.max(axis),
+    const.PROJECTION_MinIP: lambda a, axis: a.min(axis),
+    const.PROJECTION_MeanIP: lambda a, axis: a.mean(axis),
+}
+
+
+def thread_counts():
+    n = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 <= n:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != n:
+        counts.append(n)
+    return counts
+
+
+def main():
+    number_slices = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    repetitions = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    fd, filename = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        matrix = np.memmap(filename, mode="w+", dtype="int16", shape=SHAPE)
+        rng = np.random.default_rng(0)
+        for i in range(SHAPE[0]):
+            matrix[i] = rng.integers(-1024, 3071, SHAPE[1:], dtype="int16")
+        matrix.flush()
+
+        counts = thread_counts()
+        print(
+            "Volume %s, slab of %d slices, %d repetitions, ms per projection"
+            % ("x".join(str(i) for i in SHAPE[::-1]), number_slices, repetitions)
+        )
+        header = "%-14s %-8s %10s" % ("projection", "axis", "numpy")
+        header += "".join("%10s" % ("%d thr" % n) for n in counts)
+        print(header)
+
+        for orientation in ("AXIAL", "CORONAL", "SAGITAL"):
+            axis = {"AXIAL": 0, "CORONAL": 1, "SAGITAL": 2}[orientation]
+            slice_number = (SHAPE[axis] - number_slices) // 2
+            slab = slab_view(matrix, orientation, slice_number, number_slices)
+            for name, projection in PROJECTIONS:
+                line = "%-14s %-8s " % (name, orientation)
+                if projection in NUMPY_PROJECTIONS:
+                    f = NUMPY_PROJECTIONS[projection]
+                    t = timeit.timeit(
+                        lambda: f(np.array(slab), axis), number=repetitions
+                    )
+                    line += "%10.1f" % (1000 * t / repetitions)
+                else:
+                    line += "%10s" % "-"
+                for n in counts:
+                    t = timeit.timeit(
+                        lambda: project(slab, axis, projection, 300, 1.0, n),
+                        number=repetitions,
+                    )
+                    line += "%10.1f" % (1000 * t / repetitions)
+                print(line)
+    finally:
+        del matrix
+        os.remove(filename)
+
+
+if __name__ == "__main__":
+    main()
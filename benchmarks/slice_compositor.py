@@ -0,0 +1,123 @@
+"""
+Benchmark of the slice display path: the VTK pipeline used before
+(vtkImageMapToWindowLevelColors + vtkLookupTable + vtkImageMapToColors +
+vtkImageBlend) against the NumPy SliceCompositor. It also checks that both
+paths produce the same images.
+
+Usage:
+    python benchmarks/slice_compositor.py [size] [repetitions]
+"""
+
+import os
+import sys
+import timeit
+
+import numpy as np
+import vtk
+from vtk.util import numpy_support
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from invesalius.data.slice_compositor import SliceCompositor  # noqa: E402
+
+THRESHOLD_HUE_RANGE = (0, 0.6667)
+
+
+def to_vtk(n_array):
+    dy, dx = n_array.shape[:2]
+    nc = n_array.shape[2] if n_array.ndim == 3 else 1
+    image = vtk.vtkImageData()
+    image.SetDimensions(dx, dy, 1)
+    image.AllocateScalars(numpy_support.get_vtk_array_type(n_array.dtype), nc)
+    image.GetPointData().SetScalars(
+        numpy_support.numpy_to_vtk(n_array.reshape(-1, nc), deep=1)
+    )
+    return image
+
+
+def vtk_path(image, mask, ww, wl, colour, opacity):
+    colorer = vtk.vtkImageMapToWindowLevelColors()
+    colorer.SetInputData(to_vtk(image))
+    colorer.SetWindow(ww)
+    colorer.SetLevel(wl)
+    colorer.SetOutputFormatToRGB()
+    colorer.Update()
+    ww_wl_image = colorer.GetOutput()
+
+    lut_bg = vtk.vtkLookupTable()
+    lut_bg.SetTableRange(ww_wl_image.GetScalarRange())
+    lut_bg.SetSaturationRange((0, 0))
+    lut_bg.SetHueRange((0, 0))
+    lut_bg.SetValueRange((0, 1))
+    lut_bg.Build()
+    img_colours_bg = vtk.vtkImageMapToColors()
+    img_colours_bg.SetOutputFormatToRGB()
+    img_colours_bg.SetLookupTable(lut_bg)
+    img_colours_bg.SetInputData(ww_wl_image)
+    img_colours_bg.Update()
+
+    r, g, b = colour
+    lut_mask = vtk.vtkLookupTable()
+    lut_mask.SetNumberOfColors(256)
+    lut_mask.SetHueRange(THRESHOLD_HUE_RANGE)
+    lut_mask.SetSaturationRange(1, 1)
+    lut_mask.SetValueRange(0, 255)
+    lut_mask.SetRange(0, 255)
+    lut_mask.SetNumberOfTableValues(256)
+    for v in range(256):
+        lut_mask.SetTableValue(v, 0, 0, 0, 0.0)
+    lut_mask.SetTableValue(253, r, g, b, opacity)
+    lut_mask.SetTableValue(254, r, g, b, opacity)
+    lut_mask.SetTableValue(255, r, g, b, opacity)
+    lut_mask.SetRampToLinear()
+    lut_mask.Build()
+    img_colours_mask = vtk.vtkImageMapToColors()
+    img_colours_mask.SetLookupTable(lut_mask)
+    img_colours_mask.SetOutputFormatToRGBA()
+    img_colours_mask.SetInputData(to_vtk(mask))
+    img_colours_mask.Update()
+
+    blend = vtk.vtkImageBlend()
+    blend.SetBlendModeToNormal()
+    blend.SetOpacity(1, 0.8)
+    blend.SetInputData(img_colours_bg.GetOutput())
+    blend.AddInputData(img_colours_mask.GetOutput())
+    blend.Update()
+    return blend.GetOutput()
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 512
+    repetitions = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    rng = np.random.default_rng(0)
+    image = rng.integers(-1024, 3071, (size, size)).astype(np.int16)
+    mask = rng.choice(
+        np.array([0, 1, 2, 253, 254, 255], dtype=np.uint8), (size, size)
+    )
+    ww, wl = 350.0, 50.0
+    colour = (0.2, 0.7, 0.33)
+    opacity = 0.8
+
+    compositor = SliceCompositor()
+    compositor.set_window_level(ww, wl)
+
+    expected = numpy_support.vtk_to_numpy(
+        vtk_path(image, mask, ww, wl, colour, opacity).GetPointData().GetScalars()
+    ).reshape(size, size, -1)
+    result = compositor.compose(image, mask, colour, opacity)
+    print("Different pixels:", np.count_nonzero((expected != result).any(2)))
+
+    t_vtk = timeit.timeit(
+        lambda: vtk_path(image, mask, ww, wl, colour, opacity), number=repetitions
+    )
+    t_np = timeit.timeit(
+        lambda: compositor.compose(image, mask, colour, opacity), number=repetitions
+    )
+    print("%dx%d slice, %d repetitions" % (size, size, repetitions))
+    print("VTK pipeline:    %.3f ms/slice" % (1000 * t_vtk / repetitions))
+    print("SliceCompositor: %.3f ms/slice" % (1000 * t_np / repetitions))
+
+
+if __name__ == "__main__":
+    main()
@@ -651,6 +651,71 @@ PROJECTION_CONTOUR_MIDA=8
 PROJECTION_BORDER_SIZE=1.0
 PROJECTION_MIP_SIZE=2
 
+#------------ Slice cache ------------------
+# Memory (in bytes) used to keep the already computed slices of each
+# orientation. It can be changed in the config file (session/slice_cache_size).
+SLICE_CACHE_SIZE = 128 * 1024 * 1024
+
+#------------ Reoriented slices ------------------
+# Size (in pixels) of the square tiles an oblique slice is split in to be
+# sampled by several threads.
+RESLICE_TILE_SIZE = 64
+# Interpolation used while the user is rotating the volume (if the chosen one
+# is slower), the chosen one is used when the mouse is released.
+# 0 nearest neighbour, 1 trilinear, 2 tricubic, 3 Lanczos.
+RESLICE_INTERACTIVE_INTERPOLATION = 1
+
+#------------ Progressive slice rendering ------------------
+# While the user scrolls, pans or changes the window and level the slices can
+# be shown decimated (one of each PROGRESSIVE_DECIMATION x
+# PROGRESSIVE_DECIMATION pixels, 2 or 4), the full resolution slice is shown
+# after PROGRESSIVE_IDLE_TIME ms without interaction. They can be changed in
+# the config file (session/progressive_rendering, ...) or per slice viewer.
+PROGRESSIVE_RENDERING = False
+PROGRESSIVE_DECIMATION = 2
+PROGRESSIVE_IDLE_TIME = 150
+
+#------------ Render scheduler ------------------
+# The render requests of a viewer are merged and rendered at most once each
+# RENDER_FRAME_INTERVAL ms (see data/render_scheduler.py). They can be changed
+# in the config file (session/render_scheduler, session/render_frame_interval).
+RENDER_SCHEDULER = True
+RENDER_FRAME_INTERVAL = 16
+
+#------------ Volume pyramid ------------------
+# Downsampled copies (means of factor x factor x factor voxels) of the image
+# built in background after the image is loaded and saved in the project.
+VOLUME_PYRAMID_FACTORS = (2, 4, 8)
+# Maximum number of slices of the source volume read at once when building a
+# level, the building can be cancelled between blocks.
+VOLUME_PYRAMID_BLOCK_SLICES = 32
+
+#------------ Bricked volume ------------------
+# Copy of the image split in bricks of BRICK_SIZE^3 voxels (each one
+# contiguous in the file), so the axial, coronal and sagittal slices read
+# about the same amount of data. The bricks read are kept in a LRU cache of
+# BRICK_CACHE_SIZE bytes. It can be enabled in the config file
+# (session/bricked_volume, session/brick_size and session/brick_cache_size).
+BRICKED_VOLUME = False
+BRICK_SIZE = 32
+BRICK_CACHE_SIZE = 128 * 1024 * 1024
+
+#------------ Packed masks ------------------
+# The masks which are not the current one are kept packed (1 bit per voxel
+# plus the edited voxels, see data/mask_storage.py) instead of a memmap of 1
+# byte per voxel, and unpacked when they're used. It can be enabled in the
+# config file (session/packed_masks).
+PACKED_MASKS = False
+
+#------------ Edition history ------------------
+# The undo/redo history of a mask keeps the changes compressed (see
+# data/mask_history.py), up to HISTORY_MEMORY_BUDGET bytes in memory and then
+# up to HISTORY_DISK_BUDGET bytes in files, the oldest changes are forgotten
+# after. They can be changed in the config file
+# (session/history_memory_budget, session/history_disk_budget).
+HISTORY_MEMORY_BUDGET = 256 * 1024 * 1024
+HISTORY_DISK_BUDGET = 2 * 1024 * 1024 * 1024
+
 # ------------- Boolean operations ------------------
 BOOLEAN_UNION = 1
 BOOLEAN_DIFF = 2
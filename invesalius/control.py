@@ -335,7 +335,10 @@ class Controller():
         self.Slice = sl.Slice()
         self.Slice._open_image_matrix(proj.matrix_filename,
                                       tuple(proj.matrix_shape),
-                                      proj.matrix_dtype)
+                                      proj.matrix_dtype,
+                                      proj.pyramid_levels,
+                                      proj.bricks,
+                                      proj.statistics)
 
         self.Slice.window_level = proj.level
         self.Slice.window_width = proj.window
@@ -536,7 +539,10 @@ class Controller():
         self.Slice = sl.Slice()
         self.Slice._open_image_matrix(proj.matrix_filename,
                                       tuple(proj.matrix_shape),
-                                      proj.matrix_dtype)
+                                      proj.matrix_dtype,
+                                      proj.pyramid_levels,
+                                      proj.bricks,
+                                      proj.statistics)
 
         self.Slice.window_level = proj.level
         self.Slice.window_width = proj.window
@@ -623,6 +629,8 @@ class Controller():
         Publisher.sendMessage(('Set scroll position', 'AXIAL'), index=proj.matrix_shape[0]/2)
         Publisher.sendMessage(('Set scroll position', 'SAGITAL'),index=proj.matrix_shape[1]/2)
         Publisher.sendMessage(('Set scroll position', 'CORONAL'),index=proj.matrix_shape[2]/2)
+
+        self.Slice.build_volume_copies()
         
         Publisher.sendMessage('End busy cursor')
 
@@ -646,7 +654,7 @@ class Controller():
         #  proj.original_orientation = const.AXIAL
         proj.window = float(dicom.image.window)
         proj.level = float(dicom.image.level)
-        proj.threshold_range = int(matrix.min()), int(matrix.max())
+        proj.threshold_range = self.Slice.statistics.scalar_range
         proj.spacing = self.Slice.spacing
 
         ######
@@ -686,10 +694,10 @@ class Controller():
 
         proj.original_orientation =\
                     name_to_const[orientation.upper()]
-        proj.window = float(matrix.max())
-        proj.level = float(matrix.max()/4)
+        proj.window = float(self.Slice.statistics.max)
+        proj.level = float(self.Slice.statistics.max/4)
         
-        proj.threshold_range = int(matrix.min()), int(matrix.max())
+        proj.threshold_range = self.Slice.statistics.scalar_range
         #const.THRESHOLD_RANGE = proj.threshold_range
 
         proj.spacing = self.Slice.spacing
@@ -728,7 +736,7 @@ class Controller():
 
         proj.window = self.Slice.window_width
         proj.level = self.Slice.window_level
-        proj.threshold_range = int(matrix.min()), int(matrix.max())
+        proj.threshold_range = self.Slice.statistics.scalar_range
         proj.spacing = self.Slice.spacing
 
         ######
@@ -798,7 +806,7 @@ class Controller():
             proj.original_orientation =\
                 name_to_const[orientation]
 
-            proj.threshold_range = int(matrix.min()), int(matrix.max())
+            proj.threshold_range = self.Slice.statistics.scalar_range
             proj.spacing = self.Slice.spacing
 
             Publisher.sendMessage('Update threshold limits list',
@@ -867,11 +875,12 @@ class Controller():
  
 
        
-       self.matrix, scalar_range, self.filename = image_utils.bitmap2memmap(filelist, size,
+       self.matrix, scalar_range, self.filename, statistics = image_utils.bitmap2memmap(filelist, size,
                                                                orientation, (sp_z, sp_y, sp_x),resolution_percentage)
 
 
        self.Slice = sl.Slice()
+       self.Slice.statistics = statistics
        self.Slice.matrix = self.matrix
        self.Slice.matrix_filename = self.filename
 
@@ -882,10 +891,10 @@ class Controller():
        elif orientation == 'SAGITTAL':
            self.Slice.spacing = zspacing, xyspacing[1], xyspacing[0]
        
-       self.Slice.window_level = float(self.matrix.max()/4)
-       self.Slice.window_width = float(self.matrix.max())
+       self.Slice.window_level = float(scalar_range[1]/4)
+       self.Slice.window_width = float(scalar_range[1])
 
-       scalar_range = int(self.matrix.min()), int(self.matrix.max())
+       scalar_range = int(scalar_range[0]), int(scalar_range[1])
        Publisher.sendMessage('Update threshold limits list',
                              threshold_range=scalar_range)
 
@@ -981,7 +990,7 @@ class Controller():
 
             xyspacing = xyspacing[0] / resolution_percentage, xyspacing[1] / resolution_percentage
 
-            self.matrix, scalar_range, self.filename = image_utils.dcm2memmap(filelist, size,
+            self.matrix, scalar_range, self.filename, statistics = image_utils.dcm2memmap(filelist, size,
                                                                         orientation, resolution_percentage)
 
             if orientation == 'AXIAL':
@@ -991,9 +1000,10 @@ class Controller():
             elif orientation == 'SAGITTAL':
                 spacing = zspacing, xyspacing[1], xyspacing[0]
         else:
-            self.matrix, scalar_range, spacing, self.filename = image_utils.dcmmf2memmap(filelist[0], orientation)
+            self.matrix, scalar_range, spacing, self.filename, statistics = image_utils.dcmmf2memmap(filelist[0], orientation)
 
         self.Slice = sl.Slice()
+        self.Slice.statistics = statistics
         self.Slice.matrix = self.matrix
         self.Slice.matrix_filename = self.filename
 
@@ -1014,15 +1024,21 @@ class Controller():
             message = _("Fix gantry tilt applying the degrees below")
             value = -1*tilt_value
             tilt_value = dialog.ShowNumberDialog(message, value)
-            image_utils.FixGantryTilt(self.matrix, self.Slice.spacing, tilt_value)
+            self.Slice.update_statistics(image_utils.FixGantryTilt(self.matrix,
+                                                                   self.Slice.spacing,
+                                                                   tilt_value,
+                                                                   statistics))
         elif (tilt_value) and not (gui):
             tilt_value = -1*tilt_value
-            image_utils.FixGantryTilt(self.matrix, self.Slice.spacing, tilt_value)
+            self.Slice.update_statistics(image_utils.FixGantryTilt(self.matrix,
+                                                                   self.Slice.spacing,
+                                                                   tilt_value,
+                                                                   statistics))
 
         self.Slice.window_level = wl
         self.Slice.window_width = ww
 
-        scalar_range = int(self.matrix.min()), int(self.matrix.max())
+        scalar_range = self.Slice.statistics.scalar_range
 
         Publisher.sendMessage('Update threshold limits list',
                               threshold_range=scalar_range)
@@ -1031,7 +1047,7 @@ class Controller():
 
     def OpenOtherFiles(self, group):
         # Retreaving matrix from image data
-        self.matrix, scalar_range, self.filename = image_utils.img2memmap(group)
+        self.matrix, scalar_range, self.filename, statistics = image_utils.img2memmap(group)
 
         hdr = group.header
         # if group.affine.any():
@@ -1046,6 +1062,7 @@ class Controller():
         ww = float((scalar_range[1] - scalar_range[0]))
 
         self.Slice = sl.Slice()
+        self.Slice.statistics = statistics
         self.Slice.matrix = self.matrix
         self.Slice.matrix_filename = self.filename
 
@@ -0,0 +1,525 @@
+# --------------------------------------------------------------------------
+# Software:     InVesalius - Software de Reconstrucao 3D de Imagens Medicas
+# Copyright:    (C) 2001  Centro de Pesquisas Renato Archer
+# Homepage:     http://www.softwarepublico.gov.br
+# Contact:      invesalius@cti.gov.br
+# License:      GNU - GPL 2 (LICENSE.txt/LICENCA.txt)
+# --------------------------------------------------------------------------
+#    Este programa e software livre; voce pode redistribui-lo e/ou
+#    modifica-lo sob os termos da Licenca Publica Geral GNU, conforme
+#    publicada pela Free Software Foundation; de acordo com a versao 2
+#    da Licenca.
+#
+#    Este programa eh distribuido na expectativa de ser util, mas SEM
+#    QUALQUER GARANTIA; sem mesmo a garantia implicita de
+#    COMERCIALIZACAO ou de ADEQUACAO A QUALQUER PROPOSITO EM
+#    PARTICULAR. Consulte a Licenca Publica Geral GNU para obter mais
+#    detalhes.
+# --------------------------------------------------------------------------
+"""
+Bricked (chunked) on-disk layout of volumes.
+
+A C-order memmap (z, y, x) stores the rows of voxels one after another, so a
+sagittal slice (matrix[:, :, n]) reads one voxel from each row and touches
+every page of the file. A BrickedVolume stores the volume in bricks of
+brick_size^3 voxels, each one contiguous in the file, and a slice of any
+orientation reads only the bricks it crosses. The bricks read are kept in a
+LRU cache (BrickCache).
+
+BrickedVolume is an ndarray-like accessor: volume[index] with integers and
+slices returns a numpy array, volume[index] = value writes through to the
+file (and the cache) and np.asarray(volume) reads the whole volume.
+
+The Slice keeps a bricked copy of the image (BrickedMirror, optional, see
+const.BRICKED_VOLUME) to read the slices from, saved in the project as
+matrix.bricks. Projects saved without it get it when opened, or offline with
+convert_project.
+"""
+
+import collections
+import operator
+import os
+import plistlib
+import shutil
+import tempfile
+import threading
+import traceback
+
+import numpy as np
+
+import invesalius.constants as const
+
+
+def _get_step_index(ranges, bounds):
+    """
+    Index of the voxels of ranges in the region bounds (which contains them).
+    """
+    return tuple(slice(r[0] - s, None, r.step) for (r, (s, e)) in zip(ranges, bounds))
+
+
+class BrickCache(object):
+    """
+    LRU cache of bricks (numpy arrays) limited by max_bytes.
+    """
+
+    def __init__(self, max_bytes=const.BRICK_CACHE_SIZE):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._bricks = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._bricks)
+
+    def get(self, key):
+        with self._lock:
+            brick = self._bricks.get(key)
+            if brick is None:
+                self.misses += 1
+            else:
+                self._bricks.move_to_end(key)
+                self.hits += 1
+            return brick
+
+    def peek(self, key):
+        """
+        The same as get, but without updating the LRU order and the stats.
+        """
+        with self._lock:
+            return self._bricks.get(key)
+
+    def put(self, key, brick):
+        with self._lock:
+            old = self._bricks.pop(key, None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            self._bricks[key] = brick
+            self.nbytes += brick.nbytes
+            while self.nbytes > self.max_bytes and len(self._bricks) > 1:
+                _, old = self._bricks.popitem(last=False)
+                self.nbytes -= old.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._bricks.clear()
+            self.nbytes = 0
+
+
+class BrickedVolume(object):
+    """
+    Volume of the given shape stored in bricks in the file filename.
+
+    Params:
+        filename: the file of the bricks, an array (nbz, nby, nbx, brick_size,
+            brick_size, brick_size). The bricks at the end of the axes are
+            padded.
+        shape: the (z, y, x) shape of the volume.
+        dtype: the type of the voxels.
+        brick_size: the size of the bricks.
+        mode: mode of the memmap of the file (w+ creates it).
+        cache: the BrickCache used, a new one if None.
+    """
+
+    ndim = 3
+
+    def __init__(
+        self,
+        filename,
+        shape,
+        dtype,
+        brick_size=const.BRICK_SIZE,
+        mode="r+",
+        cache=None,
+    ):
+        self.filename = filename
+        self.shape = tuple(int(d) for d in shape)
+        self.dtype = np.dtype(dtype)
+        self.brick_size = brick_size
+        self.nbricks = tuple((d + brick_size - 1) // brick_size for d in self.shape)
+        self._bricks = np.memmap(
+            filename,
+            dtype=self.dtype,
+            mode=mode,
+            shape=self.nbricks + (brick_size,) * 3,
+        )
+        self.cache = BrickCache() if cache is None else cache
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    @property
+    def nbytes(self):
+        return self.size * self.dtype.itemsize
+
+    def __len__(self):
+        return self.shape[0]
+
+    def get_brick(self, index):
+        """
+        Returns the brick (bz, by, bx), from the cache if it's there.
+        """
+        brick = self.cache.get(index)
+        if brick is None:
+            brick = np.array(self._bricks[index])
+            self.cache.put(index, brick)
+        return brick
+
+    def _normalize_index(self, index):
+        """
+        Returns the ranges of voxels of each axis selected by index and which
+        axes are dropped (indexed by an integer).
+        """
+        if not isinstance(index, tuple):
+            index = (index,)
+        if any(i is Ellipsis for i in index):
+            n = index.index(Ellipsis)
+            index = (
+                index[:n] + (slice(None),) * (4 - len(index)) + index[n + 1 :]
+            )
+        if len(index) > 3:
+            raise IndexError("too many indices for BrickedVolume")
+        index = index + (slice(None),) * (3 - len(index))
+        ranges = []
+        dropped = []
+        for i, d in zip(index, self.shape):
+            if isinstance(i, slice):
+                ranges.append(range(*i.indices(d)))
+                dropped.append(False)
+            else:
+                i = operator.index(i)
+                if i < 0:
+                    i += d
+                if not 0 <= i < d:
+                    raise IndexError("index %d is out of bounds" % i)
+                ranges.append(range(i, i + 1))
+                dropped.append(True)
+        return ranges, dropped
+
+    def _get_segments(self, start, stop):
+        """
+        Splits [start, stop) of one axis by the bricks: returns, for each
+        brick crossed, its index, the part of [start, stop) inside it and the
+        same part in the brick coordinates.
+        """
+        b = self.brick_size
+        segments = []
+        for i in range(start // b, (stop - 1) // b + 1):
+            s, e = max(start, i * b), min(stop, (i + 1) * b)
+            segments.append(
+                (i, slice(s - start, e - start), slice(s - i * b, e - i * b))
+            )
+        return segments
+
+    def _iter_bricks(self, bounds):
+        """
+        Yields the bricks crossed by the region bounds ((z0, z1), (y0, y1),
+        (x0, x1)) and, for each one, the part of the region inside it and the
+        same part in the brick coordinates.
+        """
+        sz, sy, sx = [self._get_segments(s, e) for (s, e) in bounds]
+        for bz, rz, kz in sz:
+            for by, ry, ky in sy:
+                for bx, rx, kx in sx:
+                    yield (bz, by, bx), (rz, ry, rx), (kz, ky, kx)
+
+    def _read(self, bounds, use_cache=True):
+        out = np.empty([e - s for (s, e) in bounds], dtype=self.dtype)
+        for index, region, brick in self._iter_bricks(bounds):
+            if use_cache:
+                out[region] = self.get_brick(index)[brick]
+            else:
+                out[region] = self._bricks[index][brick]
+        return out
+
+    def _write(self, bounds, value):
+        for index, region, brick in self._iter_bricks(bounds):
+            self._bricks[index][brick] = value[region]
+            cached = self.cache.peek(index)
+            if cached is not None:
+                cached[brick] = value[region]
+
+    def __getitem__(self, index):
+        ranges, dropped = self._normalize_index(index)
+        if any(len(r) == 0 for r in ranges):
+            out = np.empty([len(r) for r in ranges], dtype=self.dtype)
+        else:
+            bounds = [(min(r[0], r[-1]), max(r[0], r[-1]) + 1) for r in ranges]
+            out = self._read(bounds)
+            if any(r.step != 1 for r in ranges):
+                out = out[_get_step_index(ranges, bounds)]
+        return out[tuple(0 if d else slice(None) for d in dropped)]
+
+    def __setitem__(self, index, value):
+        ranges, dropped = self._normalize_index(index)
+        if any(len(r) == 0 for r in ranges):
+            return
+        shape = [len(r) for r in ranges]
+        value = np.broadcast_to(
+            np.asarray(value, dtype=self.dtype),
+            [d for (d, dropped_) in zip(shape, dropped) if not dropped_],
+        ).reshape(shape)
+        bounds = [(min(r[0], r[-1]), max(r[0], r[-1]) + 1) for r in ranges]
+        if any(r.step != 1 for r in ranges):
+            region = self._read(bounds, False)
+            region[_get_step_index(ranges, bounds)] = value
+            value = region
+        self._write(bounds, value)
+
+    def __array__(self, dtype=None, copy=None):
+        # The whole volume is read without passing through the cache, it'd
+        # only evict the bricks of the slices being shown.
+        out = self._read([(0, d) for d in self.shape], False)
+        if dtype is not None:
+            out = out.astype(dtype)
+        return out
+
+    def _iter_slabs(self):
+        b = self.brick_size
+        for z in range(0, self.shape[0], b):
+            bounds = [(z, min(z + b, self.shape[0]))] + [(0, d) for d in self.shape[1:]]
+            yield self._read(bounds, False)
+
+    def min(self):
+        return min(slab.min() for slab in self._iter_slabs())
+
+    def max(self):
+        return max(slab.max() for slab in self._iter_slabs())
+
+    def flush(self):
+        self._bricks.flush()
+
+    def close(self):
+        self.cache.clear()
+        self._bricks._mmap.close()
+
+
+def create_bricked_volume(
+    volume, filename, brick_size=const.BRICK_SIZE, cache=None, cancelled=None
+):
+    """
+    Writes volume (any array, e.g. the image memmap) in bricks in filename,
+    reading it by slabs of brick_size slices. Returns the BrickedVolume or
+    None if it was cancelled (the function cancelled returned True), in that
+    case the file is removed.
+    """
+    bvolume = BrickedVolume(
+        filename, volume.shape, volume.dtype, brick_size, mode="w+", cache=cache
+    )
+    nbz, nby, nbx = bvolume.nbricks
+    b = brick_size
+    dz, dy, dx = volume.shape
+    padded = np.zeros((b, nby * b, nbx * b), dtype=bvolume.dtype)
+    for bz in range(nbz):
+        if cancelled is not None and cancelled():
+            bvolume.close()
+            os.remove(filename)
+            return None
+        slab = np.asarray(volume[bz * b : (bz + 1) * b])
+        padded[: slab.shape[0], :dy, :dx] = slab
+        # (z, by, y, bx, x) -> (by, bx, z, y, x)
+        bvolume._bricks[bz] = padded.reshape(b, nby, b, nbx, b).transpose(1, 3, 0, 2, 4)
+    bvolume.flush()
+    return bvolume
+
+
+def get_brick_settings():
+    import invesalius.session as ses
+
+    session = ses.Session()
+    return (
+        session.get("session", "bricked_volume", const.BRICKED_VOLUME),
+        session.get("session", "brick_size", const.BRICK_SIZE),
+        session.get("session", "brick_cache_size", const.BRICK_CACHE_SIZE),
+    )
+
+
+class BrickedMirror(object):
+    """
+    Bricked copy of the image volume, created in a background thread (see
+    build) next to the image memmap. It's read-only, the volume must be
+    discarded before being modified.
+    """
+
+    def __init__(self):
+        self.volume = None
+        self._bricked = None
+        self._lock = threading.Lock()
+        self._build_id = 0
+        self._thread = None
+
+    def get(self):
+        """
+        Returns the BrickedVolume or None if it's not created.
+        """
+        with self._lock:
+            return self._bricked
+
+    def open(self, volume, info, cache_size=const.BRICK_CACHE_SIZE):
+        """
+        Uses the bricked copy saved in a project, if it matches volume.
+
+        Params:
+            volume: the image volume.
+            info: {"filename", "shape", "dtype", "brick_size"}.
+        """
+        self.discard()
+        self.volume = volume
+        if (
+            tuple(info["shape"]) != volume.shape
+            or np.dtype(info["dtype"]) != volume.dtype
+            or not os.path.exists(info["filename"])
+        ):
+            return
+        bricked = BrickedVolume(
+            info["filename"],
+            volume.shape,
+            volume.dtype,
+            info["brick_size"],
+            mode="r",
+            cache=BrickCache(cache_size),
+        )
+        with self._lock:
+            self._bricked = bricked
+
+    def build(
+        self,
+        volume,
+        filename,
+        brick_size=const.BRICK_SIZE,
+        cache_size=const.BRICK_CACHE_SIZE,
+    ):
+        """
+        Creates the bricked copy of volume in a background thread, if it
+        doesn't exist. The file is created in the folder of filename (the
+        image memmap).
+        """
+        if volume is not self.volume:
+            self.discard()
+            self.volume = volume
+        with self._lock:
+            if self._bricked is not None or (
+                self._thread is not None and self._thread.is_alive()
+            ):
+                return
+            self._thread = threading.Thread(
+                target=self._build,
+                args=(self._build_id, volume, filename, brick_size, cache_size),
+                name="BrickedMirror",
+                daemon=True,
+            )
+            self._thread.start()
+
+    def _build(self, build_id, volume, filename, brick_size, cache_size):
+        def cancelled():
+            return build_id != self._build_id
+
+        folder, name = os.path.split(filename)
+        fd, bricks_filename = tempfile.mkstemp(
+            prefix=os.path.splitext(name)[0] + "_", suffix=".bricks", dir=folder
+        )
+        os.close(fd)
+        try:
+            bricked = create_bricked_volume(
+                volume, bricks_filename, brick_size, BrickCache(cache_size), cancelled
+            )
+        except Exception:
+            traceback.print_exc()
+            os.remove(bricks_filename)
+            return
+        if bricked is None:
+            return
+        with self._lock:
+            if not cancelled():
+                self._bricked = bricked
+                return
+        bricked.close()
+        os.remove(bricks_filename)
+
+    def discard(self):
+        """
+        Cancels the building and removes the bricked copy, to be called
+        before the volume is modified or closed.
+        """
+        with self._lock:
+            self._build_id += 1
+            thread = self._thread
+            self._thread = None
+        if thread is not None:
+            thread.join()
+        with self._lock:
+            bricked = self._bricked
+            self._bricked = None
+        if bricked is not None:
+            bricked.close()
+            try:
+                os.remove(bricked.filename)
+            except OSError:
+                pass
+        self.volume = None
+
+    def SavePlist(self, filelist):
+        """
+        Adds the bricked copy (if created) to filelist and returns its info
+        to the main plist of the project.
+        """
+        bricked = self.get()
+        if bricked is None:
+            return {}
+        bricked.flush()
+        filelist[bricked.filename] = "matrix.bricks"
+        return {
+            "filename": "matrix.bricks",
+            "shape": bricked.shape,
+            "dtype": bricked.dtype.name,
+            "brick_size": bricked.brick_size,
+        }
+
+
+def convert_project(filename, output=None, brick_size=const.BRICK_SIZE):
+    """
+    Adds the bricked copy of the image to the InVesalius project filename
+    (.inv3), saved in output (or filename itself).
+    """
+    from invesalius.project import Compress, Extract
+
+    output = filename if output is None else output
+    dir_temp = tempfile.mkdtemp()
+    try:
+        filelist = Extract(filename, dir_temp)
+        dirpath = os.path.abspath(os.path.split(filelist[0])[0])
+        main_plist = os.path.join(dirpath, "main.plist")
+        with open(main_plist, "r+b") as f:
+            project = plistlib.load(f, fmt=plistlib.FMT_XML)
+
+        matrix = project["matrix"]
+        image = np.memmap(
+            os.path.join(dirpath, matrix["filename"]),
+            shape=tuple(matrix["shape"]),
+            dtype=matrix["dtype"],
+            mode="r",
+        )
+        bricked = create_bricked_volume(
+            image, os.path.join(dirpath, "matrix.bricks"), brick_size
+        )
+        project["bricks"] = {
+            "filename": "matrix.bricks",
+            "shape": bricked.shape,
+            "dtype": bricked.dtype.name,
+            "brick_size": brick_size,
+        }
+        bricked.close()
+        del image
+        with open(main_plist, "w+b") as f:
+            plistlib.dump(project, f)
+
+        files = {}
+        for root, dirs, names in os.walk(dirpath):
+            for name in names:
+                path = os.path.join(root, name)
+                files[path] = os.path.relpath(path, dirpath)
+        Compress(dirpath, output, files, project.get("compress", True))
+    finally:
+        shutil.rmtree(dir_temp)
@@ -17,33 +17,61 @@
 #    detalhes.
 # --------------------------------------------------------------------------
 
+import collections
+
 import gdcm
 import numpy as np
 import vtk
 from vtk.util import numpy_support
 
 
-def to_vtk(
-    n_array,
-    spacing=(1.0, 1.0, 1.0),
-    slice_number=0,
-    orientation="AXIAL",
-    origin=(0, 0, 0),
-    padding=(0, 0, 0),
-):
+# Number of vtkImageData, vtkDataArray and array copies made by this module.
+# Used to check that the steady-state scrolling of slices doesn't allocate.
+allocation_counter = collections.Counter()
+
+
+def reset_allocation_counter():
+    allocation_counter.clear()
+
+
+def numpy_to_vtk_array(n_array, ncomponents=1, deep=True):
+    """
+    Converts n_array to a vtkDataArray with ncomponents per tuple. If deep is
+    False the vtkDataArray references the numpy buffer (the array is kept
+    alive by the vtkDataArray), it's only copied if it's not contiguous.
+    """
+    if deep or not n_array.flags.c_contiguous:
+        allocation_counter["array_copy"] += 1
+        n_array = np.array(n_array, order="C")
+    if ncomponents == 1:
+        n_array = n_array.reshape(-1)
+    else:
+        n_array = n_array.reshape(-1, ncomponents)
+    allocation_counter["vtkDataArray"] += 1
+    return numpy_support.numpy_to_vtk(n_array, deep=0)
+
+
+def new_vtk_image():
+    allocation_counter["vtkImageData"] += 1
+    return vtk.vtkImageData()
+
+
+def get_extent(shape, slice_number=0, orientation="AXIAL", padding=(0, 0, 0)):
+    """
+    Returns the dimensions (dx, dy, dz) and the vtkImageData extent of a
+    numpy array (or slice) with the given shape from the given orientation.
+    """
     if orientation == "SAGITTAL":
         orientation = "SAGITAL"
 
     try:
-        dz, dy, dx = n_array.shape
+        dz, dy, dx = shape
     except ValueError:
-        dy, dx = n_array.shape
+        dy, dx = shape
         dz = 1
 
     px, py, pz = padding
 
-    v_image = numpy_support.numpy_to_vtk(n_array.flat)
-
     if orientation == "AXIAL":
         extent = (
             0 - px,
@@ -74,23 +102,83 @@ def to_vtk(
             dz - 1 - pz,
         )
 
+    return (dx, dy, dz), extent
+
+
+def to_vtk(
+    n_array,
+    spacing=(1.0, 1.0, 1.0),
+    slice_number=0,
+    orientation="AXIAL",
+    origin=(0, 0, 0),
+    padding=(0, 0, 0),
+    deep=True,
+):
+    """
+    Converts n_array (3D or a 2D slice) to a vtkImageData. If deep is False
+    the vtkImageData references the numpy buffer instead of copying it.
+    """
+    (dx, dy, dz), extent = get_extent(n_array.shape, slice_number, orientation, padding)
+
+    v_image = numpy_to_vtk_array(n_array, 1, deep)
+
     # Generating the vtkImageData
-    image = vtk.vtkImageData()
+    image = new_vtk_image()
     image.SetOrigin(origin)
     image.SetSpacing(spacing)
     image.SetDimensions(dx, dy, dz)
-    # SetNumberOfScalarComponents and SetScalrType were replaced by
-    # AllocateScalars
-    #  image.SetNumberOfScalarComponents(1)
-    #  image.SetScalarType(numpy_support.get_vtk_array_type(n_array.dtype))
-    image.AllocateScalars(numpy_support.get_vtk_array_type(n_array.dtype), 1)
     image.SetExtent(extent)
     image.GetPointData().SetScalars(v_image)
 
-    image_copy = vtk.vtkImageData()
-    image_copy.DeepCopy(image)
+    return image
+
 
-    return image_copy
+def np_rgb_slice_to_vtk(
+    n_array,
+    spacing=(1.0, 1.0, 1.0),
+    slice_number=0,
+    orientation="AXIAL",
+    origin=(0, 0, 0),
+    deep=True,
+):
+    """
+    Converts a (h, w, ncomponents) uint8 image of a slice (as returned by
+    SliceCompositor) to a vtkImageData placed like to_vtk places the slice.
+    """
+    image = new_vtk_image()
+    update_vtk_image(
+        image,
+        numpy_to_vtk_array(n_array, n_array.shape[2], deep),
+        n_array.shape[:2],
+        spacing,
+        slice_number,
+        orientation,
+        origin,
+    )
+    return image
+
+
+def update_vtk_image(
+    image,
+    v_array,
+    shape,
+    spacing=(1.0, 1.0, 1.0),
+    slice_number=0,
+    orientation="AXIAL",
+    origin=(0, 0, 0),
+):
+    """
+    Updates in place the vtkImageData image to show the vtkDataArray v_array,
+    a slice with the given (h, w) shape. Nothing is allocated, so a viewer
+    can keep the same vtkImageData while the slices change.
+    """
+    (dx, dy, dz), extent = get_extent(shape, slice_number, orientation)
+    image.SetOrigin(origin)
+    image.SetSpacing(spacing)
+    image.SetDimensions(dx, dy, dz)
+    image.SetExtent(extent)
+    image.GetPointData().SetScalars(v_array)
+    image.Modified()
 
 
 def to_vtk_mask(n_array, spacing=(1.0, 1.0, 1.0), origin=(0.0, 0.0, 0.0)):
@@ -21,11 +21,11 @@ import math
 
 import numpy
 import vtk
+import invesalius.data.converters as converters
 import invesalius.data.imagedata_utils as imagedata_utils
 from invesalius.project import Project as project
 import invesalius.constants as const
 
-from vtk.util import numpy_support
 
 ORIENTATION = {'AXIAL': 2,
                'CORONAL': 1,
@@ -33,7 +33,8 @@ ORIENTATION = {'AXIAL': 2,
 
 def to_vtk(n_array, spacing, slice_number, orientation):
     """
-    It transforms a numpy array into a vtkImageData.
+    It transforms a numpy array into a vtkImageData. The vtkImageData
+    references the numpy array, it is not copied.
     """
     # TODO Merge this function with imagedata_utils.to_vtk to eliminate
     # duplicated code
@@ -43,7 +44,7 @@ def to_vtk(n_array, spacing, slice_number, orientation):
         dy, dx = n_array.shape
         dz = 1
 
-    v_image = numpy_support.numpy_to_vtk(n_array.flat)
+    v_image = converters.numpy_to_vtk_array(n_array, deep=False)
 
     if orientation == 'AXIAL':
         extent = (0, dx -1, 0, dy -1, slice_number, slice_number + dz - 1)
@@ -57,19 +58,9 @@ def to_vtk(n_array, spacing, slice_number, orientation):
     image.SetSpacing(spacing)
     image.SetDimensions(dx, dy, dz)
     image.SetExtent(extent)
-    #  image.SetNumberOfScalarComponents(1)
-    #  image.SetScalarType(numpy_support.get_vtk_array_type(n_array.dtype))
-    image.AllocateScalars(numpy_support.get_vtk_array_type(n_array.dtype), 1)
-    #  image.Update()
-    image.GetCellData().SetScalars(v_image)
     image.GetPointData().SetScalars(v_image)
-    #  image.Update()
 
-    image_copy = vtk.vtkImageData()
-    image_copy.DeepCopy(image)
-    #  image_copy.Update()
-
-    return image_copy
+    return image
 
 class CursorBase(object):
     def __init__(self):
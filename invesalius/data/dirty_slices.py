@@ -0,0 +1,165 @@
+# --------------------------------------------------------------------------
+# Software:     InVesalius - Software de Reconstrucao 3D de Imagens Medicas
+# Copyright:    (C) 2001  Centro de Pesquisas Renato Archer
+# Homepage:     http://www.softwarepublico.gov.br
+# Contact:      invesalius@cti.gov.br
+# License:      GNU - GPL 2 (LICENSE.txt/LICENCA.txt)
+# --------------------------------------------------------------------------
+#    Este programa e software livre; voce pode redistribui-lo e/ou
+#    modifica-lo sob os termos da Licenca Publica Geral GNU, conforme
+#    publicada pela Free Software Foundation; de acordo com a versao 2
+#    da Licenca.
+#
+#    Este programa eh distribuido na expectativa de ser util, mas SEM
+#    QUALQUER GARANTIA; sem mesmo a garantia implicita de
+#    COMERCIALIZACAO ou de ADEQUACAO A QUALQUER PROPOSITO EM
+#    PARTICULAR. Consulte a Licenca Publica Geral GNU para obter mais
+#    detalhes.
+# --------------------------------------------------------------------------
+"""
+Index of the slices of a mask changed by each edition.
+
+Each slice of each axis keeps the generation in which it was last changed,
+the generation is a counter incremented by each change. A component saves
+the generation when it reads the mask and asks later which slices changed
+since then (changed_since, get_changed_bounds), so it only redoes the work
+of those slices: the thresholding, the surface pieces, the 3D preview and
+the project file of the mask.
+
+The index also tells which slices are thresholded (their voxels are up to
+date, the others are thresholded from the image when they're read). In the
+mask files this is kept as flags in the border of the mask matrix (see
+read_flags and write_flags), the border is not read otherwise.
+"""
+
+import numpy as np
+
+AXIS = {"AXIAL": 0, "CORONAL": 1, "SAGITAL": 2}
+
+
+class DirtySliceIndex(object):
+    """
+    Params:
+        shape: the shape (z, y, x) of the mask, without the flags border.
+        generation: the generation of all the slices, the first one of the
+            index.
+    """
+
+    def __init__(self, shape, generation=0):
+        self.shape = tuple(int(d) for d in shape)
+        self.generation = generation
+        self.slices_generation = [
+            np.full(d, generation, dtype=np.int64) for d in self.shape
+        ]
+        # The slices thresholded of each axis.
+        self.thresholded = [np.zeros(d, dtype=bool) for d in self.shape]
+
+    def set_thresholded(self, axis=None, index=slice(None), value=True):
+        """
+        Sets the slices index (an int, a slice or an array of ints) of axis,
+        or all the slices if axis is None, as thresholded (or not).
+        """
+        if axis is None:
+            for thresholded in self.thresholded:
+                thresholded[:] = value
+        else:
+            self.thresholded[axis][index] = value
+
+    def is_thresholded(self, axis, index):
+        return bool(self.thresholded[axis][index])
+
+    def mark(self, axis, index=slice(None)):
+        """
+        The slices index (an int, a slice or an array of ints) of axis were
+        changed, returns the new generation.
+        """
+        self.generation += 1
+        self.slices_generation[axis][index] = self.generation
+        return self.generation
+
+    def mark_all(self):
+        """
+        The whole mask was changed, returns the new generation.
+        """
+        self.generation += 1
+        for generations in self.slices_generation:
+            generations[:] = self.generation
+        return self.generation
+
+    def changed_since(self, axis, generation):
+        """
+        The indices of the slices of axis changed after generation.
+        """
+        return np.flatnonzero(self.slices_generation[axis] > generation)
+
+    def is_changed(self, generation):
+        return self.generation > generation
+
+    def get_changed_bounds(self, generation):
+        """
+        Returns ((z0, z1), (y0, y1), (x0, x1)) bounding the voxels which may
+        have changed after generation, or None if none changed. A slice
+        changed in one axis spans the whole mask in the others.
+        """
+        if not self.is_changed(generation):
+            return None
+        changed = [self.changed_since(axis, generation) for axis in range(3)]
+        bounds = []
+        for axis in range(3):
+            if any(changed[a].size for a in range(3) if a != axis):
+                bounds.append((0, self.shape[axis]))
+            elif changed[axis].size:
+                bounds.append((int(changed[axis][0]), int(changed[axis][-1]) + 1))
+            else:
+                return None
+        return tuple(bounds)
+
+    def is_changed_in(self, generation, axis, start, stop):
+        """
+        If any voxel in the slices [start, stop) of axis may have changed
+        after generation.
+        """
+        bounds = self.get_changed_bounds(generation)
+        if bounds is None:
+            return False
+        b_start, b_stop = bounds[axis]
+        return b_start < stop and start < b_stop
+
+    def swap_axes(self, axis0, axis1):
+        """
+        The axes of the mask were swapped (as matrix.swapaxes(axis0, axis1)).
+        """
+        for values in (self.slices_generation, self.thresholded):
+            values[axis0], values[axis1] = values[axis1], values[axis0]
+        shape = list(self.shape)
+        shape[axis0], shape[axis1] = shape[axis1], shape[axis0]
+        self.shape = tuple(shape)
+
+    def flip(self, axis):
+        """
+        The mask was flipped along axis.
+        """
+        self.thresholded[axis] = self.thresholded[axis][::-1].copy()
+
+
+def read_flags(matrix):
+    """
+    The thresholded slices of each axis kept in the flags border of a mask
+    matrix (as in the mask files): matrix[n, 0, 0], matrix[0, n, 0] and
+    matrix[0, 0, n] are not 0 if the slice n - 1 is thresholded.
+    """
+    return [
+        np.asarray(matrix[1:, 0, 0]) != 0,
+        np.asarray(matrix[0, 1:, 0]) != 0,
+        np.asarray(matrix[0, 0, 1:]) != 0,
+    ]
+
+
+def write_flags(matrix, thresholded):
+    """
+    Writes the thresholded slices of each axis as the flags border of the
+    mask matrix, see read_flags.
+    """
+    matrix[1:, 0, 0] = thresholded[0]
+    matrix[0, 1:, 0] = thresholded[1]
+    matrix[0, 0, 1:] = thresholded[2]
@@ -38,6 +38,7 @@ import invesalius.data.slice_ as sl
 import invesalius.data.transformations as tr
 import invesalius.reader.bitmap_reader as bitmap_reader
 import invesalius.utils as utils
+from invesalius.data.volume_stats import VolumeStatistics
 from invesalius import inv_paths
 from invesalius.data import vtk_utils as vtk_utils
 from skimage.color import rgb2gray
@@ -151,18 +152,26 @@ def read_dcm_slice_as_np2(filename, resolution_percentage=1.0):
     return output
 
 
-def FixGantryTilt(matrix, spacing, tilt):
+def FixGantryTilt(matrix, spacing, tilt, statistics=None):
     """
     Fix gantry tilt given a vtkImageData and the tilt value. Return new
-    vtkImageData.
+    vtkImageData. If the statistics of matrix are given, its min is used as
+    the value outside the slices and the new statistics are returned.
     """
     angle = numpy.radians(tilt)
     spacing = spacing[0], spacing[1], spacing[2]
     gntan = math.tan(angle)
 
+    if statistics is None:
+        cval = matrix.min()
+    else:
+        cval = statistics.min
+    new_statistics = VolumeStatistics(matrix.shape, matrix.dtype)
     for n, slice_ in enumerate(matrix):
         offset = gntan * n * spacing[2]
-        matrix[n] = shift(slice_, (-offset / spacing[1], 0), cval=matrix.min())
+        matrix[n] = shift(slice_, (-offset / spacing[1], 0), cval=cval)
+        new_statistics.update(matrix[n], 0, n)
+    return new_statistics
 
 
 def BuildEditedImage(imagedata, points):
@@ -355,8 +364,7 @@ def bitmap2memmap(files, slice_size, orientation, spacing, resolution_percentage
         matrix = numpy.memmap(temp_file, mode="w+", dtype="int16", shape=shape)
 
     cont = 0
-    max_scalar = None
-    min_scalar = None
+    statistics = None
 
     xy_shape = None
     first_resample_entry = False
@@ -392,12 +400,8 @@ def bitmap2memmap(files, slice_size, orientation, spacing, resolution_percentage
 
             image = image_resized
 
-        min_aux, max_aux = image.GetScalarRange()
-        if min_scalar is None or min_aux < min_scalar:
-            min_scalar = min_aux
-
-        if max_scalar is None or max_aux > max_scalar:
-            max_scalar = max_aux
+        if statistics is None:
+            statistics = VolumeStatistics(matrix.shape, matrix.dtype)
 
         array = numpy_support.vtk_to_numpy(image.GetPointData().GetScalars())
 
@@ -409,24 +413,27 @@ def bitmap2memmap(files, slice_size, orientation, spacing, resolution_percentage
         if orientation == "CORONAL":
             array.shape = matrix.shape[0], matrix.shape[2]
             matrix[:, n, :] = array[:, ::-1]
+            statistics.update(matrix[:, n, :], 1, n)
         elif orientation == "SAGITTAL":
             array.shape = matrix.shape[0], matrix.shape[1]
             # TODO: Verify if it's necessary to add the slices swapped only in
             # sagittal rmi or only in # Rasiane's case or is necessary in all
             # sagittal cases.
             matrix[:, :, n] = array[:, ::-1]
+            statistics.update(matrix[:, :, n], 2, n)
         else:
             array.shape = matrix.shape[1], matrix.shape[2]
             matrix[n] = array
+            statistics.update(matrix[n], 0, n)
 
         if len(files) > 1:
             update_progress(cont, message)
         cont += 1
 
     matrix.flush()
-    scalar_range = min_scalar, max_scalar
+    scalar_range = statistics.scalar_range
 
-    return matrix, scalar_range, temp_file
+    return matrix, scalar_range, temp_file, statistics
 
 
 def dcm2memmap(files, slice_size, orientation, resolution_percentage):
@@ -453,25 +460,29 @@ def dcm2memmap(files, slice_size, orientation, resolution_percentage):
         shape = len(files), slice_size[1], slice_size[0]
 
     matrix = numpy.memmap(temp_file, mode="w+", dtype="int16", shape=shape)
+    statistics = VolumeStatistics(matrix.shape, matrix.dtype)
     for n, f in enumerate(files):
         im_array = read_dcm_slice_as_np2(f, resolution_percentage)[::-1]
 
         if orientation == "CORONAL":
             matrix[:, shape[1] - n - 1, :] = im_array
+            statistics.update(matrix[:, shape[1] - n - 1, :], 1, shape[1] - n - 1)
         elif orientation == "SAGITTAL":
             # TODO: Verify if it's necessary to add the slices swapped only in
             # sagittal rmi or only in # Rasiane's case or is necessary in all
             # sagittal cases.
             matrix[:, :, n] = im_array
+            statistics.update(matrix[:, :, n], 2, n)
         else:
             matrix[n] = im_array
+            statistics.update(matrix[n], 0, n)
         if len(files) > 1:
             update_progress(n, message)
 
     matrix.flush()
-    scalar_range = matrix.min(), matrix.max()
+    scalar_range = statistics.scalar_range
 
-    return matrix, scalar_range, temp_file
+    return matrix, scalar_range, temp_file, statistics
 
 
 def dcmmf2memmap(dcm_file, orientation):
@@ -491,21 +502,28 @@ def dcmmf2memmap(dcm_file, orientation):
     if orientation == "CORONAL":
         spacing = xs, zs, ys
         matrix.shape = y, z, x
+        statistics = VolumeStatistics(matrix.shape, matrix.dtype)
         for n in range(z):
             matrix[:, n, :] = np_image[n][::-1]
+            statistics.update(matrix[:, n, :], 1, n)
     elif orientation == "SAGITTAL":
         spacing = zs, ys, xs
         matrix.shape = y, x, z
+        statistics = VolumeStatistics(matrix.shape, matrix.dtype)
         for n in range(z):
             matrix[:, :, n] = np_image[n][::-1]
+            statistics.update(matrix[:, :, n], 2, n)
     else:
         spacing = xs, ys, zs
-        matrix[:] = np_image[:, ::-1, :]
+        statistics = VolumeStatistics(matrix.shape, matrix.dtype)
+        for n in range(z):
+            matrix[n] = np_image[n, ::-1, :]
+            statistics.update(matrix[n], 0, n)
 
     matrix.flush()
-    scalar_range = matrix.min(), matrix.max()
+    scalar_range = statistics.scalar_range
 
-    return matrix, scalar_range, spacing, temp_file
+    return matrix, scalar_range, spacing, temp_file, statistics
 
 
 def img2memmap(group):
@@ -525,12 +543,15 @@ def img2memmap(group):
     data = numpy.fliplr(data)
 
     matrix = numpy.memmap(temp_file, mode="w+", dtype=np.int16, shape=data.shape)
-    matrix[:] = data[:]
+    statistics = VolumeStatistics(matrix.shape, matrix.dtype)
+    for n in range(matrix.shape[0]):
+        matrix[n] = data[n]
+        statistics.update(matrix[n], 0, n)
     matrix.flush()
 
-    scalar_range = numpy.amin(matrix), numpy.amax(matrix)
+    scalar_range = statistics.scalar_range
 
-    return matrix, scalar_range, temp_file
+    return matrix, scalar_range, temp_file, statistics
 
 
 def get_LUT_value_255(data, window, level):
@@ -29,50 +29,42 @@ import invesalius.constants as const
 import invesalius.data.converters as converters
 import invesalius.data.imagedata_utils as iu
 import invesalius.session as ses
+from invesalius.data.dirty_slices import AXIS, DirtySliceIndex, read_flags, write_flags
+from invesalius.data.mask_history import HistoryBudget, MaskDelta
+from invesalius.data.mask_labels import MaskLabels
+from invesalius.data.mask_storage import PackedMask
 from invesalius.data.volume import VolumeMask
 import numpy as np
 import vtk
-from invesalius_cy import floodfill
 from invesalius.pubsub import pub as Publisher
-from scipy import ndimage
 from vtk.util import numpy_support
 
 
 class EditionHistoryNode(object):
-    def __init__(self, index, orientation, array, clean=False):
+    """
+    A state of the history: the region of the mask (the slice index of
+    orientation or the VOLUME) before (previous) or after the edition in
+    delta.
+    """
+    def __init__(self, index, orientation, delta, previous=False, clean=False):
         self.index = index
         self.orientation = orientation
-        self.filename = tempfile.mktemp(suffix='.npy')
+        self.delta = delta
+        self.previous = previous
         self.clean = clean
 
-        self._save_array(array)
-
-    def _save_array(self, array):
-        np.save(self.filename, array)
-        print("Saving history", self.index, self.orientation, self.filename, self.clean)
-
-    def commit_history(self, mvolume):
-        array = np.load(self.filename)
+    def commit_history(self, mvolume, dirty_slices=None):
         if self.orientation == 'AXIAL':
-            mvolume[self.index+1,1:,1:] = array
-            if self.clean:
-                mvolume[self.index+1, 0, 0] = 1
+            self.delta.apply(mvolume[self.index+1, 1:, 1:], self.previous)
         elif self.orientation == 'CORONAL':
-            mvolume[1:, self.index+1, 1:] = array
-            if self.clean:
-                mvolume[0, self.index+1, 0] = 1
+            self.delta.apply(mvolume[1:, self.index+1, 1:], self.previous)
         elif self.orientation == 'SAGITAL':
-            mvolume[1:, 1:, self.index+1] = array
-            if self.clean:
-                mvolume[0, 0, self.index+1] = 1
+            self.delta.apply(mvolume[1:, 1:, self.index+1], self.previous)
         elif self.orientation == 'VOLUME':
-            mvolume[:] = array
+            self.delta.apply(mvolume, self.previous)
 
-        print("applying to", self.orientation, "at slice", self.index)
-
-    def __del__(self):
-        print("Removing", self.filename)
-        os.remove(self.filename)
+        if self.clean and dirty_slices is not None and self.orientation != 'VOLUME':
+            dirty_slices.set_thresholded(AXIS[self.orientation], self.index)
 
 
 class EditionHistory(object):
@@ -81,17 +73,51 @@ class EditionHistory(object):
         self.index = -1
         self.size = size * 2
 
+        session = ses.Session()
+        self.budget = HistoryBudget(
+            session.get('session', 'history_memory_budget', const.HISTORY_MEMORY_BUDGET),
+            session.get('session', 'history_disk_budget', const.HISTORY_DISK_BUDGET))
+
         Publisher.sendMessage("Enable undo", value=False)
         Publisher.sendMessage("Enable redo", value=False)
 
-    def new_node(self, index, orientation, array, p_array, clean):
+    def new_node(self, index, orientation, array, p_array, clean, offset=None, shape=None):
+        # Only the voxels changed are saved, compressed, see MaskDelta.
+        delta = MaskDelta(array, p_array, offset, shape)
+        self.add_delta(index, orientation, delta, clean)
+
+    def add_delta(self, index, orientation, delta, clean=False):
+        if delta.is_empty:
+            return
+
         # Saving the previous state, used to undo/redo correctly.
-        p_node = EditionHistoryNode(index, orientation, p_array, clean)
+        p_node = EditionHistoryNode(index, orientation, delta, True, clean)
         self.add(p_node)
 
-        node = EditionHistoryNode(index, orientation, array, clean)
+        node = EditionHistoryNode(index, orientation, delta, False, clean)
         self.add(node)
 
+        self._keep_budget()
+
+    def _keep_budget(self):
+        deltas = [node.delta for node in self.history]
+        # The oldest editions are forgotten while the history doesn't fit the
+        # disk budget, but the last one.
+        while not self.budget.spill(deltas) and self.index >= 2:
+            self.history = self.history[2:]
+            self.index -= 2
+            deltas = deltas[2:]
+        Publisher.sendMessage("Enable undo", value=self.index > 0)
+
+        memory, disk = self.get_usage()
+        Publisher.sendMessage("Update edition history usage", memory=memory, disk=disk)
+
+    def get_usage(self):
+        """
+        Returns the bytes (in memory, in disk) used by the history.
+        """
+        return self.budget.get_usage([node.delta for node in self.history])
+
     def add(self, node):
         if self.index == self.size:
             self.history.pop(0)
@@ -106,7 +132,7 @@ class EditionHistory(object):
         Publisher.sendMessage("Enable undo", value=True)
         Publisher.sendMessage("Enable redo", value=False)
 
-    def undo(self, mvolume, actual_slices=None):
+    def undo(self, mvolume, actual_slices=None, dirty_slices=None):
         h = self.history
         if self.index > 0:
             #if self.index > 0 and h[self.index].clean:
@@ -115,25 +141,25 @@ class EditionHistory(object):
                 #self._reload_slice(self.index - 1)
             if h[self.index - 1].orientation == 'VOLUME':
                 self.index -= 1
-                h[self.index].commit_history(mvolume)
+                h[self.index].commit_history(mvolume, dirty_slices)
                 self._reload_slice(self.index)
                 Publisher.sendMessage("Enable redo", value=True)
             elif actual_slices and actual_slices[h[self.index - 1].orientation] != h[self.index - 1].index:
                 self._reload_slice(self.index - 1)
             else:
                 self.index -= 1
-                h[self.index].commit_history(mvolume)
+                h[self.index].commit_history(mvolume, dirty_slices)
                 if actual_slices and self.index and actual_slices[h[self.index - 1].orientation] == h[self.index - 1].index:
                     self.index -= 1
-                    h[self.index].commit_history(mvolume)
+                    h[self.index].commit_history(mvolume, dirty_slices)
                 self._reload_slice(self.index)
                 Publisher.sendMessage("Enable redo", value=True)
 
         if self.index == 0:
             Publisher.sendMessage("Enable undo", value=False)
-        print("AT", self.index, len(self.history), self.history[self.index].filename)
+        print("AT", self.index, len(self.history))
 
-    def redo(self, mvolume, actual_slices=None):
+    def redo(self, mvolume, actual_slices=None, dirty_slices=None):
         h = self.history
         if self.index < len(h) - 1:
             #if self.index < len(h) - 1 and h[self.index].clean:
@@ -143,23 +169,23 @@ class EditionHistory(object):
 
             if h[self.index + 1].orientation == 'VOLUME':
                 self.index += 1
-                h[self.index].commit_history(mvolume)
+                h[self.index].commit_history(mvolume, dirty_slices)
                 self._reload_slice(self.index)
                 Publisher.sendMessage("Enable undo", value=True)
             elif actual_slices and actual_slices[h[self.index + 1].orientation] != h[self.index + 1].index:
                 self._reload_slice(self.index + 1)
             else:
                 self.index += 1
-                h[self.index].commit_history(mvolume)
+                h[self.index].commit_history(mvolume, dirty_slices)
                 if actual_slices and self.index < len(h) - 1 and actual_slices[h[self.index + 1].orientation] == h[self.index + 1].index:
                     self.index += 1
-                    h[self.index].commit_history(mvolume)
+                    h[self.index].commit_history(mvolume, dirty_slices)
                 self._reload_slice(self.index)
                 Publisher.sendMessage("Enable undo", value=True)
 
         if self.index == len(h) - 1:
             Publisher.sendMessage("Enable redo", value=False)
-        print("AT", self.index, len(h), h[self.index].filename)
+        print("AT", self.index, len(h))
 
     def _reload_slice(self, index):
         Publisher.sendMessage(('Set scroll position', self.history[index].orientation),
@@ -192,7 +218,20 @@ class Mask():
     def __init__(self):
         Mask.general_index += 1
         self.index = Mask.general_index
-        self.matrix = None
+        self._matrix = None
+        # The matrix packed (see pack), it's restored when matrix is used.
+        self._packed = None
+        # The slices changed by each edition (see DirtySliceIndex).
+        self.dirty_slices = None
+        # The generation of dirty_slices shown by the 3D preview.
+        self._preview_generation = -1
+        # The generation of dirty_slices and the file of the packed matrix
+        # last saved in a project.
+        self._saved_packed = (-1, None)
+        # The statistics of the mask (see Slice.get_mask_statistics).
+        self.statistics_cache = None
+        # (key, generation, labels), see get_labels.
+        self._labels = None
         self.spacing = (1.0, 1.0, 1.0)
         self.imagedata = None
         self.colour = random.choice(const.MASK_COLOUR)
@@ -211,6 +250,79 @@ class Mask():
 
         self.history = EditionHistory()
 
+    @property
+    def matrix(self):
+        if self._matrix is None and self._packed is not None:
+            self._unpack()
+        return self._matrix
+
+    @matrix.setter
+    def matrix(self, matrix):
+        self._matrix = matrix
+        self._packed = None
+
+    @matrix.deleter
+    def matrix(self):
+        del self._matrix
+        self._packed = None
+
+    @property
+    def is_packed(self):
+        return self._packed is not None
+
+    def pack(self):
+        """
+        Keeps the matrix packed (1 bit per voxel plus the edited voxels, see
+        PackedMask) and removes its memmap, until it's used again. Returns
+        False if the mask is not packed (it's shown in the 3D preview or it
+        wouldn't be much smaller).
+        """
+        if self._packed is not None:
+            return True
+        if self._matrix is None or self.volume is not None:
+            return False
+        packed = PackedMask.from_matrix(self._matrix)
+        if packed is None:
+            return False
+        self._matrix = None
+        self._packed = packed
+        try:
+            os.remove(self.temp_file)
+        except OSError:
+            pass
+        self.temp_file = None
+        return True
+
+    def _unpack(self):
+        packed = self._packed
+        self.temp_file = tempfile.mktemp()
+        matrix = np.memmap(self.temp_file, mode='w+', dtype='uint8', shape=packed.shape)
+        packed.to_matrix(matrix)
+        self._matrix = matrix
+        self._packed = None
+
+    def is_thresholded(self, orientation, index):
+        """
+        If the slice index of orientation was already thresholded (see
+        DirtySliceIndex.thresholded), without unpacking the matrix.
+        """
+        return self.dirty_slices.is_thresholded(AXIS[orientation], index)
+
+    def get_slice(self, orientation, index):
+        """
+        A copy of the slice index of orientation (without the border),
+        without unpacking the matrix.
+        """
+        if self._packed is not None:
+            return self._packed.get_slice(orientation, index)
+        n = index + 1
+        if orientation == 'AXIAL':
+            return np.array(self._matrix[n, 1:, 1:])
+        elif orientation == 'CORONAL':
+            return np.array(self._matrix[1:, n, 1:])
+        else:
+            return np.array(self._matrix[1:, 1:, n])
+
     def __bind_events(self):
         Publisher.subscribe(self.OnFlipVolume, 'Flip volume')
         Publisher.subscribe(self.OnSwapVolumeAxes, 'Swap volume axes')
@@ -230,8 +342,26 @@ class Mask():
     def save_history(self, index, orientation, array, p_array, clean=False):
         self.history.new_node(index, orientation, array, p_array, clean)
 
+    def save_history_region(self, bbox, array, p_array):
+        """
+        Saves the edition of the region bbox (slices of the matrix without
+        the border) of the volume, array and p_array are the region
+        after and before it.
+        """
+        offset = [s.start + 1 for s in bbox]
+        self.history.new_node(0, 'VOLUME', array, p_array, False, offset, self.matrix.shape)
+
+    def edit_with_history(self, edit):
+        """
+        Edits the matrix in place by blocks of axial slices, with
+        edit(block, start), and saves the edition. The matrix is not copied
+        at once, see MaskDelta.from_edition.
+        """
+        delta = MaskDelta.from_edition(self.matrix, edit)
+        self.history.add_delta(0, 'VOLUME', delta)
+
     def undo_history(self, actual_slices):
-        self.history.undo(self.matrix, actual_slices)
+        self.history.undo(self.matrix, actual_slices, self.dirty_slices)
         self.modified()
 
         # Marking the project as changed
@@ -239,7 +369,7 @@ class Mask():
         session.ChangeProject()
 
     def redo_history(self, actual_slices):
-        self.history.redo(self.matrix, actual_slices)
+        self.history.redo(self.matrix, actual_slices, self.dirty_slices)
         self.modified()
 
         # Marking the project as changed
@@ -256,11 +386,15 @@ class Mask():
         if self.volume is None:
             if self.imagedata is None:
                 self.imagedata = self.as_vtkimagedata()
+                self._preview_generation = self.dirty_slices.generation
             self.volume = VolumeMask(self)
             self.volume.create_volume()
 
     def _update_imagedata(self, update_volume_viewer=True):
-        if self.imagedata is not None:
+        # The imagedata shares the memory of the matrix, it's only updated
+        # (sent again to the GPU) if the mask was changed since.
+        if self.imagedata is not None and self.dirty_slices.is_changed(self._preview_generation):
+            self._preview_generation = self.dirty_slices.generation
             dz, dy, dx = self.matrix.shape
             #  np_image = numpy_support.vtk_to_numpy(self.imagedata.GetPointData().GetScalars())
             #  np_image[:] = self.matrix.reshape(-1)
@@ -276,9 +410,25 @@ class Mask():
     def SavePlist(self, dir_temp, filelist):
         mask = {}
         filename = u'mask_%d' % self.index
-        mask_filename = u'%s.dat' % filename
+        if self._packed is not None:
+            mask_filename = u'%s.npz' % filename
+            # It's only packed again if the mask was changed since saved.
+            generation, temp_packed = self._saved_packed
+            if generation != self.dirty_slices.generation or not os.path.exists(temp_packed):
+                self._remove_saved_packed()
+                temp_packed = tempfile.mktemp(suffix='.npz')
+                self._packed.set_flags(self.dirty_slices.thresholded)
+                self._packed.save(temp_packed)
+                self._saved_packed = (self.dirty_slices.generation, temp_packed)
+            filelist[temp_packed] = mask_filename
+            mask['mask_storage'] = 'packed'
+        else:
+            mask_filename = u'%s.dat' % filename
+            # The thresholded slices are kept in the border of the file.
+            write_flags(self.matrix, self.dirty_slices.thresholded)
+            self.matrix.flush()
+            filelist[self.temp_file] = mask_filename
         mask_filepath = os.path.join(dir_temp, mask_filename)
-        filelist[self.temp_file] = mask_filename
         #self._save_mask(mask_filepath)
 
         mask['index'] = self.index
@@ -289,7 +439,10 @@ class Mask():
         mask['edition_threshold_range'] = self.edition_threshold_range
         mask['visible'] = self.is_shown
         mask['mask_file'] = mask_filename
-        mask['mask_shape'] = self.matrix.shape
+        if self._packed is not None:
+            mask['mask_shape'] = self._packed.shape
+        else:
+            mask['mask_shape'] = self.matrix.shape
         mask['edited'] = self.was_edited
 
         plist_filename = filename + u'.plist'
@@ -320,24 +473,30 @@ class Mask():
 
         dirpath = os.path.abspath(os.path.split(filename)[0])
         path = os.path.join(dirpath, mask_file)
-        self._open_mask(path, tuple(shape))
+        if mask.get('mask_storage') == 'packed':
+            self.temp_file = None
+            self._matrix = None
+            self._packed = PackedMask.load(path)
+            self._new_dirty_slices(self._packed.shape)
+            self.dirty_slices.thresholded = self._packed.get_flags()
+        else:
+            self._open_mask(path, tuple(shape))
 
     def OnFlipVolume(self, axis):
         submatrix = self.matrix[1:, 1:, 1:]
         if axis == 0:
             submatrix[:] = submatrix[::-1]
-            self.matrix[1::, 0, 0] = self.matrix[:0:-1, 0, 0]
         elif axis == 1:
             submatrix[:] = submatrix[:, ::-1]
-            self.matrix[0, 1::, 0] = self.matrix[0, :0:-1, 0]
         elif axis == 2:
             submatrix[:] = submatrix[:, :, ::-1]
-            self.matrix[0, 0, 1::] = self.matrix[0, 0, :0:-1]
+        self.dirty_slices.flip(axis)
         self.modified()
 
     def OnSwapVolumeAxes(self, axes):
         axis0, axis1 = axes
         self.matrix = self.matrix.swapaxes(axis0, axis1)
+        self.dirty_slices.swap_axes(axis0, axis1)
         if self.volume:
             self.imagedata = self.as_vtkimagedata()
             self.volume.change_imagedata()
@@ -350,6 +509,8 @@ class Mask():
         print(">>", filename, shape)
         self.temp_file = filename
         self.matrix = np.memmap(filename, shape=shape, dtype=dtype, mode="r+")
+        self._new_dirty_slices(shape)
+        self.dirty_slices.thresholded = read_flags(self.matrix)
 
     def _set_class_index(self, index):
         Mask.general_index = index
@@ -380,12 +541,78 @@ class Mask():
         self.temp_file = tempfile.mktemp()
         shape = shape[0] + 1, shape[1] + 1, shape[2] + 1
         self.matrix = np.memmap(self.temp_file, mode='w+', dtype='uint8', shape=shape)
+        self._new_dirty_slices(shape)
+
+    def _new_dirty_slices(self, shape):
+        # The generations go on from the ones of the previous matrix, the
+        # ones saved by the consumers of the mask are still valid.
+        if self.dirty_slices is None:
+            generation = 0
+        else:
+            generation = self.dirty_slices.generation + 1
+        self.dirty_slices = DirtySliceIndex([d - 1 for d in shape], generation)
+
+    def mark_changed(self, orientation=None, index=None):
+        """
+        Marks the slice index of orientation as changed in dirty_slices, or
+        the whole mask if orientation is None (or VOLUME). Returns the new
+        generation.
+        """
+        # The packed file saved is outdated.
+        self._remove_saved_packed()
+        if orientation is None or orientation == 'VOLUME':
+            return self.dirty_slices.mark_all()
+        return self.dirty_slices.mark(AXIS[orientation], index)
+
+    def _remove_saved_packed(self):
+        generation, temp_packed = self._saved_packed
+        if temp_packed is not None:
+            try:
+                os.remove(temp_packed)
+            except OSError:
+                pass
+            self._saved_packed = (-1, None)
+
+    def set_thresholded(self, value=True, orientation=None, index=slice(None)):
+        """
+        Sets the slice index of orientation, or all the slices if orientation
+        is None, as thresholded (or not) in dirty_slices.
+        """
+        if orientation is None:
+            self.dirty_slices.set_thresholded(value=value)
+        else:
+            self.dirty_slices.set_thresholded(AXIS[orientation], index, value)
 
-    def modified(self, all_volume=False):
+    def get_labels(self, low, high, connectivity):
+        """
+        The MaskLabels of the components of the voxels of the mask with
+        values in [low, high], labelled again only if the mask was changed.
+        """
+        key = (low, high, connectivity)
+        generation = self.dirty_slices.generation
+        if self._labels is None or self._labels[:2] != (key, generation):
+            # The previous labels are released first.
+            self._labels = None
+            labels = MaskLabels(self.matrix[1:, 1:, 1:], low, high, connectivity)
+            self._labels = (key, generation, labels)
+        return self._labels[2]
+
+    def modified(self, all_volume=False, orientation=None, index=None,
+                 keep_labels=False):
+        """
+        The mask was changed: all of it or, if orientation is given, only the
+        slice index (an int or a slice of them) of orientation. If all_volume
+        all the slices are flagged as thresholded. keep_labels tells that the labels (see get_labels)
+        were updated with the change.
+        """
         if all_volume:
-            self.matrix[0] = 1
-            self.matrix[:, 0, :] = 1
-            self.matrix[:, :, 0] = 1
+            self.set_thresholded()
+            self.mark_changed()
+        else:
+            self.mark_changed(orientation, index)
+        if keep_labels and self._labels is not None:
+            key, generation, labels = self._labels
+            self._labels = (key, self.dirty_slices.generation, labels)
         if ses.Session().auto_reload_preview:
             self._update_imagedata()
         self.modified_time = time.monotonic()
@@ -429,6 +656,7 @@ class Mask():
 
         new_mask.create_mask(shape=[i-1 for i in self.matrix.shape])
         new_mask.matrix[:] = self.matrix[:]
+        new_mask.dirty_slices.thresholded = [t.copy() for t in self.dirty_slices.thresholded]
         new_mask.spacing = self.spacing
 
         return new_mask
@@ -436,48 +664,46 @@ class Mask():
     def clear_history(self):
         self.history.clear_history()
 
+    def get_history_usage(self):
+        """
+        Returns the bytes (in memory, in disk) used by the edition history.
+        """
+        return self.history.get_usage()
+
     def fill_holes_auto(self, target, conn, orientation, index, size):
-        CON2D = {4: 1, 8: 2}
-        CON3D = {6: 1, 18: 2, 26: 3}
+        CON2D = {4: 6, 8: 18}
 
+        # The holes are the components of the voxels out of the mask.
         if target == '3D':
-            cp_mask = self.matrix.copy()
             matrix = self.matrix[1:, 1:, 1:]
-            bstruct = ndimage.generate_binary_structure(3, CON3D[conn])
-
-            imask = (~(matrix > 127))
-            labels, nlabels = ndimage.label(imask, bstruct, output=np.uint16)
-
-            if nlabels == 0:
-                return
-
-            ret = floodfill.fill_holes_automatically(matrix, labels, nlabels, size)
-            if ret:
-                self.save_history(index, orientation, self.matrix.copy(), cp_mask)
+            labels = self.get_labels(0, 127, conn)
         else:
-            bstruct = ndimage.generate_binary_structure(2, CON2D[conn])
-
+            # The slice as a volume of 1 slice, the 6 and 18 connectivities
+            # are the 4 and 8 ones in the slice.
             if orientation == 'AXIAL':
-                matrix = self.matrix[index+1, 1:, 1:]
+                matrix = self.matrix[index+1:index+2, 1:, 1:]
             elif orientation == 'CORONAL':
-                matrix = self.matrix[1:, index+1, 1:]
+                matrix = self.matrix[1:, index+1:index+2, 1:]
             elif orientation == 'SAGITAL':
-                matrix = self.matrix[1:, 1:, index+1]
+                matrix = self.matrix[1:, 1:, index+1:index+2]
 
             cp_mask = matrix.copy()
+            labels = MaskLabels(matrix, 0, 127, CON2D[conn])
 
-            imask = (~(matrix > 127))
-            labels, nlabels = ndimage.label(imask, bstruct, output=np.uint16)
+        holes = labels.get_small(size)
+        if not holes.size:
+            return
 
-            if nlabels == 0:
-                return
-
-            labels = labels.reshape(1, labels.shape[0], labels.shape[1])
-            matrix = matrix.reshape(1, matrix.shape[0], matrix.shape[1])
-
-            ret = floodfill.fill_holes_automatically(matrix, labels, nlabels, size)
-            if ret:
-                self.save_history(index, orientation, matrix.copy(), cp_mask)
+        if target == '3D':
+            # Only the region of the holes is saved in the history.
+            bbox = labels.get_labels_bbox(holes)
+            p_region = np.array(matrix[bbox])
+            labels.fill_labels(holes, matrix, 254)
+            self.save_history_region(bbox, matrix[bbox], p_region)
+        else:
+            labels.fill_labels(holes, matrix, 254)
+            axis = AXIS[orientation]
+            self.save_history(index, orientation, matrix.squeeze(axis), cp_mask.squeeze(axis))
 
     def __del__(self):
         # On Linux self.matrix is already removed so it gives an error
@@ -485,4 +711,7 @@ class Mask():
             del self.matrix
         except AttributeError:
             pass
-        os.remove(self.temp_file)
+        # A packed mask has no file.
+        if self.temp_file is not None:
+            os.remove(self.temp_file)
+        self._remove_saved_packed()
@@ -0,0 +1,158 @@
+# --------------------------------------------------------------------------
+# Software:     InVesalius - Software de Reconstrucao 3D de Imagens Medicas
+# Copyright:    (C) 2001  Centro de Pesquisas Renato Archer
+# Homepage:     http://www.softwarepublico.gov.br
+# Contact:      invesalius@cti.gov.br
+# License:      GNU - GPL 2 (LICENSE.txt/LICENCA.txt)
+# --------------------------------------------------------------------------
+#    Este programa e software livre; voce pode redistribui-lo e/ou
+#    modifica-lo sob os termos da Licenca Publica Geral GNU, conforme
+#    publicada pela Free Software Foundation; de acordo com a versao 2
+#    da Licenca.
+#
+#    Este programa eh distribuido na expectativa de ser util, mas SEM
+#    QUALQUER GARANTIA; sem mesmo a garantia implicita de
+#    COMERCIALIZACAO ou de ADEQUACAO A QUALQUER PROPOSITO EM
+#    PARTICULAR. Consulte a Licenca Publica Geral GNU para obter mais
+#    detalhes.
+# --------------------------------------------------------------------------
+"""
+Boolean operations of masks, evaluated by slabs of axial slices.
+
+An expression is an operand (the index of a mask in the operands) or a
+tuple (operation, expression, ...), e.g. A union B minus C is
+
+    (DIFF, (UNION, 0, 1), 2)
+
+evaluate_to writes its result (255 in the voxels selected, 0 in the others)
+in the out volume slab by slab, the slabs are evaluated in parallel by a
+pool of threads (NumPy releases the GIL), so only the temporaries of a few
+slabs exist at once.
+"""
+
+import os
+from concurrent import futures
+
+import numpy as np
+
+from invesalius_cy import threshold as cy_threshold
+
+# Axial slices evaluated at once by each thread.
+BLOCK_SLICES = 16
+
+UNION = "union"
+# The voxels of the first operand not in any of the others.
+DIFF = "diff"
+AND = "and"
+XOR = "xor"
+# The operand mirrored along x.
+MIRROR = "mirror"
+
+OPERATIONS = (UNION, DIFF, AND, XOR, MIRROR)
+
+
+def get_operands(expression):
+    """
+    The indices of the operands used by expression, in order.
+    """
+    if isinstance(expression, tuple):
+        operands = []
+        for e in expression[1:]:
+            for i in get_operands(e):
+                if i not in operands:
+                    operands.append(i)
+        return operands
+    return [expression]
+
+
+def check_expression(expression, n_operands):
+    if isinstance(expression, tuple):
+        operation, args = expression[0], expression[1:]
+        if operation not in OPERATIONS:
+            raise ValueError("Unknown boolean operation: %s" % operation)
+        if operation == MIRROR and len(args) != 1:
+            raise ValueError("The mirror operation has one operand")
+        if not args:
+            raise ValueError("The %s operation has no operands" % operation)
+        for e in args:
+            check_expression(e, n_operands)
+    elif not 0 <= expression < n_operands:
+        raise ValueError("Unknown operand: %s" % expression)
+
+
+def evaluate(expression, slabs):
+    """
+    The boolean array of expression, slabs[i] is the boolean array of the
+    operand i.
+    """
+    if not isinstance(expression, tuple):
+        return slabs[expression]
+    operation = expression[0]
+    values = [evaluate(e, slabs) for e in expression[1:]]
+    if operation == MIRROR:
+        return values[0][:, :, ::-1]
+    result = values[0].copy()
+    for v in values[1:]:
+        if operation == UNION:
+            result |= v
+        elif operation == DIFF:
+            result &= ~v
+        elif operation == AND:
+            result &= v
+        elif operation == XOR:
+            result ^= v
+    return result
+
+
+def read_mask_slab(matrix, z0, z1, image=None, threshold_range=None, thresholded=None):
+    """
+    The boolean array (voxel > 2, as the boolean operations used to select
+    the voxels) of the slices [z0, z1) of the mask matrix (with the border).
+    The axial slices not thresholded yet (thresholded[z] is False, see
+    DirtySliceIndex.thresholded) are thresholded from image (in a copy, the
+    mask is not modified) if they're given.
+    """
+    if image is not None and threshold_range is not None and thresholded is not None:
+        to_threshold = np.flatnonzero(~np.asarray(thresholded[z0:z1])).astype(np.intc)
+        if to_threshold.size:
+            # The slice z0 as the border of the slab.
+            slab = np.array(matrix[z0 : z1 + 1, :, :])
+            t_min, t_max = threshold_range
+            cy_threshold.threshold_volume(
+                image[z0:z1], slab, float(t_min), float(t_max), to_threshold, 1
+            )
+            return slab[1:, 1:, 1:] > 2
+    return np.asarray(matrix[z0 + 1 : z1 + 1, 1:, 1:]) > 2
+
+
+def evaluate_to(expression, readers, out, block_slices=BLOCK_SLICES, num_threads=None):
+    """
+    Evaluates expression and writes it in out (the volume, without the
+    border) as 255 or 0.
+
+    Params:
+        expression: see the module docstring.
+        readers: readers[i](z0, z1) returns the boolean array of the slices
+            [z0, z1) of the operand i, e.g. read_mask_slab.
+        out: where the result is written, e.g. matrix[1:, 1:, 1:] of a mask.
+        block_slices: the axial slices of each slab.
+        num_threads: the threads used, all the CPUs if None.
+    """
+    check_expression(expression, len(readers))
+    operands = get_operands(expression)
+
+    def _evaluate_slab(z0):
+        z1 = min(z0 + block_slices, out.shape[0])
+        slabs = {i: readers[i](z0, z1) for i in operands}
+        result = evaluate(expression, slabs)
+        out[z0:z1] = result.view(np.uint8) * np.uint8(255)
+
+    if num_threads is None:
+        num_threads = os.cpu_count() or 1
+    with futures.ThreadPoolExecutor(max_workers=num_threads) as executor:
+        for f in [
+            executor.submit(_evaluate_slab, z0)
+            for z0 in range(0, out.shape[0], block_slices)
+        ]:
+            # Raises the exceptions of the threads.
+            f.result()
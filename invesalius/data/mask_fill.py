@@ -0,0 +1,86 @@
+# --------------------------------------------------------------------------
+# Software:     InVesalius - Software de Reconstrucao 3D de Imagens Medicas
+# Copyright:    (C) 2001  Centro de Pesquisas Renato Archer
+# Homepage:     http://www.softwarepublico.gov.br
+# Contact:      invesalius@cti.gov.br
+# License:      GNU - GPL 2 (LICENSE.txt/LICENCA.txt)
+# --------------------------------------------------------------------------
+#    Este programa e software livre; voce pode redistribui-lo e/ou
+#    modifica-lo sob os termos da Licenca Publica Geral GNU, conforme
+#    publicada pela Free Software Foundation; de acordo com a versao 2
+#    da Licenca.
+#
+#    Este programa eh distribuido na expectativa de ser util, mas SEM
+#    QUALQUER GARANTIA; sem mesmo a garantia implicita de
+#    COMERCIALIZACAO ou de ADEQUACAO A QUALQUER PROPOSITO EM
+#    PARTICULAR. Consulte a Licenca Publica Geral GNU para obter mais
+#    detalhes.
+# --------------------------------------------------------------------------
+"""
+Flood fill bounded to the region it fills.
+
+The fill is written in a scratch buffer with the shape of the volume, reused
+by the next fills (only the bounding box of the voxels filled is cleared),
+so a click doesn't allocate and zero a buffer of the size of the volume. The
+caller gets the bounding box and the voxels filled in it, and only writes
+and saves in the history that region of the mask.
+"""
+
+import threading
+
+import numpy as np
+
+from invesalius_cy import floodfill
+
+_scratch_lock = threading.Lock()
+# The scratch buffers not in use, each fill (in any thread) takes one.
+_scratch_buffers = []
+
+
+def _get_scratch(shape):
+    with _scratch_lock:
+        for i, scratch in enumerate(_scratch_buffers):
+            if scratch.shape == shape:
+                return _scratch_buffers.pop(i)
+        # The buffers of other volumes are released.
+        del _scratch_buffers[:]
+    # np.zeros gets zeroed pages from the system when they are used, so only
+    # the pages of the regions filled take memory.
+    return np.zeros(shape, dtype=np.uint8)
+
+
+def _release_scratch(scratch):
+    with _scratch_lock:
+        _scratch_buffers.append(scratch)
+
+
+def floodfill_region(image, seed, t0, t1, strct):
+    """
+    Flood fills the voxels of image in [t0, t1] connected (by strct) to
+    seed. Returns (bbox, filled): the bounding box of the voxels filled (a
+    tuple of slices) and the boolean array of them in it, or None if the
+    seed is not in [t0, t1].
+
+    Params:
+        image: the volume (z, y, x).
+        seed: the (x, y, z) voxel.
+        t0, t1: the range of the values of the voxels filled.
+        strct: the structuring element of the connectivity, e.g. a (1, 3, 3)
+            one to fill an axial slice.
+    """
+    x, y, z = seed
+    scratch = _get_scratch(image.shape)
+    try:
+        bounds = floodfill.floodfill_threshold_bounds(
+            image, [[x, y, z]], t0, t1, 1, strct, scratch
+        )
+        if bounds is None:
+            return None
+        z0, z1, y0, y1, x0, x1 = bounds
+        bbox = (slice(z0, z1), slice(y0, y1), slice(x0, x1))
+        region = scratch[bbox]
+        filled = region.astype(bool)
+        region[:] = 0
+    finally:
+        _release_scratch(scratch)
+    return bbox, filled
@@ -0,0 +1,297 @@
+# --------------------------------------------------------------------------
+# Software:     InVesalius - Software de Reconstrucao 3D de Imagens Medicas
+# Copyright:    (C) 2001  Centro de Pesquisas Renato Archer
+# Homepage:     http://www.softwarepublico.gov.br
+# Contact:      invesalius@cti.gov.br
+# License:      GNU - GPL 2 (LICENSE.txt/LICENCA.txt)
+# --------------------------------------------------------------------------
+#    Este programa e software livre; voce pode redistribui-lo e/ou
+#    modifica-lo sob os termos da Licenca Publica Geral GNU, conforme
+#    publicada pela Free Software Foundation; de acordo com a versao 2
+#    da Licenca.
+#
+#    Este programa eh distribuido na expectativa de ser util, mas SEM
+#    QUALQUER GARANTIA; sem mesmo a garantia implicita de
+#    COMERCIALIZACAO ou de ADEQUACAO A QUALQUER PROPOSITO EM
+#    PARTICULAR. Consulte a Licenca Publica Geral GNU para obter mais
+#    detalhes.
+# --------------------------------------------------------------------------
+"""
+Storage of the edition history (undo and redo) of the masks.
+
+An edition is kept as a MaskDelta: the bounding box of the voxels it changed
+in the region edited (a slice or the whole mask) and, compressed, the values
+they had before and their XOR with the new values (mostly 0, so it takes
+little space). Undo and redo only write the bounding box.
+
+The deltas are compressed in memory. HistoryBudget moves the oldest ones to
+files when they use more memory than its budget and tells when they use
+more disk than its budget, then the oldest editions are forgotten.
+"""
+
+import os
+import tempfile
+import zlib
+
+import numpy as np
+
+from invesalius.data.volume_stats import BLOCK_SLICES
+
+# zlib compression level, the deltas are mostly runs of the same value.
+COMPRESSION_LEVEL = 1
+
+
+def get_changed_bounds(array, p_array, block_slices=BLOCK_SLICES):
+    """
+    Returns ((start, stop), ...) of each axis bounding the voxels which are
+    different in array and p_array (arrays with the same shape), or None if
+    they're equal. They're compared by blocks of block_slices along axis 0.
+    """
+    if array.shape != p_array.shape:
+        raise ValueError("The arrays must have the same shape")
+    ndim = array.ndim
+    starts = [None] * ndim
+    stops = [None] * ndim
+    for i in range(0, array.shape[0], block_slices):
+        diff = np.asarray(array[i : i + block_slices]) != np.asarray(
+            p_array[i : i + block_slices]
+        )
+        if not diff.any():
+            continue
+        for axis in range(ndim):
+            others = tuple(a for a in range(ndim) if a != axis)
+            changed = np.flatnonzero(diff.any(others))
+            start = int(changed[0])
+            stop = int(changed[-1]) + 1
+            if axis == 0:
+                start += i
+                stop += i
+            if starts[axis] is None or start < starts[axis]:
+                starts[axis] = start
+            if stops[axis] is None or stop > stops[axis]:
+                stops[axis] = stop
+    if starts[0] is None:
+        return None
+    return tuple(zip(starts, stops))
+
+
+def _compress(array, block_slices=BLOCK_SLICES):
+    # By blocks, the array is not copied at once.
+    compressor = zlib.compressobj(COMPRESSION_LEVEL)
+    data = []
+    for i in range(0, array.shape[0], block_slices):
+        block = np.ascontiguousarray(array[i : i + block_slices])
+        data.append(compressor.compress(block.tobytes()))
+    data.append(compressor.flush())
+    return b"".join(data)
+
+
+class MaskDelta(object):
+    """
+    The change of a region of a mask from p_array to array.
+
+    Params:
+        array: the region after the edition.
+        p_array: the region before the edition.
+        offset: if given, array and p_array are only the part, starting at
+            offset, of the region edited (with the given shape) which may
+            have changed, e.g. the bounding box of a flood fill.
+        shape: the shape of the region edited, used with offset.
+    """
+
+    def __init__(self, array, p_array, offset=None, shape=None):
+        if array.shape != p_array.shape:
+            # e.g. a slice as a (1, h, w) volume.
+            array = array.reshape(p_array.shape)
+        self.shape = p_array.shape if shape is None else tuple(shape)
+        self.dtype = np.dtype(array.dtype)
+        self.bounds = get_changed_bounds(array, p_array)
+        self.filename = None
+        self._previous = b""
+        self._xor = b""
+        if self.bounds is None:
+            return
+        bbox = self.bbox
+        previous = np.asarray(p_array[bbox])
+        self._previous = _compress(previous)
+        self._xor = _compress(np.bitwise_xor(np.asarray(array[bbox]), previous))
+        self._size = (len(self._previous), len(self._xor))
+        if offset is not None:
+            self.bounds = tuple(
+                (start + o, stop + o) for ((start, stop), o) in zip(self.bounds, offset)
+            )
+
+    @classmethod
+    def from_edition(cls, array, edit, block_slices=BLOCK_SLICES):
+        """
+        Edits array in place, by blocks of block_slices along axis 0, with
+        edit(block, start) (start is the index of the block in array) and
+        returns the MaskDelta of the edition. Only a block is copied at once,
+        so an edition of the whole mask doesn't need a copy of it as p_array.
+        The bounding box spans the slices changed along axis 0 and all of the
+        other axes.
+        """
+        # An empty delta, the edition is compressed in it below.
+        delta = cls(array[:0], array[:0], shape=array.shape)
+        previous = zlib.compressobj(COMPRESSION_LEVEL)
+        xor = zlib.compressobj(COMPRESSION_LEVEL)
+        previous_data = []
+        xor_data = []
+        start = stop = None
+        others = tuple(range(1, array.ndim))
+        for i in range(0, array.shape[0], block_slices):
+            block = array[i : i + block_slices]
+            p_block = np.array(block)
+            edit(block, i)
+            changed = np.flatnonzero((block != p_block).any(others))
+            if not changed.size:
+                continue
+            if start is None:
+                start = stop = i + int(changed[0])
+            # The slices not changed since the last ones changed are the same
+            # before and after the edition.
+            for j in range(stop, i, block_slices):
+                unchanged = np.ascontiguousarray(array[j : min(j + block_slices, i)])
+                previous_data.append(previous.compress(unchanged.tobytes()))
+                xor_data.append(xor.compress(bytes(unchanged.nbytes)))
+            first = max(stop, i) - i
+            last = int(changed[-1]) + 1
+            p_slab = np.ascontiguousarray(p_block[first:last])
+            slab = np.bitwise_xor(block[first:last], p_slab)
+            previous_data.append(previous.compress(p_slab.tobytes()))
+            xor_data.append(xor.compress(slab.tobytes()))
+            stop = i + last
+        if start is None:
+            return delta
+        previous_data.append(previous.flush())
+        xor_data.append(xor.flush())
+        delta.bounds = ((start, stop),) + tuple((0, d) for d in array.shape[1:])
+        delta._previous = b"".join(previous_data)
+        delta._xor = b"".join(xor_data)
+        delta._size = (len(delta._previous), len(delta._xor))
+        return delta
+
+    @property
+    def bbox(self):
+        return tuple(slice(start, stop) for (start, stop) in self.bounds)
+
+    @property
+    def is_empty(self):
+        return self.bounds is None
+
+    @property
+    def in_memory(self):
+        return self.filename is None
+
+    @property
+    def nbytes(self):
+        """
+        The size of the compressed delta (in memory or in its file).
+        """
+        if self.bounds is None:
+            return 0
+        return sum(self._size)
+
+    def to_disk(self, filename=None):
+        """
+        Moves the compressed delta to a file.
+        """
+        if self.filename is not None or self.bounds is None:
+            return
+        if filename is None:
+            filename = tempfile.mktemp(suffix=".delta")
+        with open(filename, "wb") as f:
+            f.write(self._previous)
+            f.write(self._xor)
+        self.filename = filename
+        self._previous = b""
+        self._xor = b""
+
+    def _load(self):
+        if self.filename is None:
+            return self._previous, self._xor
+        with open(self.filename, "rb") as f:
+            previous = f.read(self._size[0])
+            xor = f.read(self._size[1])
+        return previous, xor
+
+    def apply(self, region, previous=False):
+        """
+        Writes in region (the array edited, e.g. a slice of a mask matrix)
+        the values of the changed voxels after the edition, or before it if
+        previous. Only the bounding box of the changed voxels is written.
+        """
+        if self.bounds is None:
+            return
+        if region.shape != self.shape:
+            raise ValueError("The region must have the shape of the delta")
+        compressed_previous, compressed_xor = self._load()
+        shape = tuple(stop - start for (start, stop) in self.bounds)
+        values = np.frombuffer(zlib.decompress(compressed_previous), self.dtype)
+        values = values.reshape(shape)
+        if not previous:
+            xor = np.frombuffer(zlib.decompress(compressed_xor), self.dtype)
+            values = np.bitwise_xor(values, xor.reshape(shape))
+        region[self.bbox] = values
+
+    def remove(self):
+        if self.filename is not None:
+            try:
+                os.remove(self.filename)
+            except OSError:
+                pass
+            self.filename = None
+
+    def __del__(self):
+        self.remove()
+
+
+class HistoryBudget(object):
+    """
+    Params:
+        memory_budget: bytes of the deltas kept in memory, the oldest ones
+            are moved to files.
+        disk_budget: bytes of the deltas kept in files.
+    """
+
+    def __init__(self, memory_budget, disk_budget):
+        self.memory_budget = memory_budget
+        self.disk_budget = disk_budget
+
+    def get_usage(self, deltas):
+        """
+        Returns the bytes (in memory, in files) used by deltas.
+        """
+        memory = 0
+        disk = 0
+        for delta in _unique(deltas):
+            if delta.in_memory:
+                memory += delta.nbytes
+            else:
+                disk += delta.nbytes
+        return memory, disk
+
+    def spill(self, deltas):
+        """
+        Moves the oldest of deltas (from the oldest to the newest) to files
+        until the ones in memory fit the memory budget. Returns if the ones
+        in files fit the disk budget.
+        """
+        memory, disk = self.get_usage(deltas)
+        for delta in _unique(deltas):
+            if memory <= self.memory_budget:
+                break
+            if delta.in_memory and delta.nbytes:
+                delta.to_disk()
+                memory -= delta.nbytes
+                disk += delta.nbytes
+        return disk <= self.disk_budget
+
+
+def _unique(deltas):
+    # The deltas in order, each one once (the nodes of an edition share it).
+    seen = set()
+    for delta in deltas:
+        if id(delta) not in seen:
+            seen.add(id(delta))
+            yield delta
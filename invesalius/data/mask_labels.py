@@ -0,0 +1,119 @@
+# --------------------------------------------------------------------------
+# Software:     InVesalius - Software de Reconstrucao 3D de Imagens Medicas
+# Copyright:    (C) 2001  Centro de Pesquisas Renato Archer
+# Homepage:     http://www.softwarepublico.gov.br
+# Contact:      invesalius@cti.gov.br
+# License:      GNU - GPL 2 (LICENSE.txt/LICENCA.txt)
+# --------------------------------------------------------------------------
+#    Este programa e software livre; voce pode redistribui-lo e/ou
+#    modifica-lo sob os termos da Licenca Publica Geral GNU, conforme
+#    publicada pela Free Software Foundation; de acordo com a versao 2
+#    da Licenca.
+#
+#    Este programa eh distribuido na expectativa de ser util, mas SEM
+#    QUALQUER GARANTIA; sem mesmo a garantia implicita de
+#    COMERCIALIZACAO ou de ADEQUACAO A QUALQUER PROPOSITO EM
+#    PARTICULAR. Consulte a Licenca Publica Geral GNU para obter mais
+#    detalhes.
+# --------------------------------------------------------------------------
+"""
+Connected components of the voxels of a mask in a range of values, e.g. the
+parts selected (253 to 255) or the holes (0 to 127).
+
+They're labelled by the ccl kernel (in parallel, with 32-bit labels) with
+the size and the bounding box of each component, so the tools working on a
+component (select and remove parts, fill holes) only look up its label and
+write its bounding box.
+"""
+
+import os
+import tempfile
+
+import numpy as np
+
+from invesalius_cy import ccl
+
+# Slices written at once by fill_labels.
+BLOCK_SLICES = 32
+
+
+class MaskLabels(object):
+    """
+    Params:
+        volume: the mask (without the flags border), or a view of it.
+        low, high: the range of values of the voxels labelled.
+        connectivity: 6, 18 or 26.
+    """
+
+    def __init__(self, volume, low, high, connectivity):
+        self.low = low
+        self.high = high
+        self.connectivity = connectivity
+        self.filename = tempfile.mktemp()
+        self.labels = np.memmap(
+            self.filename, mode="w+", dtype=np.uint32, shape=volume.shape
+        )
+        self.n, self.sizes, self.bounds = ccl.label(
+            volume, low, high, connectivity, self.labels
+        )
+
+    def get_label(self, z, y, x):
+        """
+        The label of the voxel, 0 if it's not in a component.
+        """
+        return int(self.labels[z, y, x])
+
+    def get_bbox(self, label):
+        z0, z1, y0, y1, x0, x1 = self.bounds[label]
+        return slice(z0, z1), slice(y0, y1), slice(x0, x1)
+
+    def get_labels_bbox(self, labels):
+        """
+        The bounding box (as get_bbox) of the components of the array labels.
+        """
+        bounds = self.bounds[labels]
+        z0, y0, x0 = (int(i) for i in bounds[:, 0::2].min(axis=0))
+        z1, y1, x1 = (int(i) for i in bounds[:, 1::2].max(axis=0))
+        return slice(z0, z1), slice(y0, y1), slice(x0, x1)
+
+    def get_small(self, max_size):
+        """
+        The labels of the components with up to max_size voxels.
+        """
+        return np.flatnonzero((self.sizes > 0) & (self.sizes <= max_size))
+
+    def fill(self, label, out, value):
+        """
+        Sets the voxels of the component label to value in out (an array
+        with the shape of the volume labelled).
+        """
+        bbox = self.get_bbox(label)
+        out[bbox][self.labels[bbox] == label] = value
+
+    def fill_labels(self, labels, out, value):
+        """
+        The same as fill to the components of the array labels.
+        """
+        lut = np.zeros(self.n + 1, dtype=bool)
+        lut[labels] = True
+        lut[0] = False
+        for z in range(0, out.shape[0], BLOCK_SLICES):
+            selected = lut[self.labels[z : z + BLOCK_SLICES]]
+            out[z : z + BLOCK_SLICES][selected] = value
+
+    def remove(self, label):
+        """
+        Removes the component label, e.g. after its voxels are set to a value
+        out of [low, high].
+        """
+        bbox = self.get_bbox(label)
+        labels = self.labels[bbox]
+        labels[labels == label] = 0
+        self.sizes[label] = 0
+
+    def __del__(self):
+        del self.labels
+        try:
+            os.remove(self.filename)
+        except OSError:
+            pass
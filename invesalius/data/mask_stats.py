@@ -0,0 +1,177 @@
+# --------------------------------------------------------------------------
+# Software:     InVesalius - Software de Reconstrucao 3D de Imagens Medicas
+# Copyright:    (C) 2001  Centro de Pesquisas Renato Archer
+# Homepage:     http://www.softwarepublico.gov.br
+# Contact:      invesalius@cti.gov.br
+# License:      GNU - GPL 2 (LICENSE.txt/LICENCA.txt)
+# --------------------------------------------------------------------------
+#    Este programa e software livre; voce pode redistribui-lo e/ou
+#    modifica-lo sob os termos da Licenca Publica Geral GNU, conforme
+#    publicada pela Free Software Foundation; de acordo com a versao 2
+#    da Licenca.
+#
+#    Este programa eh distribuido na expectativa de ser util, mas SEM
+#    QUALQUER GARANTIA; sem mesmo a garantia implicita de
+#    COMERCIALIZACAO ou de ADEQUACAO A QUALQUER PROPOSITO EM
+#    PARTICULAR. Consulte a Licenca Publica Geral GNU para obter mais
+#    detalhes.
+# --------------------------------------------------------------------------
+"""
+Statistics of a mask and of the image in it, gathered in one pass.
+
+The mask and the image are read by slabs of axial slices, evaluated in
+parallel by a pool of threads, and the results of the slabs are merged:
+the min, max, mean and standard deviation of the image in the mask, the
+count of voxels, their volume, the area of the surface of the mask (as the
+faces between the voxels in and out of it), the bounding box and the
+centroid.
+
+The slices of the mask not thresholded yet are thresholded on the fly (see
+mask_boolean.read_mask_slab), the mask is not modified.
+"""
+
+import collections
+import os
+from concurrent import futures
+
+import numpy as np
+
+from invesalius.data.mask_boolean import read_mask_slab
+
+# Axial slices read at once by each thread.
+BLOCK_SLICES = 16
+
+# bounds: ((z0, z1), (y0, y1), (x0, x1)) of the voxels of the mask, None if
+# it's empty. centroid: (z, y, x) in voxels.
+MaskStatistics = collections.namedtuple(
+    "MaskStatistics",
+    (
+        "min",
+        "max",
+        "mean",
+        "std",
+        "voxels",
+        "volume",
+        "area",
+        "bounds",
+        "centroid",
+    ),
+)
+
+
+class _SlabStatistics(object):
+    def __init__(self, image, mask, next_slice, z0):
+        # mask is the boolean slab, next_slice the boolean slice after it (or
+        # None for the last one), to count the faces between them.
+        values = image[mask]
+        self.count = values.size
+        if self.count:
+            self.min = values.min().item()
+            self.max = values.max().item()
+            self.mean = values.mean(dtype=np.float64)
+            self.m2 = np.square(values - self.mean, dtype=np.float64).sum()
+        # The faces between the voxels in and out of the mask along each
+        # axis, the ones in the border of the volume are not counted.
+        self.faces = [
+            np.count_nonzero(mask[1:] != mask[:-1]),
+            np.count_nonzero(mask[:, 1:] != mask[:, :-1]),
+            np.count_nonzero(mask[:, :, 1:] != mask[:, :, :-1]),
+        ]
+        if next_slice is not None:
+            self.faces[0] += np.count_nonzero(mask[-1] != next_slice)
+        # The voxels by slice of each axis, for the bounds and centroid.
+        self.z0 = z0
+        self.profiles = [
+            np.count_nonzero(mask, (1, 2)),
+            np.count_nonzero(mask, (0, 2)),
+            np.count_nonzero(mask, (0, 1)),
+        ]
+
+
+def _merge(slabs, shape, spacing):
+    sx, sy, sz = spacing
+    count = sum(s.count for s in slabs)
+    faces = [sum(s.faces[a] for s in slabs) for a in range(3)]
+    area = float(faces[0] * sx * sy + faces[1] * sx * sz + faces[2] * sy * sz)
+    if not count:
+        return MaskStatistics(0, 0, 0.0, 0.0, 0, 0.0, area, None, None)
+
+    # Mean and variance of the slabs merged (Chan et al.).
+    n = 0
+    mean = 0.0
+    m2 = 0.0
+    for s in slabs:
+        if not s.count:
+            continue
+        delta = s.mean - mean
+        total = n + s.count
+        mean += delta * s.count / total
+        m2 += s.m2 + delta * delta * n * s.count / total
+        n = total
+
+    profiles = [np.zeros(d, dtype=np.int64) for d in shape]
+    for s in slabs:
+        d = s.profiles[0].size
+        profiles[0][s.z0 : s.z0 + d] += s.profiles[0]
+        profiles[1] += s.profiles[1]
+        profiles[2] += s.profiles[2]
+    bounds = []
+    centroid = []
+    for profile in profiles:
+        occupied = np.flatnonzero(profile)
+        bounds.append((int(occupied[0]), int(occupied[-1]) + 1))
+        centroid.append(float((profile * np.arange(profile.size)).sum()) / count)
+
+    return MaskStatistics(
+        min(s.min for s in slabs if s.count),
+        max(s.max for s in slabs if s.count),
+        float(mean),
+        float(np.sqrt(m2 / count)),
+        count,
+        count * sx * sy * sz,
+        area,
+        tuple(bounds),
+        tuple(centroid),
+    )
+
+
+def compute(
+    image,
+    matrix,
+    threshold_range=None,
+    spacing=(1.0, 1.0, 1.0),
+    block_slices=BLOCK_SLICES,
+    num_threads=None,
+    thresholded=None,
+):
+    """
+    Returns the MaskStatistics of the mask matrix (with the border)
+    and of image in it.
+
+    Params:
+        image: the image volume (z, y, x).
+        matrix: the mask matrix.
+        threshold_range: used in the slices of the mask not thresholded
+            yet, they're taken as they are if None.
+        thresholded: the axial slices of the mask already thresholded (see
+            DirtySliceIndex.thresholded), all of them if None.
+        spacing: (sx, sy, sz), of the voxels.
+        block_slices: the axial slices of each slab.
+        num_threads: the threads used, all the CPUs if None.
+    """
+    dz = image.shape[0]
+
+    def _slab_statistics(z0):
+        z1 = min(z0 + block_slices, dz)
+        # One more slice to count the faces between the slabs.
+        z2 = min(z1 + 1, dz)
+        mask = read_mask_slab(matrix, z0, z2, image, threshold_range, thresholded)
+        next_slice = mask[-1] if z2 > z1 else None
+        image_slab = np.asarray(image[z0:z1])
+        return _SlabStatistics(image_slab, mask[: z1 - z0], next_slice, z0)
+
+    if num_threads is None:
+        num_threads = os.cpu_count() or 1
+    with futures.ThreadPoolExecutor(max_workers=num_threads) as executor:
+        slabs = list(executor.map(_slab_statistics, range(0, dz, block_slices)))
+    return _merge(slabs, image.shape, spacing)
@@ -0,0 +1,203 @@
+# --------------------------------------------------------------------------
+# Software:     InVesalius - Software de Reconstrucao 3D de Imagens Medicas
+# Copyright:    (C) 2001  Centro de Pesquisas Renato Archer
+# Homepage:     http://www.softwarepublico.gov.br
+# Contact:      invesalius@cti.gov.br
+# License:      GNU - GPL 2 (LICENSE.txt/LICENCA.txt)
+# --------------------------------------------------------------------------
+#    Este programa e software livre; voce pode redistribui-lo e/ou
+#    modifica-lo sob os termos da Licenca Publica Geral GNU, conforme
+#    publicada pela Free Software Foundation; de acordo com a versao 2
+#    da Licenca.
+#
+#    Este programa eh distribuido na expectativa de ser util, mas SEM
+#    QUALQUER GARANTIA; sem mesmo a garantia implicita de
+#    COMERCIALIZACAO ou de ADEQUACAO A QUALQUER PROPOSITO EM
+#    PARTICULAR. Consulte a Licenca Publica Geral GNU para obter mais
+#    detalhes.
+# --------------------------------------------------------------------------
+"""
+Compact storage of the masks not being edited.
+
+A mask matrix (uint8, with the 1 voxel border, see Mask.matrix) is
+mostly 0 and 255. PackedMask keeps it as:
+
+- one bit per voxel, if the voxel is on (> 127), packed along x;
+- the voxels with other values (the edited ones: 1, 2, 253, 254) as sorted
+  flat indices and their values;
+- the three border faces as they are (they hold the flags of the file, see
+  dirty_slices.read_flags).
+
+So the matrix can be restored exactly. A slice of any orientation can be
+read without restoring the matrix (see get_slice and get_flags).
+"""
+
+import numpy as np
+
+from invesalius.data.volume_stats import BLOCK_SLICES
+
+# A mask is not packed if more than this fraction of its voxels are not 0
+# or 255 (the packed mask wouldn't be much smaller).
+MAX_EXCEPTIONS_FRACTION = 1.0 / 32
+
+
+class PackedMask(object):
+    """
+    Params:
+        shape: the shape of the mask matrix (with the border).
+    """
+
+    def __init__(self, shape):
+        self.shape = tuple(int(d) for d in shape)
+        dz, dy, dx = (d - 1 for d in self.shape)
+        self.bits = np.zeros((dz, dy, (dx + 7) // 8), dtype=np.uint8)
+        # Flat indices (in the matrix without the border) and values of the
+        # voxels not 0 or 255.
+        self.exception_indices = np.zeros(0, dtype=np.int64)
+        self.exception_values = np.zeros(0, dtype=np.uint8)
+        # matrix[0], matrix[:, 0, :] and matrix[:, :, 0].
+        self.faces = [
+            np.zeros((self.shape[1], self.shape[2]), dtype=np.uint8),
+            np.zeros((self.shape[0], self.shape[2]), dtype=np.uint8),
+            np.zeros((self.shape[0], self.shape[1]), dtype=np.uint8),
+        ]
+
+    @classmethod
+    def from_matrix(cls, matrix, block_slices=BLOCK_SLICES):
+        """
+        Packs the mask matrix, reading it by blocks of axial slices. Returns
+        None if it has too many voxels not 0 or 255.
+        """
+        packed = cls(matrix.shape)
+        dz, dy, dx = (d - 1 for d in packed.shape)
+        max_exceptions = int(dz * dy * dx * MAX_EXCEPTIONS_FRACTION)
+        indices = []
+        values = []
+        n_exceptions = 0
+        for z in range(0, dz, block_slices):
+            block = np.asarray(matrix[z + 1 : z + 1 + block_slices, 1:, 1:])
+            packed.bits[z : z + block.shape[0]] = np.packbits(block > 127, axis=2)
+            exceptions = np.flatnonzero((block != 0) & (block != 255))
+            n_exceptions += exceptions.size
+            if n_exceptions > max_exceptions:
+                return None
+            if exceptions.size:
+                values.append(block.ravel()[exceptions])
+                indices.append(exceptions + z * dy * dx)
+        if indices:
+            packed.exception_indices = np.concatenate(indices)
+            packed.exception_values = np.concatenate(values)
+        packed.faces = [
+            np.array(matrix[0]),
+            np.array(matrix[:, 0, :]),
+            np.array(matrix[:, :, 0]),
+        ]
+        return packed
+
+    @property
+    def nbytes(self):
+        return (
+            self.bits.nbytes
+            + self.exception_indices.nbytes
+            + self.exception_values.nbytes
+            + sum(face.nbytes for face in self.faces)
+        )
+
+    def to_matrix(self, out=None, block_slices=BLOCK_SLICES):
+        """
+        Restores the mask matrix into out (e.g. a memmap) or a new array.
+        """
+        if out is None:
+            out = np.empty(self.shape, dtype=np.uint8)
+        dz, dy, dx = (d - 1 for d in self.shape)
+        for z in range(0, dz, block_slices):
+            bits = self.bits[z : z + block_slices]
+            block = np.unpackbits(bits, axis=2, count=dx)
+            block *= 255
+            i = np.searchsorted(self.exception_indices, z * dy * dx)
+            e = np.searchsorted(self.exception_indices, (z + bits.shape[0]) * dy * dx)
+            block.ravel()[self.exception_indices[i:e] - z * dy * dx] = (
+                self.exception_values[i:e]
+            )
+            out[z + 1 : z + 1 + bits.shape[0], 1:, 1:] = block
+        out[0] = self.faces[0]
+        out[:, 0, :] = self.faces[1]
+        out[:, :, 0] = self.faces[2]
+        return out
+
+    def get_flags(self):
+        """
+        The same as dirty_slices.read_flags(matrix).
+        """
+        return [
+            self.faces[2][1:, 0] != 0,
+            self.faces[2][0, 1:] != 0,
+            self.faces[1][0, 1:] != 0,
+        ]
+
+    def set_flags(self, thresholded):
+        """
+        The same as dirty_slices.write_flags(matrix, thresholded), in all the
+        faces holding the flags.
+        """
+        axial, coronal, sagital = thresholded
+        self.faces[1][1:, 0] = self.faces[2][1:, 0] = axial
+        self.faces[0][1:, 0] = self.faces[2][0, 1:] = coronal
+        self.faces[0][0, 1:] = self.faces[1][0, 1:] = sagital
+
+    def get_slice(self, orientation, index):
+        """
+        The slice index of orientation without the border, as
+        np.array(matrix[index + 1, 1:, 1:]) for the axial one.
+        """
+        dz, dy, dx = (d - 1 for d in self.shape)
+        if orientation == "AXIAL":
+            n_mask = np.unpackbits(self.bits[index], axis=1, count=dx)
+            zz, yy, xx = np.array([index]), np.arange(dy)[:, None], np.arange(dx)
+        elif orientation == "CORONAL":
+            n_mask = np.unpackbits(self.bits[:, index], axis=1, count=dx)
+            zz, yy, xx = np.arange(dz)[:, None], np.array([index]), np.arange(dx)
+        else:
+            shift = 7 - index % 8
+            n_mask = (self.bits[:, :, index // 8] >> shift) & 1
+            zz, yy, xx = np.arange(dz)[:, None], np.arange(dy), np.array([index])
+        n_mask *= 255
+        if self.exception_indices.size:
+            # The exceptions of the slice, by the flat indices of its voxels.
+            flat = ((zz * dy + yy) * dx + xx).reshape(n_mask.shape)
+            if orientation == "AXIAL":
+                i = np.searchsorted(self.exception_indices, flat[0, 0])
+                e = np.searchsorted(self.exception_indices, flat[-1, -1] + 1)
+                indices = self.exception_indices[i:e]
+                values = self.exception_values[i:e]
+            else:
+                indices = self.exception_indices
+                values = self.exception_values
+            if indices.size:
+                positions = np.searchsorted(indices, flat)
+                positions[positions == indices.size] = 0
+                found = indices[positions] == flat
+                n_mask[found] = values[positions[found]]
+        return n_mask
+
+    def save(self, filename):
+        arrays = {
+            "shape": np.array(self.shape),
+            "bits": self.bits,
+            "exception_indices": self.exception_indices,
+            "exception_values": self.exception_values,
+        }
+        for i, face in enumerate(self.faces):
+            arrays["face_%d" % i] = face
+        with open(filename, "wb") as f:
+            np.savez_compressed(f, **arrays)
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename) as arrays:
+            packed = cls(arrays["shape"])
+            packed.bits = arrays["bits"]
+            packed.exception_indices = arrays["exception_indices"]
+            packed.exception_values = arrays["exception_values"]
+            packed.faces = [arrays["face_%d" % i] for i in range(3)]
+        return packed
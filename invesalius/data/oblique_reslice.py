@@ -0,0 +1,119 @@
+# --------------------------------------------------------------------------
+# Software:     InVesalius - Software de Reconstrucao 3D de Imagens Medicas
+# Copyright:    (C) 2001  Centro de Pesquisas Renato Archer
+# Homepage:     http://www.softwarepublico.gov.br
+# Contact:      invesalius@cti.gov.br
+# License:      GNU - GPL 2 (LICENSE.txt/LICENCA.txt)
+# --------------------------------------------------------------------------
+#    Este programa e software livre; voce pode redistribui-lo e/ou
+#    modifica-lo sob os termos da Licenca Publica Geral GNU, conforme
+#    publicada pela Free Software Foundation; de acordo com a versao 2
+#    da Licenca.
+#
+#    Este programa eh distribuido na expectativa de ser util, mas SEM
+#    QUALQUER GARANTIA; sem mesmo a garantia implicita de
+#    COMERCIALIZACAO ou de ADEQUACAO A QUALQUER PROPOSITO EM
+#    PARTICULAR. Consulte a Licenca Publica Geral GNU para obter mais
+#    detalhes.
+# --------------------------------------------------------------------------
+"""
+Slices of the reoriented volume (Slice.q_orientation not the identity).
+
+Only the pixels of the displayed planes are sampled (transforms.reslice_plane),
+with the interpolation methods from interpolation.pyx: nearest neighbour,
+trilinear, tricubic and Lanczos. The view matrix is cached and the value outside
+the volume (its minimum) is given by the caller (from the volume statistics), so
+a slice request doesn't scan the whole volume.
+"""
+
+import numpy as np
+
+import invesalius.constants as const
+from invesalius.data import transformations
+from invesalius.data.slab_projection import AXIS
+from invesalius_cy import transforms
+
+
+def get_view_matrix(q_orientation, center):
+    """
+    Matrix which maps the voxel coordinates (z, y, x, in mm) of the
+    reoriented volume to the original one, rotating around center.
+    """
+    cx, cy, cz = center
+    T0 = transformations.translation_matrix((-cz, -cy, -cx))
+    R = transformations.quaternion_matrix(q_orientation)
+    T1 = transformations.translation_matrix((cz, cy, cx))
+    return transformations.concatenate_matrices(T1, R.T, T0)
+
+
+class ObliqueReslicer(object):
+    """
+    Samples the slices (or slabs) of the reoriented volume.
+
+    Params:
+        tile_size: size of the square tiles the plane is split in, each tile
+            is sampled by one thread.
+        num_threads: threads used, <= 0 means all of them.
+    """
+
+    def __init__(self, tile_size=const.RESLICE_TILE_SIZE, num_threads=0):
+        self.tile_size = tile_size
+        self.num_threads = num_threads
+        self._matrix_key = None
+        self._matrix = None
+
+    def get_view_matrix(self, q_orientation, center):
+        key = (tuple(q_orientation), tuple(center))
+        if key != self._matrix_key:
+            self._matrix = get_view_matrix(q_orientation, center)
+            self._matrix_key = key
+        return self._matrix
+
+    def reslice(
+        self,
+        matrix,
+        spacing,
+        q_orientation,
+        center,
+        orientation,
+        slice_number,
+        number_slices,
+        interp_method,
+        cval,
+        step=1,
+    ):
+        """
+        Returns the slab [slice_number, slice_number + number_slices) of the
+        given orientation of the reoriented volume, with the same shape as
+        the slab of matrix.
+
+        Params:
+            interp_method: 0 nearest neighbour, 1 trilinear, 2 tricubic and
+                3 Lanczos.
+            cval: the value outside the volume, its minimum.
+            step: only one of each step x step pixels of the slices is
+                sampled, the slab is decimated in the slice plane.
+        """
+        M = self.get_view_matrix(q_orientation, center)
+
+        axis = AXIS[orientation]
+        number_slices = max(min(number_slices, matrix.shape[axis] - slice_number), 1)
+        shape = tuple(
+            (d + step - 1) // step for (i, d) in enumerate(matrix.shape) if i != axis
+        )
+        out = np.empty((number_slices,) + shape, dtype=matrix.dtype)
+        for i in range(number_slices):
+            transforms.reslice_plane(
+                matrix,
+                spacing,
+                M,
+                slice_number + i,
+                orientation,
+                interp_method,
+                cval,
+                out[i],
+                step,
+                self.tile_size,
+                self.num_threads,
+            )
+        return np.moveaxis(out, 0, axis)
@@ -0,0 +1,120 @@
+# --------------------------------------------------------------------------
+# Software:     InVesalius - Software de Reconstrucao 3D de Imagens Medicas
+# Copyright:    (C) 2001  Centro de Pesquisas Renato Archer
+# Homepage:     http://www.softwarepublico.gov.br
+# Contact:      invesalius@cti.gov.br
+# License:      GNU - GPL 2 (LICENSE.txt/LICENCA.txt)
+# --------------------------------------------------------------------------
+#    Este programa e software livre; voce pode redistribui-lo e/ou
+#    modifica-lo sob os termos da Licenca Publica Geral GNU, conforme
+#    publicada pela Free Software Foundation; de acordo com a versao 2
+#    da Licenca.
+#
+#    Este programa eh distribuido na expectativa de ser util, mas SEM
+#    QUALQUER GARANTIA; sem mesmo a garantia implicita de
+#    COMERCIALIZACAO ou de ADEQUACAO A QUALQUER PROPOSITO EM
+#    PARTICULAR. Consulte a Licenca Publica Geral GNU para obter mais
+#    detalhes.
+# --------------------------------------------------------------------------
+"""
+Coalescing of the render requests of a viewer.
+
+A single edit or navigation update is usually followed by several messages
+(Reload actual slice, Update slice viewer, Set cross focal point, ...) and
+each one used to render the viewer. The viewers now request a render of a
+kind (what has to be updated) to their RenderScheduler, which merges the
+requests and renders at most once per frame (frame_interval ms), with the
+kinds requested since the last frame.
+
+The requested and rendered counters show how many renders were merged.
+"""
+
+import collections
+import time
+
+import wx
+
+import invesalius.constants as const
+
+# What changed and has to be updated before rendering. IMAGE is the slice
+# shown, with its masks (only the layers changed are composed again, see
+# Slice.prepare_slice).
+IMAGE = "image"
+OVERLAY = "overlay"
+CURSOR = "cursor"
+KINDS = (IMAGE, OVERLAY, CURSOR)
+
+
+class RenderScheduler(object):
+    """
+    Params:
+        render: called with the set of kinds requested since the last frame,
+            it updates what's needed and renders the viewer.
+        frame_interval: minimum time (ms) between two frames.
+        enabled: if False each request is rendered at once (only counted).
+    """
+
+    def __init__(
+        self, render, frame_interval=const.RENDER_FRAME_INTERVAL, enabled=True
+    ):
+        self.render = render
+        self.frame_interval = frame_interval
+        self.enabled = enabled
+        # Requests of each kind and frames rendered.
+        self.requested = collections.Counter()
+        self.rendered = 0
+        self._pending = set()
+        self._timer = None
+        self._last_frame = 0.0
+
+    def request(self, kind):
+        """
+        Requests a render of kind (one of KINDS), done in the next frame.
+        """
+        self.requested[kind] += 1
+        self._pending.add(kind)
+        if not self.enabled:
+            self.flush()
+            return
+        if self._timer is not None and self._timer.IsRunning():
+            return
+        elapsed = (time.perf_counter() - self._last_frame) * 1000.0
+        # At least 1 ms, so the requests sent by the current event are merged.
+        delay = max(int(self.frame_interval - elapsed), 1)
+        if self._timer is None:
+            self._timer = wx.CallLater(delay, self.flush)
+        else:
+            self._timer.Start(delay)
+
+    def flush(self):
+        """
+        Renders the pending requests now.
+        """
+        if self._timer is not None and self._timer.IsRunning():
+            self._timer.Stop()
+        if not self._pending:
+            return
+        kinds = self._pending
+        self._pending = set()
+        self._last_frame = time.perf_counter()
+        self.rendered += 1
+        self.render(kinds)
+
+    def cancel(self):
+        """
+        Discards the pending requests, e.g. when the project is closed.
+        """
+        if self._timer is not None:
+            self._timer.Stop()
+        self._pending = set()
+
+    @property
+    def merged(self):
+        """
+        Number of requests which didn't need a render of their own.
+        """
+        return sum(self.requested.values()) - self.rendered
+
+    def reset_counters(self):
+        self.requested = collections.Counter()
+        self.rendered = 0
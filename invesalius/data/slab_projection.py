@@ -0,0 +1,253 @@
+# --------------------------------------------------------------------------
+# Software:     InVesalius - Software de Reconstrucao 3D de Imagens Medicas
+# Copyright:    (C) 2001  Centro de Pesquisas Renato Archer
+# Homepage:     http://www.softwarepublico.gov.br
+# Contact:      invesalius@cti.gov.br
+# License:      GNU - GPL 2 (LICENSE.txt/LICENCA.txt)
+# --------------------------------------------------------------------------
+#    Este programa e software livre; voce pode redistribui-lo e/ou
+#    modifica-lo sob os termos da Licenca Publica Geral GNU, conforme
+#    publicada pela Free Software Foundation; de acordo com a versao 2
+#    da Licenca.
+#
+#    Este programa eh distribuido na expectativa de ser util, mas SEM
+#    QUALQUER GARANTIA; sem mesmo a garantia implicita de
+#    COMERCIALIZACAO ou de ADEQUACAO A QUALQUER PROPOSITO EM
+#    PARTICULAR. Consulte a Licenca Publica Geral GNU para obter mais
+#    detalhes.
+# --------------------------------------------------------------------------
+"""
+Incremental MaxIP, MinIP and MeanIP of thick slabs.
+
+When the user scrolls one slice at a time the slab [n, n + number_slices)
+only gains and loses one slice. MeanIP keeps a running sum. MaxIP and MinIP
+use the van Herk/Gil-Werman block decomposition: the volume is split in
+blocks of number_slices slices, the window is the union of a suffix of one
+block (stored when the window enters the block) and a prefix of the next
+one (updated with one slice per step). So each step reads one slice and
+costs O(pixels), amortized, instead of O(pixels x number_slices).
+
+The results are the same as the reduction of the whole slab (MeanIP of
+integer volumes is summed in int64, which is exact).
+
+The projections computed from scratch (all the other projection types,
+jumps and oblique slabs) use the multi-threaded kernels from mips, which
+read the slab in place (a view of the memmap) instead of copying it (see
+slice_render.project).
+"""
+
+import numpy as np
+
+import invesalius.constants as const
+from invesalius.data.slice_render import (  # noqa: F401
+    AXIS,
+    KERNEL_DTYPES,
+    project,
+    slab_view,
+)
+
+SLIDING_PROJECTIONS = (
+    const.PROJECTION_MaxIP,
+    const.PROJECTION_MinIP,
+    const.PROJECTION_MeanIP,
+)
+
+
+def _read_slice(matrix, axis, n):
+    if axis == 0:
+        return matrix[n]
+    elif axis == 1:
+        return matrix[:, n, :]
+    else:
+        return matrix[:, :, n]
+
+
+def project_slab(matrix, orientation, slice_number, number_slices, projection):
+    """
+    Projection of the whole slab [slice_number, slice_number + number_slices),
+    computed from scratch.
+    """
+    slab = slab_view(matrix, orientation, slice_number, number_slices)
+    return project(slab, AXIS[orientation], projection)
+
+
+class _MaxMinWindow(object):
+    """
+    van Herk/Gil-Werman sliding max (or min) over windows [j, j + size) that
+    move forward. read(j) returns the slice j or None if it's outside the
+    volume (treated as the identity of the operation).
+    """
+
+    def __init__(self, read, size, shape, dtype, ufunc):
+        self.read = read
+        self.size = size
+        self.ufunc = ufunc
+        if ufunc is np.maximum:
+            identity = np.iinfo(dtype).min if dtype.kind in "iu" else -np.inf
+        else:
+            identity = np.iinfo(dtype).max if dtype.kind in "iu" else np.inf
+        self.identity = identity
+        # suffix[t] = op of the slices [block_start + t, block_start + size)
+        self.suffix = np.empty((size,) + shape, dtype=dtype)
+        # op of the slices from the start of the next block to j + size - 1
+        self.prefix = np.empty(shape, dtype=dtype)
+        self.block_start = None
+        self.j = None
+
+    def _combine(self, out, j):
+        s = self.read(j)
+        if s is not None:
+            self.ufunc(out, s, out=out)
+
+    def _load_block(self, block_start):
+        self.block_start = block_start
+        suffix = self.suffix
+        suffix[-1] = self.identity
+        self._combine(suffix[-1], block_start + self.size - 1)
+        for t in range(self.size - 2, -1, -1):
+            suffix[t] = suffix[t + 1]
+            self._combine(suffix[t], block_start + t)
+
+    def start(self, j):
+        self.j = j
+        self._load_block((j // self.size) * self.size)
+        self.prefix[:] = self.identity
+        for p in range(self.block_start + self.size, j + self.size):
+            self._combine(self.prefix, p)
+        return self.value()
+
+    def step(self):
+        self.j += 1
+        if self.j == self.block_start + self.size:
+            self._load_block(self.j)
+            self.prefix[:] = self.identity
+        else:
+            self._combine(self.prefix, self.j + self.size - 1)
+        return self.value()
+
+    def value(self):
+        return self.ufunc(self.suffix[self.j - self.block_start], self.prefix)
+
+
+class _MeanWindow(object):
+    """
+    Running sum (int64) of the slices of the window [j, j + size).
+    """
+
+    def __init__(self, read, size, shape, dtype):
+        self.read = read
+        self.size = size
+        self.sum = np.zeros(shape, dtype=np.int64)
+        self.count = 0
+        self.j = None
+
+    def _add(self, j, sign):
+        s = self.read(j)
+        if s is not None:
+            if sign > 0:
+                self.sum += s
+            else:
+                self.sum -= s
+            self.count += sign
+
+    def start(self, j):
+        self.j = j
+        self.sum[:] = 0
+        self.count = 0
+        for p in range(j, j + self.size):
+            self._add(p, 1)
+        return self.value()
+
+    def step(self):
+        self._add(self.j, -1)
+        self.j += 1
+        self._add(self.j + self.size - 1, 1)
+        return self.value()
+
+    def value(self):
+        return self.sum / self.count
+
+
+class SlabProjector(object):
+    """
+    Computes the MaxIP, MinIP or MeanIP of the slab starting at a slice of one
+    orientation, incrementally when the slab moves one slice from the last
+    one. Jumps are computed from scratch (project_slab) and the first step in
+    a new direction restarts the incremental state.
+    """
+
+    def __init__(self, orientation):
+        self.orientation = orientation
+        self.axis = AXIS[orientation]
+        self.full_projections = 0
+        self.incremental_projections = 0
+        self.reset()
+
+    def reset(self):
+        self._key = None
+        self._position = None
+        self._direction = 0
+        self._window = None
+
+    def project(self, matrix, slice_number, number_slices, projection, generation):
+        """
+        Params:
+            matrix: the image volume.
+            slice_number: first slice of the slab.
+            number_slices: the thickness of the slab.
+            projection: PROJECTION_MaxIP, PROJECTION_MinIP or PROJECTION_MeanIP.
+            generation: changes when the volume is modified (e.g. the
+                image_generation of the SliceBuffer), invalidating the state.
+        """
+        key = (id(matrix), matrix.shape, projection, number_slices, generation)
+        if key != self._key:
+            self.reset()
+            self._key = key
+
+        position = self._position
+        self._position = slice_number
+        if position is None or abs(slice_number - position) != 1 or (
+            projection == const.PROJECTION_MeanIP and matrix.dtype.kind not in "iub"
+        ):
+            self._window = None
+            self._direction = 0
+            self.full_projections += 1
+            return project_slab(
+                matrix, self.orientation, slice_number, number_slices, projection
+            )
+
+        direction = slice_number - position
+        nslices = matrix.shape[self.axis]
+        if direction > 0:
+            j = slice_number
+        else:
+            # Scrolling backwards is scrolling forward in the reversed volume.
+            j = nslices - slice_number - number_slices
+
+        self.incremental_projections += 1
+        if self._window is None or direction != self._direction:
+            self._direction = direction
+            self._window = self._create_window(matrix, number_slices, projection)
+            return self._window.start(j)
+        return self._window.step()
+
+    def _create_window(self, matrix, number_slices, projection):
+        axis = self.axis
+        nslices = matrix.shape[axis]
+        direction = self._direction
+
+        def read(j):
+            if direction < 0:
+                j = nslices - 1 - j
+            if 0 <= j < nslices:
+                return _read_slice(matrix, axis, j)
+            return None
+
+        shape = tuple(d for (i, d) in enumerate(matrix.shape) if i != axis)
+        if projection == const.PROJECTION_MeanIP:
+            return _MeanWindow(read, number_slices, shape, matrix.dtype)
+        elif projection == const.PROJECTION_MaxIP:
+            ufunc = np.maximum
+        else:
+            ufunc = np.minimum
+        return _MaxMinWindow(read, number_slices, shape, matrix.dtype, ufunc)
@@ -16,8 +16,10 @@
 #    PARTICULAR. Consulte a Licenca Publica Geral GNU para obter mais
 #    detalhes.
 # --------------------------------------------------------------------------
+import functools
 import os
 import tempfile
+import threading
 
 import numpy as np
 import vtk
@@ -27,52 +29,37 @@ from invesalius.pubsub import pub as Publisher
 import invesalius.constants as const
 import invesalius.data.converters as converters
 import invesalius.data.imagedata_utils as iu
+import invesalius.data.mask_boolean as mask_boolean
+import invesalius.data.mask_stats as mask_stats
 import invesalius.session as ses
 import invesalius.style as st
 import invesalius.utils as utils
-from invesalius.data import transformations
+from invesalius.data.bricked_volume import BrickedMirror, get_brick_settings
 from invesalius.data.mask import Mask
+from invesalius.data.oblique_reslice import ObliqueReslicer
+from invesalius.data.slab_projection import (
+    AXIS,
+    SLIDING_PROJECTIONS,
+    SlabProjector,
+    project,
+    slab_view,
+)
+from invesalius.data.slice_buffer import SliceBuffer
+from invesalius.data.slice_compositor import SliceCompositor
+from invesalius.data.slice_prefetch import SlicePrefetcher
+from invesalius.data.slice_render import RenderMask, render_slice
+from invesalius.data.threshold_preview import ThresholdPreviewer
+from invesalius.data.volume_pyramid import VolumePyramid
+from invesalius.data.volume_stats import VolumeStatistics
 from invesalius.project import Project
-from invesalius_cy import mips, transforms
+from invesalius_cy import threshold as cy_threshold
+from invesalius_cy import transforms
 
 OTHER = 0
 PLIST = 1
 WIDGET = 2
 
 
-class SliceBuffer(object):
-    """
-    This class is used as buffer that mantains the vtkImageData and numpy array
-    from actual slices from each orientation.
-    """
-
-    def __init__(self):
-        self.index = -1
-        self.image = None
-        self.mask = None
-        self.vtk_image = None
-        self.vtk_mask = None
-
-    def discard_vtk_mask(self):
-        self.vtk_mask = None
-
-    def discard_vtk_image(self):
-        self.vtk_image = None
-
-    def discard_mask(self):
-        self.mask = None
-
-    def discard_image(self):
-        self.image = None
-
-    def discard_buffer(self):
-        self.index = -1
-        self.image = None
-        self.mask = None
-        self.vtk_image = None
-        self.vtk_mask = None
-
-
 # Only one slice will be initialized per time (despite several viewers
 # show it from distinct perspectives).
 # Therefore, we use Singleton design pattern for implementing it.
@@ -81,6 +68,10 @@ class Slice(metaclass=utils.Singleton):
         self.current_mask = None
         self.blend_filter = None
         self.histogram = None
+        # VolumeStatistics of the image, gathered while it's written (see
+        # imagedata_utils.dcm2memmap) or saved in the project.
+        self.statistics = None
+        self._threshold_previewer = None
         self._matrix = None
         self._affine = np.identity(4)
         self._n_tracts = 0
@@ -100,16 +91,23 @@ class Slice(metaclass=utils.Singleton):
         self.center = [0, 0, 0]
 
         self.q_orientation = np.array((1, 0, 0, 0))
+        self.reslicer = ObliqueReslicer()
+        self.pyramid = VolumePyramid()
+        self.bricked = BrickedMirror()
+        # True while the user is rotating the volume, a faster interpolation
+        # is used meanwhile (see get_interpolation_method).
+        self.interactive_reslice = False
 
         self.number_of_colours = 256
         self.saturation_range = (0, 0)
         self.hue_range = (0, 0)
         self.value_range = (0, 1)
 
-        self.buffer_slices = {
-            "AXIAL": SliceBuffer(),
-            "CORONAL": SliceBuffer(),
-            "SAGITAL": SliceBuffer(),
+        self.buffer_slices = self._create_slice_buffers()
+        self.slab_projectors = {
+            "AXIAL": SlabProjector("AXIAL"),
+            "CORONAL": SlabProjector("CORONAL"),
+            "SAGITAL": SlabProjector("SAGITAL"),
         }
 
         self.num_gradient = 0
@@ -119,8 +117,26 @@ class Slice(metaclass=utils.Singleton):
         self.nodes = None
 
         self.from_ = OTHER
+        self.compositor = SliceCompositor()
+        # Used by render_slice, so it doesn't change the tables used by the
+        # slice viewers.
+        self.render_compositor = SliceCompositor()
+        # Held while the slice buffers are filled, the SlicePrefetcher fills
+        # them from another thread.
+        self.buffer_lock = threading.RLock()
+        # The vtkImageData shown by the slice viewer of each orientation and
+        # its decimation level (see GetSlices).
+        self.display_images = {}
+        self.display_decimation = {}
+        # The vtkImageData and filters of the 3D plane of each orientation
+        # (see UpdateSlice3D).
+        self.plane_images = {}
+        self.prefetcher = SlicePrefetcher(self)
         self.__bind_events()
         self.opacity = 0.8
+        # [mask, opacity] of the masks shown along with the current one (see
+        # ShowMaskLayer), blended in this order under it.
+        self.mask_layers = []
 
     @property
     def matrix(self):
@@ -128,10 +144,12 @@ class Slice(metaclass=utils.Singleton):
 
     @matrix.setter
     def matrix(self, value):
+        self.discard_volume_copies()
         self._matrix = value
-        i, e = value.min(), value.max()
-        r = int(e) - int(i)
-        self.histogram = np.histogram(self._matrix, r, (i, e))[0]
+        if self.statistics is None or not self.statistics.matches(value):
+            self.update_statistics()
+        else:
+            self.update_statistics(self.statistics)
         self.center = [
             (s * d / 2.0) for (d, s) in zip(self.matrix.shape[::-1], self.spacing)
         ]
@@ -185,9 +203,14 @@ class Slice(metaclass=utils.Singleton):
         Publisher.subscribe(
             self.__set_current_mask_threshold_actual_slice, "Changing threshold values"
         )
+        Publisher.subscribe(self.__update_threshold_preview, "Set threshold values")
+        Publisher.subscribe(
+            self.__update_threshold_preview_changing, "Changing threshold values"
+        )
         Publisher.subscribe(self.__set_current_mask_colour, "Change mask colour")
         Publisher.subscribe(self.__set_mask_name, "Change mask name")
         Publisher.subscribe(self.__show_mask, "Show mask")
+        Publisher.subscribe(self.ShowMaskLayer, "Show mask layer")
         Publisher.subscribe(self.__hide_current_mask, "Hide current mask")
         Publisher.subscribe(self.__show_current_mask, "Show current mask")
         Publisher.subscribe(self.__clean_current_mask, "Clean current mask")
@@ -244,6 +267,16 @@ class Slice(metaclass=utils.Singleton):
 
         Publisher.subscribe(self._set_interpolation_method, "Set interpolation method")
 
+    def _create_slice_buffers(self):
+        max_bytes = ses.Session().get(
+            "session", "slice_cache_size", const.SLICE_CACHE_SIZE
+        )
+        return {
+            "AXIAL": SliceBuffer(max_bytes),
+            "CORONAL": SliceBuffer(max_bytes),
+            "SAGITAL": SliceBuffer(max_bytes),
+        }
+
     def GetMaxSliceNumber(self, orientation):
         shape = self.matrix.shape
 
@@ -262,6 +295,7 @@ class Slice(metaclass=utils.Singleton):
             buffer_.discard_mask()
 
     def OnRemoveMasks(self, mask_indexes):
+        self.prefetcher.cancel(wait=True)
         proj = Project()
         for item in mask_indexes:
             proj.RemoveMask(item)
@@ -278,6 +312,14 @@ class Slice(metaclass=utils.Singleton):
                 Publisher.sendMessage("Show mask", index=item, value=False)
                 Publisher.sendMessage("Reload actual slice")
 
+        masks = list(proj.mask_dict.values())
+        layers = [layer for layer in self.mask_layers if layer[0] in masks]
+        if len(layers) != len(self.mask_layers):
+            self.mask_layers = layers
+            Publisher.sendMessage("Reload actual slice")
+        # The indexes of the masks left were changed.
+        self._send_mask_layers()
+
     def OnDuplicateMasks(self, mask_indexes):
         proj = Project()
         mask_dict = proj.mask_dict
@@ -320,11 +362,17 @@ class Slice(metaclass=utils.Singleton):
         self.CloseProject()
 
     def CloseProject(self):
-        f = self._matrix.filename
-        self._matrix._mmap.close()
-        self._matrix = None
+        self.prefetcher.cancel(wait=True)
+        self.discard_volume_copies()
+        with self.buffer_lock:
+            f = self._matrix.filename
+            self._matrix._mmap.close()
+            self._matrix = None
         os.remove(f)
+        self.statistics = None
+        self._threshold_previewer = None
         self.current_mask = None
+        self.mask_layers = []
 
         for name in self.aux_matrices:
             m = self.aux_matrices[name]
@@ -379,10 +427,12 @@ class Slice(metaclass=utils.Singleton):
     def __set_current_mask_threshold(self, threshold_range):
         if self.current_mask is None:
             return
+        self.prefetcher.cancel(wait=True)
         proj = Project()
         index = proj.mask_dict.get_key(self.current_mask)
         self.num_gradient += 1
         self.current_mask.matrix[:] = 0
+        self.current_mask.set_thresholded(False)
         self.current_mask.clear_history()
 
         if self.current_mask.auto_update_mask and self.current_mask.volume is not None:
@@ -414,19 +464,19 @@ class Slice(metaclass=utils.Singleton):
         if b_mask is not None:
             n = self.buffer_slices["AXIAL"].index + 1
             self.current_mask.matrix[n, 1:, 1:] = b_mask
-            self.current_mask.matrix[n, 0, 0] = 1
+            self.current_mask.set_thresholded(True, "AXIAL", n - 1)
 
         b_mask = self.buffer_slices["CORONAL"].mask
         if b_mask is not None:
             n = self.buffer_slices["CORONAL"].index + 1
             self.current_mask.matrix[1:, n, 1:] = b_mask
-            self.current_mask.matrix[0, n, 0] = 1
+            self.current_mask.set_thresholded(True, "CORONAL", n - 1)
 
         b_mask = self.buffer_slices["SAGITAL"].mask
         if b_mask is not None:
             n = self.buffer_slices["SAGITAL"].index + 1
             self.current_mask.matrix[1:, 1:, n] = b_mask
-            self.current_mask.matrix[0, 0, n] = 1
+            self.current_mask.set_thresholded(True, "SAGITAL", n - 1)
 
         if to_reload:
             Publisher.sendMessage("Reload actual slice")
@@ -449,6 +499,43 @@ class Slice(metaclass=utils.Singleton):
 
         Publisher.sendMessage("Reload actual slice")
 
+    def __update_threshold_preview(self, threshold_range):
+        if self.current_mask is None or self.statistics is None:
+            return
+        preview = self.get_threshold_preview(threshold_range, self.current_mask)
+        Publisher.sendMessage("Update threshold preview", preview=preview)
+
+    def __update_threshold_preview_changing(self, threshold_range):
+        # While the threshold is changing the mask is not thresholded, the
+        # edits are discarded when the range is set.
+        if self.current_mask is None or self.statistics is None:
+            return
+        preview = self.get_threshold_preview(threshold_range)
+        Publisher.sendMessage("Update threshold preview", preview=preview)
+
+    def get_threshold_preview(self, threshold_range=None, mask=None):
+        """
+        Returns the ThresholdPreview (number of voxels, volume and slices
+        occupied) of threshold_range, without thresholding the volume. If
+        mask is given (and threshold_range is None or its threshold range)
+        its thresholded and edited slices are taken into account.
+        """
+        if threshold_range is None:
+            if mask is None:
+                mask = self.current_mask
+            threshold_range = mask.threshold_range
+        previewer = self._threshold_previewer
+        if (
+            previewer is None
+            or previewer.volume is not self.matrix
+            or previewer.statistics is not self.statistics
+        ):
+            previewer = self._threshold_previewer = ThresholdPreviewer(
+                self.matrix, self.statistics, self.spacing
+            )
+        previewer.spacing = self.spacing
+        return previewer.preview(threshold_range, mask)
+
     def __set_current_mask_colour(self, colour):
         # "if" is necessary because wx events are calling this before any mask
         # has been created
@@ -485,6 +572,7 @@ class Slice(metaclass=utils.Singleton):
 
     def __clean_current_mask(self):
         if self.current_mask:
+            self.prefetcher.cancel(wait=True)
             self.current_mask.clean()
             for buffer_ in self.buffer_slices.values():
                 buffer_.discard_vtk_mask()
@@ -522,6 +610,7 @@ class Slice(metaclass=utils.Singleton):
         return temp_file, matrix
 
     def edit_mask_pixel(self, operation, index, position, radius, orientation):
+        self.prefetcher.cancel(wait=True)
         mask = self.buffer_slices[orientation].mask
         image = self.buffer_slices[orientation].image
         thresh_min, thresh_max = self.current_mask.edition_threshold_range
@@ -605,89 +694,71 @@ class Slice(metaclass=utils.Singleton):
                 roi_m[index] = 254
             elif operation == const.BRUSH_ERASE:
                 roi_m[index] = 1
-            self.buffer_slices[orientation].discard_vtk_mask()
+            buffer_ = self.buffer_slices[orientation]
+            buffer_.discard_vtk_mask(buffer_.index)
 
         # Marking the project as changed
         session = ses.Session()
         session.ChangeProject()
 
     def GetSlices(
-        self, orientation, slice_number, number_slices, inverted=False, border_size=1.0
+        self,
+        orientation,
+        slice_number,
+        number_slices,
+        inverted=False,
+        border_size=1.0,
+        decimation=1,
     ):
-        if (
-            self.buffer_slices[orientation].index == slice_number
-            and self._type_projection == const.PROJECTION_NORMAL
-        ):
-            if self.buffer_slices[orientation].vtk_image:
-                image = self.buffer_slices[orientation].vtk_image
+        """
+        Returns the vtkImageData showing the given slice. The same vtkImageData
+        is returned for each orientation, it's updated in place.
+
+        With decimation > 1 (used while the user is interacting) only one of
+        each decimation x decimation pixels is computed, unless the full
+        resolution slice is already in the buffer. The level used is kept in
+        display_decimation.
+        """
+        with self.buffer_lock:
+            buffer_ = self.buffer_slices[orientation]
+            buffer_.index = slice_number
+            if decimation > 1 and not self.is_slice_prepared(
+                orientation, slice_number, number_slices, inverted, border_size
+            ):
+                rgb_image = self.get_decimated_slice(
+                    orientation,
+                    slice_number,
+                    number_slices,
+                    inverted,
+                    border_size,
+                    decimation,
+                )
+                vtk_scalars = converters.numpy_to_vtk_array(rgb_image, 3, deep=False)
             else:
-                n_image = self.get_image_slice(
+                decimation = 1
+                entry = self.prepare_slice(
                     orientation, slice_number, number_slices, inverted, border_size
                 )
-                image = converters.to_vtk(
-                    n_image, self.spacing, slice_number, orientation
-                )
-                ww_wl_image = self.do_ww_wl(image)
-                image = self.do_colour_image(ww_wl_image)
-            if self.current_mask and self.current_mask.is_shown:
-                if self.buffer_slices[orientation].vtk_mask:
-                    # Prints that during navigation causes delay in update
-                    # print "Getting from buffer"
-                    mask = self.buffer_slices[orientation].vtk_mask
-                else:
-                    # Prints that during navigation causes delay in update
-                    # print "Do not getting from buffer"
-                    n_mask = self.get_mask_slice(orientation, slice_number)
-                    mask = converters.to_vtk(
-                        n_mask, self.spacing, slice_number, orientation
+                if entry.vtk_scalars is None:
+                    buffer_.update(
+                        slice_number,
+                        vtk_scalars=converters.numpy_to_vtk_array(
+                            entry.rgb_image, 3, deep=False
+                        ),
                     )
-                    mask = self.do_colour_mask(mask, self.opacity)
-                    self.buffer_slices[orientation].mask = n_mask
-                final_image = self.do_blend(image, mask)
-                self.buffer_slices[orientation].vtk_mask = mask
-            else:
-                final_image = image
-            self.buffer_slices[orientation].vtk_image = image
-        else:
-            n_image = self.get_image_slice(
-                orientation, slice_number, number_slices, inverted, border_size
-            )
-            image = converters.to_vtk(n_image, self.spacing, slice_number, orientation)
-            ww_wl_image = self.do_ww_wl(image)
-            image = self.do_colour_image(ww_wl_image)
-
-            if self.current_mask and self.current_mask.is_shown:
-                n_mask = self.get_mask_slice(orientation, slice_number)
-                mask = converters.to_vtk(
-                    n_mask, self.spacing, slice_number, orientation
-                )
-                mask = self.do_colour_mask(mask, self.opacity)
-                final_image = self.do_blend(image, mask)
-            else:
-                n_mask = None
-                final_image = image
-                mask = None
-
-            self.buffer_slices[orientation].index = slice_number
-            self.buffer_slices[orientation].mask = n_mask
-            self.buffer_slices[orientation].vtk_image = image
-            self.buffer_slices[orientation].vtk_mask = mask
+                rgb_image = entry.rgb_image
+                vtk_scalars = entry.vtk_scalars
+        self.display_decimation[orientation] = decimation
 
         if self.to_show_aux == "watershed" and self.current_mask is not None and self.current_mask.is_shown:
             m = self.get_aux_slice("watershed", orientation, slice_number)
-            tmp_vimage = converters.to_vtk(m, self.spacing, slice_number, orientation)
-            cimage = self.do_custom_colour(
-                tmp_vimage,
-                {
-                    0: (0.0, 0.0, 0.0, 0.0),
-                    1: (0.0, 1.0, 0.0, 1.0),
-                    2: (1.0, 0.0, 0.0, 1.0),
-                },
-            )
-            final_image = self.do_blend(final_image, cimage)
+            colour_table = {
+                0: (0.0, 0.0, 0.0, 0.0),
+                1: (0.0, 1.0, 0.0, 1.0),
+                2: (1.0, 0.0, 0.0, 1.0),
+            }
         elif self.to_show_aux and self.current_mask:
             m = self.get_aux_slice(self.to_show_aux, orientation, slice_number)
-            tmp_vimage = converters.to_vtk(m, self.spacing, slice_number, orientation)
             try:
                 colour_table =  self.aux_matrices_colours[self.to_show_aux]
             except KeyError:
@@ -697,12 +768,378 @@ class Slice(metaclass=utils.Singleton):
                     254: (1.0, 0.0, 0.0, 1.0),
                     255: (1.0, 0.0, 0.0, 1.0),
                 }
-            aux_image = self.do_custom_colour(
-                tmp_vimage,
-                colour_table
+        else:
+            m = None
+
+        if m is not None:
+            # The aux overlays change often (e.g. watershed), so the image with
+            # them is not kept in the buffer.
+            m = m[::decimation, ::decimation]
+            rgb_image = rgb_image.copy()
+            self.compositor.blend(
+                rgb_image, m, *self.compositor.get_overlay_table(colour_table)
+            )
+            vtk_scalars = converters.numpy_to_vtk_array(rgb_image, 3, deep=False)
+
+        try:
+            image = self.display_images[orientation]
+        except KeyError:
+            image = self.display_images[orientation] = converters.new_vtk_image()
+        converters.update_vtk_image(
+            image,
+            vtk_scalars,
+            rgb_image.shape[:2],
+            self._get_display_spacing(orientation, decimation),
+            slice_number,
+            orientation,
+        )
+        return image
+
+    def _get_display_spacing(self, orientation, decimation):
+        # The decimated slices cover the same area with bigger pixels.
+        sx, sy, sz = self.spacing
+        if orientation == "AXIAL":
+            return (sx * decimation, sy * decimation, sz)
+        elif orientation == "CORONAL":
+            return (sx * decimation, sy, sz * decimation)
+        else:
+            return (sx, sy * decimation, sz * decimation)
+
+    def is_slice_prepared(
+        self, orientation, slice_number, number_slices, inverted=False, border_size=1.0
+    ):
+        """
+        Returns True if the composed image of the given slice is in the
+        buffer and up to date.
+        """
+        entry = self.buffer_slices[orientation].get(slice_number)
+        if entry is None or entry.rgb_image is None:
+            return False
+        image_key = self._get_image_key(number_slices, inverted, border_size)
+        if entry.image_key != image_key:
+            return False
+        self._update_compositor()
+        return entry.rgb_key == self._get_rgb_key(image_key)
+
+    def get_decimated_slice(
+        self,
+        orientation,
+        slice_number,
+        number_slices,
+        inverted=False,
+        border_size=1.0,
+        decimation=2,
+    ):
+        """
+        Returns the composed image (numpy RGB) of the given slice sampling
+        only one of each decimation x decimation pixels (or the means of them,
+        from the volume pyramid, if it's built). It's not kept in the buffer
+        and the masks are sampled the same way, see get_decimated_mask_slice.
+        """
+        level = None
+        # The slice of the masks and the image (decimated as the masks) used
+        # to threshold them.
+        mask_slice = slice_number
+        threshold_image = None
+        if self._type_projection == const.PROJECTION_NORMAL:
+            number_slices = 1
+            level = self.pyramid.get_level(decimation)
+        axis = AXIS[orientation]
+        if np.any(self.q_orientation[1::]):
+            slab = self.reslicer.reslice(
+                self.matrix,
+                self.spacing,
+                self.q_orientation,
+                self.center,
+                orientation,
+                slice_number,
+                number_slices,
+                self.get_interpolation_method(),
+                self.statistics.min,
+                decimation,
+            )
+            if inverted:
+                slab = np.flip(slab, axis)
+        elif level is not None:
+            # The level has the shape of the decimated volume, each pixel is
+            # the mean of the ones skipped (in depth too), the masks are read
+            # from the first slice of the block.
+            slab = slab_view(level, orientation, slice_number // decimation, 1)
+            mask_slice = slice_number - slice_number % decimation
+        else:
+            index = [slice(None, None, decimation)] * 3
+            index[axis] = slice(None)
+            slab = slab_view(
+                self.get_slice_source(),
+                orientation,
+                slice_number,
+                number_slices,
+                inverted,
+            )[tuple(index)]
+
+        if self._type_projection == const.PROJECTION_NORMAL:
+            n_image = np.array(slab).reshape(
+                [d for (i, d) in enumerate(slab.shape) if i != axis]
+            )
+            if not np.any(self.q_orientation[1::]):
+                threshold_image = n_image
+        else:
+            n_image = project(
+                slab, axis, self._type_projection, self.window_level, border_size
+            )
+
+        self._update_compositor()
+        masks = list(self.get_mask_layers())
+        if self.current_mask and self.current_mask.is_shown:
+            masks.append((self.current_mask, self.opacity))
+        layers = [
+            (
+                self.get_decimated_mask_slice(
+                    mask, orientation, mask_slice, decimation, threshold_image
+                ),
+                mask.colour,
+                opacity,
+            )
+            for (mask, opacity) in masks
+        ]
+        return self.compositor.compose_layers(n_image, layers)
+
+    def get_decimated_mask_slice(
+        self, mask, orientation, slice_number, decimation, image=None
+    ):
+        """
+        Returns the slice of mask sampling only one of each decimation x
+        decimation pixels, without reading the whole slice. The slices not
+        thresholded yet are thresholded from image (the slice of the image
+        decimated the same way, it's sampled from the volume if None), the
+        mask is not modified.
+        """
+        axis = AXIS[orientation]
+        if mask.is_packed:
+            n_mask = mask.get_slice(orientation, slice_number)
+            n_mask = n_mask[::decimation, ::decimation]
+        else:
+            index = [slice(1, None, decimation)] * 3
+            index[axis] = slice_number + 1
+            n_mask = np.array(mask.matrix[tuple(index)])
+        if not mask.is_thresholded(orientation, slice_number):
+            if image is None:
+                index = [slice(None, None, decimation)] * 3
+                index[axis] = slice_number
+                image = self.get_slice_source()[tuple(index)]
+            n_mask = self.do_threshold_to_a_slice(image, n_mask, mask.threshold_range)
+        return n_mask
+
+    def prepare_slice(
+        self,
+        orientation,
+        slice_number,
+        number_slices,
+        inverted=False,
+        border_size=1.0,
+        generation=None,
+    ):
+        """
+        Makes sure the buffer of the given orientation has the image, mask and
+        composed image (numpy) of slice_number, and returns its entry.
+
+        If generation is given and the buffer was invalidated (e.g. the mask
+        was edited) since that generation, nothing is stored and None is
+        returned.
+        """
+        buffer_ = self.buffer_slices[orientation]
+        self._update_compositor()
+        n_image = self.get_image_slice(
+            orientation, slice_number, number_slices, inverted, border_size
+        )
+        entry = buffer_.get(slice_number)
+        rgb_key = self._get_rgb_key(entry.image_key)
+
+        if entry.rgb_image is None or entry.rgb_key != rgb_key:
+            # Only the slices of the layers modified since the last time are
+            # read, the layers are blended in one pass.
+            layers = self.get_layers(orientation, slice_number)
+            if rgb_key[-1] is not None:
+                n_mask = self.get_mask_slice(orientation, slice_number)
+                layers.append((n_mask, self.current_mask.colour, self.opacity))
+            else:
+                n_mask = entry.mask
+            rgb_image = self.compositor.compose_layers(n_image, layers)
+            if generation is not None and generation != buffer_.generation:
+                return None
+            buffer_.update(
+                slice_number,
+                mask=n_mask,
+                rgb_image=rgb_image,
+                vtk_scalars=None,
+                rgb_key=rgb_key,
+            )
+        return entry
+
+    def prefetch_slice(
+        self,
+        orientation,
+        slice_number,
+        number_slices,
+        inverted=False,
+        border_size=1.0,
+        compositor=None,
+    ):
+        """
+        Used by the SlicePrefetcher from its thread: stores in the buffer the
+        image of slice_number and, if no mask is shown, its composed image
+        (made with compositor, not the one of the GUI thread). The masks are
+        never read nor written, their slices are made by prepare_slice when
+        the slice is shown. buffer_lock is only held to read and update the
+        buffer. Returns True if something was stored.
+        """
+        buffer_ = self.buffer_slices[orientation]
+        self._update_compositor(compositor)
+        with self.buffer_lock:
+            generation = buffer_.generation
+            image_generation = buffer_.image_generation
+            image_key = self._get_image_key(number_slices, inverted, border_size)
+            rgb_key = self._get_rgb_key(image_key, compositor)
+            # Without masks the composed image is the image coloured by the
+            # colour table.
+            compose = rgb_key[-2:] == ((), None)
+            entry = buffer_.get(slice_number)
+            n_image = None
+            if entry is not None and entry.image_key == image_key:
+                if not compose or entry.rgb_key == rgb_key:
+                    return False
+                n_image = entry.image
+
+        if n_image is None:
+            n_image = self.compute_image_slice(
+                orientation,
+                slice_number,
+                number_slices,
+                inverted,
+                border_size,
+                incremental=False,
+            )
+        values = {"image": n_image, "image_key": image_key}
+        if compose:
+            values["rgb_image"] = compositor.compose_layers(n_image, [])
+            values["vtk_scalars"] = None
+            values["rgb_key"] = rgb_key
+
+        with self.buffer_lock:
+            if (
+                generation != buffer_.generation
+                or image_generation != buffer_.image_generation
+            ):
+                return False
+            buffer_.update(slice_number, **values)
+        return True
+
+    def _get_rgb_key(self, image_key, compositor=None):
+        """
+        Returns the parameters which the composed image of a slice depends on,
+        besides its image (image_key). The last one is the key of the mask
+        shown, or None, the one before it the keys of the mask layers.
+        """
+        if compositor is None:
+            compositor = self.compositor
+        if self.current_mask and self.current_mask.is_shown:
+            mask_key = (
+                id(self.current_mask),
+                tuple(self.current_mask.colour),
+                self.opacity,
             )
-            final_image = self.do_blend(final_image, aux_image)
-        return final_image
+        else:
+            mask_key = None
+        return (
+            image_key,
+            compositor.window_width,
+            compositor.window_level,
+            compositor.palette,
+            tuple(
+                self._get_layer_key(mask) + (tuple(mask.colour), opacity)
+                for (mask, opacity) in self.get_mask_layers()
+            ),
+            mask_key,
+        )
+
+    def _update_compositor(self, compositor=None):
+        """
+        Sets the current window and level and colour table in the compositor
+        (self.compositor if None), the compositor only rebuilds its tables if
+        they have changed.
+        """
+        if compositor is None:
+            compositor = self.compositor
+        if self.from_ == PLIST:
+            compositor.set_plist_palette(self.values)
+        elif self.from_ == WIDGET:
+            compositor.set_widget_palette(self.nodes)
+        else:
+            compositor.set_hsv_palette(
+                self.hue_range, self.saturation_range, self.value_range
+            )
+        compositor.set_window_level(self.window_width, self.window_level)
+
+    def render_slice(
+        self,
+        orientation,
+        index,
+        ww=None,
+        wl=None,
+        masks=None,
+        projection=None,
+        number_slices=1,
+        inverted=False,
+        border_size=1.0,
+    ):
+        """
+        Returns the RGBA (numpy) image of a slice rendered with the current
+        colour table, without touching the slice buffers and the viewers (see
+        slice_render.render_slice).
+
+        Params:
+            ww, wl: window width and level, the current ones if None.
+            masks: list of Mask, the mask layers and the current mask (if
+                shown) if None.
+            projection: one of the PROJECTION_* constants, the current one if
+                None.
+        """
+        if ww is None:
+            ww = self.window_width
+        if wl is None:
+            wl = self.window_level
+        if projection is None:
+            projection = self._type_projection
+        if masks is None:
+            masks = self.get_mask_layers()
+            if self.current_mask is not None and self.current_mask.is_shown:
+                masks.append((self.current_mask, self.opacity))
+        else:
+            masks = [(m, self.opacity) for m in masks]
+        masks = [
+            RenderMask(
+                m.matrix,
+                m.colour,
+                m.threshold_range,
+                opacity,
+                m.dirty_slices.thresholded,
+            )
+            for (m, opacity) in masks
+        ]
+        self._update_compositor(self.render_compositor)
+        return render_slice(
+            self.get_slice_source(),
+            orientation,
+            index,
+            ww,
+            wl,
+            masks,
+            projection,
+            number_slices,
+            inverted,
+            border_size,
+            self.render_compositor,
+        )
 
     def get_image_slice(
         self,
@@ -712,343 +1149,180 @@ class Slice(metaclass=utils.Singleton):
         inverted=False,
         border_size=1.0,
     ):
-        dz, dy, dx = self.matrix.shape
+        image_key = self._get_image_key(number_slices, inverted, border_size)
+        entry = self.buffer_slices[orientation].get(slice_number)
         if (
-            self.buffer_slices[orientation].index == slice_number
-            and self.buffer_slices[orientation].image is not None
+            entry is not None
+            and entry.image is not None
+            and entry.image_key == image_key
         ):
-            n_image = self.buffer_slices[orientation].image
+            n_image = entry.image
         else:
-            if self._type_projection == const.PROJECTION_NORMAL:
-                number_slices = 1
-
-            if np.any(self.q_orientation[1::]):
-                cx, cy, cz = self.center
-                T0 = transformations.translation_matrix((-cz, -cy, -cx))
-                #  Rx = transformations.rotation_matrix(rx, (0, 0, 1))
-                #  Ry = transformations.rotation_matrix(ry, (0, 1, 0))
-                #  Rz = transformations.rotation_matrix(rz, (1, 0, 0))
-                #  #  R = transformations.euler_matrix(rz, ry, rx, 'rzyx')
-                #  R = transformations.concatenate_matrices(Rx, Ry, Rz)
-                R = transformations.quaternion_matrix(self.q_orientation)
-                T1 = transformations.translation_matrix((cz, cy, cx))
-                M = transformations.concatenate_matrices(T1, R.T, T0)
+            n_image = self.compute_image_slice(
+                orientation, slice_number, number_slices, inverted, border_size
+            )
+            self.buffer_slices[orientation].update(
+                slice_number, image=n_image, image_key=image_key
+            )
+        return n_image
 
-            if orientation == "AXIAL":
-                tmp_array = np.array(
-                    self.matrix[slice_number : slice_number + number_slices]
-                )
-                if np.any(self.q_orientation[1::]):
-                    transforms.apply_view_matrix_transform(
-                        self.matrix,
-                        self.spacing,
-                        M,
-                        slice_number,
-                        orientation,
-                        self.interp_method,
-                        self.matrix.min(),
-                        tmp_array,
-                    )
-                if self._type_projection == const.PROJECTION_NORMAL:
-                    n_image = tmp_array.reshape(dy, dx)
-                else:
-                    if inverted:
-                        tmp_array = tmp_array[::-1]
-
-                    if self._type_projection == const.PROJECTION_MaxIP:
-                        n_image = np.array(tmp_array).max(0)
-                    elif self._type_projection == const.PROJECTION_MinIP:
-                        n_image = np.array(tmp_array).min(0)
-                    elif self._type_projection == const.PROJECTION_MeanIP:
-                        n_image = np.array(tmp_array).mean(0)
-                    elif self._type_projection == const.PROJECTION_LMIP:
-                        n_image = np.empty(
-                            shape=(tmp_array.shape[1], tmp_array.shape[2]),
-                            dtype=tmp_array.dtype,
-                        )
-                        mips.lmip(
-                            tmp_array, 0, self.window_level, self.window_level, n_image
-                        )
-                    elif self._type_projection == const.PROJECTION_MIDA:
-                        n_image = np.empty(
-                            shape=(tmp_array.shape[1], tmp_array.shape[2]),
-                            dtype=tmp_array.dtype,
-                        )
-                        mips.mida(
-                            tmp_array, 0, self.window_level, self.window_level, n_image
-                        )
-                    elif self._type_projection == const.PROJECTION_CONTOUR_MIP:
-                        n_image = np.empty(
-                            shape=(tmp_array.shape[1], tmp_array.shape[2]),
-                            dtype=tmp_array.dtype,
-                        )
-                        mips.fast_countour_mip(
-                            tmp_array,
-                            border_size,
-                            0,
-                            self.window_level,
-                            self.window_level,
-                            0,
-                            n_image,
-                        )
-                    elif self._type_projection == const.PROJECTION_CONTOUR_LMIP:
-                        n_image = np.empty(
-                            shape=(tmp_array.shape[1], tmp_array.shape[2]),
-                            dtype=tmp_array.dtype,
-                        )
-                        mips.fast_countour_mip(
-                            tmp_array,
-                            border_size,
-                            0,
-                            self.window_level,
-                            self.window_level,
-                            1,
-                            n_image,
-                        )
-                    elif self._type_projection == const.PROJECTION_CONTOUR_MIDA:
-                        n_image = np.empty(
-                            shape=(tmp_array.shape[1], tmp_array.shape[2]),
-                            dtype=tmp_array.dtype,
-                        )
-                        mips.fast_countour_mip(
-                            tmp_array,
-                            border_size,
-                            0,
-                            self.window_level,
-                            self.window_level,
-                            2,
-                            n_image,
-                        )
-                    else:
-                        n_image = np.array(self.matrix[slice_number])
+    def compute_image_slice(
+        self,
+        orientation,
+        slice_number,
+        number_slices=1,
+        inverted=False,
+        border_size=1.0,
+        incremental=True,
+    ):
+        """
+        Computes the image slice (or projection of the slab) without the
+        slice buffer. If not incremental the sliding projections are computed
+        from the whole slab and the volume is read from the memmap (not the
+        bricked copy), so nothing shared with the GUI thread is changed (it's
+        used by the SlicePrefetcher).
+        """
+        if self._type_projection == const.PROJECTION_NORMAL:
+            number_slices = 1
 
-            elif orientation == "CORONAL":
-                tmp_array = np.array(
-                    self.matrix[:, slice_number : slice_number + number_slices, :]
-                )
-                if np.any(self.q_orientation[1::]):
-                    transforms.apply_view_matrix_transform(
-                        self.matrix,
-                        self.spacing,
-                        M,
-                        slice_number,
-                        orientation,
-                        self.interp_method,
-                        self.matrix.min(),
-                        tmp_array,
-                    )
+        if (
+            incremental
+            and self._type_projection in SLIDING_PROJECTIONS
+            and not np.any(self.q_orientation[1::])
+        ):
+            # MaxIP, MinIP and MeanIP are updated incrementally when
+            # scrolling one slice at a time.
+            return self.slab_projectors[orientation].project(
+                self.get_slice_source(),
+                slice_number,
+                number_slices,
+                self._type_projection,
+                self.buffer_slices[orientation].image_generation,
+            )
 
-                if self._type_projection == const.PROJECTION_NORMAL:
-                    n_image = tmp_array.reshape(dz, dx)
-                else:
-                    # if slice_number == 0:
-                    # slice_number = 1
-                    # if slice_number - number_slices < 0:
-                    # number_slices = slice_number
-                    if inverted:
-                        tmp_array = tmp_array[:, ::-1, :]
-                    if self._type_projection == const.PROJECTION_MaxIP:
-                        n_image = np.array(tmp_array).max(1)
-                    elif self._type_projection == const.PROJECTION_MinIP:
-                        n_image = np.array(tmp_array).min(1)
-                    elif self._type_projection == const.PROJECTION_MeanIP:
-                        n_image = np.array(tmp_array).mean(1)
-                    elif self._type_projection == const.PROJECTION_LMIP:
-                        n_image = np.empty(
-                            shape=(tmp_array.shape[0], tmp_array.shape[2]),
-                            dtype=tmp_array.dtype,
-                        )
-                        mips.lmip(
-                            tmp_array, 1, self.window_level, self.window_level, n_image
-                        )
-                    elif self._type_projection == const.PROJECTION_MIDA:
-                        n_image = np.empty(
-                            shape=(tmp_array.shape[0], tmp_array.shape[2]),
-                            dtype=tmp_array.dtype,
-                        )
-                        mips.mida(
-                            tmp_array, 1, self.window_level, self.window_level, n_image
-                        )
-                    elif self._type_projection == const.PROJECTION_CONTOUR_MIP:
-                        n_image = np.empty(
-                            shape=(tmp_array.shape[0], tmp_array.shape[2]),
-                            dtype=tmp_array.dtype,
-                        )
-                        mips.fast_countour_mip(
-                            tmp_array,
-                            border_size,
-                            1,
-                            self.window_level,
-                            self.window_level,
-                            0,
-                            n_image,
-                        )
-                    elif self._type_projection == const.PROJECTION_CONTOUR_LMIP:
-                        n_image = np.empty(
-                            shape=(tmp_array.shape[0], tmp_array.shape[2]),
-                            dtype=tmp_array.dtype,
-                        )
-                        mips.fast_countour_mip(
-                            tmp_array,
-                            border_size,
-                            1,
-                            self.window_level,
-                            self.window_level,
-                            1,
-                            n_image,
-                        )
-                    elif self._type_projection == const.PROJECTION_CONTOUR_MIDA:
-                        n_image = np.empty(
-                            shape=(tmp_array.shape[0], tmp_array.shape[2]),
-                            dtype=tmp_array.dtype,
-                        )
-                        mips.fast_countour_mip(
-                            tmp_array,
-                            border_size,
-                            1,
-                            self.window_level,
-                            self.window_level,
-                            2,
-                            n_image,
-                        )
-                    else:
-                        n_image = np.array(self.matrix[:, slice_number, :])
-            elif orientation == "SAGITAL":
-                tmp_array = np.array(
-                    self.matrix[:, :, slice_number : slice_number + number_slices]
-                )
-                if np.any(self.q_orientation[1::]):
-                    transforms.apply_view_matrix_transform(
-                        self.matrix,
-                        self.spacing,
-                        M,
-                        slice_number,
-                        orientation,
-                        self.interp_method,
-                        self.matrix.min(),
-                        tmp_array,
-                    )
+        axis = AXIS[orientation]
+        if np.any(self.q_orientation[1::]):
+            # Only the pixels of the slab are sampled.
+            tmp_array = self.reslicer.reslice(
+                self.matrix,
+                self.spacing,
+                self.q_orientation,
+                self.center,
+                orientation,
+                slice_number,
+                number_slices,
+                self.get_interpolation_method(),
+                self.statistics.min,
+            )
+            if inverted:
+                tmp_array = np.flip(tmp_array, axis)
+        else:
+            # A view of the memmap, the projection kernels read it in place
+            # (or the slab read from the bricked copy).
+            tmp_array = slab_view(
+                self.get_slice_source() if incremental else self.matrix,
+                orientation,
+                slice_number,
+                number_slices,
+                inverted,
+            )
 
-                if self._type_projection == const.PROJECTION_NORMAL:
-                    n_image = tmp_array.reshape(dz, dy)
-                else:
-                    if inverted:
-                        tmp_array = tmp_array[:, :, ::-1]
-                    if self._type_projection == const.PROJECTION_MaxIP:
-                        n_image = np.array(tmp_array).max(2)
-                    elif self._type_projection == const.PROJECTION_MinIP:
-                        n_image = np.array(tmp_array).min(2)
-                    elif self._type_projection == const.PROJECTION_MeanIP:
-                        n_image = np.array(tmp_array).mean(2)
-                    elif self._type_projection == const.PROJECTION_LMIP:
-                        n_image = np.empty(
-                            shape=(tmp_array.shape[0], tmp_array.shape[1]),
-                            dtype=tmp_array.dtype,
-                        )
-                        mips.lmip(
-                            tmp_array, 2, self.window_level, self.window_level, n_image
-                        )
-                    elif self._type_projection == const.PROJECTION_MIDA:
-                        n_image = np.empty(
-                            shape=(tmp_array.shape[0], tmp_array.shape[1]),
-                            dtype=tmp_array.dtype,
-                        )
-                        mips.mida(
-                            tmp_array, 2, self.window_level, self.window_level, n_image
-                        )
-
-                    elif self._type_projection == const.PROJECTION_CONTOUR_MIP:
-                        n_image = np.empty(
-                            shape=(tmp_array.shape[0], tmp_array.shape[1]),
-                            dtype=tmp_array.dtype,
-                        )
-                        mips.fast_countour_mip(
-                            tmp_array,
-                            border_size,
-                            2,
-                            self.window_level,
-                            self.window_level,
-                            0,
-                            n_image,
-                        )
-                    elif self._type_projection == const.PROJECTION_CONTOUR_LMIP:
-                        n_image = np.empty(
-                            shape=(tmp_array.shape[0], tmp_array.shape[1]),
-                            dtype=tmp_array.dtype,
-                        )
-                        mips.fast_countour_mip(
-                            tmp_array,
-                            border_size,
-                            2,
-                            self.window_level,
-                            self.window_level,
-                            1,
-                            n_image,
-                        )
-                    elif self._type_projection == const.PROJECTION_CONTOUR_MIDA:
-                        n_image = np.empty(
-                            shape=(tmp_array.shape[0], tmp_array.shape[1]),
-                            dtype=tmp_array.dtype,
-                        )
-                        mips.fast_countour_mip(
-                            tmp_array,
-                            border_size,
-                            2,
-                            self.window_level,
-                            self.window_level,
-                            2,
-                            n_image,
-                        )
-                    else:
-                        n_image = np.array(self.matrix[:, :, slice_number])
-
-            self.buffer_slices[orientation].image = n_image
-        return n_image
+        if self._type_projection == const.PROJECTION_NORMAL:
+            return np.array(tmp_array).reshape(
+                [d for (i, d) in enumerate(self.matrix.shape) if i != axis]
+            )
+        return project(
+            tmp_array,
+            axis,
+            self._type_projection,
+            self.window_level,
+            border_size,
+        )
+
+    def _get_image_key(self, number_slices, inverted, border_size):
+        """
+        Returns the parameters which the image slice depends on, besides its
+        orientation and index. Used to know if a cached slice is still valid.
+        """
+        if self._type_projection == const.PROJECTION_NORMAL:
+            key = (const.PROJECTION_NORMAL,)
+        else:
+            key = (self._type_projection, number_slices, inverted, border_size)
+            if self._type_projection not in (
+                const.PROJECTION_MaxIP,
+                const.PROJECTION_MinIP,
+                const.PROJECTION_MeanIP,
+            ):
+                key += (self.window_level,)
+        if np.any(self.q_orientation[1::]):
+            key += (
+                tuple(self.q_orientation),
+                tuple(self.center),
+                self.get_interpolation_method(),
+            )
+        return key
+
+    def get_interpolation_method(self):
+        """
+        Interpolation used to sample the reoriented volume. While the user is
+        rotating it, the interactive one if it's faster than interp_method.
+        """
+        if self.interactive_reslice:
+            return min(self.interp_method, const.RESLICE_INTERACTIVE_INTERPOLATION)
+        return self.interp_method
+
+    @property
+    def image_generation(self):
+        """
+        Changes every time the image slices are discarded, e.g. when the
+        volume is modified.
+        """
+        return tuple(b.image_generation for b in self.buffer_slices.values())
 
     def get_mask_slice(self, orientation, slice_number):
         """
         It gets the from actual mask the given slice from given orientation
         """
-        # It's necessary because the first position for each dimension from
-        # mask matrix is used as flags to control if the mask in the
-        # slice_number position has been generated.
-        if (
-            self.buffer_slices[orientation].index == slice_number
-            and self.buffer_slices[orientation].mask is not None
-        ):
-            return self.buffer_slices[orientation].mask
+        # The slices not thresholded yet (see DirtySliceIndex.thresholded)
+        # are thresholded the first time they're read.
+        entry = self.buffer_slices[orientation].get(slice_number)
+        if entry is not None and entry.mask is not None:
+            return entry.mask
         n = slice_number + 1
         if orientation == "AXIAL":
-            if self.current_mask.matrix[n, 0, 0] == 0:
+            if not self.current_mask.is_thresholded(orientation, slice_number):
                 mask = self.current_mask.matrix[n, 1:, 1:]
                 mask[:] = self.do_threshold_to_a_slice(
                     self.get_image_slice(orientation, slice_number), mask
                 )
-                self.current_mask.matrix[n, 0, 0] = 1
+                self.current_mask.set_thresholded(True, orientation, slice_number)
+                self.current_mask.mark_changed(orientation, slice_number)
             n_mask = np.array(
                 self.current_mask.matrix[n, 1:, 1:],
                 dtype=self.current_mask.matrix.dtype,
             )
 
         elif orientation == "CORONAL":
-            if self.current_mask.matrix[0, n, 0] == 0:
+            if not self.current_mask.is_thresholded(orientation, slice_number):
                 mask = self.current_mask.matrix[1:, n, 1:]
                 mask[:] = self.do_threshold_to_a_slice(
                     self.get_image_slice(orientation, slice_number), mask
                 )
-                self.current_mask.matrix[0, n, 0] = 1
+                self.current_mask.set_thresholded(True, orientation, slice_number)
+                self.current_mask.mark_changed(orientation, slice_number)
             n_mask = np.array(
                 self.current_mask.matrix[1:, n, 1:],
                 dtype=self.current_mask.matrix.dtype,
             )
 
         elif orientation == "SAGITAL":
-            if self.current_mask.matrix[0, 0, n] == 0:
+            if not self.current_mask.is_thresholded(orientation, slice_number):
                 mask = self.current_mask.matrix[1:, 1:, n]
                 mask[:] = self.do_threshold_to_a_slice(
                     self.get_image_slice(orientation, slice_number), mask
                 )
-                self.current_mask.matrix[0, 0, n] = 1
+                self.current_mask.set_thresholded(True, orientation, slice_number)
+                self.current_mask.mark_changed(orientation, slice_number)
             n_mask = np.array(
                 self.current_mask.matrix[1:, 1:, n],
                 dtype=self.current_mask.matrix.dtype,
@@ -1056,6 +1330,58 @@ class Slice(metaclass=utils.Singleton):
 
         return n_mask
 
+    def get_mask_layers(self):
+        """
+        The (mask, opacity) of the mask layers shown, the current mask is not
+        shown as a layer.
+        """
+        return [
+            (mask, opacity)
+            for (mask, opacity) in self.mask_layers
+            if mask is not self.current_mask
+        ]
+
+    def _get_layer_key(self, mask):
+        return (mask.index, mask.modified_time, tuple(mask.threshold_range))
+
+    def get_layer_slice(self, mask, orientation, slice_number):
+        """
+        Returns the slice of a mask layer, thresholding it if needed without
+        modifying the mask (see slice_render.get_mask_slice). It's kept in
+        the slice buffer until the mask is modified.
+        """
+        buffer_ = self.buffer_slices[orientation]
+        key = self._get_layer_key(mask)
+        entry = buffer_.get(slice_number)
+        if entry is not None:
+            cached = entry.layers.get(id(mask))
+            if cached is not None and cached[0] == key:
+                return cached[1]
+
+        # Read through the mask, so a packed mask isn't unpacked.
+        n_mask = mask.get_slice(orientation, slice_number)
+        if not mask.is_thresholded(orientation, slice_number):
+            image = self.get_image_slice(orientation, slice_number)
+            n_mask = self.do_threshold_to_a_slice(image, n_mask, mask.threshold_range)
+        entry = buffer_.get(slice_number)
+        layers = dict(entry.layers) if entry is not None else {}
+        layers[id(mask)] = (key, n_mask)
+        buffer_.update(slice_number, layers=layers)
+        return n_mask
+
+    def get_layers(self, orientation, slice_number):
+        """
+        Returns the (mask slice, colour, opacity) of the mask layers shown.
+        """
+        return [
+            (
+                self.get_layer_slice(mask, orientation, slice_number),
+                mask.colour,
+                opacity,
+            )
+            for (mask, opacity) in self.get_mask_layers()
+        ]
+
     def get_aux_slice(self, name, orientation, n):
         m = self.aux_matrices[name]
         if orientation == "AXIAL":
@@ -1116,6 +1442,7 @@ class Slice(metaclass=utils.Singleton):
         If slice_number is None then all the threshold is calculated for all
         slices, otherwise only to indicated slice.
         """
+        self.prefetcher.cancel(wait=True)
         thresh_min, thresh_max = threshold_range
 
         proj = Project()
@@ -1173,10 +1500,39 @@ class Slice(metaclass=utils.Singleton):
                 buffer_.discard_mask()
             Publisher.sendMessage("Reload actual slice")
 
+    def ShowMaskLayer(self, index, value, opacity=None):
+        """
+        Shows (value True) or hides the mask index as a layer in the slice
+        viewers, along with the current mask. opacity defaults to the one of
+        the current mask, showing a mask already shown changes its opacity.
+        """
+        proj = Project()
+        mask = proj.mask_dict[index]
+        if opacity is None:
+            opacity = self.opacity
+        layers = [layer for layer in self.mask_layers if layer[0] is not mask]
+        if not value:
+            self.mask_layers = layers
+        elif len(layers) == len(self.mask_layers):
+            self.mask_layers.append([mask, opacity])
+        else:
+            for layer in self.mask_layers:
+                if layer[0] is mask:
+                    layer[1] = opacity
+        self._send_mask_layers()
+        Publisher.sendMessage("Reload actual slice")
+
+    def _send_mask_layers(self):
+        # The masks shown as layers, to the mask list of the data panel.
+        mask_dict = Project().mask_dict
+        indexes = [mask_dict.get_key(mask) for (mask, opacity) in self.mask_layers]
+        Publisher.sendMessage("Update mask layers", indexes=indexes)
+
     # ---------------------------------------------------------------------------
 
     def SelectCurrentMask(self, index):
         "Insert mask data, based on given index, into pipeline."
+        self.prefetcher.cancel(wait=True)
         if self.current_mask:
             self.current_mask.is_shown = False
             self.current_mask.on_show()
@@ -1189,11 +1545,10 @@ class Slice(metaclass=utils.Singleton):
         colour = future_mask.colour
         self.SetMaskColour(index, colour, update=False)
 
-        self.buffer_slices = {
-            "AXIAL": SliceBuffer(),
-            "CORONAL": SliceBuffer(),
-            "SAGITAL": SliceBuffer(),
-        }
+        # Only the cached mask slices depend on the current mask.
+        for buffer_ in self.buffer_slices.values():
+            buffer_.discard_mask()
+            buffer_.discard_vtk_mask()
 
         Publisher.sendMessage(
             "Set mask threshold in notebook",
@@ -1207,6 +1562,18 @@ class Slice(metaclass=utils.Singleton):
         Publisher.sendMessage("Select mask name in combo", index=index)
         Publisher.sendMessage("Update slice viewer")
 
+        if ses.Session().get("session", "packed_masks", const.PACKED_MASKS):
+            self.pack_inactive_masks()
+
+    def pack_inactive_masks(self):
+        """
+        Packs the masks but the current one (see Mask.pack), they're unpacked
+        when their matrix is used again.
+        """
+        for mask in Project().mask_dict.values():
+            if mask is not self.current_mask:
+                mask.pack()
+
     # ---------------------------------------------------------------------------
 
     def CreateSurfaceFromIndex(self, surface_parameters):
@@ -1254,21 +1621,10 @@ class Slice(metaclass=utils.Singleton):
             Publisher.sendMessage("Reload actual slice")
 
     def UpdateWindowLevelBackground(self, window, level):
+        # The cached slices are checked against the window and level (see
+        # GetSlices and _get_image_key), so they don't need to be discarded.
         self.window_width = window
         self.window_level = level
-
-        for buffer_ in self.buffer_slices.values():
-            if self._type_projection in (
-                const.PROJECTION_NORMAL,
-                const.PROJECTION_MaxIP,
-                const.PROJECTION_MinIP,
-                const.PROJECTION_MeanIP,
-                const.PROJECTION_LMIP,
-            ):
-                buffer_.discard_vtk_image()
-            else:
-                buffer_.discard_buffer()
-
         Publisher.sendMessage("Reload actual slice")
 
     def UpdateColourTableBackground(self, values):
@@ -1277,33 +1633,16 @@ class Slice(metaclass=utils.Singleton):
         self.saturation_range = values[1]
         self.hue_range = values[2]
         self.value_range = values[3]
-        for buffer_ in self.buffer_slices.values():
-            buffer_.discard_vtk_image()
         Publisher.sendMessage("Reload actual slice")
 
     def UpdateColourTableBackgroundPlist(self, values):
         self.values = values
         self.from_ = PLIST
-        for buffer_ in self.buffer_slices.values():
-            buffer_.discard_vtk_image()
-
         Publisher.sendMessage("Reload actual slice")
 
     def UpdateColourTableBackgroundWidget(self, nodes):
         self.nodes = nodes
         self.from_ = WIDGET
-        for buffer_ in self.buffer_slices.values():
-            if self._type_projection in (
-                const.PROJECTION_NORMAL,
-                const.PROJECTION_MaxIP,
-                const.PROJECTION_MinIP,
-                const.PROJECTION_MeanIP,
-                const.PROJECTION_LMIP,
-            ):
-                buffer_.discard_vtk_image()
-            else:
-                buffer_.discard_buffer()
-
         knodes = sorted(self.nodes)
         p0 = knodes[0].value
         pn = knodes[-1].value
@@ -1314,23 +1653,55 @@ class Slice(metaclass=utils.Singleton):
         Publisher.sendMessage("Reload actual slice")
 
     def UpdateSlice3D(self, widget, orientation):
-        img = self.buffer_slices[orientation].vtk_image
-        original_orientation = Project().original_orientation
-        cast = vtk.vtkImageCast()
-        cast.SetInputData(img)
-        cast.SetOutputScalarTypeToDouble()
-        cast.ClampOverflowOn()
-        cast.Update()
-
-        # if (original_orientation == const.AXIAL):
-        flip = vtk.vtkImageFlip()
-        flip.SetInputConnection(cast.GetOutputPort())
-        flip.SetFilteredAxis(1)
-        flip.FlipAboutOriginOn()
+        """
+        Shows in the 3D plane widget the slice of orientation shown by the
+        slice viewer. The composed image (with the masks) in the buffer is
+        used, through the same vtkDataArray, so the slice isn't computed
+        again. Only if it's not up to date the image slice is coloured.
+        """
+        with self.buffer_lock:
+            buffer_ = self.buffer_slices[orientation]
+            entry = buffer_.get(buffer_.index)
+            if entry is None or entry.image is None:
+                return
+            self._update_compositor()
+            if entry.rgb_image is not None and entry.rgb_key == self._get_rgb_key(
+                entry.image_key
+            ):
+                if entry.vtk_scalars is None:
+                    buffer_.update(
+                        buffer_.index,
+                        vtk_scalars=converters.numpy_to_vtk_array(
+                            entry.rgb_image, 3, deep=False
+                        ),
+                    )
+                shape = entry.rgb_image.shape[:2]
+                vtk_scalars = entry.vtk_scalars
+            else:
+                rgb_image = self.compositor.colour_image(entry.image)
+                shape = rgb_image.shape[:2]
+                vtk_scalars = converters.numpy_to_vtk_array(rgb_image, 3, deep=False)
+
+        # The vtkImageData and filters of each orientation are kept, only
+        # their input changes.
+        try:
+            image, cast, flip = self.plane_images[orientation]
+        except KeyError:
+            image = converters.new_vtk_image()
+            cast = vtk.vtkImageCast()
+            cast.SetInputData(image)
+            cast.SetOutputScalarTypeToDouble()
+            cast.ClampOverflowOn()
+            flip = vtk.vtkImageFlip()
+            flip.SetInputConnection(cast.GetOutputPort())
+            flip.SetFilteredAxis(1)
+            flip.FlipAboutOriginOn()
+            self.plane_images[orientation] = image, cast, flip
+        converters.update_vtk_image(
+            image, vtk_scalars, shape, self.spacing, buffer_.index, orientation
+        )
         flip.Update()
         widget.SetInputConnection(flip.GetOutputPort())
-        # else:
-        # widget.SetInput(cast.GetOutput())
 
     def create_new_mask(
         self,
@@ -1481,29 +1852,46 @@ class Slice(metaclass=utils.Singleton):
         else:
             thresh_min, thresh_max = self.current_mask.threshold_range
 
-        m = ((slice_matrix >= thresh_min) & (slice_matrix <= thresh_max)) * 255
-        m[mask == 1] = 1
-        m[mask == 2] = 2
-        m[mask == 253] = 253
-        m[mask == 254] = 254
-        return m.astype("uint8")
+        m = np.empty(slice_matrix.shape, dtype="uint8")
+        cy_threshold.threshold_slice(
+            slice_matrix, mask, float(thresh_min), float(thresh_max), m
+        )
+        return m
 
-    def do_threshold_to_all_slices(self, mask=None):
+    def do_threshold_to_all_slices(self, mask=None, start=0, stop=None):
         """
         Apply threshold to all slices.
 
         Params:
             - mask: the mask where result of the threshold will be stored.If
               None, it'll be the current mask.
+            - start, stop: only the axial slices [start, stop) are
+              thresholded.
         """
+        self.prefetcher.cancel(wait=True)
         if mask is None:
             mask = self.current_mask
-        for n in range(1, mask.matrix.shape[0]):
-            if mask.matrix[n, 0, 0] == 0:
-                m = mask.matrix[n, 1:, 1:]
-                mask.matrix[n, 1:, 1:] = self.do_threshold_to_a_slice(
-                    self.matrix[n - 1], m, mask.threshold_range
-                )
+        if stop is None:
+            stop = self.matrix.shape[0]
+        # Only the slices not thresholded yet, they're set as thresholded
+        # after, so the next call doesn't threshold them again.
+        thresholded = mask.dirty_slices.thresholded[0]
+        to_threshold = np.flatnonzero(~thresholded[start:stop]).astype(np.intc)
+        if not to_threshold.size:
+            return
+        to_threshold += start
+
+        thresh_min, thresh_max = mask.threshold_range
+        # The slices are thresholded in parallel, in place.
+        cy_threshold.threshold_volume(
+            self.matrix,
+            mask.matrix,
+            float(thresh_min),
+            float(thresh_max),
+            to_threshold,
+        )
+        mask.dirty_slices.set_thresholded(0, to_threshold)
+        mask.dirty_slices.mark(0, to_threshold)
 
         mask.matrix.flush()
 
@@ -1610,6 +1998,7 @@ class Slice(metaclass=utils.Singleton):
         self.do_boolean_op(operation, mask1, mask2)
 
     def do_boolean_op(self, op, m1, m2):
+        self.prefetcher.cancel(wait=True)
         name_ops = {
             const.BOOLEAN_UNION: _(u"Union"),
             const.BOOLEAN_DIFF: _(u"Diff"),
@@ -1617,8 +2006,25 @@ class Slice(metaclass=utils.Singleton):
             const.BOOLEAN_XOR: _(u"XOR"),
             const.BOOLEAN_MIRROR_DIFF: _(u"MDiff"),
         }
+        expressions = {
+            const.BOOLEAN_UNION: (mask_boolean.UNION, 0, 1),
+            const.BOOLEAN_DIFF: (mask_boolean.DIFF, 0, 1),
+            const.BOOLEAN_AND: (mask_boolean.AND, 0, 1),
+            const.BOOLEAN_XOR: (mask_boolean.XOR, 0, 1),
+            const.BOOLEAN_MIRROR_DIFF: (mask_boolean.DIFF, (mask_boolean.MIRROR, 0), 1),
+        }
 
         name = u"%s_%s_%s" % (name_ops[op], m1.name, m2.name)
+        self.do_boolean_expression(expressions[op], [m1, m2], name)
+
+    def do_boolean_expression(self, expression, masks, name):
+        """
+        Creates a new mask with the result of a boolean expression of masks
+        (see mask_boolean), e.g. (UNION, 0, (DIFF, 1, 2)). The masks are
+        read by slabs, the slices not thresholded yet are thresholded on the
+        fly and the masks are not modified.
+        """
+        self.prefetcher.cancel(wait=True)
         proj = Project()
         mask_dict = proj.mask_dict
         names_list = [mask_dict[i].name for i in mask_dict.keys()]
@@ -1628,31 +2034,20 @@ class Slice(metaclass=utils.Singleton):
         future_mask.create_mask(self.matrix.shape)
         future_mask.spacing = self.spacing
         future_mask.name = new_name
-
-        future_mask.matrix[:] = 1
-        m = future_mask.matrix[1:, 1:, 1:]
-
-        self.do_threshold_to_all_slices(m1)
-        m1 = m1.matrix[1:, 1:, 1:]
-
-        self.do_threshold_to_all_slices(m2)
-        m2 = m2.matrix[1:, 1:, 1:]
-
-        if op == const.BOOLEAN_UNION:
-            m[:] = ((m1 > 2) + (m2 > 2)) * 255
-
-        elif op == const.BOOLEAN_DIFF:
-            m[:] = ((m1 > 2) ^ ((m1 > 2) & (m2 > 2))) * 255
-
-        elif op == const.BOOLEAN_AND:
-            m[:] = ((m1 > 2) & (m2 > 2)) * 255
-
-        elif op == const.BOOLEAN_XOR:
-            m[:] = np.logical_xor((m1 > 2), (m2 > 2)) * 255
-
-        elif op == const.BOOLEAN_MIRROR_DIFF:
-            m1[:] = m1[:, :, ::-1]
-            m[:] = ((m1 > 2) ^ ((m1 > 2) & (m2 > 2))) * 255
+        future_mask.set_thresholded()
+
+        readers = [
+            functools.partial(
+                mask_boolean.read_mask_slab,
+                mask.matrix,
+                image=self.matrix,
+                threshold_range=mask.threshold_range,
+                thresholded=mask.dirty_slices.thresholded[0],
+            )
+            for mask in masks
+        ]
+        mask_boolean.evaluate_to(expression, readers, future_mask.matrix[1:, 1:, 1:])
+        future_mask.matrix.flush()
 
         for o in self.buffer_slices:
             self.buffer_slices[o].discard_mask()
@@ -1665,6 +2060,7 @@ class Slice(metaclass=utils.Singleton):
         """
         Apply the modifications (edition) in mask buffer to mask.
         """
+        self.prefetcher.cancel(wait=True)
         b_mask = self.buffer_slices[orientation].mask
         index = self.buffer_slices[orientation].index
 
@@ -1676,7 +2072,6 @@ class Slice(metaclass=utils.Singleton):
             # clean=True)
             p_mask = self.current_mask.matrix[index + 1, 1:, 1:].copy()
             self.current_mask.matrix[index + 1, 1:, 1:] = b_mask
-            self.current_mask.matrix[index + 1, 0, 0] = 2
 
         elif orientation == "CORONAL":
             # if self.current_mask.matrix[0, index+1, 0] != 2:
@@ -1685,7 +2080,6 @@ class Slice(metaclass=utils.Singleton):
             # clean=True)
             p_mask = self.current_mask.matrix[1:, index + 1, 1:].copy()
             self.current_mask.matrix[1:, index + 1, 1:] = b_mask
-            self.current_mask.matrix[0, index + 1, 0] = 2
 
         elif orientation == "SAGITAL":
             # if self.current_mask.matrix[0, 0, index+1] != 2:
@@ -1694,8 +2088,9 @@ class Slice(metaclass=utils.Singleton):
             # clean=True)
             p_mask = self.current_mask.matrix[1:, 1:, index + 1].copy()
             self.current_mask.matrix[1:, 1:, index + 1] = b_mask
-            self.current_mask.matrix[0, 0, index + 1] = 2
 
+        self.current_mask.set_thresholded(True, orientation, index)
+        self.current_mask.mark_changed(orientation, index)
         self.current_mask.save_history(index, orientation, b_mask, p_mask)
         self.current_mask.was_edited = True
 
@@ -1706,17 +2101,14 @@ class Slice(metaclass=utils.Singleton):
         Publisher.sendMessage("Reload actual slice")
 
     def apply_reorientation(self):
+        self.discard_volume_copies()
         temp_file = tempfile.mktemp()
         mcopy = np.memmap(
             temp_file, shape=self.matrix.shape, dtype=self.matrix.dtype, mode="w+"
         )
         mcopy[:] = self.matrix
 
-        cx, cy, cz = self.center
-        T0 = transformations.translation_matrix((-cz, -cy, -cx))
-        R = transformations.quaternion_matrix(self.q_orientation)
-        T1 = transformations.translation_matrix((cz, cy, cx))
-        M = transformations.concatenate_matrices(T1, R.T, T0)
+        M = self.reslicer.get_view_matrix(self.q_orientation, self.center)
 
         transforms.apply_view_matrix_transform(
             mcopy,
@@ -1725,12 +2117,13 @@ class Slice(metaclass=utils.Singleton):
             0,
             "AXIAL",
             self.interp_method,
-            mcopy.min(),
+            self.statistics.min,
             self.matrix,
         )
 
         del mcopy
         os.remove(temp_file)
+        self.update_statistics()
 
         self.q_orientation = np.array((1, 0, 0, 0))
         self.center = [
@@ -1740,14 +2133,17 @@ class Slice(metaclass=utils.Singleton):
         self.__clean_current_mask()
         if self.current_mask:
             self.current_mask.matrix[:] = 0
+            self.current_mask.set_thresholded(False)
             self.current_mask.was_edited = False
 
         for o in self.buffer_slices:
             self.buffer_slices[o].discard_buffer()
+        self.build_volume_copies()
 
         Publisher.sendMessage("Reload actual slice")
 
     def __undo_edition(self):
+        self.prefetcher.cancel(wait=True)
         buffer_slices = self.buffer_slices
         actual_slices = {
             "AXIAL": buffer_slices["AXIAL"].index,
@@ -1762,6 +2158,7 @@ class Slice(metaclass=utils.Singleton):
         Publisher.sendMessage("Reload actual slice")
 
     def __redo_edition(self):
+        self.prefetcher.cancel(wait=True)
         buffer_slices = self.buffer_slices
         actual_slices = {
             "AXIAL": buffer_slices["AXIAL"].index,
@@ -1775,24 +2172,82 @@ class Slice(metaclass=utils.Singleton):
             self.buffer_slices[o].discard_vtk_mask()
         Publisher.sendMessage("Reload actual slice")
 
-    def _open_image_matrix(self, filename, shape, dtype):
+    def _open_image_matrix(
+        self, filename, shape, dtype, pyramid_levels=None, bricks=None, statistics=None
+    ):
         self.matrix_filename = filename
+        self.statistics = statistics
         self.matrix = np.memmap(filename, shape=shape, dtype=dtype, mode="r+")
+        if pyramid_levels:
+            self.pyramid.open(self.matrix, pyramid_levels)
+        enabled, brick_size, cache_size = get_brick_settings()
+        if bricks and enabled:
+            self.bricked.open(self.matrix, bricks, cache_size)
+
+    def build_volume_copies(self):
+        """
+        Builds (in background) the levels of the volume pyramid and the
+        bricked copy of the image (if enabled) not built yet.
+        """
+        if self.matrix is None:
+            return
+        self.pyramid.build(self.matrix, self.matrix_filename)
+        enabled, brick_size, cache_size = get_brick_settings()
+        if enabled:
+            self.bricked.build(
+                self.matrix, self.matrix_filename, brick_size, cache_size
+            )
+
+    def update_statistics(self, statistics=None):
+        """
+        Sets the statistics of the image (computed from it if None) and the
+        histogram, to be called after the image values are changed.
+        """
+        if statistics is None:
+            statistics = VolumeStatistics.from_volume(self.matrix)
+        self.statistics = statistics
+        self.histogram = statistics.get_histogram()
+        if self.histogram is None:
+            i, e = statistics.scalar_range
+            self.histogram = np.histogram(self.matrix, int(e) - int(i), (i, e))[0]
+
+    def discard_volume_copies(self):
+        """
+        Discards the volume pyramid and the bricked copy of the image, to be
+        called before the image is modified.
+        """
+        self.pyramid.discard()
+        self.bricked.discard()
+
+    def get_slice_source(self):
+        """
+        The volume the axis aligned slices are read from: the bricked copy of
+        the image, if it's created, or the image.
+        """
+        bricked = self.bricked.get()
+        if bricked is None:
+            return self.matrix
+        return bricked
 
     def OnFlipVolume(self, axis):
+        self.discard_volume_copies()
         if axis == 0:
             self.matrix[:] = self.matrix[::-1]
         elif axis == 1:
             self.matrix[:] = self.matrix[:, ::-1]
         elif axis == 2:
             self.matrix[:] = self.matrix[:, :, ::-1]
+        self.statistics.flip(axis)
 
         for buffer_ in self.buffer_slices.values():
             buffer_.discard_buffer()
+        self.build_volume_copies()
 
     def OnSwapVolumeAxes(self, axes):
         axis0, axis1 = axes
+        self.statistics.swap_axes(axis0, axis1)
         self.matrix = self.matrix.swapaxes(axis0, axis1)
+        self.build_volume_copies()
         if (axis0, axis1) == (2, 1):
             self.spacing = self.spacing[1], self.spacing[0], self.spacing[2]
         elif (axis0, axis1) == (2, 0):
@@ -1810,6 +2265,7 @@ class Slice(metaclass=utils.Singleton):
             iu.Export(imagedata, filename)
 
     def _fill_holes_auto(self, parameters):
+        self.prefetcher.cancel(wait=True)
         target = parameters["target"]
         conn = parameters["conn"]
         orientation = parameters["orientation"]
@@ -1831,48 +2287,41 @@ class Slice(metaclass=utils.Singleton):
         self.buffer_slices["CORONAL"].discard_vtk_mask()
         self.buffer_slices["SAGITAL"].discard_vtk_mask()
 
-        self.current_mask.modified(target == '3D')
+        self.current_mask.modified(target == "3D", orientation, index)
         Publisher.sendMessage("Reload actual slice")
 
-    def calc_image_density(self, mask=None):
-        if mask is None:
-            mask = self.current_mask
-        self.do_threshold_to_all_slices(mask)
-        values = self.matrix[mask.matrix[1:, 1:, 1:] > 127]
-
-        if len(values):
-            _min = values.min()
-            _max = values.max()
-            _mean = values.mean()
-            _std = values.std()
-            return _min, _max, _mean, _std
-        else:
-            return 0, 0, 0, 0
-
-    def calc_mask_area(self, mask=None):
+    def get_mask_statistics(self, mask=None):
+        """
+        Returns the MaskStatistics (see mask_stats) of mask (the current one
+        if None) and the image in it. They're computed once, while the mask
+        and the image are not changed.
+        """
         if mask is None:
             mask = self.current_mask
+        key = (
+            mask.modified_time,
+            mask.dirty_slices.generation,
+            tuple(mask.threshold_range),
+            tuple(self.spacing),
+            self.statistics,
+        )
+        if mask.statistics_cache is None or mask.statistics_cache[0] != key:
+            statistics = mask_stats.compute(
+                self.matrix,
+                mask.matrix,
+                mask.threshold_range,
+                self.spacing,
+                thresholded=mask.dirty_slices.thresholded[0],
+            )
+            mask.statistics_cache = (key, statistics)
+        return mask.statistics_cache[1]
 
-        self.do_threshold_to_all_slices(mask)
-        bin_img = mask.matrix[1:, 1:, 1:] > 127
-
-        sx, sy, sz = self.spacing
-
-        kernel = np.zeros((3, 3, 3))
-        kernel[1, 1, 1] = 2 * sx * sy + 2 * sx * sz + 2 * sy * sz
-        kernel[0, 1, 1] = -(sx * sy)
-        kernel[2, 1, 1] = -(sx * sy)
-
-        kernel[1, 0, 1] = -(sx * sz)
-        kernel[1, 2, 1] = -(sx * sz)
-
-        kernel[1, 1, 0] = -(sy * sz)
-        kernel[1, 1, 2] = -(sy * sz)
-
-        #  area = ndimage.generic_filter(bin_img * 1.0, _conv_area, size=(3, 3, 3), mode='constant', cval=1, extra_arguments=(sx, sy, sz)).sum()
-        area = transforms.convolve_non_zero(bin_img * 1.0, kernel, 1).sum()
+    def calc_image_density(self, mask=None):
+        statistics = self.get_mask_statistics(mask)
+        return statistics.min, statistics.max, statistics.mean, statistics.std
 
-        return area
+    def calc_mask_area(self, mask=None):
+        return self.get_mask_statistics(mask).area
 
 
 def _conv_area(x, sx, sy, sz):
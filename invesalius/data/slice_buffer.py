@@ -0,0 +1,223 @@
+# --------------------------------------------------------------------------
+# Software:     InVesalius - Software de Reconstrucao 3D de Imagens Medicas
+# Copyright:    (C) 2001  Centro de Pesquisas Renato Archer
+# Homepage:     http://www.softwarepublico.gov.br
+# Contact:      invesalius@cti.gov.br
+# License:      GNU - GPL 2 (LICENSE.txt/LICENCA.txt)
+# --------------------------------------------------------------------------
+#    Este programa e software livre; voce pode redistribui-lo e/ou
+#    modifica-lo sob os termos da Licenca Publica Geral GNU, conforme
+#    publicada pela Free Software Foundation; de acordo com a versao 2
+#    da Licenca.
+#
+#    Este programa eh distribuido na expectativa de ser util, mas SEM
+#    QUALQUER GARANTIA; sem mesmo a garantia implicita de
+#    COMERCIALIZACAO ou de ADEQUACAO A QUALQUER PROPOSITO EM
+#    PARTICULAR. Consulte a Licenca Publica Geral GNU para obter mais
+#    detalhes.
+# --------------------------------------------------------------------------
+"""
+The cache of the slices of one orientation used by the Slice.
+
+It keeps, for each slice, the image, the mask, the slices of the mask layers
+and the composed image (see SliceBufferEntry), up to a number of bytes. The
+least recently used slices are evicted first, but the one shown.
+"""
+
+import collections
+
+
+class SliceBufferEntry(object):
+    """
+    The cached data of one slice: the raw image slice, the mask slice, the
+    slices of the mask layers and the composed (image + masks) slice as numpy
+    array and as vtkDataArray (vtk_scalars, which references the numpy array,
+    no copy). image_key and rgb_key are the parameters used to generate image
+    and rgb_image, they are used to know if those are still valid.
+    """
+
+    __slots__ = (
+        "image",
+        "mask",
+        "layers",
+        "rgb_image",
+        "vtk_scalars",
+        "image_key",
+        "rgb_key",
+        "transient_mask",
+        "nbytes",
+    )
+
+    def __init__(self):
+        self.image = None
+        self.mask = None
+        # id(mask) -> (layer key, mask slice), see Slice.get_layer_slice.
+        self.layers = {}
+        self.rgb_image = None
+        self.vtk_scalars = None
+        self.image_key = None
+        self.rgb_key = None
+        self.transient_mask = False
+        self.nbytes = 0
+
+    def calc_nbytes(self):
+        nbytes = 0
+        for array in (self.image, self.mask, self.rgb_image):
+            if array is not None:
+                nbytes += array.nbytes
+        for key, array in self.layers.values():
+            nbytes += array.nbytes
+        return nbytes
+
+
+class SliceBuffer(object):
+    """
+    This class is used as buffer that mantains the vtkImageData and numpy array
+    from slices from each orientation.
+
+    The slices are kept in a LRU cache limited by max_bytes (see
+    constants.SLICE_CACHE_SIZE). The attributes
+    index, image, mask and rgb_image refer to the actual slice (the
+    one shown by the viewer). The discard_* methods discard the data from the
+    given slice index or, if index is None, from all cached slices.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        # Incremented each time cached data is discarded or set from outside,
+        # so a slice computed concurrently with that is not stored.
+        self.generation = 0
+        # Incremented each time image slices are discarded (e.g. the volume
+        # was changed).
+        self.image_generation = 0
+        self._index = -1
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, index):
+        return index in self._entries
+
+    @property
+    def index(self):
+        return self._index
+
+    @index.setter
+    def index(self, index):
+        if index == self._index:
+            return
+        # A mask set from outside (e.g. threshold preview) may not be in the
+        # mask volume, so it's only kept while its slice is the actual one.
+        entry = self._entries.get(self._index)
+        if entry is not None and entry.transient_mask:
+            self.discard_mask(self._index)
+            self.discard_vtk_mask(self._index)
+        self._index = index
+
+    def _get_current(self, attr):
+        entry = self._entries.get(self._index)
+        if entry is None:
+            return None
+        return getattr(entry, attr)
+
+    @property
+    def image(self):
+        return self._get_current("image")
+
+    @image.setter
+    def image(self, image):
+        self.update(self._index, image=image)
+
+    @property
+    def mask(self):
+        return self._get_current("mask")
+
+    @mask.setter
+    def mask(self, mask):
+        self.generation += 1
+        self.update(self._index, mask=mask, transient_mask=mask is not None)
+
+    @property
+    def rgb_image(self):
+        return self._get_current("rgb_image")
+
+    def get(self, index):
+        """
+        Returns the cached entry of the slice index (or None), marking it as
+        the most recently used.
+        """
+        try:
+            entry = self._entries[index]
+        except KeyError:
+            return None
+        self._entries.move_to_end(index)
+        return entry
+
+    def update(self, index, **values):
+        """
+        Sets the given attributes (see SliceBufferEntry) of the slice index,
+        evicting the least recently used slices if the cache is full.
+        """
+        if index < 0:
+            return
+        try:
+            entry = self._entries[index]
+        except KeyError:
+            entry = self._entries[index] = SliceBufferEntry()
+        self._entries.move_to_end(index)
+        for attr, value in values.items():
+            setattr(entry, attr, value)
+        self._update_nbytes(entry)
+        self._evict()
+
+    def _update_nbytes(self, entry):
+        nbytes = entry.calc_nbytes()
+        self.nbytes += nbytes - entry.nbytes
+        entry.nbytes = nbytes
+
+    def _evict(self):
+        for index in list(self._entries):
+            if self.nbytes <= self.max_bytes:
+                break
+            if index != self._index:
+                self.nbytes -= self._entries.pop(index).nbytes
+
+    def _discard(self, index, attrs):
+        self.generation += 1
+        if index is None:
+            entries = list(self._entries.values())
+        elif index in self._entries:
+            entries = [self._entries[index]]
+        else:
+            return
+        for entry in entries:
+            for attr in attrs:
+                setattr(entry, attr, None)
+            if "mask" in attrs:
+                entry.transient_mask = False
+            self._update_nbytes(entry)
+
+    def discard_vtk_mask(self, index=None):
+        self._discard(index, ("rgb_image", "vtk_scalars", "rgb_key"))
+
+    def discard_vtk_image(self, index=None):
+        self._discard(index, ("rgb_image", "vtk_scalars", "rgb_key"))
+
+    def discard_mask(self, index=None):
+        self._discard(index, ("mask",))
+
+    def discard_image(self, index=None):
+        self.image_generation += 1
+        self._discard(index, ("image", "image_key"))
+
+    def discard_buffer(self, index=None):
+        self.generation += 1
+        self.image_generation += 1
+        if index is None:
+            self._index = -1
+            self._entries.clear()
+            self.nbytes = 0
+        elif index in self._entries:
+            self.nbytes -= self._entries.pop(index).nbytes
@@ -0,0 +1,515 @@
+# --------------------------------------------------------------------------
+# Software:     InVesalius - Software de Reconstrucao 3D de Imagens Medicas
+# Copyright:    (C) 2001  Centro de Pesquisas Renato Archer
+# Homepage:     http://www.softwarepublico.gov.br
+# Contact:      invesalius@cti.gov.br
+# License:      GNU - GPL 2 (LICENSE.txt/LICENCA.txt)
+# --------------------------------------------------------------------------
+#    Este programa e software livre; voce pode redistribui-lo e/ou
+#    modifica-lo sob os termos da Licenca Publica Geral GNU, conforme
+#    publicada pela Free Software Foundation; de acordo com a versao 2
+#    da Licenca.
+#
+#    Este programa eh distribuido na expectativa de ser util, mas SEM
+#    QUALQUER GARANTIA; sem mesmo a garantia implicita de
+#    COMERCIALIZACAO ou de ADEQUACAO A QUALQUER PROPOSITO EM
+#    PARTICULAR. Consulte a Licenca Publica Geral GNU para obter mais
+#    detalhes.
+# --------------------------------------------------------------------------
+"""
+NumPy implementation of the slice display pipeline.
+
+It replaces the chain vtkImageMapToWindowLevelColors -> vtkLookupTable ->
+vtkImageMapToColors -> vtkImageBlend used to build each displayed slice. The
+arithmetic (truncations, table quantization and the fixed point blending) is
+the same used by VTK, so the images are identical to the ones produced by the
+VTK filters.
+
+This module only depends on NumPy, it must not import wx or VTK.
+"""
+
+import colorsys
+
+import numpy as np
+
+PALETTE_HSV = 0
+PALETTE_PLIST = 1
+PALETTE_WIDGET = 2
+
+# vtkImageBlend opacity used to blend the mask and aux overlays.
+BLEND_OPACITY = 0.8
+
+# 255 * 256, the maximum weight reached by alpha * opacity in vtkImageBlend.
+_BLEND_MAX_WEIGHT = 65280
+
+# Mask values with colour. 0 is not thresholded yet, 1 and 2 are erased.
+MASK_COLOURED_VALUES = (253, 254, 255)
+MASK_TRANSPARENT_VALUES = (0, 1, 2)
+
+# Mask layers blended together by compose_layers, the table of the
+# combinations of 12 layers has 3 * 4096 * 256 bytes.
+LAYERS_PER_PASS = 12
+
+_MAX_CACHED_TABLES = 32
+
+
+def _vtk_uchar(values):
+    """
+    Converts [0, 1] float colours to unsigned char the way vtkLookupTable
+    does when SetTableValue is used.
+    """
+    return (np.asarray(values, dtype=np.float64) * 255.0 + 0.5).astype(np.uint8)
+
+
+def build_hsv_table(hue_range, saturation_range, value_range, ncolours=256):
+    """
+    Builds the same table as vtkLookupTable.Build() with the default s-curve
+    ramp. Returns a (ncolours, 3) uint8 array.
+    """
+    i = np.arange(ncolours, dtype=np.float64)
+    max_index = max(ncolours - 1, 1)
+    hue = hue_range[0] + i * ((hue_range[1] - hue_range[0]) / max_index)
+    sat = saturation_range[0] + i * (
+        (saturation_range[1] - saturation_range[0]) / max_index
+    )
+    val = value_range[0] + i * ((value_range[1] - value_range[0]) / max_index)
+    rgb = np.array(
+        [colorsys.hsv_to_rgb(h, s, v) for (h, s, v) in zip(hue, sat, val)],
+        dtype=np.float64,
+    )
+    return (127.5 * (1.0 + np.cos((1.0 - rgb) * np.pi))).astype(np.uint8)
+
+
+def build_mask_table(colour, opacity):
+    """
+    RGBA table used to colour a mask slice, equivalent to the vtkLookupTable
+    built by Slice.do_colour_mask. Only the values really used by the masks
+    receive colour, all the others are transparent.
+    """
+    table = np.zeros((256, 4), dtype=np.uint8)
+    r, g, b = colour[:3]
+    table[list(MASK_COLOURED_VALUES)] = _vtk_uchar((r, g, b, opacity))
+    return table
+
+
+def build_custom_table(map_colours):
+    """
+    RGBA table from a {value: (r, g, b, a)} dict, equivalent to
+    Slice.do_custom_colour. Values greater than the greatest key are clamped
+    to it, as vtkImageMapToColors does.
+    """
+    table = np.zeros((256, 4), dtype=np.uint8)
+    for v in map_colours:
+        table[v] = _vtk_uchar(map_colours[v])
+    maxv = max(map_colours)
+    table[maxv + 1 :] = table[maxv]
+    return table
+
+
+def build_blend_table(table, opacity=BLEND_OPACITY):
+    """
+    Given a RGBA table (256, 4) of an overlay, returns a (3, 65536) uint8
+    table indexed by (overlay_value << 8) | image_channel_value with the
+    result of vtkImageBlend (normal mode) for each channel.
+    """
+    o = int(256 * opacity + 0.5)
+    weights = table[:, 3].astype(np.uint32)[:, np.newaxis] * o
+    base = np.arange(256, dtype=np.uint32)[np.newaxis, :]
+    blend_table = np.empty((3, 65536), dtype=np.uint8)
+    for c in range(3):
+        colour = table[:, c].astype(np.uint32)[:, np.newaxis]
+        blend_table[c] = (
+            (base * (_BLEND_MAX_WEIGHT - weights) + colour * weights)
+            // _BLEND_MAX_WEIGHT
+        ).ravel()
+    return blend_table
+
+
+def build_layers_table(blend_tables):
+    """
+    Given the blend tables (see build_blend_table) of the mask layers, returns
+    a (3, 2**n * 256) uint8 table indexed by (code << 8) | image_channel_value
+    with the result of blending, in order, the layers whose bit is set in code
+    (layer i is bit i). All the coloured values of a mask have the same colour.
+    """
+    n = len(blend_tables)
+    table = np.empty((3, 2**n, 256), dtype=np.uint8)
+    table[:, 0] = np.arange(256, dtype=np.uint8)
+    offset = MASK_COLOURED_VALUES[0] << 8
+    for i, blend_table in enumerate(blend_tables):
+        # The codes with i as the highest bit, from the ones without it.
+        codes = slice(2**i, 2 ** (i + 1))
+        for c in range(3):
+            table[c, codes] = blend_table[c, offset : offset + 256][
+                table[c, : 2**i]
+            ]
+    return table.reshape(3, -1)
+
+
+def layers_code(masks):
+    """
+    Returns the uint16 array with the bit i set where masks[i] (mask slices,
+    up to LAYERS_PER_PASS) is coloured.
+    """
+    code = np.zeros(masks[0].shape, dtype=np.uint16)
+    for i, mask in enumerate(masks):
+        code |= (mask >= MASK_COLOURED_VALUES[0]).astype(np.uint16) << i
+    return code
+
+
+def window_level(values, ww, wl):
+    """
+    Applies window and level to values and returns an uint8 array, using the
+    same arithmetic as vtkImageMapToWindowLevelColors.
+    """
+    shift = ww / 2.0 - wl
+    scale = 255.0 / ww
+    out = (np.asarray(values, dtype=np.float64) + shift) * scale
+    np.clip(out, 0, 255, out=out)
+    return out.astype(np.uint8)
+
+
+def table_index(values, range_min, range_max, ncolours=256):
+    """
+    Index in a lookup table of ncolours entries covering
+    [range_min, range_max], as computed by vtkLookupTable.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if range_max > range_min:
+        index = np.floor((values - range_min) * (ncolours / (range_max - range_min)))
+        np.clip(index, 0, ncolours - 1, out=index)
+        return index.astype(np.intp)
+    return np.zeros(values.shape, dtype=np.intp)
+
+
+def colour_transfer(values, nodes):
+    """
+    Maps values through a piecewise linear RGB function defined by nodes
+    ((value, (r, g, b)) with 0-255 colours), like vtkColorTransferFunction.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    xs = np.array([n[0] for n in nodes], dtype=np.float64)
+    cs = np.array([n[1] for n in nodes], dtype=np.float64) / 255.0
+    if len(xs) == 1:
+        rgb = np.repeat(cs, values.size, axis=0)
+    else:
+        k = np.searchsorted(xs, values, side="right") - 1
+        np.clip(k, 0, len(xs) - 2, out=k)
+        x1 = xs[k]
+        x2 = xs[k + 1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            s = np.where(x2 > x1, (values - x1) / (x2 - x1), 1.0)
+        s = np.clip(s, 0.0, 1.0)[:, np.newaxis]
+        rgb = (1.0 - s) * cs[k] + s * cs[k + 1]
+    return (rgb * 255.0 + 0.5).astype(np.uint8)
+
+
+class SliceCompositor(object):
+    """
+    Composes the final RGB image of a slice from the raw image slice, the
+    mask slice and optional overlays.
+
+    Lookup tables are cached and only rebuilt when the window and level, the
+    palette, the mask colour or opacity change. Integer images of up to 16
+    bits with a mask are composed with only one table lookup per pixel.
+    """
+
+    def __init__(self):
+        self.window_width = 255.0
+        self.window_level = 127.0
+        self.palette = (PALETTE_HSV, ((0, 0), (0, 0), (0, 1)))
+        self._clear_image_tables()
+        # Tables that only depend on the overlay colours.
+        self._overlay_tables = {}
+        self._blend_tables = {}
+        self._layers_tables = {}
+
+    def _clear_image_tables(self):
+        # dtype -> image value (raw bits) to colour table
+        self._image_luts = {}
+        # (dtype, range_min, range_max) -> image lut with the range table
+        self._merged_luts = {}
+        # (image lut key, mask table key) -> image lut with mask blended
+        self._masked_luts = {}
+        # (range_min, range_max) -> (256, 3) table
+        self._range_tables = {}
+        self._hsv_table = None
+
+    def set_window_level(self, ww, wl):
+        ww = float(ww)
+        wl = float(wl)
+        if (ww, wl) != (self.window_width, self.window_level):
+            self.window_width = ww
+            self.window_level = wl
+            self._clear_image_tables()
+
+    def set_hsv_palette(self, hue_range, saturation_range, value_range):
+        palette = (
+            PALETTE_HSV,
+            (tuple(hue_range), tuple(saturation_range), tuple(value_range)),
+        )
+        self._set_palette(palette)
+
+    def set_plist_palette(self, values):
+        palette = (
+            PALETTE_PLIST,
+            tuple(tuple(float(c) for c in v) for v in values),
+        )
+        self._set_palette(palette)
+
+    def set_widget_palette(self, nodes):
+        palette = (
+            PALETTE_WIDGET,
+            tuple(sorted((n.value, tuple(n.colour)) for n in nodes)),
+        )
+        self._set_palette(palette)
+
+    def _set_palette(self, palette):
+        if palette != self.palette:
+            self.palette = palette
+            self._clear_image_tables()
+
+    def _colour_values(self, values):
+        """
+        Colours an array of image values with the current palette. For the
+        HSV palette it returns the window and level values (uint8) because
+        the colour depends on the range of the whole slice.
+        """
+        kind, params = self.palette
+        ww = self.window_width
+        wl = self.window_level
+        if kind == PALETTE_HSV:
+            return window_level(values, ww, wl)
+        elif kind == PALETTE_PLIST:
+            table = np.zeros((256, 3), dtype=np.uint8)
+            table[:] = _vtk_uchar(np.arange(256) / 255.0)[:, np.newaxis]
+            table[: len(params)] = _vtk_uchar(np.array(params[:256]) / 255.0)
+            index = table_index(values, wl - ww / 2.0, wl + ww / 2.0)
+            return table[index]
+        else:
+            return colour_transfer(values, params)
+
+    def _get_range_table(self, range_min, range_max):
+        """
+        Grey (or pseudo colour) table applied after the window and level by
+        the HSV palette. VTK maps the range of each slice to the table.
+        """
+        key = (int(range_min), int(range_max))
+        try:
+            return self._range_tables[key]
+        except KeyError:
+            pass
+        if self._hsv_table is None:
+            self._hsv_table = build_hsv_table(*self.palette[1])
+        table = self._hsv_table[table_index(np.arange(256), *key)]
+        _cache(self._range_tables, key, table)
+        return table
+
+    def _get_image_lut(self, image):
+        """
+        Returns (key, lut) where lut is a colour table indexed by the raw
+        bits of the 8 or 16 bits integer image.
+        """
+        dtype = image.dtype
+        try:
+            lut = self._image_luts[dtype]
+        except KeyError:
+            nbits = dtype.itemsize * 8
+            values = np.arange(2**nbits, dtype="uint%d" % nbits).view(dtype)
+            lut = self._colour_values(values)
+            self._image_luts[dtype] = lut
+
+        if self.palette[0] != PALETTE_HSV:
+            return (dtype,), lut
+
+        # The HSV palette depends on the range of the slice after window and
+        # level, so this range is merged into the lut.
+        rmin, rmax = window_level(
+            (image.min(), image.max()), self.window_width, self.window_level
+        )
+        key = (dtype, int(rmin), int(rmax))
+        try:
+            return key, self._merged_luts[key]
+        except KeyError:
+            pass
+        merged = self._get_range_table(rmin, rmax)[lut]
+        _cache(self._merged_luts, key, merged)
+        return key, merged
+
+    def _get_masked_lut(self, lut_key, lut, table_key, table):
+        """
+        Returns the image lut stacked with one copy of it already blended
+        with each distinct colour of the overlay table, and the group of each
+        overlay value (0 is no colour).
+        """
+        key = (lut_key, table_key)
+        try:
+            return self._masked_luts[key]
+        except KeyError:
+            pass
+        groups = np.zeros(256, dtype=np.uint32)
+        luts = [lut]
+        blend_table = self._get_blend_table(table_key, table)
+        colours = {}
+        for value in np.flatnonzero(table[:, 3]):
+            colour = tuple(table[value])
+            if colour not in colours:
+                colours[colour] = len(luts)
+                blended = np.empty_like(lut)
+                offset = int(value) << 8
+                for c in range(3):
+                    blended[:, c] = blend_table[c, offset:offset + 256][lut[:, c]]
+                luts.append(blended)
+            groups[value] = colours[colour]
+        masked = (np.concatenate(luts), groups)
+        _cache(self._masked_luts, key, masked)
+        return masked
+
+    def _get_blend_table(self, table_key, table):
+        try:
+            return self._blend_tables[table_key]
+        except KeyError:
+            pass
+        blend_table = build_blend_table(table)
+        _cache(self._blend_tables, table_key, blend_table)
+        return blend_table
+
+    def get_mask_table(self, colour, opacity):
+        key = ("mask", tuple(colour[:3]), opacity)
+        try:
+            return key, self._overlay_tables[key]
+        except KeyError:
+            pass
+        table = build_mask_table(colour, opacity)
+        _cache(self._overlay_tables, key, table)
+        return key, table
+
+    def _get_layers_table(self, table_keys, tables):
+        key = tuple(table_keys)
+        try:
+            return self._layers_tables[key]
+        except KeyError:
+            pass
+        blend_tables = [self._get_blend_table(k, t) for (k, t) in zip(key, tables)]
+        layers_table = build_layers_table(blend_tables)
+        _cache(self._layers_tables, key, layers_table)
+        return layers_table
+
+    def get_overlay_table(self, map_colours):
+        key = tuple(sorted(map_colours.items()))
+        try:
+            return key, self._overlay_tables[key]
+        except KeyError:
+            pass
+        table = build_custom_table(map_colours)
+        _cache(self._overlay_tables, key, table)
+        return key, table
+
+    def colour_image(self, image):
+        """
+        Returns the (h, w, 3) uint8 RGB image from the raw image slice.
+        """
+        if _is_lut_indexable(image):
+            lut_key, lut = self._get_image_lut(image)
+            return lut.take(_raw_bits(image), axis=0)
+
+        coloured = self._colour_values(image.ravel())
+        if self.palette[0] == PALETTE_HSV:
+            table = self._get_range_table(coloured.min(), coloured.max())
+            coloured = table[coloured]
+        return coloured.reshape(image.shape + (3,))
+
+    def blend(self, rgb, values, table_key, table):
+        """
+        Blends in place an uint8 overlay (values), coloured by the RGBA table,
+        over the rgb image.
+        """
+        blend_table = self._get_blend_table(table_key, table)
+        index = values.astype(np.uint16) << 8
+        for c in range(3):
+            rgb[..., c] = blend_table[c].take(index | rgb[..., c])
+        return rgb
+
+    def compose(
+        self, image, mask=None, mask_colour=None, mask_opacity=None, overlays=()
+    ):
+        """
+        Returns the final (h, w, 3) uint8 image shown in the slice viewer.
+
+        Params:
+            image: the raw image slice.
+            mask: the uint8 mask slice or None.
+            mask_colour: RGB (0-1) colour of the mask.
+            mask_opacity: the opacity of the mask.
+            overlays: list of (uint8 array, {value: (r, g, b, a)}) blended
+                after the mask.
+        """
+        if mask is None:
+            rgb = self.colour_image(image)
+        else:
+            table_key, table = self.get_mask_table(mask_colour, mask_opacity)
+            if _is_lut_indexable(image):
+                lut_key, lut = self._get_image_lut(image)
+                masked_lut, groups = self._get_masked_lut(
+                    lut_key, lut, table_key, table
+                )
+                nbits = image.dtype.itemsize * 8
+                index = groups.take(mask) << nbits
+                index |= _raw_bits(image)
+                rgb = masked_lut.take(index, axis=0)
+            else:
+                rgb = self.colour_image(image)
+                self.blend(rgb, mask, table_key, table)
+
+        for values, map_colours in overlays:
+            self.blend(rgb, values, *self.get_overlay_table(map_colours))
+        return rgb
+
+    def blend_layers(self, rgb, layers, code=None):
+        """
+        Blends in place the mask layers, a list of (uint8 mask slice, colour,
+        opacity) blended in this order, over the rgb image. Up to
+        LAYERS_PER_PASS layers are blended in one pass, with one table lookup
+        per pixel and channel whatever the number of layers.
+
+        Params:
+            code: the layers_code of the mask slices (of all the layers, up
+                to LAYERS_PER_PASS of them), if it's known.
+        """
+        for start in range(0, len(layers), LAYERS_PER_PASS):
+            group = layers[start : start + LAYERS_PER_PASS]
+            keys, tables = zip(*[self.get_mask_table(c, o) for (m, c, o) in group])
+            layers_table = self._get_layers_table(keys, tables)
+            if code is None or len(layers) > LAYERS_PER_PASS:
+                code = layers_code([m for (m, colour, opacity) in group])
+            index = code.astype(np.uint32) << 8
+            for c in range(3):
+                rgb[..., c] = layers_table[c].take(index | rgb[..., c])
+        return rgb
+
+    def compose_layers(self, image, layers, code=None):
+        """
+        Returns the final (h, w, 3) uint8 image of the raw image slice with
+        the mask layers (see blend_layers) blended over it.
+        """
+        if len(layers) == 1:
+            mask, colour, opacity = layers[0]
+            return self.compose(image, mask, colour, opacity)
+        rgb = self.colour_image(image)
+        if layers:
+            self.blend_layers(rgb, layers, code)
+        return rgb
+
+
+def _is_lut_indexable(image):
+    return image.dtype.kind in "iu" and image.dtype.itemsize <= 2
+
+
+def _raw_bits(image):
+    return image.view("uint%d" % (image.dtype.itemsize * 8))
+
+
+def _cache(cache, key, value):
+    if len(cache) >= _MAX_CACHED_TABLES:
+        cache.clear()
+    cache[key] = value
@@ -0,0 +1,205 @@
+# --------------------------------------------------------------------------
+# Software:     InVesalius - Software de Reconstrucao 3D de Imagens Medicas
+# Copyright:    (C) 2001  Centro de Pesquisas Renato Archer
+# Homepage:     http://www.softwarepublico.gov.br
+# Contact:      invesalius@cti.gov.br
+# License:      GNU - GPL 2 (LICENSE.txt/LICENCA.txt)
+# --------------------------------------------------------------------------
+#    Este programa e software livre; voce pode redistribui-lo e/ou
+#    modifica-lo sob os termos da Licenca Publica Geral GNU, conforme
+#    publicada pela Free Software Foundation; de acordo com a versao 2
+#    da Licenca.
+#
+#    Este programa eh distribuido na expectativa de ser util, mas SEM
+#    QUALQUER GARANTIA; sem mesmo a garantia implicita de
+#    COMERCIALIZACAO ou de ADEQUACAO A QUALQUER PROPOSITO EM
+#    PARTICULAR. Consulte a Licenca Publica Geral GNU para obter mais
+#    detalhes.
+# --------------------------------------------------------------------------
+"""
+Read-ahead of slices while the user scrolls.
+
+The SlicePrefetcher watches the scroll direction and velocity of each
+orientation and, in a background thread, fills the slice buffers (see
+Slice.prefetch_slice) with the next slices in that direction: memmap read,
+projection and, if no mask is shown, colour mapping. The masks are only read
+and thresholded by the GUI thread, so the prefetch never works on a mask
+being changed; the paths changing a mask cancel it anyway (cancel with wait)
+so the slices aren't read meanwhile.
+"""
+
+import threading
+import time
+import traceback
+
+from invesalius.data.slice_compositor import SliceCompositor
+
+# Slices read ahead when scrolling slowly and the maximum read ahead.
+PREFETCH_MIN_SLICES = 2
+PREFETCH_MAX_SLICES = 16
+# How long (seconds) ahead of the scroll the prefetch tries to be.
+PREFETCH_LOOKAHEAD_TIME = 0.25
+# Scroll events more spaced than this (seconds) are not used to calculate
+# the velocity.
+SCROLL_IDLE_TIME = 0.5
+
+
+class _ScrollState(object):
+    def __init__(self):
+        self.index = None
+        self.direction = 0
+        self.time = 0.0
+        self.velocity = 0.0
+
+
+class SlicePrefetcher(object):
+    """
+    Prefetches the slices ahead of the scroll, per orientation.
+
+    Params:
+        slice_: the Slice whose buffers are filled.
+    """
+
+    def __init__(self, slice_):
+        self.slice_ = slice_
+        self.enabled = True
+        self.prefetched = 0
+        self._scroll = {}
+        # orientation -> (job id, slice indexes, GetSlices params)
+        self._jobs = {}
+        # orientation -> id of the job not cancelled
+        self._active_jobs = {}
+        self._job_id = 0
+        self._condition = threading.Condition()
+        self._thread = None
+        # True while a slice is being prefetched.
+        self._working = False
+        # The colour tables of the prefetched slices, the compositor of the
+        # Slice is only used by the GUI thread.
+        self.compositor = SliceCompositor()
+
+    def scrolled(self, orientation, index, number_slices, inverted, border_size):
+        """
+        Called by the slice viewer after scrolling to the slice index. It
+        schedules the slices ahead in the scroll direction.
+        """
+        if not self.enabled:
+            return
+
+        now = time.monotonic()
+        state = self._scroll.setdefault(orientation, _ScrollState())
+        if state.index is None or index == state.index:
+            state.index = index
+            state.time = now
+            return
+
+        direction = 1 if index > state.index else -1
+        elapsed = now - state.time
+        if direction != state.direction:
+            self.cancel(orientation)
+            state.velocity = 0.0
+        elif elapsed < SCROLL_IDLE_TIME:
+            velocity = abs(index - state.index) / max(elapsed, 1e-3)
+            # Smoothed, a single fast event must not trigger a long read ahead.
+            state.velocity = 0.5 * state.velocity + 0.5 * velocity
+        else:
+            state.velocity = 0.0
+
+        state.index = index
+        state.direction = direction
+        state.time = now
+
+        nslices = int(PREFETCH_MIN_SLICES + state.velocity * PREFETCH_LOOKAHEAD_TIME)
+        nslices = min(nslices, PREFETCH_MAX_SLICES)
+        max_index = self.slice_.GetNumberOfSlices(orientation) - 1
+        last = index + direction * (nslices + 1)
+        indexes = [
+            i for i in range(index + direction, last, direction) if 0 <= i <= max_index
+        ]
+        if not indexes:
+            return
+
+        with self._condition:
+            self._job_id += 1
+            self._active_jobs[orientation] = self._job_id
+            self._jobs[orientation] = (
+                self._job_id,
+                indexes,
+                (number_slices, inverted, border_size),
+            )
+            self._condition.notify_all()
+        self._start()
+
+    def cancel(self, orientation=None, wait=False):
+        """
+        Cancels the pending prefetch of the given orientation (or all). If
+        wait, it also waits for the slice being prefetched, if any.
+        """
+        with self._condition:
+            if orientation is None:
+                self._jobs.clear()
+                self._active_jobs.clear()
+            else:
+                self._jobs.pop(orientation, None)
+                self._active_jobs.pop(orientation, None)
+            if wait and threading.current_thread() is not self._thread:
+                while self._working:
+                    self._condition.wait()
+
+    def _start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run, name="SlicePrefetcher", daemon=True
+            )
+            self._thread.start()
+
+    def _next_slice(self):
+        """
+        Returns the next (orientation, index, params, job_id) to prefetch,
+        waiting for a job if there is none.
+        """
+        with self._condition:
+            while not self._jobs:
+                self._condition.wait()
+            orientation = next(iter(self._jobs))
+            job_id, indexes, params = self._jobs.pop(orientation)
+            index = indexes.pop(0)
+            if indexes:
+                # Put it back at the end, so the orientations take turns.
+                self._jobs[orientation] = (job_id, indexes, params)
+            self._working = True
+            return orientation, index, params, job_id
+
+    def _done(self):
+        with self._condition:
+            self._working = False
+            self._condition.notify_all()
+
+    def _run(self):
+        while True:
+            orientation, index, params, job_id = self._next_slice()
+            try:
+                self._prefetch(orientation, index, params, job_id)
+            finally:
+                self._done()
+
+    def _prefetch(self, orientation, index, params, job_id):
+        slice_ = self.slice_
+        with self._condition:
+            # The job may have been cancelled (or replaced) while waiting.
+            if self._active_jobs.get(orientation) != job_id:
+                return
+        if slice_.matrix is None:
+            return
+        try:
+            stored = slice_.prefetch_slice(
+                orientation, index, *params, compositor=self.compositor
+            )
+        except Exception:
+            # The project may have been closed meanwhile, but it may be a bug
+            # as well, so it's not silenced.
+            traceback.print_exc()
+            self.cancel(orientation)
+            return
+        if stored:
+            self.prefetched += 1
@@ -0,0 +1,344 @@
+# --------------------------------------------------------------------------
+# Software:     InVesalius - Software de Reconstrucao 3D de Imagens Medicas
+# Copyright:    (C) 2001  Centro de Pesquisas Renato Archer
+# Homepage:     http://www.softwarepublico.gov.br
+# Contact:      invesalius@cti.gov.br
+# License:      GNU - GPL 2 (LICENSE.txt/LICENCA.txt)
+# --------------------------------------------------------------------------
+#    Este programa e software livre; voce pode redistribui-lo e/ou
+#    modifica-lo sob os termos da Licenca Publica Geral GNU, conforme
+#    publicada pela Free Software Foundation; de acordo com a versao 2
+#    da Licenca.
+#
+#    Este programa eh distribuido na expectativa de ser util, mas SEM
+#    QUALQUER GARANTIA; sem mesmo a garantia implicita de
+#    COMERCIALIZACAO ou de ADEQUACAO A QUALQUER PROPOSITO EM
+#    PARTICULAR. Consulte a Licenca Publica Geral GNU para obter mais
+#    detalhes.
+# --------------------------------------------------------------------------
+"""
+Headless rendering of slices.
+
+render_slice returns the RGBA image of a slice of a volume, with the same
+pixels shown by the slice viewer (projection, window and level, colour table
+and masks), without wx, VTK or a render window. It can be used by batch jobs
+(thumbnails, QA sheets, regression images) and benchmarks of the display
+path, e.g.:
+
+    image = open_project_folder(folder)
+    rgba = render_slice(image.matrix, "AXIAL", 120, image.window,
+                        image.level, masks=image.masks)
+
+Like slice_compositor, this module must not import wx or VTK (so it doesn't
+import invesalius.constants), the projection kernels used by the Slice are
+also here.
+"""
+
+import collections
+import os
+import plistlib
+import tarfile
+
+import numpy as np
+
+from invesalius.data.dirty_slices import read_flags
+from invesalius.data.mask_storage import PackedMask
+from invesalius.data.slice_compositor import SliceCompositor
+from invesalius_cy import mips
+
+# The values of the PROJECTION_* constants.
+PROJECTION_NORMAL = 0
+PROJECTION_MaxIP = 1
+PROJECTION_MinIP = 2
+PROJECTION_MeanIP = 3
+PROJECTION_LMIP = 4
+PROJECTION_MIDA = 5
+PROJECTION_CONTOUR_MIP = 6
+PROJECTION_CONTOUR_LMIP = 7
+PROJECTION_CONTOUR_MIDA = 8
+
+# The opacity the Slice uses to blend the masks (Slice.opacity).
+MASK_OPACITY = 0.8
+
+AXIS = {"AXIAL": 0, "CORONAL": 1, "SAGITAL": 2}
+
+# Types of the image_t fused type, the ones handled by the mips kernels.
+KERNEL_DTYPES = (np.dtype(np.float64), np.dtype(np.int16), np.dtype(np.uint8))
+
+# A mask to render: its matrix (with the border, as Mask.matrix), its RGB
+# (0-1) colour, the threshold range used in the slices not thresholded yet,
+# the opacity and the thresholded slices of each axis (as
+# DirtySliceIndex.thresholded, all of them if None).
+RenderMask = collections.namedtuple(
+    "RenderMask", ("matrix", "colour", "threshold_range", "opacity", "thresholded")
+)
+RenderMask.__new__.__defaults__ = (None, MASK_OPACITY, None)
+
+# The image and masks of a project, see open_project_folder.
+ProjectImage = collections.namedtuple(
+    "ProjectImage", ("matrix", "spacing", "window", "level", "masks")
+)
+
+
+def slab_view(matrix, orientation, slice_number, number_slices, inverted=False):
+    """
+    View (not a copy) of the slab [slice_number, slice_number + number_slices)
+    of matrix, reversed along the projection axis if inverted. If matrix is a
+    BrickedVolume the slab is read from its bricks.
+    """
+    axis = AXIS[orientation]
+    index = [slice(None)] * 3
+    if inverted:
+        start = slice_number + number_slices - 1
+        stop = slice_number - 1 if slice_number > 0 else None
+        index[axis] = slice(start, stop, -1)
+    else:
+        index[axis] = slice(slice_number, slice_number + number_slices)
+    return matrix[tuple(index)]
+
+
+def project(slab, axis, projection, window_level=0, border_size=1.0, num_threads=0):
+    """
+    Projection of slab along axis.
+
+    Params:
+        slab: the volume to project, any strided view (it's not copied).
+        axis: 0, 1 or 2.
+        projection: one of the PROJECTION_* constants but PROJECTION_NORMAL.
+        window_level: used by the LMIP, MIDA and contour projections.
+        border_size: used by the contour projections.
+        num_threads: threads used by the kernels, <= 0 means all.
+    """
+    shape = tuple(d for (i, d) in enumerate(slab.shape) if i != axis)
+    if (
+        projection in (PROJECTION_MaxIP, PROJECTION_MinIP, PROJECTION_MeanIP)
+        and slab.dtype not in KERNEL_DTYPES
+    ):
+        # NumPy reductions, they also read the slab in place.
+        if projection == PROJECTION_MaxIP:
+            return np.asarray(slab).max(axis)
+        elif projection == PROJECTION_MinIP:
+            return np.asarray(slab).min(axis)
+        else:
+            return np.asarray(slab).mean(axis)
+
+    if projection == PROJECTION_MeanIP:
+        out = np.empty(shape, dtype=np.float64)
+        mips.mean_projection(slab, axis, out, num_threads)
+        return out
+
+    out = np.empty(shape, dtype=slab.dtype)
+    if projection == PROJECTION_MaxIP:
+        mips.max_min_projection(slab, axis, True, out, num_threads)
+    elif projection == PROJECTION_MinIP:
+        mips.max_min_projection(slab, axis, False, out, num_threads)
+    elif projection == PROJECTION_LMIP:
+        mips.lmip(slab, axis, window_level, window_level, out, num_threads)
+    elif projection == PROJECTION_MIDA:
+        mips.mida(slab, axis, window_level, window_level, out, num_threads)
+    elif projection in (
+        PROJECTION_CONTOUR_MIP,
+        PROJECTION_CONTOUR_LMIP,
+        PROJECTION_CONTOUR_MIDA,
+    ):
+        tmip = {
+            PROJECTION_CONTOUR_MIP: 0,
+            PROJECTION_CONTOUR_LMIP: 1,
+            PROJECTION_CONTOUR_MIDA: 2,
+        }[projection]
+        mips.fast_countour_mip(
+            slab,
+            border_size,
+            axis,
+            window_level,
+            window_level,
+            tmip,
+            out,
+            num_threads,
+        )
+    else:
+        raise ValueError("Unknown projection: %s" % projection)
+    return out
+
+
+def get_image_slice(
+    volume,
+    orientation,
+    index,
+    projection=PROJECTION_NORMAL,
+    number_slices=1,
+    inverted=False,
+    window_level=0,
+    border_size=1.0,
+):
+    """
+    Returns the image slice (or the projection of the slab starting at it)
+    of the given orientation, as Slice.get_image_slice.
+    """
+    axis = AXIS[orientation]
+    if projection == PROJECTION_NORMAL:
+        slab = slab_view(volume, orientation, index, 1)
+        return np.array(slab).reshape(
+            [d for (i, d) in enumerate(slab.shape) if i != axis]
+        )
+    slab = slab_view(volume, orientation, index, number_slices, inverted)
+    return project(slab, axis, projection, window_level, border_size)
+
+
+def is_mask_slice_thresholded(mask, orientation, index):
+    """
+    If the slice index of the mask (a RenderMask) is already thresholded.
+    """
+    if mask.thresholded is None:
+        return True
+    return bool(mask.thresholded[AXIS[orientation]][index])
+
+
+def get_mask_slice(mask, orientation, index, image_slice):
+    """
+    Returns the slice of the mask (a RenderMask). The slices not thresholded
+    yet (see RenderMask) are thresholded from image_slice as
+    Slice.get_mask_slice does, but the mask is not modified. image_slice may
+    be None if the slice is already thresholded.
+    """
+    matrix = mask.matrix
+    n = index + 1
+    thresholded = is_mask_slice_thresholded(mask, orientation, index)
+    if orientation == "AXIAL":
+        n_mask = np.array(matrix[n, 1:, 1:])
+    elif orientation == "CORONAL":
+        n_mask = np.array(matrix[1:, n, 1:])
+    else:
+        n_mask = np.array(matrix[1:, 1:, n])
+
+    if not thresholded and mask.threshold_range is not None:
+        thresh_min, thresh_max = mask.threshold_range
+        m = ((image_slice >= thresh_min) & (image_slice <= thresh_max)) * 255
+        edited = np.isin(n_mask, (1, 2, 253, 254))
+        m[edited] = n_mask[edited]
+        n_mask = m.astype(np.uint8)
+    return n_mask
+
+
+def _as_render_mask(mask):
+    if isinstance(mask, RenderMask):
+        return mask
+    # e.g. a Mask
+    dirty_slices = getattr(mask, "dirty_slices", None)
+    return RenderMask(
+        mask.matrix,
+        mask.colour,
+        getattr(mask, "threshold_range", None),
+        thresholded=dirty_slices.thresholded if dirty_slices is not None else None,
+    )
+
+
+def render_slice(
+    volume,
+    orientation,
+    index,
+    ww,
+    wl,
+    masks=(),
+    projection=PROJECTION_NORMAL,
+    number_slices=1,
+    inverted=False,
+    border_size=1.0,
+    compositor=None,
+):
+    """
+    Returns the (h, w, 4) uint8 RGBA image of a slice, the same as the one
+    composed by the Slice (the rows are in the order of the volume, the slice
+    viewer shows them from the bottom up).
+
+    Params:
+        volume: the image volume (z, y, x), any array, e.g. a memmap.
+        orientation: AXIAL, CORONAL or SAGITAL.
+        index: the slice (first one of the slab) index.
+        ww, wl: window width and level.
+        masks: RenderMask (or Mask) list, blended in this order (in one pass,
+            see SliceCompositor.blend_layers).
+        projection: one of the PROJECTION_* constants.
+        number_slices: the thickness of the slab projected.
+        inverted: the slab is projected in the inverse order.
+        border_size: used by the contour projections.
+        compositor: the SliceCompositor used (with its colour table), reusing
+            one when rendering several slices avoids rebuilding the tables. A
+            new one, with the grey colour table, if None.
+    """
+    image = get_image_slice(
+        volume, orientation, index, projection, number_slices, inverted, wl, border_size
+    )
+    if compositor is None:
+        compositor = SliceCompositor()
+    compositor.set_window_level(ww, wl)
+
+    layers = []
+    for mask in masks:
+        mask = _as_render_mask(mask)
+        n_mask = get_mask_slice(mask, orientation, index, image)
+        layers.append((n_mask, mask.colour, mask.opacity))
+    rgb = compositor.compose_layers(image, layers)
+
+    rgba = np.empty(rgb.shape[:2] + (4,), dtype=np.uint8)
+    rgba[..., :3] = rgb
+    rgba[..., 3] = 255
+    return rgba
+
+
+def extract_project(filename, folder):
+    """
+    Extracts the InVesalius project filename (.inv3) in folder and returns
+    the folder with its files (main.plist, matrix.dat, ...).
+    """
+    with tarfile.open(filename, "r") as tar:
+        tar.extractall(folder)
+        name = tar.getnames()[0]
+    return os.path.join(folder, os.path.split(name)[0])
+
+
+def open_project_folder(dirpath, visible_masks_only=True):
+    """
+    Opens (read-only) the image and masks of the project in dirpath, without
+    the project and mask classes (they need wx). Returns a ProjectImage.
+    """
+    with open(os.path.join(dirpath, "main.plist"), "r+b") as f:
+        project = plistlib.load(f, fmt=plistlib.FMT_XML)
+
+    matrix = project["matrix"]
+    image = np.memmap(
+        os.path.join(dirpath, matrix["filename"]),
+        shape=tuple(matrix["shape"]),
+        dtype=matrix["dtype"],
+        mode="r",
+    )
+
+    masks = []
+    for index in sorted(project.get("masks", {}), key=int):
+        with open(os.path.join(dirpath, project["masks"][index]), "r+b") as f:
+            mask = plistlib.load(f, fmt=plistlib.FMT_XML)
+        if visible_masks_only and not mask["visible"]:
+            continue
+        path = os.path.join(dirpath, mask["mask_file"])
+        if mask.get("mask_storage") == "packed":
+            m = PackedMask.load(path).to_matrix()
+        else:
+            m = np.memmap(
+                path, shape=tuple(mask["mask_shape"]), dtype="uint8", mode="r"
+            )
+        masks.append(
+            RenderMask(
+                m,
+                tuple(mask["colour"]),
+                mask["threshold_range"],
+                thresholded=read_flags(m),
+            )
+        )
+
+    return ProjectImage(
+        image,
+        project["spacing"],
+        project["window_width"],
+        project["window_level"],
+        masks,
+    )
@@ -46,6 +46,7 @@ from invesalius.data.measures import (CircleDensityMeasure, MeasureData,
                                       PolygonDensityMeasure)
 
 from invesalius_cy import floodfill
+from invesalius.data.mask_fill import floodfill_region
 
 # For tracts
 import invesalius.data.tractography as dtr
@@ -646,6 +647,8 @@ class WWWLInteractorStyle(DefaultInteractorStyle):
             self.acum_achange_level += mouse_y - self.last_y
             self.last_x, self.last_y = mouse_x, mouse_y
 
+            # All the slice viewers are reloaded, decimated while dragging.
+            Publisher.sendMessage('Slice interaction')
             Publisher.sendMessage('Bright and contrast adjustment image',
                                   window=self.acum_achange_window,
                                   level=self.acum_achange_level)
@@ -1037,6 +1040,7 @@ class PanMoveInteractorStyle(DefaultInteractorStyle):
 
     def OnPanMove(self, obj, evt):
         if self.left_pressed:
+            self.viewer.OnInteraction(reload_slice=True)
             obj.Pan()
             obj.OnRightButtonDown()
 
@@ -1411,7 +1415,8 @@ class EditorInteractorStyle(DefaultInteractorStyle):
         self.viewer._flush_buffer = True
         self.viewer.slice_.apply_slice_buffer_to_mask(self.orientation)
         self.viewer._flush_buffer = False
-        self.viewer.slice_.current_mask.modified()
+        index = self.viewer.slice_.buffer_slices[self.orientation].index
+        self.viewer.slice_.current_mask.modified(orientation=self.orientation, index=index)
 
     def EOnScrollForward(self, evt, obj):
         iren = self.viewer.interactor
@@ -1774,19 +1779,19 @@ class WaterShedInteractorStyle(DefaultInteractorStyle):
         if self.orientation == 'AXIAL':
             image = self.viewer.slice_.matrix[n]
             mask = self.viewer.slice_.current_mask.matrix[n+1, 1:, 1:]
-            self.viewer.slice_.current_mask.matrix[n+1, 0, 0] = 1
+            self.viewer.slice_.current_mask.set_thresholded(True, 'AXIAL', n)
             markers = self.matrix[n]
 
         elif self.orientation == 'CORONAL':
             image = self.viewer.slice_.matrix[:, n, :]
             mask = self.viewer.slice_.current_mask.matrix[1:, n+1, 1:]
-            self.viewer.slice_.current_mask.matrix[0, n+1, 0]
+            self.viewer.slice_.current_mask.set_thresholded(True, 'CORONAL', n)
             markers = self.matrix[:, n, :]
 
         elif self.orientation == 'SAGITAL':
             image = self.viewer.slice_.matrix[:, :, n]
             mask = self.viewer.slice_.current_mask.matrix[1: , 1:, n+1]
-            self.viewer.slice_.current_mask.matrix[0 , 0, n+1]
+            self.viewer.slice_.current_mask.set_thresholded(True, 'SAGITAL', n)
             markers = self.matrix[:, :, n]
 
         ww = self.viewer.slice_.window_width
@@ -2034,6 +2039,7 @@ class ReorientImageInteractorStyle(DefaultInteractorStyle):
 
     def CleanUp(self):
         self.viewer.interactor.Unbind(wx.EVT_LEFT_DCLICK)
+        self.viewer.slice_.interactive_reslice = False
 
         for actor in self.actors:
             self.viewer.slice_data.renderer.RemoveActor(actor)
@@ -2045,6 +2051,8 @@ class ReorientImageInteractorStyle(DefaultInteractorStyle):
         Publisher.sendMessage('Show current mask')
 
     def OnLeftClick(self, obj, evt):
+        # A faster interpolation is used until the mouse is released.
+        self.viewer.slice_.interactive_reslice = True
         if self._over_center:
             self.dragging = True
         else:
@@ -2062,10 +2070,11 @@ class ReorientImageInteractorStyle(DefaultInteractorStyle):
 
     def OnLeftRelease(self, obj, evt):
         self.dragging = False
+        self.to_rot = False
 
-        if self.to_rot:
-            Publisher.sendMessage('Reload actual slice')
-            self.to_rot = False
+        # Shows the slices again using the chosen interpolation.
+        self.viewer.slice_.interactive_reslice = False
+        Publisher.sendMessage('Reload actual slice')
 
     def OnMouseMove(self, obj, evt):
         """
@@ -2138,8 +2147,8 @@ class ReorientImageInteractorStyle(DefaultInteractorStyle):
         elif self.viewer.orientation == 'SAGITAL':
             self.viewer.slice_.center = (icx, y, z)
 
-
-        self._discard_buffers()
+        # The slices cached are checked against the center (see
+        # Slice._get_image_key), they don't need to be discarded.
         self.viewer.slice_.current_mask.clear_history()
         Publisher.sendMessage('Reload actual slice')
 
@@ -2174,7 +2183,8 @@ class ReorientImageInteractorStyle(DefaultInteractorStyle):
         az, ay, ax = transformations.euler_from_quaternion(self.viewer.slice_.q_orientation)
         Publisher.sendMessage('Update reorient angles', angles=(ax, ay, az))
 
-        self._discard_buffers()
+        # The slices cached are checked against q_orientation (see
+        # Slice._get_image_key), they don't need to be discarded.
         if self.viewer.slice_.current_mask:
             self.viewer.slice_.current_mask.clear_history()
         Publisher.sendMessage('Reload actual slice %s' % self.viewer.orientation)
@@ -2307,6 +2317,9 @@ class FloodFillMaskInteractorStyle(DefaultInteractorStyle):
         if (self.viewer.slice_.buffer_slices[self.orientation].mask is None):
             return
 
+        # The mask is changed, the slices aren't read ahead meanwhile.
+        self.viewer.slice_.prefetcher.cancel(wait=True)
+
         viewer = self.viewer
         iren = viewer.interactor
         mouse_x, mouse_y = iren.GetEventPosition()
@@ -2316,10 +2329,9 @@ class FloodFillMaskInteractorStyle(DefaultInteractorStyle):
         if mask[z, y, x] < self.t0 or mask[z, y, x] > self.t1:
             return
 
+        bbox = None
         if self.config.target == "3D":
-            bstruct = np.array(generate_binary_structure(3, CON3D[self.config.con_3d]), dtype='uint8')
             self.viewer.slice_.do_threshold_to_all_slices()
-            cp_mask = self.viewer.slice_.current_mask.matrix.copy()
         else:
             _bstruct = generate_binary_structure(2, CON2D[self.config.con_2d])
             if self.orientation == 'AXIAL':
@@ -2347,7 +2359,7 @@ class FloodFillMaskInteractorStyle(DefaultInteractorStyle):
             self.viewer.slice_.current_mask.save_history(index, self.orientation, p_mask, b_mask)
         else:
             with futures.ThreadPoolExecutor(max_workers=1) as executor:
-                future = executor.submit(floodfill.floodfill_threshold, mask, [[x, y, z]], self.t0, self.t1, self.fill_value, bstruct, mask)
+                future = executor.submit(self._fill_component, mask, x, y, z)
 
                 dlg = wx.ProgressDialog(self._progr_title, self._progr_msg, parent=wx.GetApp().GetTopWindow(), style=wx.PD_APP_MODAL)
                 while not future.done():
@@ -2356,7 +2368,10 @@ class FloodFillMaskInteractorStyle(DefaultInteractorStyle):
 
                 dlg.Destroy()
 
-            self.viewer.slice_.current_mask.save_history(0, 'VOLUME', self.viewer.slice_.current_mask.matrix.copy(), cp_mask)
+            result = future.result()
+            if result is not None:
+                bbox, p_region = result
+                self.viewer.slice_.current_mask.save_history_region(bbox, mask[bbox], p_region)
 
         self.viewer.slice_.buffer_slices['AXIAL'].discard_mask()
         self.viewer.slice_.buffer_slices['CORONAL'].discard_mask()
@@ -2367,9 +2382,29 @@ class FloodFillMaskInteractorStyle(DefaultInteractorStyle):
         self.viewer.slice_.buffer_slices['SAGITAL'].discard_vtk_mask()
 
         self.viewer.slice_.current_mask.was_edited = True
-        self.viewer.slice_.current_mask.modified(True)
+        if bbox is None:
+            self.viewer.slice_.current_mask.modified(True)
+        else:
+            # Only the slices of the component were changed, and the labels
+            # were updated.
+            self.viewer.slice_.current_mask.modified(orientation='AXIAL', index=bbox[0], keep_labels=True)
         Publisher.sendMessage('Reload actual slice')
 
+    def _fill_component(self, mask, x, y, z):
+        # The component is looked up in the labels of the mask, which are
+        # kept (without it) to the next click while the mask isn't changed.
+        # Returns its bounding box and the values it had there, or None.
+        labels = self.viewer.slice_.current_mask.get_labels(self.t0, self.t1, self.config.con_3d)
+        label = labels.get_label(z, y, x)
+        if not label:
+            return None
+        bbox = labels.get_bbox(label)
+        p_region = mask[bbox].copy()
+        labels.fill(label, mask, self.fill_value)
+        if not self.t0 <= self.fill_value <= self.t1:
+            labels.remove(label)
+        return bbox, p_region
+
 
 class RemoveMaskPartsInteractorStyle(FloodFillMaskInteractorStyle):
     def __init__(self, viewer):
@@ -2468,15 +2503,20 @@ class CropMaskInteractorStyle(DefaultInteractorStyle):
             zf += 1
 
             self.viewer.slice_.do_threshold_to_all_slices()
-            cp_mask = self.viewer.slice_.current_mask.matrix.copy()
 
-            tmp_mask = self.viewer.slice_.current_mask.matrix[zi-1:zf+1, yi-1:yf+1, xi-1:xf+1].copy()
+            def crop(block, start):
+                # The voxels out of the box are set to 1, slice by slice.
+                for z, plane in enumerate(block, start):
+                    if zi - 1 <= z < zf + 1:
+                        tmp_mask = plane[yi-1:yf+1, xi-1:xf+1].copy()
+                        plane[:] = 1
+                        plane[yi-1:yf+1, xi-1:xf+1] = tmp_mask
+                    else:
+                        plane[:] = 1
 
-            self.viewer.slice_.current_mask.matrix[:] = 1
-
-            self.viewer.slice_.current_mask.matrix[zi-1:zf+1, yi-1:yf+1, xi-1:xf+1] = tmp_mask
-
-            self.viewer.slice_.current_mask.save_history(0, 'VOLUME', self.viewer.slice_.current_mask.matrix.copy(), cp_mask)
+            # The mask is cropped and saved in the history by blocks of
+            # slices, without a copy of the whole mask.
+            self.viewer.slice_.current_mask.edit_with_history(crop)
 
             self.viewer.slice_.buffer_slices['AXIAL'].discard_mask()
             self.viewer.slice_.buffer_slices['CORONAL'].discard_mask()
@@ -2564,6 +2604,9 @@ class SelectMaskPartsInteractorStyle(DefaultInteractorStyle):
         if (self.viewer.slice_.buffer_slices[self.orientation].mask is None):
             return
 
+        # The mask is changed, the slices aren't read ahead meanwhile.
+        self.viewer.slice_.prefetcher.cancel(wait=True)
+
         iren = self.viewer.interactor
         mouse_x, mouse_y = iren.GetEventPosition()
         x, y, z = self.viewer.get_voxel_coord_by_screen_pos(mouse_x, mouse_y, self.picker)
@@ -2579,7 +2622,10 @@ class SelectMaskPartsInteractorStyle(DefaultInteractorStyle):
         if iren.GetControlKey():
             floodfill.floodfill_threshold(self.config.mask.matrix[1:, 1:, 1:], [[x, y, z]], 254, 255, 0, bstruct, self.config.mask.matrix[1:, 1:, 1:])
         else:
-            floodfill.floodfill_threshold(mask, [[x, y, z]], self.t0, self.t1, self.fill_value, bstruct, self.config.mask.matrix[1:, 1:, 1:])
+            labels = self.viewer.slice_.current_mask.get_labels(self.t0, self.t1, self.config.con_3d)
+            label = labels.get_label(z, y, x)
+            if label:
+                labels.fill(label, self.config.mask.matrix[1:, 1:, 1:], self.fill_value)
 
         self.viewer.slice_.aux_matrices['SELECT'] = self.config.mask.matrix[1:, 1:, 1:]
         self.viewer.slice_.to_show_aux = 'SELECT'
@@ -2590,9 +2636,7 @@ class SelectMaskPartsInteractorStyle(DefaultInteractorStyle):
     def _create_new_mask(self):
         mask = self.viewer.slice_.create_new_mask(show=False, add_to_project=False)
         mask.was_edited = True
-        mask.matrix[0, :, :] = 1
-        mask.matrix[:, 0, :] = 1
-        mask.matrix[:, :, 0] = 1
+        mask.set_thresholded()
 
         self.config.mask = mask
 
@@ -2665,8 +2709,12 @@ class FloodFillSegmentInteractorStyle(DefaultInteractorStyle):
         if (self.viewer.slice_.buffer_slices[self.orientation].mask is None):
             return
 
+        # The mask is changed, the slices aren't read ahead meanwhile.
+        self.viewer.slice_.prefetcher.cancel(wait=True)
+
+        bbox = None
         if self.config.target == "3D":
-            self.do_3d_seg()
+            bbox = self.do_3d_seg()
         else:
             self.do_2d_seg()
 
@@ -2679,7 +2727,11 @@ class FloodFillSegmentInteractorStyle(DefaultInteractorStyle):
         self.viewer.slice_.buffer_slices['SAGITAL'].discard_vtk_mask()
 
         self.viewer.slice_.current_mask.was_edited = True
-        self.viewer.slice_.current_mask.modified(self.config.target == '3D')
+        if bbox is None:
+            self.viewer.slice_.current_mask.modified(self.config.target == '3D')
+        else:
+            # Only the slices in the region filled were changed.
+            self.viewer.slice_.current_mask.modified(orientation='AXIAL', index=bbox[0])
         Publisher.sendMessage('Reload actual slice')
 
     def do_2d_seg(self):
@@ -2781,7 +2833,6 @@ class FloodFillSegmentInteractorStyle(DefaultInteractorStyle):
 
         bstruct = np.array(generate_binary_structure(3, CON3D[self.config.con_3d]), dtype='uint8')
         self.viewer.slice_.do_threshold_to_all_slices()
-        cp_mask = self.viewer.slice_.current_mask.matrix.copy()
 
         if self.config.method == 'confidence':
             with futures.ThreadPoolExecutor(max_workers=1) as executor:
@@ -2793,10 +2844,22 @@ class FloodFillSegmentInteractorStyle(DefaultInteractorStyle):
                     time.sleep(0.1)
                 dlg.Destroy()
                 out_mask = future.result()
+
+            # Only the bounding box of the region grown is written and saved
+            # in the history.
+            objects = ndimage.find_objects(out_mask.astype(np.uint8))
+            if not objects:
+                return
+            bbox = objects[0]
+            region = mask[bbox]
+            p_region = region.copy()
+            region[out_mask[bbox].astype('bool')] = self.config.fill_value
+            self.viewer.slice_.current_mask.save_history_region(bbox, region, p_region)
+            return bbox
         else:
-            out_mask = np.zeros_like(mask)
+            # Only the region filled is written and saved in the history.
             with futures.ThreadPoolExecutor(max_workers=1) as executor:
-                future = executor.submit(floodfill.floodfill_threshold, image, [[x, y, z]], t0, t1, 1, bstruct, out_mask)
+                future = executor.submit(floodfill_region, image, (x, y, z), t0, t1, bstruct)
 
                 dlg = wx.ProgressDialog(self._progr_title, self._progr_msg, parent=wx.GetApp().GetTopWindow(), style=wx.PD_APP_MODAL|wx.PD_AUTO_HIDE)
                 while not future.done():
@@ -2804,9 +2867,15 @@ class FloodFillSegmentInteractorStyle(DefaultInteractorStyle):
                     time.sleep(0.1)
                 dlg.Destroy()
 
-        mask[out_mask.astype('bool')] = self.config.fill_value
-
-        self.viewer.slice_.current_mask.save_history(0, 'VOLUME', self.viewer.slice_.current_mask.matrix.copy(), cp_mask)
+            result = future.result()
+            if result is None:
+                return
+            bbox, filled = result
+            region = mask[bbox]
+            p_region = region.copy()
+            region[filled] = self.config.fill_value
+            self.viewer.slice_.current_mask.save_history_region(bbox, region, p_region)
+            return bbox
 
     def do_rg_confidence(self, image, mask, p, bstruct):
         x, y, z = p
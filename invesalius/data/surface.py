@@ -161,6 +161,9 @@ class SurfaceManager():
         self.last_surface_index = 0
         self.affine_vtk = None
         self.convert2inv = None
+        # The pieces of the last surface created from each mask, see
+        # _get_surface_pieces.
+        self._surface_pieces = {}
         self.__bind_events()
 
         self._default_parameters = {
@@ -591,6 +594,31 @@ class SurfaceManager():
         msg = utl.log_traceback(e)
         dialog.error = msg
 
+    def _get_surface_pieces(self, mask, key):
+        """
+        The pieces ({(init, end): filename}) of the last surface created from
+        mask with the same key whose slices of the mask weren't changed since.
+        """
+        if key is None or mask.index not in self._surface_pieces:
+            return {}
+        p_key, generation, pieces = self._surface_pieces[mask.index]
+        if p_key != key:
+            return {}
+        dirty_slices = mask.dirty_slices
+        return {roi: filename for (roi, filename) in pieces.items()
+                if os.path.exists(filename)
+                and not dirty_slices.is_changed_in(generation, 0, roi[0], roi[1])}
+
+    def _set_surface_pieces(self, mask, key, generation, pieces):
+        if key is None:
+            self._surface_pieces.pop(mask.index, None)
+        else:
+            self._surface_pieces[mask.index] = (key, generation, dict(pieces))
+
+    def _add_surface_piece(self, filenames, pieces, roi, filename):
+        pieces[roi] = filename
+        filenames.append(filename)
+
     def AddNewActor(self, slice_, mask, surface_parameters):
         """
         Create surface actor, save into project and send it to viewer.
@@ -606,6 +634,8 @@ class SurfaceManager():
         mask_temp_file = mask.temp_file
         mask_shape = mask.matrix.shape
         mask_dtype = mask.matrix.dtype
+        source_mask = mask
+        generation = mask.dirty_slices.generation
 
         algorithm = surface_parameters['method']['algorithm']
         options = surface_parameters['method']['options']
@@ -654,7 +684,8 @@ class SurfaceManager():
 
         if imagedata_resolution > 0:
             spacing = tuple([s * imagedata_resolution for s in spacing])
-            matrix = iu.resize_image_array(matrix, 1.0/imagedata_resolution, True)
+            # Zooms the closest level of the volume pyramid, not the volume.
+            matrix = slice_.pyramid.resize(imagedata_resolution, True)
             mask = iu.resize_image_array(mask.matrix, 1.0/imagedata_resolution, True)
 
             filename_img = matrix.filename
@@ -669,6 +700,18 @@ class SurfaceManager():
 
         n_pieces = int(round(matrix.shape[0] / piece_size + 0.5, 0))
 
+        # The pieces whose slices of the mask weren't changed since the last
+        # surface created from it (with the same parameters) are reused.
+        if imagedata_resolution > 0:
+            pieces_key = None
+        else:
+            pieces_key = (slice_.statistics, filename_img, matrix.shape,
+                          mask_temp_file, mask_shape, spacing, mode, min_value,
+                          max_value, decimate_reduction,
+                          smooth_relaxation_factor, smooth_iterations,
+                          flip_image, algorithm, fill_border_holes)
+        pieces = self._get_surface_pieces(source_mask, pieces_key)
+
         filenames = []
         ctx = multiprocessing.get_context('spawn')
         pool = ctx.Pool(processes=min(n_pieces, n_processors))
@@ -683,6 +726,9 @@ class SurfaceManager():
                 init = i * piece_size
                 end = init + piece_size + o_piece
                 roi = slice(init, end)
+                if (init, end) in pieces:
+                    filenames.append(pieces[(init, end)])
+                    continue
                 print("new_piece", roi)
                 f = pool.apply_async(surface_process.create_surface_piece,
                                      args = (filename_img, matrix.shape, matrix.dtype,
@@ -693,10 +739,13 @@ class SurfaceManager():
                                              smooth_iterations, language, flip_image,
                                              algorithm != 'Default', algorithm,
                                              imagedata_resolution, fill_border_holes),
-                                     callback=lambda x: filenames.append(x))
+                                     callback=functools.partial(self._add_surface_piece,
+                                                                filenames, pieces,
+                                                                (init, end)))
 
             while len(filenames) != n_pieces:
                 time.sleep(0.25)
+            self._set_surface_pieces(source_mask, pieces_key, generation, pieces)
 
             f = pool.apply_async(surface_process.join_process_surface,
                                  args=(filenames, algorithm, smooth_iterations,
@@ -743,6 +792,9 @@ class SurfaceManager():
                 init = i * piece_size
                 end = init + piece_size + o_piece
                 roi = slice(init, end)
+                if (init, end) in pieces:
+                    filenames.append(pieces[(init, end)])
+                    continue
                 print("new_piece", roi)
                 f = pool.apply_async(surface_process.create_surface_piece,
                                      args = (filename_img, matrix.shape, matrix.dtype,
@@ -753,7 +805,9 @@ class SurfaceManager():
                                              smooth_iterations, language, flip_image,
                                              algorithm != 'Default', algorithm,
                                              imagedata_resolution, fill_border_holes),
-                                     callback=lambda x: filenames.append(x),
+                                     callback=functools.partial(self._add_surface_piece,
+                                                                filenames, pieces,
+                                                                (init, end)),
                                      error_callback=functools.partial(self._on_callback_error,
                                                                       dialog=sp))
 
@@ -764,6 +818,9 @@ class SurfaceManager():
                 sp.Update(_("Creating 3D surface..."))
                 wx.Yield()
 
+            if len(filenames) == n_pieces:
+                self._set_surface_pieces(source_mask, pieces_key, generation, pieces)
+
             if not sp.WasCancelled() or sp.running:
                 f = pool.apply_async(surface_process.join_process_surface,
                                      args=(filenames, algorithm, smooth_iterations,
@@ -0,0 +1,166 @@
+# --------------------------------------------------------------------------
+# Software:     InVesalius - Software de Reconstrucao 3D de Imagens Medicas
+# Copyright:    (C) 2001  Centro de Pesquisas Renato Archer
+# Homepage:     http://www.softwarepublico.gov.br
+# Contact:      invesalius@cti.gov.br
+# License:      GNU - GPL 2 (LICENSE.txt/LICENCA.txt)
+# --------------------------------------------------------------------------
+#    Este programa e software livre; voce pode redistribui-lo e/ou
+#    modifica-lo sob os termos da Licenca Publica Geral GNU, conforme
+#    publicada pela Free Software Foundation; de acordo com a versao 2
+#    da Licenca.
+#
+#    Este programa eh distribuido na expectativa de ser util, mas SEM
+#    QUALQUER GARANTIA; sem mesmo a garantia implicita de
+#    COMERCIALIZACAO ou de ADEQUACAO A QUALQUER PROPOSITO EM
+#    PARTICULAR. Consulte a Licenca Publica Geral GNU para obter mais
+#    detalhes.
+# --------------------------------------------------------------------------
+"""
+Preview of the voxels selected by a threshold range, without thresholding
+the volume.
+
+The number of voxels of the image in a range is taken from the cumulative
+histogram of the image (built from the value counts of its VolumeStatistics,
+or, for float images, from a fine histogram built the first time it's
+needed). The slices which may have voxels in the range come from the min and
+max of each slice.
+
+If the mask being thresholded is given and the range is its threshold range,
+its slices already thresholded and edited by the user are taken into
+account, as Slice.do_threshold_to_all_slices would keep them.
+"""
+
+import collections
+
+import numpy as np
+
+from invesalius.data.volume_stats import BLOCK_SLICES
+
+# Bins of the histogram of float images (the counts are interpolated in the
+# bins at the ends of the range).
+FLOAT_BINS = 4096
+
+# Values of the edited voxels of the masks.
+EDITED_ON = (253, 254)
+EDITED_OFF = (1, 2)
+
+# voxels: the number of voxels selected, volume: their volume (mm^3),
+# occupied: for each axis a boolean array of the slices with voxels selected
+# (or which may have them), exact: False if voxels is an estimate (float
+# images).
+ThresholdPreview = collections.namedtuple(
+    "ThresholdPreview", ("threshold_range", "voxels", "volume", "occupied", "exact")
+)
+
+
+class ThresholdPreviewer(object):
+    """
+    Params:
+        volume: the image volume.
+        statistics: its VolumeStatistics.
+        spacing: the voxel spacing (x, y, z).
+    """
+
+    def __init__(self, volume, statistics, spacing):
+        self.volume = volume
+        self.statistics = statistics
+        self.spacing = spacing
+        self._cumulative = None
+        self._edges = None
+
+    def _get_cumulative(self):
+        # cumulative[i] is the number of voxels with value < origin + i (or
+        # the float bin i).
+        if self._cumulative is None:
+            stats = self.statistics
+            if stats.counts is not None:
+                counts = stats.counts
+            else:
+                low, high = stats.scalar_range
+                if high <= low:
+                    high = low + 1
+                self._edges = np.linspace(low, high, FLOAT_BINS + 1)
+                counts = np.zeros(FLOAT_BINS, dtype=np.int64)
+                for z in range(0, self.volume.shape[0], BLOCK_SLICES):
+                    block = np.asarray(self.volume[z : z + BLOCK_SLICES])
+                    counts += np.histogram(block, self._edges)[0]
+            cumulative = np.zeros(counts.size + 1, dtype=np.int64)
+            np.cumsum(counts, out=cumulative[1:])
+            self._cumulative = cumulative
+        return self._cumulative
+
+    def count(self, low, high):
+        """
+        Number of voxels of the image in [low, high].
+        """
+        cumulative = self._get_cumulative()
+        if high < low:
+            return 0
+        if self._edges is None:
+            origin = self.statistics.counts_origin
+            i = min(max(int(np.ceil(low)) - origin, 0), cumulative.size - 1)
+            e = min(max(int(np.floor(high)) - origin + 1, 0), cumulative.size - 1)
+            return int(cumulative[e] - cumulative[i]) if e > i else 0
+        # Float images: linear in each bin.
+        c_low, c_high = np.interp([low, high], self._edges, cumulative)
+        return int(round(max(c_high - c_low, 0)))
+
+    def preview(self, threshold_range, mask=None):
+        """
+        Returns the ThresholdPreview of threshold_range. If mask is given and
+        threshold_range is its threshold range, its thresholded and edited
+        slices are taken into account.
+        """
+        low, high = threshold_range
+        voxels = self.count(low, high)
+        occupied = [self.statistics.get_occupied(axis, low, high) for axis in range(3)]
+        if mask is not None and tuple(mask.threshold_range) == tuple(threshold_range):
+            voxels += self._get_mask_correction(mask, low, high, occupied)
+        sx, sy, sz = self.spacing
+        return ThresholdPreview(
+            tuple(threshold_range),
+            voxels,
+            voxels * sx * sy * sz,
+            occupied,
+            self._edges is None,
+        )
+
+    def _get_mask_correction(self, mask, low, high, occupied):
+        """
+        Difference between the voxels of the mask and the ones of the image
+        in range in the slices already thresholded (see
+        DirtySliceIndex.thresholded) and the voxels edited in them.
+        """
+        matrix = mask.matrix
+        thresholded = mask.dirty_slices.thresholded
+        correction = 0
+        axial = np.flatnonzero(thresholded[0])
+        for z in axial:
+            on = np.count_nonzero(np.asarray(matrix[z + 1, 1:, 1:]) > 127)
+            image = np.asarray(self.volume[z])
+            correction += on - np.count_nonzero((image >= low) & (image <= high))
+            occupied[0][z] = on > 0
+
+        # In the coronal and sagittal slices thresholded only the edited
+        # voxels (outside the axial ones above) differ from the threshold.
+        not_axial = np.ones(matrix.shape[0] - 1, dtype=bool)
+        not_axial[axial] = False
+        coronal = np.flatnonzero(thresholded[1])
+        for y in coronal:
+            m = np.asarray(matrix[1:, y + 1, 1:])[not_axial]
+            image = np.asarray(self.volume[:, y, :])[not_axial]
+            correction += self._count_edited(m, image, low, high)
+        not_coronal = np.ones(matrix.shape[1] - 1, dtype=bool)
+        not_coronal[coronal] = False
+        for x in np.flatnonzero(thresholded[2]):
+            m = np.asarray(matrix[1:, 1:, x + 1])[not_axial][:, not_coronal]
+            image = np.asarray(self.volume[:, :, x])[not_axial][:, not_coronal]
+            correction += self._count_edited(m, image, low, high)
+        return int(correction)
+
+    def _count_edited(self, m, image, low, high):
+        in_range = (image >= low) & (image <= high)
+        added = np.count_nonzero(np.isin(m, EDITED_ON) & ~in_range)
+        removed = np.count_nonzero(np.isin(m, EDITED_OFF) & in_range)
+        return added - removed
@@ -22,6 +22,7 @@ import collections
 import itertools
 import os
 import tempfile
+import time
 
 import numpy as np
 
@@ -48,6 +49,7 @@ import invesalius.utils as utils
 import invesalius.session as ses
 import invesalius.data.converters as converters
 import invesalius.data.measures as measures
+import invesalius.data.render_scheduler as rs
 
 from invesalius.gui.widgets.inv_spinctrl import InvSpinCtrl, InvFloatSpinCtrl
 from invesalius.gui.widgets.canvas_renderer import CanvasRendererCTX
@@ -216,6 +218,32 @@ class Viewer(wx.Panel):
         self.__config_interactor()
         self.cross_actor = vtk.vtkActor()
 
+        # Progressive rendering: while the user is interacting (scrolling,
+        # panning, changing the window and level) the slices are shown
+        # decimated, the full resolution slice is shown after
+        # progressive_idle_time ms without interaction.
+        session = ses.Session()
+        self.progressive_rendering = session.get(
+            'session', 'progressive_rendering', const.PROGRESSIVE_RENDERING)
+        self.progressive_decimation = session.get(
+            'session', 'progressive_decimation', const.PROGRESSIVE_DECIMATION)
+        self.progressive_idle_time = session.get(
+            'session', 'progressive_idle_time', const.PROGRESSIVE_IDLE_TIME)
+        # Slices shown and time (seconds) spent producing them at each
+        # decimation level (1 is the full resolution).
+        self.progressive_frames = collections.Counter()
+        self.progressive_time = collections.Counter()
+        self._interacting = False
+        self._idle_timer = None
+
+        # The render requests (reload the slice, redraw the canvas, ...) are
+        # merged and rendered at most once per frame.
+        self.render_scheduler = rs.RenderScheduler(
+            self._RenderFrame,
+            session.get('session', 'render_frame_interval',
+                        const.RENDER_FRAME_INTERVAL),
+            session.get('session', 'render_scheduler', const.RENDER_SCHEDULER))
+
         self.__bind_events()
         self.__bind_events_wx()
 
@@ -343,7 +371,7 @@ class Viewer(wx.Panel):
         value = STR_WL%(window_level, window_width)
         if (self.wl_text):
             self.wl_text.SetValue(value)
-            self.canvas.modified = True
+            self.canvas.update_element(self.wl_text)
             #self.interactor.Render()
 
     def EnableText(self):
@@ -590,6 +618,7 @@ class Viewer(wx.Panel):
         :param position: list of 6 coordinates in vtk world coordinate system wx, wy, wz
         """
         self.cross.SetFocalPoint(position[:3])
+        self.render_scheduler.request(rs.CURSOR)
 
     def ScrollSlice(self, coord):
         if self.orientation == "AXIAL":
@@ -875,6 +904,7 @@ class Viewer(wx.Panel):
         Publisher.subscribe(self.OnSwapVolumeAxes, 'Swap volume axes')
 
         Publisher.subscribe(self.ReloadActualSlice, 'Reload actual slice')
+        Publisher.subscribe(self.OnInteraction, 'Slice interaction')
         Publisher.subscribe(self.ReloadActualSlice, 'Reload actual slice %s' % self.orientation)
         Publisher.subscribe(self.OnUpdateScroll, 'Update scroll')
 
@@ -995,6 +1025,11 @@ class Viewer(wx.Panel):
         self.CloseProject()
 
     def CloseProject(self):
+        if self._idle_timer is not None:
+            self._idle_timer.Stop()
+        self._interacting = False
+        self.render_scheduler.cancel()
+
         for slice_data in self.slice_data_list:
             del slice_data
 
@@ -1247,13 +1282,26 @@ class Viewer(wx.Panel):
         self.slice_data.renderer.ResetCameraClippingRange()
 
     def UpdateRender(self):
-        self.interactor.Render()
+        self.render_scheduler.request(rs.CURSOR)
 
     def UpdateCanvas(self, evt=None):
         if self.canvas is not None:
+            self.render_scheduler.request(rs.OVERLAY)
+
+    def _RenderFrame(self, kinds):
+        """
+        Renders the requests merged by the render scheduler.
+        """
+        if self.slice_data is None:
+            return
+        if rs.IMAGE in kinds:
+            # It also updates the canvas draw list.
+            self.set_slice_number(self.scroll.GetThumbPosition())
+        elif rs.OVERLAY in kinds and self.canvas is not None:
             self._update_draw_list()
+        if rs.OVERLAY in kinds and self.canvas is not None:
             self.canvas.modified = True
-            self.interactor.Render()
+        self.interactor.Render()
 
     def _update_draw_list(self):
         cp_draw_list = self.canvas.draw_list[:]
@@ -1290,10 +1338,10 @@ class Viewer(wx.Panel):
 
     @number_slices.setter
     def number_slices(self, val):
+        # The cached slices are checked against the number of slices, no need
+        # to discard them.
         if val != self._number_slices:
             self._number_slices = val
-            buffer_ = self.slice_.buffer_slices[self.orientation]
-            buffer_.discard_buffer()
 
     def set_scroll_position(self, position):
         self.scroll.SetThumbPosition(position)
@@ -1301,11 +1349,63 @@ class Viewer(wx.Panel):
 
     def UpdateSlice3D(self, pos):
         original_orientation = project.Project().original_orientation
+        # The 3D plane shows the slice composed for this viewer, so a pending
+        # reload is done first.
+        self.render_scheduler.flush()
         pos = self.scroll.GetThumbPosition()
         Publisher.sendMessage('Change slice from slice plane',
                               orientation=self.orientation, index=pos)
 
+    def SetProgressiveRendering(self, enabled, decimation=None, idle_time=None):
+        """
+        Enables or disables the progressive rendering in this viewer.
+
+        Params:
+            decimation: 2 or 4, the slices shown while interacting have one
+                of each decimation x decimation pixels.
+            idle_time: ms without interaction to show the full resolution
+                slice.
+        """
+        self.progressive_rendering = enabled
+        if decimation is not None:
+            self.progressive_decimation = decimation
+        if idle_time is not None:
+            self.progressive_idle_time = idle_time
+        if not enabled and self._interacting:
+            self._OnInteractionIdle()
+
+    def OnInteraction(self, reload_slice=False):
+        """
+        Called while the user interacts with the viewer, the slices are shown
+        decimated until the interaction stops. If reload_slice the current
+        slice is shown decimated now (when the interaction itself doesn't
+        reload it, e.g. panning).
+        """
+        if not self.progressive_rendering:
+            return
+        was_interacting = self._interacting
+        self._interacting = True
+        if self._idle_timer is None:
+            self._idle_timer = wx.CallLater(self.progressive_idle_time,
+                                            self._OnInteractionIdle)
+        else:
+            self._idle_timer.Restart(self.progressive_idle_time)
+        if reload_slice and not was_interacting and self.slice_data is not None:
+            self.ReloadActualSlice()
+
+    def _OnInteractionIdle(self):
+        self._interacting = False
+        if self._idle_timer is not None:
+            self._idle_timer.Stop()
+        if self.slice_data is not None and \
+                self.slice_.display_decimation.get(self.orientation, 1) > 1:
+            pos = self.scroll.GetThumbPosition()
+            self.ReloadActualSlice()
+            self.UpdateSlice3D(pos)
+
     def OnScrollBar(self, evt=None, update3D=True):
+        if evt:
+            self.OnInteraction()
         pos = self.scroll.GetThumbPosition()
         self.set_slice_number(pos)
         if update3D:
@@ -1397,7 +1497,9 @@ class Viewer(wx.Panel):
                 self.slice_.apply_slice_buffer_to_mask(self.orientation)
             pos = pos - 1
             self.scroll.SetThumbPosition(pos)
+            self.OnInteraction()
             self.OnScrollBar()
+            self._prefetch_slices(pos)
 
     def OnScrollBackward(self, evt=None, obj=None):
         if not self.scroll_enabled:
@@ -1410,7 +1512,16 @@ class Viewer(wx.Panel):
                 self.slice_.apply_slice_buffer_to_mask(self.orientation)
             pos = pos + 1
             self.scroll.SetThumbPosition(pos)
+            self.OnInteraction()
             self.OnScrollBar()
+            self._prefetch_slices(pos)
+
+    def _prefetch_slices(self, pos):
+        inverted = self.mip_ctrls.inverted.GetValue()
+        border_size = self.mip_ctrls.border_spin.GetValue()
+        self.slice_.prefetcher.scrolled(
+            self.orientation, pos, self.number_slices, inverted, border_size
+        )
 
     def OnSize(self, evt):
         w, h = evt.GetSize()
@@ -1426,14 +1537,10 @@ class Viewer(wx.Panel):
 
     def OnSetMIPBorder(self, border_size):
         self.slice_.n_border = border_size
-        buffer_ = self.slice_.buffer_slices[self.orientation]
-        buffer_.discard_buffer()
         self.ReloadActualSlice()
 
     def OnSetMIPInvert(self, invert):
         self._mip_inverted = invert
-        buffer_ = self.slice_.buffer_slices[self.orientation]
-        buffer_.discard_buffer()
         self.ReloadActualSlice()
 
     def OnShowMIPInterface(self, flag):
@@ -1458,12 +1565,20 @@ class Viewer(wx.Panel):
             index = max_slice_number - 1
         inverted = self.mip_ctrls.inverted.GetValue()
         border_size = self.mip_ctrls.border_spin.GetValue()
+        if self._interacting:
+            decimation = self.progressive_decimation
+        else:
+            decimation = 1
+        t0 = time.perf_counter()
         try:
             image = self.slice_.GetSlices(self.orientation, index,
                                           self.number_slices, inverted,
-                                          border_size)
+                                          border_size, decimation)
         except IndexError:
             return
+        decimation = self.slice_.display_decimation.get(self.orientation, 1)
+        self.progressive_frames[decimation] += 1
+        self.progressive_time[decimation] += time.perf_counter() - t0
         self.slice_data.actor.SetInputData(image)
         for actor in self.actors_by_slice_number[self.slice_data.number]:
             self.slice_data.renderer.RemoveActor(actor)
@@ -1494,14 +1609,10 @@ class Viewer(wx.Panel):
     def ChangeSliceNumber(self, index):
         #self.set_slice_number(index)
         self.scroll.SetThumbPosition(index)
-        pos = self.scroll.GetThumbPosition()
-        self.set_slice_number(pos)
-        self.interactor.Render()
+        self.render_scheduler.request(rs.IMAGE)
 
     def ReloadActualSlice(self):
-        pos = self.scroll.GetThumbPosition()
-        self.set_slice_number(pos)
-        self.interactor.Render()
+        self.render_scheduler.request(rs.IMAGE)
 
     def OnUpdateScroll(self):
         max_slice_number = sl.Slice().GetNumberOfSlices(self.orientation)
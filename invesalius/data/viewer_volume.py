@@ -36,11 +36,13 @@ from scipy.spatial import distance
 from imageio import imsave
 
 import invesalius.constants as const
+import invesalius.data.render_scheduler as rs
 import invesalius.data.slice_ as sl
 import invesalius.data.styles_3d as styles
 import invesalius.data.transformations as tr
 import invesalius.data.vtk_utils as vtku
 import invesalius.project as prj
+import invesalius.session as ses
 import invesalius.style as st
 import invesalius.utils as utils
 
@@ -134,6 +136,15 @@ class Viewer(wx.Panel):
 
         self.view_angle = None
 
+        # The 'Render volume viewer' requests are merged and rendered at most
+        # once per frame.
+        session = ses.Session()
+        self.render_scheduler = rs.RenderScheduler(
+            self._RenderFrame,
+            session.get('session', 'render_frame_interval',
+                        const.RENDER_FRAME_INTERVAL),
+            session.get('session', 'render_scheduler', const.RENDER_SCHEDULER))
+
         self.__bind_events()
         self.__bind_events_wx()
 
@@ -483,6 +494,7 @@ class Viewer(wx.Panel):
 
 
     def OnCloseProject(self):
+        self.render_scheduler.cancel()
         if self.raycasting_volume:
             self.raycasting_volume = False
 
@@ -1956,6 +1968,9 @@ class Viewer(wx.Panel):
         orientation_widget.InteractiveOff()
 
     def UpdateRender(self):
+        self.render_scheduler.request(rs.IMAGE)
+
+    def _RenderFrame(self, kinds):
         self.interactor.Render()
 
     def SetWidgetInteractor(self, widget=None):
@@ -570,7 +570,8 @@ class Volume():
         flip.Update()
         image = flip.GetOutput()
         
-        scale = image.GetScalarRange()
+        # The flip doesn't change the scalar range of the image
+        scale = tuple(float(v) for v in slice_.Slice().statistics.scalar_range)
         self.scale = scale
 
         cast = vtk.vtkImageShiftScale()
@@ -689,17 +690,10 @@ class Volume():
                                       self.volume_mapper)
 
     def CalculateHistogram(self):
-        image = self.image
-        r = int(image.GetScalarRange()[1] - image.GetScalarRange()[0])
-        accumulate = vtk.vtkImageAccumulate()
-        accumulate.SetInputData(image)
-        accumulate.SetComponentExtent(0, r -1, 0, 0, 0, 0)
-        accumulate.SetComponentOrigin(image.GetScalarRange()[0], 0, 0)
-        #  accumulate.ReleaseDataFlagOn()
-        accumulate.Update()
-        n_image = numpy_support.vtk_to_numpy(accumulate.GetOutput().GetPointData().GetScalars())
-        del accumulate
-        init, end = image.GetScalarRange()
+        # From the statistics of the image, gathered when it was imported
+        slice_data = slice_.Slice()
+        n_image = slice_data.histogram
+        init, end = (float(v) for v in slice_data.statistics.scalar_range)
         Publisher.sendMessage('Load histogram', histogram=n_image, init=init, end=end)
 
                               
@@ -0,0 +1,257 @@
+# --------------------------------------------------------------------------
+# Software:     InVesalius - Software de Reconstrucao 3D de Imagens Medicas
+# Copyright:    (C) 2001  Centro de Pesquisas Renato Archer
+# Homepage:     http://www.softwarepublico.gov.br
+# Contact:      invesalius@cti.gov.br
+# License:      GNU - GPL 2 (LICENSE.txt/LICENCA.txt)
+# --------------------------------------------------------------------------
+#    Este programa e software livre; voce pode redistribui-lo e/ou
+#    modifica-lo sob os termos da Licenca Publica Geral GNU, conforme
+#    publicada pela Free Software Foundation; de acordo com a versao 2
+#    da Licenca.
+#
+#    Este programa eh distribuido na expectativa de ser util, mas SEM
+#    QUALQUER GARANTIA; sem mesmo a garantia implicita de
+#    COMERCIALIZACAO ou de ADEQUACAO A QUALQUER PROPOSITO EM
+#    PARTICULAR. Consulte a Licenca Publica Geral GNU para obter mais
+#    detalhes.
+# --------------------------------------------------------------------------
+"""
+Multi-resolution copies of the image volume.
+
+Each level is a memmap (stored next to the image memmap) where each voxel is
+the mean of a block of factor x factor x factor voxels of the volume (the
+blocks at the end of odd sized axes repeat the last voxel). The levels are
+built in a background thread, each one from the previous level (the 4x from
+the 2x, ...), and are saved in the project, so it's done once per volume.
+"""
+
+import os
+import tempfile
+import threading
+import traceback
+
+import numpy as np
+
+import invesalius.constants as const
+import invesalius.data.imagedata_utils as iu
+
+
+def get_level_shape(shape, factor):
+    return tuple((d + factor - 1) // factor for d in shape)
+
+
+def downsample(image, factor, out, cancelled=None):
+    """
+    Fills out with the means of the factor x factor x factor blocks of image,
+    reading it by blocks of slices. Returns False if it was cancelled (the
+    function cancelled returned True) before finishing.
+    """
+    nz, ny, nx = image.shape
+    oz, oy, ox = out.shape
+    pad_y = oy * factor - ny
+    pad_x = ox * factor - nx
+    nblock = max(const.VOLUME_PYRAMID_BLOCK_SLICES // factor, 1)
+    integer = out.dtype.kind in "iub"
+    count = factor ** 3
+    for z0 in range(0, oz, nblock):
+        if cancelled is not None and cancelled():
+            return False
+        z1 = min(z0 + nblock, oz)
+        block = np.asarray(image[z0 * factor : z1 * factor])
+        pad_z = (z1 - z0) * factor - block.shape[0]
+        if pad_z or pad_y or pad_x:
+            block = np.pad(block, ((0, pad_z), (0, pad_y), (0, pad_x)), mode="edge")
+        block = block.reshape(z1 - z0, factor, oy, factor, ox, factor)
+        if integer:
+            s = block.sum(axis=(1, 3, 5), dtype=np.int64)
+            out[z0:z1] = (s + count // 2) // count
+        else:
+            out[z0:z1] = block.mean(axis=(1, 3, 5))
+    return True
+
+
+def _remove_memmap(m):
+    filename = m.filename
+    m._mmap.close()
+    try:
+        os.remove(filename)
+    except OSError:
+        pass
+
+
+class VolumePyramid(object):
+    """
+    The downsampled levels of the image volume.
+
+    Params:
+        factors: the downsampling factors of the levels.
+    """
+
+    def __init__(self, factors=const.VOLUME_PYRAMID_FACTORS):
+        self.factors = tuple(sorted(factors))
+        self.volume = None
+        self._levels = {}
+        self._lock = threading.Lock()
+        self._build_id = 0
+        self._thread = None
+
+    def open(self, volume, levels):
+        """
+        Uses the levels saved in a project, the ones which don't match the
+        volume are ignored (build creates them again).
+
+        Params:
+            volume: the image volume.
+            levels: {factor: {"filename", "shape", "dtype"}}.
+        """
+        self.discard()
+        self.volume = volume
+        for factor, level in levels.items():
+            factor = int(factor)
+            shape = tuple(level["shape"])
+            if (
+                factor not in self.factors
+                or shape != get_level_shape(volume.shape, factor)
+                or np.dtype(level["dtype"]) != volume.dtype
+                or not os.path.exists(level["filename"])
+            ):
+                continue
+            m = np.memmap(level["filename"], shape=shape, dtype=volume.dtype, mode="r")
+            with self._lock:
+                self._levels[factor] = m
+
+    def build(self, volume, filename):
+        """
+        Builds the levels of volume that are missing in a background thread.
+        The levels files are created in the folder of filename (the image
+        memmap).
+        """
+        if volume is not self.volume:
+            self.discard()
+            self.volume = volume
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            factors = [f for f in self.factors if f not in self._levels]
+            if not factors:
+                return
+            build_id = self._build_id
+            self._thread = threading.Thread(
+                target=self._build,
+                args=(build_id, volume, filename, factors),
+                name="VolumePyramid",
+                daemon=True,
+            )
+            self._thread.start()
+
+    def _build(self, build_id, volume, filename, factors):
+        def cancelled():
+            return build_id != self._build_id
+
+        folder, name = os.path.split(filename)
+        prefix = os.path.splitext(name)[0]
+        built = {}
+        try:
+            for factor in factors:
+                # From the largest level already built of which it's a multiple.
+                source, source_factor = volume, 1
+                for f in sorted(built):
+                    if factor % f == 0:
+                        source, source_factor = built[f], f
+                shape = get_level_shape(volume.shape, factor)
+                fd, level_filename = tempfile.mkstemp(
+                    prefix="%s_%dx_" % (prefix, factor), suffix=".dat", dir=folder
+                )
+                os.close(fd)
+                m = np.memmap(
+                    level_filename, shape=shape, dtype=volume.dtype, mode="w+"
+                )
+                built[factor] = m
+                if not downsample(source, factor // source_factor, m, cancelled):
+                    break
+                m.flush()
+                with self._lock:
+                    if cancelled():
+                        break
+                    self._levels[factor] = m
+        except Exception:
+            traceback.print_exc()
+        finally:
+            with self._lock:
+                kept = [id(m) for m in self._levels.values()]
+            for m in built.values():
+                if id(m) not in kept:
+                    _remove_memmap(m)
+
+    def discard(self):
+        """
+        Cancels the building and removes the levels, to be called before the
+        volume is modified or closed.
+        """
+        with self._lock:
+            self._build_id += 1
+            thread = self._thread
+            self._thread = None
+        if thread is not None:
+            # It stops after the block of slices being read.
+            thread.join()
+        with self._lock:
+            levels = list(self._levels.values())
+            self._levels = {}
+        for m in levels:
+            _remove_memmap(m)
+        self.volume = None
+
+    def get_level(self, factor):
+        """
+        Returns the level of the given factor (the volume if it's 1) or None
+        if it's not built.
+        """
+        if factor == 1:
+            return self.volume
+        with self._lock:
+            return self._levels.get(factor)
+
+    def get_level_for_resolution(self, resolution):
+        """
+        Returns (factor, level) of the coarsest level built whose voxels are
+        not larger than resolution times the ones of the volume, (1, volume)
+        if there is none.
+        """
+        with self._lock:
+            factors = [f for f in self._levels if f <= resolution]
+            if factors:
+                factor = max(factors)
+                return factor, self._levels[factor]
+        return 1, self.volume
+
+    def resize(self, resolution, as_mmap=False):
+        """
+        The same as imagedata_utils.resize_image_array(volume, 1.0 /
+        resolution, as_mmap), but zooming the closest level.
+        """
+        factor, level = self.get_level_for_resolution(resolution)
+        shape = [int(round(d * (1.0 / resolution))) for d in self.volume.shape]
+        if factor == 1:
+            return iu.resize_image_array(level, 1.0 / resolution, as_mmap)
+        zoom = [float(s) / d for (s, d) in zip(shape, level.shape)]
+        return iu.resize_image_array(level, zoom, as_mmap)
+
+    def SavePlist(self, filelist):
+        """
+        Adds the built levels to filelist and returns their info to the main
+        plist of the project.
+        """
+        levels = {}
+        with self._lock:
+            for factor, m in self._levels.items():
+                m.flush()
+                filename = "matrix_%dx.dat" % factor
+                filelist[m.filename] = filename
+                levels[str(factor)] = {
+                    "filename": filename,
+                    "shape": m.shape,
+                    "dtype": m.dtype.name,
+                }
+        return levels
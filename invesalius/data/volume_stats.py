@@ -0,0 +1,189 @@
+# --------------------------------------------------------------------------
+# Software:     InVesalius - Software de Reconstrucao 3D de Imagens Medicas
+# Copyright:    (C) 2001  Centro de Pesquisas Renato Archer
+# Homepage:     http://www.softwarepublico.gov.br
+# Contact:      invesalius@cti.gov.br
+# License:      GNU - GPL 2 (LICENSE.txt/LICENCA.txt)
+# --------------------------------------------------------------------------
+#    Este programa e software livre; voce pode redistribui-lo e/ou
+#    modifica-lo sob os termos da Licenca Publica Geral GNU, conforme
+#    publicada pela Free Software Foundation; de acordo com a versao 2
+#    da Licenca.
+#
+#    Este programa eh distribuido na expectativa de ser util, mas SEM
+#    QUALQUER GARANTIA; sem mesmo a garantia implicita de
+#    COMERCIALIZACAO ou de ADEQUACAO A QUALQUER PROPOSITO EM
+#    PARTICULAR. Consulte a Licenca Publica Geral GNU para obter mais
+#    detalhes.
+# --------------------------------------------------------------------------
+"""
+Statistics of the image volume: the min and max of each slice of the three
+axes and the count of each value (for integer volumes up to 16 bits).
+
+They are gathered while the volume is written (update is called with each
+slice or block of slices written), so the volume isn't read again to get its
+scalar range or histogram. They are saved in the project and updated when the
+volume is flipped or its axes are swapped.
+
+The min and max of the slices also tell which slices may have voxels in a
+range of values (see get_occupied and get_bounds).
+"""
+
+import numpy as np
+
+# Slices read at once by from_volume.
+BLOCK_SLICES = 32
+
+
+def _has_counts(dtype):
+    return dtype.kind in "iu" and dtype.itemsize <= 2
+
+
+class VolumeStatistics(object):
+    """
+    Params:
+        shape: the shape (z, y, x) of the volume.
+        dtype: the dtype of the volume.
+    """
+
+    def __init__(self, shape, dtype):
+        self.shape = tuple(int(d) for d in shape)
+        self.dtype = np.dtype(dtype)
+        if self.dtype.kind in "iu":
+            info = np.iinfo(self.dtype)
+        else:
+            info = np.finfo(self.dtype)
+        # The min and max of each slice of each axis.
+        self.slices_min = [np.full(d, info.max, dtype=self.dtype) for d in self.shape]
+        self.slices_max = [np.full(d, info.min, dtype=self.dtype) for d in self.shape]
+        if _has_counts(self.dtype):
+            self.counts_origin = int(info.min)
+            self.counts = np.zeros(int(info.max) - int(info.min) + 1, dtype=np.int64)
+        else:
+            self.counts_origin = 0
+            self.counts = None
+
+    @classmethod
+    def from_volume(cls, volume, block_slices=BLOCK_SLICES):
+        """
+        Statistics of volume, read by blocks of axial slices.
+        """
+        stats = cls(volume.shape, volume.dtype)
+        for z in range(0, volume.shape[0], block_slices):
+            stats.update(np.asarray(volume[z : z + block_slices]), 0, z)
+        return stats
+
+    def update(self, block, axis=0, index=0):
+        """
+        Adds the slices in block, written in the volume from the slice index
+        of axis on. block is 3D (with the slices along axis) or a 2D slice.
+        """
+        if block.ndim == 2:
+            block = np.expand_dims(block, axis)
+        for a in range(3):
+            others = tuple(i for i in range(3) if i != a)
+            b_min = block.min(others)
+            b_max = block.max(others)
+            if a == axis:
+                s = slice(index, index + block.shape[axis])
+            else:
+                s = slice(None)
+            np.minimum(self.slices_min[a][s], b_min, out=self.slices_min[a][s])
+            np.maximum(self.slices_max[a][s], b_max, out=self.slices_max[a][s])
+        if self.counts is not None:
+            values = block.astype(np.intp).ravel()
+            values -= self.counts_origin
+            self.counts += np.bincount(values, minlength=self.counts.size)
+
+    def matches(self, volume):
+        return self.shape == volume.shape and self.dtype == volume.dtype
+
+    @property
+    def min(self):
+        return self.slices_min[0].min().item()
+
+    @property
+    def max(self):
+        return self.slices_max[0].max().item()
+
+    @property
+    def scalar_range(self):
+        return self.min, self.max
+
+    def get_histogram(self):
+        """
+        The same as np.histogram(volume, max - min, (min, max))[0] (one bin
+        per value, the max is in the last one), None if the value counts
+        aren't available (float volumes).
+        """
+        if self.counts is None:
+            return None
+        i = int(self.min) - self.counts_origin
+        e = int(self.max) - self.counts_origin
+        histogram = self.counts[i:e].copy()
+        if histogram.size:
+            histogram[-1] += self.counts[e]
+        return histogram
+
+    def get_occupied(self, axis, low, high):
+        """
+        Boolean array of the slices of axis which may have voxels in [low,
+        high] (the ones whose range overlaps it).
+        """
+        return (self.slices_max[axis] >= low) & (self.slices_min[axis] <= high)
+
+    def get_bounds(self, low, high):
+        """
+        Returns ((z0, z1), (y0, y1), (x0, x1)), the slices of each axis which
+        bound the voxels with values in [low, high], or None if there is none.
+        """
+        bounds = []
+        for axis in range(3):
+            occupied = np.flatnonzero(self.get_occupied(axis, low, high))
+            if not occupied.size:
+                return None
+            bounds.append((int(occupied[0]), int(occupied[-1]) + 1))
+        return tuple(bounds)
+
+    def flip(self, axis):
+        """
+        The volume was flipped along axis.
+        """
+        self.slices_min[axis] = self.slices_min[axis][::-1].copy()
+        self.slices_max[axis] = self.slices_max[axis][::-1].copy()
+
+    def swap_axes(self, axis0, axis1):
+        """
+        The axes of the volume were swapped (as volume.swapaxes(axis0, axis1)).
+        """
+        for values in (self.slices_min, self.slices_max):
+            values[axis0], values[axis1] = values[axis1], values[axis0]
+        shape = list(self.shape)
+        shape[axis0], shape[axis1] = shape[axis1], shape[axis0]
+        self.shape = tuple(shape)
+
+    def save(self, filename):
+        arrays = {
+            "shape": np.array(self.shape),
+            "dtype": np.array(self.dtype.str),
+            "counts_origin": np.array(self.counts_origin),
+        }
+        for axis in range(3):
+            arrays["slices_min_%d" % axis] = self.slices_min[axis]
+            arrays["slices_max_%d" % axis] = self.slices_max[axis]
+        if self.counts is not None:
+            arrays["counts"] = self.counts
+        with open(filename, "wb") as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename) as arrays:
+            stats = cls(arrays["shape"], str(arrays["dtype"]))
+            for axis in range(3):
+                stats.slices_min[axis] = arrays["slices_min_%d" % axis]
+                stats.slices_max[axis] = arrays["slices_max_%d" % axis]
+            if "counts" in arrays:
+                stats.counts_origin = int(arrays["counts_origin"])
+                stats.counts = arrays["counts"]
+        return stats
@@ -438,6 +438,8 @@ class MasksListCtrlPanel(InvListCtrl):
         self._click_check = False
         self.mask_list_index = {}
         self.current_index = 0
+        # The masks shown as layers along with the current one.
+        self.mask_layers = set()
         self.__init_columns()
         self.__init_image_list()
         self.__bind_events_wx()
@@ -446,6 +448,7 @@ class MasksListCtrlPanel(InvListCtrl):
     def __bind_events_wx(self):
         self.Bind(wx.EVT_LIST_END_LABEL_EDIT, self.OnEditLabel)
         self.Bind(wx.EVT_KEY_UP, self.OnKeyEvent)
+        self.Bind(wx.EVT_LIST_ITEM_RIGHT_CLICK, self.OnMouseRightDown)
 
     def __bind_events(self):
         Publisher.subscribe(self.AddMask, 'Add mask')
@@ -458,6 +461,7 @@ class MasksListCtrlPanel(InvListCtrl):
         Publisher.subscribe(self.__hide_current_mask, 'Hide current mask')
         Publisher.subscribe(self.__show_current_mask, 'Show current mask')
         Publisher.subscribe(self.OnCloseProject, 'Close project data')
+        Publisher.subscribe(self.OnUpdateMaskLayers, 'Update mask layers')
 
     def OnKeyEvent(self, event):
         keycode = event.GetKeyCode()
@@ -502,6 +506,24 @@ class MasksListCtrlPanel(InvListCtrl):
     def OnCloseProject(self):
         self.DeleteAllItems()
         self.mask_list_index = {}
+        self.mask_layers = set()
+
+    def OnMouseRightDown(self, evt):
+        index = evt.GetIndex()
+        menu = wx.Menu()
+        layer_item = menu.AppendCheckItem(wx.ID_ANY, _('Show as layer'))
+        layer_item.Check(index in self.mask_layers)
+        # The current mask is always shown.
+        layer_item.Enable(index != self.current_index)
+        menu.Bind(wx.EVT_MENU, lambda e: self.OnMenuShowLayer(index, e.IsChecked()), layer_item)
+        self.PopupMenu(menu)
+        menu.Destroy()
+
+    def OnMenuShowLayer(self, index, value):
+        Publisher.sendMessage('Show mask layer', index=index, value=value)
+
+    def OnUpdateMaskLayers(self, indexes):
+        self.mask_layers = set(indexes)
 
     def OnChangeCurrentMask(self, index):
         try:
@@ -481,6 +481,14 @@ class MaskProperties(wx.Panel):
                                            (0, 255, 0, 100))
         self.gradient = gradient
 
+        ## LINE 5
+        # Voxels and volume selected by the threshold (see
+        # Slice.get_threshold_preview).
+        text_preview = wx.StaticText(self, -1, "")
+        if sys.platform != 'win32':
+            text_preview.SetWindowVariant(wx.WINDOW_VARIANT_SMALL)
+        self.text_preview = text_preview
+
         # Add all lines into main sizer
         sizer = wx.BoxSizer(wx.VERTICAL)
         sizer.AddSpacer(7)
@@ -493,6 +501,8 @@ class MaskProperties(wx.Panel):
 
         sizer.AddSpacer(5)
         sizer.Add(gradient, 1, wx.EXPAND|wx.LEFT|wx.RIGHT, 5)
+        sizer.AddSpacer(2)
+        sizer.Add(text_preview, 0, wx.GROW|wx.EXPAND|wx.LEFT|wx.RIGHT, 5)
         sizer.AddSpacer(7)
 
         sizer.Fit(self)
@@ -525,9 +535,18 @@ class MaskProperties(wx.Panel):
         Publisher.subscribe(self.OnRemoveMasks, 'Remove masks')
         Publisher.subscribe(self.OnCloseProject, 'Close project data')
         Publisher.subscribe(self.SetThresholdValues2, 'Set threshold values')
+        Publisher.subscribe(self.SetThresholdPreview, 'Update threshold preview')
 
     def OnCloseProject(self):
         self.CloseProject()
+        self.text_preview.SetLabel("")
+
+    def SetThresholdPreview(self, preview):
+        if preview.exact:
+            text = _(u"%d voxels, %.2f mm³") % (preview.voxels, preview.volume)
+        else:
+            text = _(u"~%d voxels, ~%.2f mm³") % (preview.voxels, preview.volume)
+        self.text_preview.SetLabel(text)
 
     def CloseProject(self):
         n = self.combo_mask_name.GetCount()
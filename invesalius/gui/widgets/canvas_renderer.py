@@ -60,6 +60,12 @@ class CanvasRendererCTX:
 
         This class uses wx.GraphicsContext to render to a vtkImage.
 
+        The objects are rasterized to a cached layer, which is only drawn
+        again when the camera, the draw list or an object (modified = True)
+        changes. The objects under interaction (hovered or dragged) and the
+        ones updated with update_element are drawn over that layer on each
+        render.
+
         TODO: Verify why in Windows the color are strange when using transparency.
         TODO: Add support to evento (ex. click on a square)
         """
@@ -74,6 +80,17 @@ class CanvasRendererCTX:
         self.last_cam_modif_time = -1
         self.modified = True
         self._drawn = False
+        # Only the live objects were changed (see _refresh_live).
+        self._live_modified = False
+        # The cached layer with the objects not drawn live, and what it was
+        # drawn with.
+        self._static_array = None
+        self._draw_list_key = None
+        self._live_key = None
+        # Draw list elements updated with update_element, drawn live.
+        self._updated_elements = []
+        # id(object) -> the draw_list element it belongs to.
+        self._draw_roots = {}
         self._init_canvas()
 
         self._over_obj = None
@@ -184,6 +201,30 @@ class CanvasRendererCTX:
         self.modified = True
         self.viewer.interactor.Render()
 
+    def _refresh_live(self):
+        # Only the objects under interaction changed, they are drawn again
+        # over the cached layer.
+        self._live_modified = True
+        self.viewer.interactor.Render()
+
+    def update_element(self, element):
+        """
+        Tells the canvas only element (from draw_list) changed, e.g. a text
+        updated while the user interacts. From then on it's drawn over the
+        cached layer, without drawing the other objects again.
+        """
+        if element not in self._updated_elements:
+            self._updated_elements.append(element)
+        self._live_modified = True
+
+    def _get_live_elements(self):
+        live = list(self._updated_elements)
+        for obj in (self._drag_obj, self._over_obj):
+            root = self._draw_roots.get(id(obj))
+            if root is not None and root not in live:
+                live.append(root)
+        return live
+
     def OnMouseMove(self, evt):
         x, y = evt.GetPosition()
         y = self.viewer.interactor.GetSize()[1] - y
@@ -225,7 +266,7 @@ class CanvasRendererCTX:
 
         if redraw:
             #  Publisher.sendMessage('Redraw canvas %s' % self.orientation)
-            self.Refresh()
+            self._refresh_live()
 
         evt.Skip()
 
@@ -306,18 +347,58 @@ class CanvasRendererCTX:
             self._resize_canvas(w, h)
 
         cam_modif_time = self.evt_renderer.GetActiveCamera().GetMTime()
-        if (not self.modified) and cam_modif_time == self.last_cam_modif_time:
+        draw_list_key = [id(element) for element in self.draw_list]
+        live = self._get_live_elements()
+        live_key = [id(element) for element in live]
+        redraw_static = (
+            self.modified
+            or cam_modif_time != self.last_cam_modif_time
+            or draw_list_key != self._draw_list_key
+            or live_key != self._live_key
+        )
+        if not (redraw_static or self._live_modified):
             return
 
         self.last_cam_modif_time = cam_modif_time
 
-        self._array[:] = 0
+        self._ordered_draw_list = sorted(self._follow_draw_list(), key=lambda x: x[0])
+        live_objects = [(l, d) for (l, d) in self._ordered_draw_list
+                        if self._draw_roots[id(d)] in live]
+
+        if redraw_static:
+            static_objects = [(l, d) for (l, d) in self._ordered_draw_list
+                              if self._draw_roots[id(d)] not in live]
+            self._draw_objects(static_objects)
+            self._static_array = self._array.copy()
+            self._draw_list_key = draw_list_key
+            self._live_key = live_key
+
+        if live_objects:
+            self._draw_objects(live_objects, self._static_array)
+        elif not redraw_static:
+            self._array[:] = self._static_array
 
-        coord = vtk.vtkCoordinate()
+        self._cv_image.Modified()
+        self.modified = False
+        self._live_modified = False
+
+    def _draw_objects(self, objects, background=None):
+        """
+        Draws the (layer, object) list to the canvas array, over background
+        (a RGBA array as the canvas array) if given.
+        """
+        if background is None:
+            self._array[:] = 0
+            rgb = self.rgb
+            alpha = self.alpha
+        else:
+            rgb = np.ascontiguousarray(background[:, :, :3])
+            alpha = np.ascontiguousarray(background[:, :, 3])
 
-        self.image.SetDataBuffer(self.rgb)
-        self.image.SetAlphaBuffer(self.alpha)
-        self.image.Clear()
+        self.image.SetDataBuffer(rgb)
+        self.image.SetAlphaBuffer(alpha)
+        if background is None:
+            self.image.Clear()
         gc = wx.GraphicsContext.Create(self.image)
         if sys.platform != 'darwin':
             gc.SetAntialiasMode(0)
@@ -335,8 +416,7 @@ class CanvasRendererCTX:
         gc.SetBrush(brush)
         gc.Scale(1, -1)
 
-        self._ordered_draw_list = sorted(self._follow_draw_list(), key=lambda x: x[0])
-        for l, d in self._ordered_draw_list: #sorted(self.draw_list, key=lambda x: x.layer if hasattr(x, 'layer') else 0):
+        for l, d in objects: #sorted(self.draw_list, key=lambda x: x.layer if hasattr(x, 'layer') else 0):
             d.draw_to_canvas(gc, self)
 
         gc.Destroy()
@@ -346,23 +426,27 @@ class CanvasRendererCTX:
         if self._drawn:
             self.bitmap = self.image.ConvertToBitmap()
             self.bitmap.CopyToBuffer(self._array, wx.BitmapBufferFormat_RGBA)
+        elif background is not None:
+            self._array[:] = background
 
-        self._cv_image.Modified()
-        self.modified = False
         self._drawn = False
 
     def _follow_draw_list(self):
         out = []
-        def loop(node, layer):
+        roots = {}
+        def loop(node, layer, root):
             for child in node.children:
-                loop(child, layer + child.layer)
+                loop(child, layer + child.layer, root)
                 out.append((layer + child.layer, child))
+                roots[id(child)] = root
 
         for element in self.draw_list:
             out.append((element.layer, element))
+            roots[id(element)] = element
             if hasattr(element, 'children'):
-                loop(element,element.layer)
+                loop(element,element.layer, element)
 
+        self._draw_roots = roots
         return out
 
 
@@ -37,6 +37,7 @@ import invesalius.data.polydata_utils as pu
 import invesalius.version as version
 from invesalius import inv_paths
 from invesalius.data import imagedata_utils
+from invesalius.data.volume_stats import VolumeStatistics
 from invesalius.presets import Presets
 from invesalius.utils import Singleton, debug, decode, touch, TwoWaysDictionary
 
@@ -87,6 +88,14 @@ class Project(metaclass=Singleton):
 
         self.raycasting_preset = ''
 
+        # Levels of the volume pyramid and bricked copy of the matrix saved
+        # in the project
+        self.pyramid_levels = {}
+        self.bricks = {}
+
+        # VolumeStatistics of the matrix saved in the project
+        self.statistics = None
+
 
         #self.surface_quality_list = ["Low", "Medium", "High", "Optimal *",
         #                             "Custom"i]
@@ -236,6 +245,25 @@ class Project(metaclass=Singleton):
         }
         project['matrix'] = matrix
         filelist[self.matrix_filename] = 'matrix.dat'
+
+        # Saving the levels of the volume pyramid already built
+        import invesalius.data.slice_ as slc
+        pyramid = slc.Slice().pyramid.SavePlist(filelist)
+        if pyramid:
+            project['pyramid'] = pyramid
+
+        # Saving the bricked copy of the matrix, if created
+        bricks = slc.Slice().bricked.SavePlist(filelist)
+        if bricks:
+            project['bricks'] = bricks
+
+        # Saving the statistics of the matrix
+        statistics = slc.Slice().statistics
+        if statistics is not None:
+            statistics_file = os.path.join(dir_temp, 'matrix_stats.npz')
+            statistics.save(statistics_file)
+            filelist[statistics_file] = 'matrix_stats.npz'
+            project['statistics'] = 'matrix_stats.npz'
         #shutil.copyfile(self.matrix_filename, filename_tmp)
 
         # Saving the masks
@@ -327,6 +355,28 @@ class Project(metaclass=Singleton):
         self.matrix_shape = project["matrix"]['shape']
         self.matrix_dtype = project["matrix"]['dtype']
 
+        # Levels of the volume pyramid (see Slice.pyramid)
+        self.pyramid_levels = {}
+        for factor, level in project.get("pyramid", {}).items():
+            self.pyramid_levels[int(factor)] = {
+                'filename': os.path.join(dirpath, level['filename']),
+                'shape': level['shape'],
+                'dtype': level['dtype'],
+            }
+
+        # Bricked copy of the matrix (see Slice.bricked)
+        self.bricks = {}
+        if project.get("bricks"):
+            self.bricks = dict(project["bricks"])
+            self.bricks['filename'] = os.path.join(dirpath,
+                                                   project["bricks"]['filename'])
+
+        # Statistics of the matrix (see Slice.statistics)
+        self.statistics = None
+        if project.get("statistics"):
+            self.statistics = VolumeStatistics.load(os.path.join(dirpath,
+                                                                 project["statistics"]))
+
         if project.get("affine", ""):
             self.affine = project["affine"]
             Publisher.sendMessage('Update affine matrix',
@@ -0,0 +1,229 @@
+#cython: language_level=3str
+
+# Connected component labelling of the masks. The volume is split in blocks
+# of slices labelled in parallel with an union-find, whose parents are kept
+# in the labels array (the flat index of the parent plus 1, 0 in the
+# background). The components crossing the blocks are merged after and the
+# labels are made consecutive, the size and the bounding box of each
+# component are computed in the same pass.
+
+import numpy as np
+cimport numpy as np
+cimport cython
+cimport openmp
+
+from cython.parallel import prange
+
+from .cy_my_types cimport mask_t
+
+ctypedef np.uint32_t label_t
+
+
+cdef int get_num_threads(int num_threads) noexcept:
+    # num_threads <= 0 means all the threads OpenMP is allowed to use.
+    if num_threads <= 0:
+        return openmp.omp_get_max_threads()
+    return num_threads
+
+
+def get_offsets(int connectivity):
+    """
+    The (dz, dy, dx) of the neighbours of a voxel visited before it (in the
+    order of the voxels in the volume), for the connectivity 6, 18 or 26.
+    """
+    if connectivity not in (6, 18, 26):
+        raise ValueError("The connectivity must be 6, 18 or 26")
+    max_nonzero = {6: 1, 18: 2, 26: 3}[connectivity]
+    offsets = []
+    for dz in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            for dx in (-1, 0, 1):
+                offset = (dz, dy, dx)
+                nonzero = [d for d in offset if d]
+                if nonzero and nonzero[0] < 0 and len(nonzero) <= max_nonzero:
+                    offsets.append(offset)
+    return np.array(offsets, dtype=np.int32)
+
+
+@cython.boundscheck(False) # turn of bounds-checking for entire function
+@cython.wraparound(False)
+cdef inline Py_ssize_t find(label_t* parents, Py_ssize_t p) noexcept nogil:
+    # With path halving. When it's run in parallel (after the unions) the
+    # parents written are ancestors in the same tree, so it's still right.
+    cdef Py_ssize_t q
+    while parents[p] - 1 != p:
+        q = parents[parents[p] - 1] - 1
+        parents[p] = q + 1
+        p = q
+    return p
+
+
+@cython.boundscheck(False) # turn of bounds-checking for entire function
+@cython.wraparound(False)
+cdef inline void union_(label_t* parents, Py_ssize_t a, Py_ssize_t b) noexcept nogil:
+    # The root is the first voxel of the component.
+    cdef Py_ssize_t ra = find(parents, a)
+    cdef Py_ssize_t rb = find(parents, b)
+    if ra < rb:
+        parents[rb] = ra + 1
+    elif rb < ra:
+        parents[ra] = rb + 1
+
+
+@cython.boundscheck(False) # turn of bounds-checking for entire function
+@cython.wraparound(False)
+@cython.nonecheck(False)
+@cython.cdivision(True)
+cdef void label_block(const mask_t[:, :, :] volume, int low, int high,
+                      label_t* parents, const int[:, :] offsets, int z0,
+                      int z1) noexcept nogil:
+    cdef int dy = volume.shape[1]
+    cdef int dx = volume.shape[2]
+    cdef int z, y, x, i, nz, ny, nx
+    cdef int n_offsets = offsets.shape[0]
+    cdef Py_ssize_t p, q
+    cdef mask_t v
+    for z in range(z0, z1):
+        for y in range(dy):
+            for x in range(dx):
+                p = (<Py_ssize_t>z * dy + y) * dx + x
+                v = volume[z, y, x]
+                if v < low or v > high:
+                    parents[p] = 0
+                    continue
+                # p joins the tree of its first neighbour, the others are
+                # merged with it.
+                parents[p] = 0
+                for i in range(n_offsets):
+                    nz = z + offsets[i, 0]
+                    ny = y + offsets[i, 1]
+                    nx = x + offsets[i, 2]
+                    if nz < z0 or ny < 0 or ny >= dy or nx < 0 or nx >= dx:
+                        continue
+                    q = (<Py_ssize_t>nz * dy + ny) * dx + nx
+                    if not parents[q]:
+                        continue
+                    if parents[p]:
+                        union_(parents, p, q)
+                    else:
+                        parents[p] = find(parents, q) + 1
+                if not parents[p]:
+                    parents[p] = p + 1
+
+
+@cython.boundscheck(False) # turn of bounds-checking for entire function
+@cython.wraparound(False)
+@cython.nonecheck(False)
+@cython.cdivision(True)
+def label(const mask_t[:, :, :] volume, int low, int high, int connectivity,
+          label_t[:, :, ::1] labels, int block_slices=16, int num_threads=0):
+    """
+    Labels the components (with the given connectivity: 6, 18 or 26) of the
+    voxels of volume with values in [low, high]. The labels (1 to n, in the
+    order of the first voxel of each component, 0 in the other voxels) are
+    written in labels.
+
+    Returns (n, sizes, bounds): the number of components, the number of
+    voxels of each one and their bounding boxes, sizes[i] and bounds[i] =
+    (z0, z1, y0, y1, x0, x1) are of the label i (the index 0 is not used).
+    """
+    cdef int dz = volume.shape[0]
+    cdef int dy = volume.shape[1]
+    cdef int dx = volume.shape[2]
+    cdef int nt = get_num_threads(num_threads)
+    cdef int[:, :] offsets = get_offsets(connectivity)
+    cdef int n_offsets = offsets.shape[0]
+    cdef int n_blocks, b, z, y, x, i, ny, nx
+    cdef Py_ssize_t p, q, r
+    cdef Py_ssize_t n_roots = 0
+    cdef label_t* parents
+    cdef label_t n = 0
+    cdef label_t l
+
+    if labels.shape[0] != dz or labels.shape[1] != dy or labels.shape[2] != dx:
+        raise ValueError("The labels must have the shape of the volume")
+    if <Py_ssize_t>dz * dy * dx >= 0xffffffff:
+        raise ValueError("The volume is too big to be labelled")
+    if block_slices < 1:
+        block_slices = 1
+    if dz == 0 or dy == 0 or dx == 0:
+        return 0, np.zeros(1, dtype=np.int64), np.zeros((1, 6), dtype=np.int32)
+
+    parents = &labels[0, 0, 0]
+    n_blocks = (dz + block_slices - 1) // block_slices
+
+    # The components inside each block.
+    for b in prange(n_blocks, nogil=True, schedule='dynamic', num_threads=nt):
+        label_block(volume, low, high, parents, offsets, b * block_slices,
+                    min((b + 1) * block_slices, dz))
+
+    # The components crossing the first slice of each block.
+    with nogil:
+        for b in range(1, n_blocks):
+            z = b * block_slices
+            for y in range(dy):
+                for x in range(dx):
+                    p = (<Py_ssize_t>z * dy + y) * dx + x
+                    if not parents[p]:
+                        continue
+                    for i in range(n_offsets):
+                        if offsets[i, 0] != -1:
+                            continue
+                        ny = y + offsets[i, 1]
+                        nx = x + offsets[i, 2]
+                        if ny < 0 or ny >= dy or nx < 0 or nx >= dx:
+                            continue
+                        q = (<Py_ssize_t>(z - 1) * dy + ny) * dx + nx
+                        if parents[q]:
+                            union_(parents, p, q)
+
+    # Each voxel points to its root.
+    for z in prange(dz, nogil=True, schedule='static', num_threads=nt):
+        for y in range(dy):
+            for x in range(dx):
+                p = (<Py_ssize_t>z * dy + y) * dx + x
+                if parents[p]:
+                    r = find(parents, p)
+                    parents[p] = r + 1
+                    if r == p:
+                        n_roots += 1
+
+    sizes_arr = np.zeros(n_roots + 1, dtype=np.int64)
+    bounds_arr = np.zeros((n_roots + 1, 6), dtype=np.int32)
+    cdef np.int64_t[:] sizes = sizes_arr
+    cdef int[:, :] bounds = bounds_arr
+
+    # The roots are the first voxels of their components, so they're
+    # labelled before the other voxels, which take the label of the root.
+    with nogil:
+        for z in range(dz):
+            for y in range(dy):
+                for x in range(dx):
+                    p = (<Py_ssize_t>z * dy + y) * dx + x
+                    if not parents[p]:
+                        continue
+                    r = parents[p] - 1
+                    if r == p:
+                        n = n + 1
+                        l = n
+                        bounds[l, 0] = z
+                        bounds[l, 2] = y
+                        bounds[l, 4] = x
+                        bounds[l, 1] = z + 1
+                        bounds[l, 3] = y + 1
+                        bounds[l, 5] = x + 1
+                    else:
+                        l = parents[r]
+                        bounds[l, 1] = z + 1
+                        if y < bounds[l, 2]:
+                            bounds[l, 2] = y
+                        if y + 1 > bounds[l, 3]:
+                            bounds[l, 3] = y + 1
+                        if x < bounds[l, 4]:
+                            bounds[l, 4] = x
+                        if x + 1 > bounds[l, 5]:
+                            bounds[l, 5] = x + 1
+                    parents[p] = l
+                    sizes[l] += 1
+
+    return n, sizes_arr, bounds_arr
@@ -160,6 +160,86 @@ def floodfill_threshold(np.ndarray[image_t, ndim=3] data, list seeds, int t0, in
         return out
 
 
+@cython.boundscheck(False) # turn of bounds-checking for entire function
+@cython.wraparound(False)
+@cython.nonecheck(False)
+def floodfill_threshold_bounds(np.ndarray[image_t, ndim=3] data, list seeds, int t0, int t1, int fill, np.ndarray[mask_t, ndim=3] strct, np.ndarray[mask_t, ndim=3] out):
+    """
+    The same as floodfill_threshold, but out is required (it must not have
+    voxels with the value fill) and it returns the bounding box (z0, z1, y0,
+    y1, x0, x1) of the voxels filled, or None if none was filled. Only the
+    voxels filled are read and written in out, so it can be a buffer reused
+    by the fills (cleared in the bounding box after each one).
+    """
+    cdef int x, y, z
+    cdef int dx, dy, dz
+    cdef int odx, ody, odz
+    cdef int xo, yo, zo
+    cdef int i, j, k
+    cdef int offset_x, offset_y, offset_z
+    cdef int z0, z1, y0, y1, x0, x1
+
+    dz = data.shape[0]
+    dy = data.shape[1]
+    dx = data.shape[2]
+
+    odz = strct.shape[0]
+    ody = strct.shape[1]
+    odx = strct.shape[2]
+
+    cdef cdeque[coord] stack
+    cdef coord c
+
+    offset_z = odz // 2
+    offset_y = ody // 2
+    offset_x = odx // 2
+
+    z0, y0, x0 = dz, dy, dx
+    z1, y1, x1 = -1, -1, -1
+
+    for i, j, k in seeds:
+        if data[k, j, i] >= t0 and data[k, j, i] <= t1 and out[k, j, i] != fill:
+            c.x = i
+            c.y = j
+            c.z = k
+            stack.push_back(c)
+            out[k, j, i] = fill
+
+    with nogil:
+        while stack.size():
+            c = stack.back()
+            stack.pop_back()
+
+            x = c.x
+            y = c.y
+            z = c.z
+
+            z0 = min(z0, z)
+            z1 = max(z1, z)
+            y0 = min(y0, y)
+            y1 = max(y1, y)
+            x0 = min(x0, x)
+            x1 = max(x1, x)
+
+            for k in range(odz):
+                zo = z + k - offset_z
+                for j in range(ody):
+                    yo = y + j - offset_y
+                    for i in range(odx):
+                        if strct[k, j, i]:
+                            xo = x + i - offset_x
+                            if 0 <= xo < dx and 0 <= yo < dy and 0 <= zo < dz and out[zo, yo, xo] != fill and t0 <= data[zo, yo, xo] <= t1:
+                                out[zo, yo, xo] = fill
+                                c.x = xo
+                                c.y = yo
+                                c.z = zo
+                                stack.push_back(c)
+
+    if z1 < 0:
+        return None
+    return z0, z1 + 1, y0, y1 + 1, x0, x1 + 1
+
+
 @cython.boundscheck(False) # turn of bounds-checking for entire function
 @cython.wraparound(False)
 @cython.nonecheck(False)
@@ -4,10 +4,14 @@
 import numpy as np
 cimport numpy as np
 cimport cython
+cimport openmp
 
 from libc.math cimport floor, ceil, sqrt, fabs
+from libc.stdlib cimport malloc, free
 from cython.parallel import prange
 
+from .cy_my_types cimport image_t
+
 DTYPE = np.uint8
 ctypedef np.uint8_t DTYPE_t
 
@@ -17,77 +21,284 @@ ctypedef np.int16_t DTYPE16_t
 DTYPEF32 = np.float32
 ctypedef np.float32_t DTYPEF32_t
 
+
+cdef int get_num_threads(int num_threads):
+    # num_threads <= 0 means all the threads OpenMP is allowed to use.
+    if num_threads <= 0:
+        return openmp.omp_get_max_threads()
+    return num_threads
+
+
 @cython.boundscheck(False) # turn of bounds-checking for entire function
-def lmip(np.ndarray[DTYPE16_t, ndim=3] image, int axis, DTYPE16_t tmin,
-         DTYPE16_t tmax, np.ndarray[DTYPE16_t, ndim=2] out):
-    cdef DTYPE16_t max
-    cdef int start
+@cython.wraparound(False)
+cdef inline int max_min_row(const image_t[:] src, image_t* dst, int n,
+                            bint is_max) nogil:
+    # dst = max(dst, src) (or min). The loops over pointers are vectorized by
+    # the compiler when the row is contiguous, the usual case.
+    cdef const image_t* psrc
+    cdef int i
+    if src.strides[0] == sizeof(image_t):
+        psrc = &src[0]
+        if is_max:
+            for i in range(n):
+                dst[i] = psrc[i] if psrc[i] > dst[i] else dst[i]
+        else:
+            for i in range(n):
+                dst[i] = psrc[i] if psrc[i] < dst[i] else dst[i]
+    else:
+        for i in range(n):
+            if (is_max and src[i] > dst[i]) or (not is_max and src[i] < dst[i]):
+                dst[i] = src[i]
+    return 0
+
+
+@cython.boundscheck(False) # turn of bounds-checking for entire function
+@cython.wraparound(False)
+cdef inline int sum_row(const image_t[:] src, double* dst, int n) nogil:
+    # dst += src
+    cdef const image_t* psrc
+    cdef int i
+    if src.strides[0] == sizeof(image_t):
+        psrc = &src[0]
+        for i in range(n):
+            dst[i] += psrc[i]
+    else:
+        for i in range(n):
+            dst[i] += src[i]
+    return 0
+
+
+@cython.boundscheck(False) # turn of bounds-checking for entire function
+@cython.wraparound(False)
+def max_min_projection(const image_t[:, :, :] image, int axis, bint is_max,
+                       image_t[:, ::1] out, int num_threads=0):
+    """
+    Maximum (is_max) or minimum intensity projection of image along axis.
+    The image can be any strided view (e.g. a slab of the memmap), it's not
+    copied.
+    """
     cdef int sz = image.shape[0]
     cdef int sy = image.shape[1]
     cdef int sx = image.shape[2]
+    cdef int nt = get_num_threads(num_threads)
+    cdef image_t v, r
+    cdef int x, y, z
 
-    # AXIAL
-    if axis == 0:
-        for x in range(sx):
-            for y in range(sy):
-                max = image[0, y, x]
-                if max >= tmin and max <= tmax:
-                    start = 1
-                else:
-                    start = 0
+    with nogil:
+        # AXIAL
+        if axis == 0:
+            for y in prange(sy, num_threads=nt):
+                out[y, :] = image[0, y, :]
+                for z in range(1, sz):
+                    max_min_row(image[z, y, :], &out[y, 0], sx, is_max)
+
+        # CORONAL
+        elif axis == 1:
+            for z in prange(sz, num_threads=nt):
+                out[z, :] = image[z, 0, :]
+                for y in range(1, sy):
+                    max_min_row(image[z, y, :], &out[z, 0], sx, is_max)
+
+        # SAGITAL
+        elif axis == 2:
+            for z in prange(sz, num_threads=nt):
+                for y in range(sy):
+                    r = image[z, y, 0]
+                    for x in range(1, sx):
+                        v = image[z, y, x]
+                        if (is_max and v > r) or (not is_max and v < r):
+                            r = v
+                    out[z, y] = r
+
+
+@cython.boundscheck(False) # turn of bounds-checking for entire function
+@cython.wraparound(False)
+@cython.cdivision(True)
+def mean_projection(const image_t[:, :, :] image, int axis,
+                    np.float64_t[:, ::1] out, int num_threads=0):
+    """
+    Mean intensity projection of image along axis.
+    """
+    cdef int sz = image.shape[0]
+    cdef int sy = image.shape[1]
+    cdef int sx = image.shape[2]
+    cdef int nt = get_num_threads(num_threads)
+    cdef double r
+    cdef int x, y, z
+
+    with nogil:
+        # AXIAL
+        if axis == 0:
+            for y in prange(sy, num_threads=nt):
+                out[y, :] = 0.0
                 for z in range(sz):
-                    if image[z, y, x] > max:
-                        max = image[z, y, x]
+                    sum_row(image[z, y, :], &out[y, 0], sx)
+                for x in range(sx):
+                    out[y, x] = out[y, x] / sz
 
-                    elif image[z, y, x] < max and start:
-                        break
-                    
-                    if image[z, y, x] >= tmin and image[z, y, x] <= tmax:
-                        start = 1
+        # CORONAL
+        elif axis == 1:
+            for z in prange(sz, num_threads=nt):
+                out[z, :] = 0.0
+                for y in range(sy):
+                    sum_row(image[z, y, :], &out[z, 0], sx)
+                for x in range(sx):
+                    out[z, x] = out[z, x] / sy
 
-                out[y, x] = max
+        # SAGITAL
+        elif axis == 2:
+            for z in prange(sz, num_threads=nt):
+                for y in range(sy):
+                    r = 0.0
+                    for x in range(sx):
+                        r = r + image[z, y, x]
+                    out[z, y] = r / sx
 
-    #CORONAL
-    elif axis == 1:
-        for z in range(sz):
+
+@cython.boundscheck(False) # turn of bounds-checking for entire function
+@cython.wraparound(False)
+cdef int min_max(const DTYPE16_t[:, :, :] image, DTYPE16_t* vmin,
+                 DTYPE16_t* vmax, int num_threads) nogil:
+    cdef int sz = image.shape[0]
+    cdef int sy = image.shape[1]
+    cdef int sx = image.shape[2]
+    cdef DTYPE16_t[:, :] tmp
+    cdef DTYPE16_t v
+    cdef int x, y, z
+
+    with gil:
+        # min and max of each z, reduced below.
+        tmp = np.empty((sz, 2), dtype=DTYPE16)
+
+    for z in prange(sz, num_threads=num_threads):
+        tmp[z, 0] = image[z, 0, 0]
+        tmp[z, 1] = image[z, 0, 0]
+        for y in range(sy):
             for x in range(sx):
-                max = image[z, 0, x]
-                if max >= tmin and max <= tmax:
-                    start = 1
-                else:
-                    start = 0
-                for y in range(sy):
-                    if image[z, y, x] > max:
-                        max = image[z, y, x]
+                v = image[z, y, x]
+                if v < tmp[z, 0]:
+                    tmp[z, 0] = v
+                elif v > tmp[z, 1]:
+                    tmp[z, 1] = v
 
-                    elif image[z, y, x] < max and start:
-                        break
-                    
-                    if image[z, y, x] >= tmin and image[z, y, x] <= tmax:
-                        start = 1
+    vmin[0] = tmp[0, 0]
+    vmax[0] = tmp[0, 1]
+    for z in range(1, sz):
+        if tmp[z, 0] < vmin[0]:
+            vmin[0] = tmp[z, 0]
+        if tmp[z, 1] > vmax[0]:
+            vmax[0] = tmp[z, 1]
 
-                out[z, x] = max
+    return 0
 
-    #CORONAL
-    elif axis == 2:
-        for z in range(sz):
-            for y in range(sy):
-                max = image[z, y, 0]
-                if max >= tmin and max <= tmax:
-                    start = 1
-                else:
-                    start = 0
-                for x in range(sx):
-                    if image[z, y, x] > max:
-                        max = image[z, y, x]
 
-                    elif image[z, y, x] < max and start:
-                        break
-                    
-                    if image[z, y, x] >= tmin and image[z, y, x] <= tmax:
-                        start = 1
+@cython.boundscheck(False) # turn of bounds-checking for entire function
+@cython.wraparound(False)
+cdef inline DTYPE16_t lmip_ray(const DTYPE16_t[:] ray, DTYPE16_t tmin,
+                               DTYPE16_t tmax) nogil:
+    # Local maximum of the ray: the first maximum after the ray has reached a
+    # value in [tmin, tmax].
+    cdef DTYPE16_t max = ray[0]
+    cdef DTYPE16_t v
+    cdef int start
+    cdef int i
+
+    if max >= tmin and max <= tmax:
+        start = 1
+    else:
+        start = 0
+
+    for i in range(ray.shape[0]):
+        v = ray[i]
+        if v > max:
+            max = v
+
+        elif v < max and start:
+            break
+
+        if v >= tmin and v <= tmax:
+            start = 1
 
-                out[z, y] = max
+    return max
+
+
+@cython.boundscheck(False) # turn of bounds-checking for entire function
+@cython.wraparound(False)
+cdef int lmip_rays(const DTYPE16_t[:, :, :] image, int axis, int a,
+                   DTYPE16_t tmin, DTYPE16_t tmax, DTYPE16_t* out) nogil:
+    # The same as lmip_ray for all the rays (a, b) along axis 0 or 1, but
+    # reading the volume a row at a time instead of a voxel per row.
+    cdef int size = image.shape[axis]
+    cdef int n = image.shape[2]
+    cdef const DTYPE16_t[:] row
+    cdef DTYPE16_t v
+    cdef int remaining = n
+    cdef int i, b
+    # 0: searching the range [tmin, tmax], 1: started, 2: done.
+    cdef char* state = <char*>malloc(n)
+
+    if axis == 0:
+        row = image[0, a, :]
+    else:
+        row = image[a, 0, :]
+    for b in range(n):
+        out[b] = row[b]
+        if row[b] >= tmin and row[b] <= tmax:
+            state[b] = 1
+        else:
+            state[b] = 0
+
+    for i in range(size):
+        if axis == 0:
+            row = image[i, a, :]
+        else:
+            row = image[a, i, :]
+        for b in range(n):
+            if state[b] == 2:
+                continue
+            v = row[b]
+            if v > out[b]:
+                out[b] = v
+            elif v < out[b] and state[b]:
+                state[b] = 2
+                remaining = remaining - 1
+                continue
+
+            if v >= tmin and v <= tmax:
+                state[b] = 1
+        if remaining == 0:
+            break
+
+    free(state)
+    return 0
+
+
+@cython.boundscheck(False) # turn of bounds-checking for entire function
+@cython.wraparound(False)
+def lmip(const DTYPE16_t[:, :, :] image, int axis, DTYPE16_t tmin,
+         DTYPE16_t tmax, DTYPE16_t[:, ::1] out, int num_threads=0):
+    cdef int sz = image.shape[0]
+    cdef int sy = image.shape[1]
+    cdef int sx = image.shape[2]
+    cdef int nt = get_num_threads(num_threads)
+    cdef int x, y, z
+
+    with nogil:
+        # AXIAL
+        if axis == 0:
+            for y in prange(sy, num_threads=nt):
+                lmip_rays(image, 0, y, tmin, tmax, &out[y, 0])
+
+        #CORONAL
+        elif axis == 1:
+            for z in prange(sz, num_threads=nt):
+                lmip_rays(image, 1, z, tmin, tmax, &out[z, 0])
+
+        #SAGITAL
+        elif axis == 2:
+            for z in prange(sz, num_threads=nt):
+                for y in range(sy):
+                    out[z, y] = lmip_ray(image[z, y, :], tmin, tmax)
 
 
 cdef DTYPE16_t get_colour(DTYPE16_t vl, DTYPE16_t wl, DTYPE16_t ww):
@@ -135,134 +346,98 @@ cdef float get_opacity_f32(DTYPEF32_t vl, DTYPE16_t wl, DTYPE16_t ww) nogil:
 
 
 @cython.boundscheck(False) # turn of bounds-checking for entire function
+@cython.wraparound(False)
 @cython.cdivision(True)
-def mida(np.ndarray[DTYPE16_t, ndim=3] image, int axis, DTYPE16_t wl,
-         DTYPE16_t ww, np.ndarray[DTYPE16_t, ndim=2] out):
-    cdef int sz = image.shape[0]
-    cdef int sy = image.shape[1]
-    cdef int sx = image.shape[2]
-
-    cdef DTYPE16_t min = image.min()
-    cdef DTYPE16_t max = image.max()
+cdef inline DTYPE16_t mida_ray(const DTYPE16_t[:, :, :] image, int axis,
+                               int a, int b, int size, DTYPE16_t min,
+                               DTYPE16_t max, DTYPE16_t wl,
+                               DTYPE16_t ww) nogil:
+    # Maximum intensity difference accumulation of the ray (a, b) along axis.
     cdef DTYPE16_t vl
-
-    cdef DTYPE16_t min_value = wl - (ww // 2)
-    cdef DTYPE16_t max_value = wl + (ww // 2)
-
-    cdef float fmax=0.0
+    cdef float fmax = 0.0
     cdef float fpi
     cdef float dl
     cdef float bt
-
     cdef float alpha
     cdef float alpha_p = 0.0
-    cdef float colour
-    cdef float colour_p = 0
+    cdef float colour = 0.0
+    cdef float colour_p = 0.0
+    cdef int i
 
-    cdef int x, y, z
+    for i in range(size):
+        if axis == 0:
+            vl = image[i, a, b]
+        elif axis == 1:
+            vl = image[a, i, b]
+        else:
+            vl = image[a, b, i]
 
-    # AXIAL
-    if axis == 0:
-        for x in prange(sx, nogil=True):
-            for y in range(sy):
-                fmax = 0.0
-                alpha_p = 0.0
-                colour_p = 0.0
-                for z in range(sz):
-                    vl = image[z, y, x]
-                    fpi = 1.0/(max - min) * (vl - min)
-                    if fpi > fmax:
-                        dl = fpi - fmax
-                        fmax = fpi
-                    else:
-                        dl = 0.0
+        fpi = 1.0/(max - min) * (vl - min)
+        if fpi > fmax:
+            dl = fpi - fmax
+            fmax = fpi
+        else:
+            dl = 0.0
 
-                    bt = 1.0 - dl
-                    
-                    colour = fpi
-                    alpha = get_opacity(vl, wl, ww)
-                    colour = (bt * colour_p) + (1 - bt * alpha_p) * colour * alpha
-                    alpha = (bt * alpha_p) + (1 - bt * alpha_p) * alpha
+        bt = 1.0 - dl
 
-                    colour_p = colour
-                    alpha_p = alpha
+        colour = fpi
+        alpha = get_opacity(vl, wl, ww)
+        colour = (bt * colour_p) + (1 - bt * alpha_p) * colour * alpha
+        alpha = (bt * alpha_p) + (1 - bt * alpha_p) * alpha
 
-                    if alpha >= 1.0:
-                        break
+        colour_p = colour
+        alpha_p = alpha
 
+        if alpha >= 1.0:
+            break
 
-                #out[y, x] = <DTYPE16_t>((max_value - min_value) * colour + min_value)
-                out[y, x] = <DTYPE16_t>((max - min) * colour + min)
+    #return <DTYPE16_t>((max_value - min_value) * colour + min_value)
+    return <DTYPE16_t>((max - min) * colour + min)
 
 
-    #CORONAL
-    elif axis == 1:
-        for z in prange(sz, nogil=True):
-            for x in range(sx):
-                fmax = 0.0
-                alpha_p = 0.0
-                colour_p = 0.0
-                for y in range(sy):
-                    vl = image[z, y, x]
-                    fpi = 1.0/(max - min) * (vl - min)
-                    if fpi > fmax:
-                        dl = fpi - fmax
-                        fmax = fpi
-                    else:
-                        dl = 0.0
-
-                    bt = 1.0 - dl
-                    
-                    colour = fpi
-                    alpha = get_opacity(vl, wl, ww)
-                    colour = (bt * colour_p) + (1 - bt * alpha_p) * colour * alpha
-                    alpha = (bt * alpha_p) + (1 - bt * alpha_p) * alpha
-
-                    colour_p = colour
-                    alpha_p = alpha
-
-                    if alpha >= 1.0:
-                        break
-
-                out[z, x] = <DTYPE16_t>((max - min) * colour + min)
-
-    #AXIAL
-    elif axis == 2:
-        for z in prange(sz, nogil=True):
-            for y in range(sy):
-                fmax = 0.0
-                alpha_p = 0.0
-                colour_p = 0.0
-                for x in range(sx):
-                    vl = image[z, y, x]
-                    fpi = 1.0/(max - min) * (vl - min)
-                    if fpi > fmax:
-                        dl = fpi - fmax
-                        fmax = fpi
-                    else:
-                        dl = 0.0
+@cython.boundscheck(False) # turn of bounds-checking for entire function
+@cython.wraparound(False)
+@cython.cdivision(True)
+def mida(const DTYPE16_t[:, :, :] image, int axis, DTYPE16_t wl,
+         DTYPE16_t ww, DTYPE16_t[:, :] out, int num_threads=0):
+    cdef int sz = image.shape[0]
+    cdef int sy = image.shape[1]
+    cdef int sx = image.shape[2]
+    cdef int nt = get_num_threads(num_threads)
+
+    cdef DTYPE16_t min
+    cdef DTYPE16_t max
 
-                    bt = 1.0 - dl
-                    
-                    colour = fpi
-                    alpha = get_opacity(vl, wl, ww)
-                    colour = (bt * colour_p) + (1 - bt * alpha_p) * colour * alpha
-                    alpha = (bt * alpha_p) + (1 - bt * alpha_p) * alpha
+    cdef int x, y, z
+
+    with nogil:
+        min_max(image, &min, &max, nt)
 
-                    colour_p = colour
-                    alpha_p = alpha
+        # AXIAL
+        if axis == 0:
+            for y in prange(sy, num_threads=nt):
+                for x in range(sx):
+                    out[y, x] = mida_ray(image, 0, y, x, sz, min, max, wl, ww)
 
-                    if alpha >= 1.0:
-                        break
+        #CORONAL
+        elif axis == 1:
+            for z in prange(sz, num_threads=nt):
+                for x in range(sx):
+                    out[z, x] = mida_ray(image, 1, z, x, sy, min, max, wl, ww)
 
-                out[z, y] = <DTYPE16_t>((max - min) * colour + min)
+        #SAGITAL
+        elif axis == 2:
+            for z in prange(sz, num_threads=nt):
+                for y in range(sy):
+                    out[z, y] = mida_ray(image, 2, z, y, sx, min, max, wl, ww)
 
 
 
 @cython.boundscheck(False) # turn of bounds-checking for entire function
 @cython.cdivision(True)
-cdef inline void finite_difference(DTYPE16_t[:, :, :] image,
-                              int x, int y, int z, float h, float *g) nogil:
+cdef inline int finite_difference(const DTYPE16_t[:, :, :] image,
+                             int x, int y, int z, float h, float *g) nogil:
     cdef int px, py, pz, fx, fy, fz
 
     cdef int sz = image.shape[0]
@@ -309,11 +484,13 @@ cdef inline void finite_difference(DTYPE16_t[:, :, :] image,
     g[1] = gy
     g[2] = gz
 
+    return 0
+
 
 
 @cython.boundscheck(False) # turn of bounds-checking for entire function
 @cython.cdivision(True)
-cdef inline float calc_fcm_itensity(DTYPE16_t[:, :, :] image,
+cdef inline float calc_fcm_itensity(const DTYPE16_t[:, :, :] image,
                       int x, int y, int z, float n, float* dir) nogil:
     cdef float g[3]
     finite_difference(image, x, y, z, 1.0, g)
@@ -325,33 +502,25 @@ cdef inline float calc_fcm_itensity(DTYPE16_t[:, :, :] image,
     return vl
 
 @cython.boundscheck(False) # turn of bounds-checking for entire function
+@cython.wraparound(False)
 @cython.cdivision(True)
-def fast_countour_mip(np.ndarray[DTYPE16_t, ndim=3] image,
+def fast_countour_mip(const DTYPE16_t[:, :, :] image,
                       float n,
                       int axis,
                       DTYPE16_t wl, DTYPE16_t ww,
                       int tmip,
-                      np.ndarray[DTYPE16_t, ndim=2] out):
+                      DTYPE16_t[:, ::1] out,
+                      int num_threads=0):
     cdef int sz = image.shape[0]
     cdef int sy = image.shape[1]
     cdef int sx = image.shape[2]
-    cdef float gm
-    cdef float alpha
-    cdef float sf
-    cdef float d
+    cdef int nt = get_num_threads(num_threads)
 
-    cdef float* g
     cdef float* dir = [ 0, 0, 0 ]
 
-    cdef DTYPE16_t[:, :, :] vimage = image
-    cdef np.ndarray[DTYPE16_t, ndim=3] tmp = np.empty_like(image)
+    cdef DTYPE16_t[:, :, :] tmp = np.empty((sz, sy, sx), dtype=DTYPE16)
 
-    cdef DTYPE16_t min = image.min()
-    cdef DTYPE16_t max = image.max()
-    cdef float fmin = <float>min
-    cdef float fmax = <float>max
     cdef float vl
-    cdef DTYPE16_t V
 
     cdef int x, y, z
 
@@ -362,20 +531,15 @@ def fast_countour_mip(np.ndarray[DTYPE16_t, ndim=3] image,
     elif axis == 2:
         dir[0] = 1.0
 
-    for z in prange(sz, nogil=True):
+    for z in prange(sz, nogil=True, num_threads=nt):
         for y in range(sy):
             for x in range(sx):
-                vl = calc_fcm_itensity(vimage, x, y, z, n, dir)
+                vl = calc_fcm_itensity(image, x, y, z, n, dir)
                 tmp[z, y, x] = <DTYPE16_t>vl
 
-    cdef DTYPE16_t tmin = tmp.min()
-    cdef DTYPE16_t tmax = tmp.max()
-
-    #tmp = ((max - min)/<float>(tmax - tmin)) * (tmp - tmin) + min
-
     if tmip == 0:
-        out[:] = tmp.max(axis)
+        max_min_projection(tmp, axis, True, out, nt)
     elif tmip == 1:
-        lmip(tmp, axis, 700, 3033, out)
+        lmip(tmp, axis, 700, 3033, out, nt)
     elif tmip == 2:
-        mida(tmp, axis, wl, ww, out)
+        mida(tmp, axis, wl, ww, out, nt)
@@ -0,0 +1,159 @@
+#cython: language_level=3str
+
+# Thresholding of the image into the masks, keeping the voxels edited by the
+# user (the values 1, 2, 253 and 254 of the mask).
+
+import numpy as np
+cimport numpy as np
+cimport cython
+cimport openmp
+
+from cython.parallel import prange
+
+from .cy_my_types cimport mask_t
+
+# All the image types, not only the ones of image_t.
+ctypedef fused threshold_image_t:
+    np.int8_t
+    np.uint8_t
+    np.int16_t
+    np.uint16_t
+    np.int32_t
+    np.uint32_t
+    np.int64_t
+    np.uint64_t
+    np.float32_t
+    np.float64_t
+
+
+cdef int get_num_threads(int num_threads):
+    # num_threads <= 0 means all the threads OpenMP is allowed to use.
+    if num_threads <= 0:
+        return openmp.omp_get_max_threads()
+    return num_threads
+
+
+cdef void init_edited_lut(mask_t* lut):
+    # lut[v] is v for the values of the voxels edited by the user, 0 for the
+    # others.
+    cdef int i
+    for i in range(256):
+        lut[i] = 0
+    lut[1] = 1
+    lut[2] = 2
+    lut[253] = 253
+    lut[254] = 254
+
+
+@cython.boundscheck(False) # turn of bounds-checking for entire function
+@cython.wraparound(False)
+cdef inline void threshold_row(const threshold_image_t* src, const mask_t* mask,
+                               mask_t* dst, int n, double t_min, double t_max,
+                               const mask_t* lut) nogil:
+    # Contiguous rows, without branches so the loop is vectorized by the
+    # compiler. dst can be mask.
+    cdef int i
+    cdef mask_t m, r
+    cdef double v
+    for i in range(n):
+        m = lut[mask[i]]
+        v = <double>src[i]
+        r = 255 * ((v >= t_min) & (v <= t_max))
+        dst[i] = m if m else r
+
+
+@cython.boundscheck(False) # turn of bounds-checking for entire function
+@cython.wraparound(False)
+@cython.nonecheck(False)
+@cython.cdivision(True)
+def threshold_volume(const threshold_image_t[:, :, :] image,
+                     mask_t[:, :, :] mask,
+                     double t_min, double t_max,
+                     const int[:] slices, int num_threads=0):
+    """
+    Thresholds in place the given axial slices (indices in image) of mask (a
+    Mask.matrix, with the border): the voxels with the image in [t_min,
+    t_max] are set to 255 and the others to 0, but the ones edited by the
+    user are kept. The slices are thresholded in parallel.
+    """
+    cdef int dz = image.shape[0]
+    cdef int dy = image.shape[1]
+    cdef int dx = image.shape[2]
+    cdef int n_slices = slices.shape[0]
+    cdef int i, z, y, x
+    cdef mask_t m
+    cdef double v
+    cdef mask_t lut[256]
+    cdef int nt = get_num_threads(num_threads)
+
+    if mask.shape[0] != dz + 1 or mask.shape[1] != dy + 1 or mask.shape[2] != dx + 1:
+        raise ValueError("The mask must have the shape of the image plus the border")
+    for i in range(n_slices):
+        if slices[i] < 0 or slices[i] >= dz:
+            raise IndexError("Slice %d out of the image" % slices[i])
+
+    init_edited_lut(lut)
+
+    if image.strides[2] == sizeof(threshold_image_t) and mask.strides[2] == 1:
+        for i in prange(n_slices, nogil=True, schedule='dynamic',
+                        num_threads=nt):
+            z = slices[i]
+            for y in range(dy):
+                threshold_row(&image[z, y, 0], &mask[z + 1, y + 1, 1],
+                              &mask[z + 1, y + 1, 1], dx, t_min, t_max, lut)
+        return
+
+    for i in prange(n_slices, nogil=True, schedule='dynamic',
+                    num_threads=nt):
+        z = slices[i]
+        for y in range(dy):
+            for x in range(dx):
+                m = lut[mask[z + 1, y + 1, x + 1]]
+                if m == 0:
+                    v = <double>image[z, y, x]
+                    if v >= t_min and v <= t_max:
+                        m = 255
+                mask[z + 1, y + 1, x + 1] = m
+
+
+@cython.boundscheck(False) # turn of bounds-checking for entire function
+@cython.wraparound(False)
+@cython.nonecheck(False)
+@cython.cdivision(True)
+def threshold_slice(const threshold_image_t[:, :] image,
+                    const mask_t[:, :] mask,
+                    double t_min, double t_max,
+                    mask_t[:, :] out):
+    """
+    The same as threshold_volume to a slice (without the flags border),
+    written to out (it can be mask itself).
+    """
+    cdef int dy = image.shape[0]
+    cdef int dx = image.shape[1]
+    cdef int y, x
+    cdef mask_t m
+    cdef double v
+    cdef mask_t lut[256]
+
+    if mask.shape[0] != dy or mask.shape[1] != dx:
+        raise ValueError("The mask must have the shape of the image")
+
+    init_edited_lut(lut)
+
+    if (image.strides[1] == sizeof(threshold_image_t) and mask.strides[1] == 1
+            and out.strides[1] == 1):
+        with nogil:
+            for y in range(dy):
+                threshold_row(&image[y, 0], &mask[y, 0], &out[y, 0], dx,
+                              t_min, t_max, lut)
+        return
+
+    with nogil:
+        for y in range(dy):
+            for x in range(dx):
+                m = lut[mask[y, x]]
+                if m == 0:
+                    v = <double>image[y, x]
+                    if v >= t_min and v <= t_max:
+                        m = 255
+                out[y, x] = m
@@ -3,6 +3,7 @@
 import numpy as np
 cimport numpy as np
 cimport cython
+cimport openmp
 
 from .cy_my_types cimport image_t
 from .interpolation cimport interpolate, tricub_interpolate, tricubicInterpolate, lanczos3, nearest_neighbour_interp
@@ -137,6 +138,118 @@ def apply_view_matrix_transform(image_t[:, :, :] volume,
             count += 1
 
 
+@cython.boundscheck(False) # turn of bounds-checking for entire function
+@cython.cdivision(True)
+@cython.wraparound(False)
+def reslice_plane(image_t[:, :, :] volume,
+                  spacing,
+                  double[:, :] M,
+                  int n, str orientation,
+                  int minterpol,
+                  image_t cval,
+                  image_t[:, :] out,
+                  int step=1,
+                  int tile_size=64,
+                  int num_threads=0):
+    """
+    Samples only the plane n of the given orientation of the volume
+    transformed by M (the same as apply_view_matrix_transform with an out of
+    one slice). M must be affine, so the voxel coordinate of each pixel is
+    the coordinate of the first pixel plus its row and column times the
+    (cached) steps, instead of a matrix product per pixel. The plane is
+    split in tiles of tile_size x tile_size pixels processed by num_threads
+    threads (<= 0 means all of them), the voxels read by one tile are close
+    to each other even when the plane is oblique. With step > 1 only one of
+    each step x step pixels is sampled (out is the decimated plane).
+    """
+    cdef int dz, dy, dx
+    dz = volume.shape[0]
+    dy = volume.shape[1]
+    dx = volume.shape[2]
+
+    cdef int oh = out.shape[0]
+    cdef int ow = out.shape[1]
+
+    cdef double sx, sy, sz
+    sx = spacing[0]
+    sy = spacing[1]
+    sz = spacing[2]
+
+    cdef interp_function f_interp
+
+    if minterpol == 0:
+        f_interp = nearest_neighbour_interp
+    elif minterpol == 1:
+        f_interp = interpolate
+    elif minterpol == 2:
+        f_interp = tricubicInterpolate
+    else:
+        f_interp = lanczos3
+
+    # M in voxel coordinates (z, y, x): S^-1 M S.
+    cdef double s[3]
+    s[0] = sz
+    s[1] = sy
+    s[2] = sx
+    cdef double A[3][4]
+    cdef int i, j
+    for i in range(3):
+        for j in range(3):
+            A[i][j] = M[i, j] * s[j] / s[i]
+        A[i][3] = M[i, 3] / s[i]
+
+    # The voxel (z, y, x) of the pixel (0, 0) of the plane and the steps for
+    # each row and column.
+    cdef int ra, ca
+    cdef double p[3]
+    p[0] = 0
+    p[1] = 0
+    p[2] = 0
+    if orientation == 'AXIAL':
+        p[0] = n
+        ra, ca = 1, 2
+    elif orientation == 'CORONAL':
+        p[1] = n
+        ra, ca = 0, 2
+    else:
+        p[2] = n
+        ra, ca = 0, 1
+
+    cdef double o[3]
+    cdef double dr[3]
+    cdef double dc[3]
+    for i in range(3):
+        o[i] = A[i][0] * p[0] + A[i][1] * p[1] + A[i][2] * p[2] + A[i][3]
+        dr[i] = A[i][ra] * step
+        dc[i] = A[i][ca] * step
+
+    if tile_size < 1:
+        tile_size = 1
+    cdef int ntr = (oh + tile_size - 1) // tile_size
+    cdef int ntc = (ow + tile_size - 1) // tile_size
+    cdef int nt = num_threads
+    if nt <= 0:
+        nt = openmp.omp_get_max_threads()
+
+    cdef int t, r, c, r0, c0, r1, c1
+    cdef double nz, ny, nx
+
+    for t in prange(ntr * ntc, nogil=True, schedule='dynamic', num_threads=nt):
+        r0 = (t // ntc) * tile_size
+        c0 = (t % ntc) * tile_size
+        r1 = min(r0 + tile_size, oh)
+        c1 = min(c0 + tile_size, ow)
+        for r in range(r0, r1):
+            for c in range(c0, c1):
+                nz = o[0] + r * dr[0] + c * dc[0]
+                ny = o[1] + r * dr[1] + c * dc[1]
+                nx = o[2] + r * dr[2] + c * dc[2]
+                if 0 <= nz <= (dz-1) and 0 <= ny <= (dy-1) and 0 <= nx <= (dx-1):
+                    out[r, c] = <image_t>f_interp(volume, nx, ny, nz)
+                else:
+                    out[r, c] = cval
+
+
 @cython.boundscheck(False) # turn of bounds-checking for entire function
 @cython.cdivision(True)
 @cython.wraparound(False)
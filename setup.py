@@ -90,6 +90,14 @@ setup(
                 "invesalius_cy.transforms",
                 ["invesalius_cy/transforms.pyx"],
             ),
+            Extension(
+                "invesalius_cy.threshold",
+                ["invesalius_cy/threshold.pyx"],
+            ),
+            Extension(
+                "invesalius_cy.ccl",
+                ["invesalius_cy/ccl.pyx"],
+            ),
             Extension(
                 "invesalius_cy.floodfill",
                 ["invesalius_cy/floodfill.pyx"],
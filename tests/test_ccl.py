@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+ndimage = pytest.importorskip("scipy.ndimage")
+ccl = pytest.importorskip("invesalius_cy.ccl")
+
+from invesalius.data.mask_labels import MaskLabels  # noqa: E402
+
+STRUCTURES = {6: 1, 18: 2, 26: 3}
+
+
+def random_volume(shape, p, seed=0):
+    rng = np.random.default_rng(seed)
+    volume = (rng.random(shape) < p).astype(np.uint8) * 255
+    volume[rng.random(shape) < 0.05] = 254
+    return volume
+
+
+def assert_labels(volume, low, high, connectivity, block_slices=16, num_threads=0):
+    structure = ndimage.generate_binary_structure(3, STRUCTURES[connectivity])
+    expected, n_expected = ndimage.label((volume >= low) & (volume <= high), structure)
+
+    labels = np.empty(volume.shape, dtype=np.uint32)
+    n, sizes, bounds = ccl.label(
+        volume, low, high, connectivity, labels, block_slices, num_threads
+    )
+    assert n == n_expected
+    np.testing.assert_array_equal(labels, expected)
+    np.testing.assert_array_equal(sizes[1:], np.bincount(expected.ravel())[1:])
+    for i, objects in enumerate(ndimage.find_objects(expected), 1):
+        assert tuple(bounds[i]) == sum(((s.start, s.stop) for s in objects), ())
+
+
+@pytest.mark.parametrize(
+    "shape, p", [((37, 41, 43), 0.35), ((20, 30, 30), 0.6), ((1, 50, 60), 0.5)]
+)
+@pytest.mark.parametrize("connectivity", [6, 18, 26])
+@pytest.mark.parametrize("block_slices", [1, 4, 16, 100])
+def test_label(shape, p, connectivity, block_slices):
+    assert_labels(random_volume(shape, p), 254, 255, connectivity, block_slices, 3)
+
+
+def test_label_view():
+    # A view of the mask without the flags border, not contiguous.
+    matrix = np.zeros((31, 41, 51), dtype=np.uint8)
+    matrix[1:, 1:, 1:] = random_volume((30, 40, 50), 0.3, 1)
+    assert_labels(matrix[1:, 1:, 1:], 128, 255, 6)
+
+
+def test_mask_labels():
+    volume = random_volume((25, 30, 35), 0.3, 2)
+    mask_labels = MaskLabels(volume, 128, 255, 6)
+    expected, n = ndimage.label(volume > 127)
+    sizes = np.bincount(expected.ravel())
+    assert mask_labels.n == n
+
+    small = mask_labels.get_small(3)
+    np.testing.assert_array_equal(small, np.flatnonzero(sizes[1:] <= 3) + 1)
+
+    z, y, x = np.nonzero(np.isin(expected, small))
+    assert mask_labels.get_labels_bbox(small) == (
+        slice(z.min(), z.max() + 1),
+        slice(y.min(), y.max() + 1),
+        slice(x.min(), x.max() + 1),
+    )
+
+    out = volume.copy()
+    mask_labels.fill_labels(small, out, 0)
+    np.testing.assert_array_equal(out, np.where(np.isin(expected, small), 0, volume))
+
+    label = int(small[0])
+    mask_labels.remove(label)
+    assert mask_labels.sizes[label] == 0
+    assert not np.any(mask_labels.labels == label)
@@ -0,0 +1,90 @@
+import functools
+
+import numpy as np
+import pytest
+
+pytest.importorskip("invesalius_cy.threshold")
+
+from invesalius.data import mask_boolean as mb  # noqa: E402
+
+SHAPE = (23, 17, 19)
+
+
+def random_matrix(rng):
+    """
+    A mask matrix (with the border) of 0, 255 and edited voxels.
+    """
+    matrix = np.zeros([d + 1 for d in SHAPE], dtype=np.uint8)
+    values = np.array([0, 0, 255, 255, 1, 2, 253, 254], dtype=np.uint8)
+    matrix[1:, 1:, 1:] = rng.choice(values, SHAPE)
+    return matrix
+
+
+@pytest.fixture
+def operands():
+    rng = np.random.default_rng(0)
+    matrices = [random_matrix(rng) for i in range(3)]
+    readers = [functools.partial(mb.read_mask_slab, m) for m in matrices]
+    volumes = [m[1:, 1:, 1:] > 2 for m in matrices]
+    return readers, volumes
+
+
+@pytest.mark.parametrize(
+    "expression, expected",
+    [
+        ((mb.UNION, 0, 1), lambda a, b, c: a | b),
+        ((mb.DIFF, 0, 1), lambda a, b, c: a & ~b),
+        ((mb.AND, 0, 1), lambda a, b, c: a & b),
+        ((mb.XOR, 0, 1), lambda a, b, c: a ^ b),
+        ((mb.DIFF, (mb.MIRROR, 0), 1), lambda a, b, c: a[:, :, ::-1] & ~b),
+        ((mb.DIFF, (mb.UNION, 0, 1), 2), lambda a, b, c: (a | b) & ~c),
+        ((mb.UNION, 0, 1, 2), lambda a, b, c: a | b | c),
+        (2, lambda a, b, c: c),
+    ],
+)
+@pytest.mark.parametrize("block_slices", [1, 5, 16, 100])
+def test_evaluate_to(operands, expression, expected, block_slices):
+    readers, volumes = operands
+    out = np.full(SHAPE, 7, dtype=np.uint8)
+    mb.evaluate_to(expression, readers, out, block_slices, num_threads=3)
+    np.testing.assert_array_equal(out, expected(*volumes) * np.uint8(255))
+
+
+def test_operands():
+    assert mb.get_operands((mb.DIFF, (mb.UNION, 2, 0), 2)) == [2, 0]
+
+
+@pytest.mark.parametrize(
+    "expression",
+    [("nand", 0, 1), (mb.MIRROR, 0, 1), (mb.UNION,), (mb.UNION, 0, 3)],
+)
+def test_bad_expressions(operands, expression):
+    readers, volumes = operands
+    out = np.zeros(SHAPE, dtype=np.uint8)
+    with pytest.raises(ValueError):
+        mb.evaluate_to(expression, readers, out)
+
+
+def test_slices_not_thresholded():
+    # The slices not thresholded are thresholded from the image, keeping the
+    # edited voxels, and the mask is not modified.
+    rng = np.random.default_rng(1)
+    image = rng.integers(-1000, 2000, SHAPE).astype(np.int16)
+    matrix = random_matrix(rng)
+    original = matrix.copy()
+    thresholded = rng.random(SHAPE[0]) < 0.5
+    low, high = 100, 900
+
+    in_range = (image >= low) & (image <= high)
+    inside = matrix[1:, 1:, 1:]
+    edited = np.isin(inside, (1, 2, 253, 254))
+    expected = inside > 2
+    expected[~thresholded] = np.where(edited, inside > 2, in_range)[~thresholded]
+
+    slab = mb.read_mask_slab(matrix, 4, 15, image, (low, high), thresholded)
+    np.testing.assert_array_equal(slab, expected[4:15])
+    np.testing.assert_array_equal(matrix, original)
+
+    # Without the thresholded slices the matrix is taken as it is.
+    slab = mb.read_mask_slab(matrix, 4, 15, image, (low, high))
+    np.testing.assert_array_equal(slab, inside[4:15] > 2)
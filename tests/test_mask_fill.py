@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+ndimage = pytest.importorskip("scipy.ndimage")
+pytest.importorskip("invesalius_cy.floodfill")
+
+from invesalius.data import mask_fill  # noqa: E402
+
+
+def random_image(shape=(20, 30, 25), seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 100, shape).astype(np.int16)
+
+
+def expected_fill(image, seed, t0, t1, strct):
+    x, y, z = seed
+    # ndimage.label takes only 3x3x3 structures.
+    structure = np.zeros((3, 3, 3), dtype=bool)
+    d = (3 - strct.shape[0]) // 2
+    structure[d : 3 - d] = strct
+    labels, n = ndimage.label((image >= t0) & (image <= t1), structure)
+    return labels == labels[z, y, x]
+
+
+@pytest.mark.parametrize(
+    "strct",
+    [
+        ndimage.generate_binary_structure(3, 1),
+        ndimage.generate_binary_structure(3, 3),
+        # An axial slice.
+        np.array([ndimage.generate_binary_structure(2, 1)]),
+    ],
+)
+def test_floodfill_region(strct):
+    image = random_image()
+    seed = (7, 11, 9)
+    t0, t1 = 20, 70
+    image[seed[2], seed[1], seed[0]] = 50
+
+    bbox, filled = mask_fill.floodfill_region(image, seed, t0, t1, strct)
+    expected = expected_fill(image, seed, t0, t1, strct)
+    z, y, x = np.nonzero(expected)
+    assert bbox == (
+        slice(z.min(), z.max() + 1),
+        slice(y.min(), y.max() + 1),
+        slice(x.min(), x.max() + 1),
+    )
+    np.testing.assert_array_equal(filled, expected[bbox])
+
+
+def test_seed_out_of_range():
+    image = random_image()
+    image[3, 4, 5] = 90
+    strct = ndimage.generate_binary_structure(3, 1)
+    assert mask_fill.floodfill_region(image, (5, 4, 3), 20, 70, strct) is None
+
+
+def test_scratch_reused():
+    image = random_image(seed=1)
+    strct = ndimage.generate_binary_structure(3, 1)
+    image[2, 2, 2] = 50
+    mask_fill.floodfill_region(image, (2, 2, 2), 20, 70, strct)
+    scratch = mask_fill._scratch_buffers[-1]
+    # The buffer is released cleared, to be used by the next fill.
+    assert not scratch.any()
+    image[5, 6, 7] = 50
+    mask_fill.floodfill_region(image, (7, 6, 5), 20, 70, strct)
+    assert mask_fill._scratch_buffers[-1] is scratch
+    assert not scratch.any()
+
+    # The buffers of other shapes are released.
+    mask_fill.floodfill_region(image[1:], (2, 2, 2), 20, 70, strct)
+    assert len(mask_fill._scratch_buffers) == 1
+    assert mask_fill._scratch_buffers[0] is not scratch
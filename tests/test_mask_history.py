@@ -0,0 +1,143 @@
+import os
+
+import numpy as np
+
+from invesalius.data.mask_history import HistoryBudget, MaskDelta, get_changed_bounds
+
+
+def edited_volume(rng, shape=(20, 30, 40)):
+    p_array = (255 * (rng.random(shape) < 0.3)).astype(np.uint8)
+    array = p_array.copy()
+    array[3:7, 10:12, 5:30] = 254
+    array[15, 2, 8] = 1
+    return array, p_array
+
+
+def test_changed_bounds():
+    array, p_array = edited_volume(np.random.default_rng(0))
+    assert get_changed_bounds(array, p_array, block_slices=4) == (
+        (3, 16),
+        (2, 12),
+        (5, 30),
+    )
+    assert get_changed_bounds(p_array, p_array.copy()) is None
+
+
+def test_apply_and_undo():
+    array, p_array = edited_volume(np.random.default_rng(1))
+    delta = MaskDelta(array, p_array)
+    assert not delta.is_empty
+    assert delta.nbytes < array[delta.bbox].nbytes
+
+    region = p_array.copy()
+    delta.apply(region)
+    np.testing.assert_array_equal(region, array)
+    delta.apply(region, previous=True)
+    np.testing.assert_array_equal(region, p_array)
+
+
+def test_slice_as_volume():
+    # The 2D editions are saved as (1, h, w) volumes of a slice.
+    rng = np.random.default_rng(2)
+    p_array = (255 * (rng.random((30, 40)) < 0.5)).astype(np.uint8)
+    array = p_array.copy()
+    array[4:9, 4:9] = 254
+    delta = MaskDelta(array.reshape(1, 30, 40), p_array)
+    region = p_array.copy()
+    delta.apply(region)
+    np.testing.assert_array_equal(region, array)
+
+
+def test_region_with_offset():
+    array, p_array = edited_volume(np.random.default_rng(3))
+    volume = np.zeros((25, 35, 45), dtype=np.uint8)
+    offset = (2, 3, 4)
+    bbox = tuple(slice(o, o + d) for (o, d) in zip(offset, array.shape))
+    volume[bbox] = p_array
+    expected = volume.copy()
+    expected[bbox] = array
+
+    delta = MaskDelta(array, p_array, offset, volume.shape)
+    delta.apply(volume)
+    np.testing.assert_array_equal(volume, expected)
+    delta.apply(volume, previous=True)
+    np.testing.assert_array_equal(volume[bbox], p_array)
+
+
+def test_empty_delta():
+    p_array = np.zeros((5, 6, 7), dtype=np.uint8)
+    delta = MaskDelta(p_array.copy(), p_array)
+    assert delta.is_empty and delta.nbytes == 0
+    delta.apply(p_array)
+
+
+def test_to_disk():
+    array, p_array = edited_volume(np.random.default_rng(4))
+    delta = MaskDelta(array, p_array)
+    nbytes = delta.nbytes
+    delta.to_disk()
+    try:
+        assert not delta.in_memory and delta.nbytes == nbytes
+        region = p_array.copy()
+        delta.apply(region)
+        np.testing.assert_array_equal(region, array)
+    finally:
+        filename = delta.filename
+        delta.remove()
+    assert delta.filename is None
+    assert not os.path.exists(filename)
+
+
+def test_budget_spills_the_oldest():
+    rng = np.random.default_rng(5)
+    deltas = [MaskDelta(*edited_volume(rng)) for i in range(4)]
+    try:
+        total = sum(d.nbytes for d in deltas)
+        newest = deltas[2].nbytes + deltas[3].nbytes
+        budget = HistoryBudget(newest, total)
+        # The deltas of an edition are shared by its two nodes.
+        nodes = [d for d in deltas for i in range(2)]
+        assert budget.spill(nodes)
+        assert [d.in_memory for d in deltas] == [False, False, True, True]
+        assert budget.get_usage(nodes) == (newest, total - newest)
+
+        # Over the disk budget, the caller forgets the oldest editions.
+        assert not HistoryBudget(0, deltas[0].nbytes).spill(deltas)
+    finally:
+        for delta in deltas:
+            delta.remove()
+
+
+def test_from_edition():
+    rng = np.random.default_rng(7)
+    p_array = (255 * (rng.random((40, 30, 20)) < 0.3)).astype(np.uint8)
+
+    def crop(block, start):
+        for z, plane in enumerate(block, start):
+            if 9 <= z < 30:
+                tmp = plane[5:20, 3:15].copy()
+                plane[:] = 1
+                plane[5:20, 3:15] = tmp
+            elif z in (2, 35):
+                plane[:] = 1
+
+    expected = p_array.copy()
+    crop(expected, 0)
+    array = p_array.copy()
+    delta = MaskDelta.from_edition(array, crop, block_slices=4)
+    np.testing.assert_array_equal(array, expected)
+    assert delta.bounds == ((2, 36), (0, 30), (0, 20))
+
+    delta.apply(array, previous=True)
+    np.testing.assert_array_equal(array, p_array)
+    delta.to_disk()
+    delta.apply(array)
+    np.testing.assert_array_equal(array, expected)
+    delta.remove()
+
+
+def test_from_edition_unchanged():
+    array = np.ones((10, 5, 5), dtype=np.uint8)
+    delta = MaskDelta.from_edition(array, lambda block, start: None)
+    assert delta.is_empty
+    assert delta.shape == array.shape
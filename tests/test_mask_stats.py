@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("invesalius_cy.threshold")
+
+from invesalius.data import mask_stats  # noqa: E402
+
+SHAPE = (21, 18, 15)
+SPACING = (0.5, 0.75, 2.0)
+
+
+def make_volumes(seed=0):
+    rng = np.random.default_rng(seed)
+    image = rng.integers(-1000, 2000, SHAPE).astype(np.int16)
+    inside = np.zeros(SHAPE, dtype=bool)
+    inside[3:17, 2:11, 4:14] = rng.random((14, 9, 10)) < 0.7
+    matrix = np.zeros([d + 1 for d in SHAPE], dtype=np.uint8)
+    matrix[1:, 1:, 1:] = inside * np.uint8(255)
+    return image, matrix, inside
+
+
+def expected_statistics(image, inside):
+    sx, sy, sz = SPACING
+    values = image[inside].astype(np.float64)
+    faces = [np.count_nonzero(np.diff(inside, axis=a)) for a in range(3)]
+    z, y, x = np.nonzero(inside)
+    return {
+        "min": values.min(),
+        "max": values.max(),
+        "mean": values.mean(),
+        "std": values.std(),
+        "voxels": values.size,
+        "volume": values.size * sx * sy * sz,
+        "area": faces[0] * sx * sy + faces[1] * sx * sz + faces[2] * sy * sz,
+        "bounds": tuple((int(c.min()), int(c.max()) + 1) for c in (z, y, x)),
+        "centroid": (z.mean(), y.mean(), x.mean()),
+    }
+
+
+def assert_statistics(stats, expected):
+    for name, value in expected.items():
+        np.testing.assert_allclose(getattr(stats, name), value, err_msg=name)
+
+
+@pytest.mark.parametrize("block_slices", [1, 4, 16, 100])
+@pytest.mark.parametrize("num_threads", [1, 3])
+def test_compute(block_slices, num_threads):
+    image, matrix, inside = make_volumes()
+    stats = mask_stats.compute(
+        image,
+        matrix,
+        spacing=SPACING,
+        block_slices=block_slices,
+        num_threads=num_threads,
+    )
+    assert_statistics(stats, expected_statistics(image, inside))
+
+
+def test_slices_not_thresholded():
+    image, matrix, inside = make_volumes(1)
+    original = matrix.copy()
+    thresholded = np.ones(SHAPE[0], dtype=bool)
+    thresholded[5:9] = False
+    low, high = 0, 800
+    inside[5:9] = (image[5:9] >= low) & (image[5:9] <= high)
+
+    stats = mask_stats.compute(
+        image,
+        matrix,
+        (low, high),
+        SPACING,
+        block_slices=3,
+        num_threads=2,
+        thresholded=thresholded,
+    )
+    assert_statistics(stats, expected_statistics(image, inside))
+    np.testing.assert_array_equal(matrix, original)
+
+
+def test_empty_mask():
+    image, matrix, inside = make_volumes()
+    matrix[:] = 0
+    stats = mask_stats.compute(image, matrix, spacing=SPACING)
+    assert stats.voxels == 0
+    assert stats.volume == 0.0
+    assert stats.area == 0.0
+    assert stats.bounds is None
+    assert stats.centroid is None
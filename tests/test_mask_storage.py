@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from invesalius.data.dirty_slices import read_flags, write_flags
+from invesalius.data.mask_storage import PackedMask
+
+ORIENTATIONS = ("AXIAL", "CORONAL", "SAGITAL")
+
+
+def random_matrix(rng, shape=(24, 31, 45), edited=300):
+    """
+    A mask matrix (with the border) mostly 0 and 255, with some edited voxels
+    and flags.
+    """
+    matrix = np.zeros(shape, dtype=np.uint8)
+    matrix[1:, 1:, 1:] = 255 * (rng.random([d - 1 for d in shape]) < 0.3)
+    inside = matrix[1:, 1:, 1:]
+    indices = rng.integers(0, inside.size, edited)
+    values = np.array([1, 2, 253, 254], dtype=np.uint8)
+    inside.ravel()[indices] = rng.choice(values, edited)
+    write_flags(matrix, [rng.random(d - 1) < 0.5 for d in shape])
+    return matrix
+
+
+def matrix_slice(matrix, orientation, index):
+    n = index + 1
+    if orientation == "AXIAL":
+        return matrix[n, 1:, 1:]
+    elif orientation == "CORONAL":
+        return matrix[1:, n, 1:]
+    return matrix[1:, 1:, n]
+
+
+def test_round_trip():
+    matrix = random_matrix(np.random.default_rng(0))
+    packed = PackedMask.from_matrix(matrix, block_slices=5)
+    np.testing.assert_array_equal(packed.to_matrix(), matrix)
+    assert packed.nbytes < matrix.nbytes / 4
+
+    out = np.full(matrix.shape, 7, dtype=np.uint8)
+    packed.to_matrix(out, block_slices=3)
+    np.testing.assert_array_equal(out, matrix)
+
+
+@pytest.mark.parametrize("orientation", ORIENTATIONS)
+def test_slices_without_unpacking(orientation):
+    matrix = random_matrix(np.random.default_rng(1))
+    packed = PackedMask.from_matrix(matrix)
+    axis = ORIENTATIONS.index(orientation)
+    for index in range(matrix.shape[axis] - 1):
+        np.testing.assert_array_equal(
+            packed.get_slice(orientation, index),
+            matrix_slice(matrix, orientation, index),
+        )
+
+
+def test_flags():
+    rng = np.random.default_rng(2)
+    matrix = random_matrix(rng)
+    packed = PackedMask.from_matrix(matrix)
+    for flags, expected in zip(packed.get_flags(), read_flags(matrix)):
+        np.testing.assert_array_equal(flags, expected)
+
+    thresholded = [rng.random(d - 1) < 0.5 for d in matrix.shape]
+    packed.set_flags(thresholded)
+    write_flags(matrix, thresholded)
+    np.testing.assert_array_equal(packed.to_matrix(), matrix)
+
+
+def test_save_and_load(tmp_path):
+    matrix = random_matrix(np.random.default_rng(3))
+    packed = PackedMask.from_matrix(matrix)
+    filename = str(tmp_path / "mask.npz")
+    packed.save(filename)
+    loaded = PackedMask.load(filename)
+    assert loaded.shape == matrix.shape
+    np.testing.assert_array_equal(loaded.to_matrix(), matrix)
+
+
+def test_not_packed_if_mostly_edited():
+    matrix = np.full((9, 10, 11), 254, dtype=np.uint8)
+    assert PackedMask.from_matrix(matrix) is None
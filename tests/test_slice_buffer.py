@@ -0,0 +1,77 @@
+import numpy as np
+
+from invesalius.data.slice_buffer import SliceBuffer
+
+SLICE_BYTES = 1000
+
+
+def image():
+    return np.zeros(SLICE_BYTES, dtype=np.uint8)
+
+
+def test_least_recently_used_evicted():
+    buffer_ = SliceBuffer(3 * SLICE_BYTES)
+    for index in range(3):
+        buffer_.update(index, image=image())
+    assert buffer_.nbytes == 3 * SLICE_BYTES
+
+    # 0 is used again, so 1 is the least recently used one.
+    assert buffer_.get(0) is not None
+    buffer_.update(3, image=image())
+    assert 1 not in buffer_
+    assert all(index in buffer_ for index in (0, 2, 3))
+    assert buffer_.nbytes == 3 * SLICE_BYTES
+
+
+def test_current_slice_not_evicted():
+    buffer_ = SliceBuffer(2 * SLICE_BYTES)
+    buffer_.index = 0
+    buffer_.update(0, image=image())
+    for index in range(1, 5):
+        buffer_.update(index, image=image())
+    assert 0 in buffer_
+    assert buffer_.image is not None
+    assert len(buffer_) == 2
+
+
+def test_nbytes_follow_the_entries():
+    buffer_ = SliceBuffer(10 * SLICE_BYTES)
+    buffer_.update(0, image=image(), mask=image())
+    buffer_.update(0, rgb_image=np.zeros((10, 10, 3), dtype=np.uint8))
+    assert buffer_.nbytes == 2 * SLICE_BYTES + 300
+
+    buffer_.discard_mask(0)
+    assert buffer_.nbytes == SLICE_BYTES + 300
+    buffer_.discard_vtk_image()
+    assert buffer_.nbytes == SLICE_BYTES
+    buffer_.discard_buffer(0)
+    assert buffer_.nbytes == 0 and len(buffer_) == 0
+
+
+def test_generations():
+    buffer_ = SliceBuffer(10 * SLICE_BYTES)
+    buffer_.update(0, image=image())
+    generation = buffer_.generation
+    image_generation = buffer_.image_generation
+
+    # Storing a slice computed doesn't invalidate the others.
+    buffer_.update(1, image=image())
+    assert buffer_.generation == generation
+
+    buffer_.discard_mask()
+    assert buffer_.generation > generation
+    assert buffer_.image_generation == image_generation
+    buffer_.discard_image()
+    assert buffer_.image_generation > image_generation
+    assert buffer_.get(0).image is None
+
+
+def test_transient_mask_dropped_when_slice_changes():
+    buffer_ = SliceBuffer(10 * SLICE_BYTES)
+    buffer_.index = 4
+    buffer_.update(4, image=image())
+    buffer_.mask = image()
+    assert buffer_.mask is not None
+    buffer_.index = 5
+    assert buffer_.get(4).mask is None
+    assert buffer_.get(4).image is not None
@@ -0,0 +1,153 @@
+import numpy as np
+import pytest
+
+from invesalius.data.slice_compositor import SliceCompositor
+
+vtk = pytest.importorskip("vtk")
+numpy_support = pytest.importorskip("vtk.util.numpy_support")
+
+THRESHOLD_HUE_RANGE = (0, 0.6667)
+
+
+def to_vtk(n_array):
+    dy, dx = n_array.shape[:2]
+    nc = n_array.shape[2] if n_array.ndim == 3 else 1
+    image = vtk.vtkImageData()
+    image.SetDimensions(dx, dy, 1)
+    image.AllocateScalars(numpy_support.get_vtk_array_type(n_array.dtype), nc)
+    image.GetPointData().SetScalars(
+        numpy_support.numpy_to_vtk(n_array.reshape(-1, nc), deep=1)
+    )
+    return image
+
+
+def to_numpy(image, shape):
+    scalars = numpy_support.vtk_to_numpy(image.GetPointData().GetScalars())
+    return scalars.reshape(shape + (-1,))
+
+
+def vtk_colour_image(image, ww, wl):
+    # The pipeline of the slice viewer before the SliceCompositor.
+    colorer = vtk.vtkImageMapToWindowLevelColors()
+    colorer.SetInputData(to_vtk(image))
+    colorer.SetWindow(ww)
+    colorer.SetLevel(wl)
+    colorer.SetOutputFormatToRGB()
+    colorer.Update()
+    ww_wl_image = colorer.GetOutput()
+
+    lut_bg = vtk.vtkLookupTable()
+    lut_bg.SetTableRange(ww_wl_image.GetScalarRange())
+    lut_bg.SetSaturationRange((0, 0))
+    lut_bg.SetHueRange((0, 0))
+    lut_bg.SetValueRange((0, 1))
+    lut_bg.Build()
+    img_colours_bg = vtk.vtkImageMapToColors()
+    img_colours_bg.SetOutputFormatToRGB()
+    img_colours_bg.SetLookupTable(lut_bg)
+    img_colours_bg.SetInputData(ww_wl_image)
+    img_colours_bg.Update()
+    return img_colours_bg.GetOutput()
+
+
+def vtk_mask_image(mask, colour, opacity):
+    r, g, b = colour
+    lut_mask = vtk.vtkLookupTable()
+    lut_mask.SetNumberOfColors(256)
+    lut_mask.SetHueRange(THRESHOLD_HUE_RANGE)
+    lut_mask.SetSaturationRange(1, 1)
+    lut_mask.SetValueRange(0, 255)
+    lut_mask.SetRange(0, 255)
+    lut_mask.SetNumberOfTableValues(256)
+    for v in range(256):
+        lut_mask.SetTableValue(v, 0, 0, 0, 0.0)
+    for v in (253, 254, 255):
+        lut_mask.SetTableValue(v, r, g, b, opacity)
+    lut_mask.SetRampToLinear()
+    lut_mask.Build()
+    img_colours_mask = vtk.vtkImageMapToColors()
+    img_colours_mask.SetLookupTable(lut_mask)
+    img_colours_mask.SetOutputFormatToRGBA()
+    img_colours_mask.SetInputData(to_vtk(mask))
+    img_colours_mask.Update()
+    return img_colours_mask.GetOutput()
+
+
+def vtk_compose(image, mask, ww, wl, colour, opacity):
+    blend = vtk.vtkImageBlend()
+    blend.SetBlendModeToNormal()
+    blend.SetOpacity(1, 0.8)
+    blend.SetInputData(vtk_colour_image(image, ww, wl))
+    blend.AddInputData(vtk_mask_image(mask, colour, opacity))
+    blend.Update()
+    return to_numpy(blend.GetOutput(), image.shape)
+
+
+def random_slice(rng, dtype, shape=(61, 47)):
+    if np.dtype(dtype).kind == "f":
+        return rng.uniform(-1024, 3071, shape).astype(dtype)
+    info = np.iinfo(dtype)
+    low, high = max(info.min, -1024), min(info.max, 3071)
+    return rng.integers(low, high, shape).astype(dtype)
+
+
+def random_mask(rng, shape=(61, 47)):
+    values = np.array([0, 1, 2, 253, 254, 255], dtype=np.uint8)
+    return rng.choice(values, shape)
+
+
+@pytest.mark.parametrize("dtype", [np.int16, np.uint8, np.uint16, np.float32])
+@pytest.mark.parametrize("ww, wl", [(350.0, 50.0), (4000.0, 1000.0), (1.0, 0.0)])
+def test_colour_image_as_vtk(dtype, ww, wl):
+    rng = np.random.default_rng(0)
+    image = random_slice(rng, dtype)
+    compositor = SliceCompositor()
+    compositor.set_window_level(ww, wl)
+    expected = to_numpy(vtk_colour_image(image, ww, wl), image.shape)
+    np.testing.assert_array_equal(compositor.colour_image(image), expected)
+
+
+@pytest.mark.parametrize("dtype", [np.int16, np.uint8, np.float32])
+@pytest.mark.parametrize("opacity", [0.8, 0.35, 1.0])
+def test_compose_mask_as_vtk(dtype, opacity):
+    rng = np.random.default_rng(1)
+    image = random_slice(rng, dtype)
+    mask = random_mask(rng)
+    colour = (0.2, 0.7, 0.33)
+    compositor = SliceCompositor()
+    compositor.set_window_level(350.0, 50.0)
+    expected = vtk_compose(image, mask, 350.0, 50.0, colour, opacity)
+    result = compositor.compose(image, mask, colour, opacity)
+    np.testing.assert_array_equal(result, expected)
+
+
+def test_tables_follow_window_level():
+    rng = np.random.default_rng(2)
+    image = random_slice(rng, np.int16)
+    mask = random_mask(rng)
+    colour = (1.0, 0.0, 0.5)
+    compositor = SliceCompositor()
+    for ww, wl in ((350.0, 50.0), (1000.0, 300.0), (350.0, 50.0)):
+        compositor.set_window_level(ww, wl)
+        expected = vtk_compose(image, mask, ww, wl, colour, 0.8)
+        result = compositor.compose(image, mask, colour, 0.8)
+        np.testing.assert_array_equal(result, expected)
+
+
+def test_layers_blended_in_order():
+    rng = np.random.default_rng(3)
+    image = random_slice(rng, np.int16)
+    layers = [
+        (random_mask(rng), (0.2, 0.7, 0.33), 0.8),
+        (random_mask(rng), (1.0, 0.0, 0.0), 0.5),
+        (random_mask(rng), (0.0, 0.0, 1.0), 0.3),
+    ]
+    compositor = SliceCompositor()
+    compositor.set_window_level(350.0, 50.0)
+    expected = compositor.colour_image(image)
+    for mask, colour, opacity in layers:
+        compositor.blend(expected, mask, *compositor.get_mask_table(colour, opacity))
+    np.testing.assert_array_equal(compositor.compose_layers(image, layers), expected)
+    assert np.array_equal(
+        compositor.compose_layers(image, []), compositor.colour_image(image)
+    )